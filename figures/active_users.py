@@ -0,0 +1,251 @@
+"""Active user counts for any window of days
+
+The daily pipeline stores the set of active user ids for each site and course
+for each day in the `DailyActiveUsers` model. See
+`figures.pipeline.daily_active_users`. The functions in this module get the
+active users for a window of days (a day, a week, a month, or any date range)
+as the union of the stored sets, so they do not need to scan StudentModule.
+
+For days the pipeline has not stored, such as today or days before we started
+storing active users, we fall back to querying StudentModule for those days
+only.
+
+Sites listed in the ``FIGURES_APPROXIMATE_MAU_SITES`` feature get approximate
+counts. We merge the stored HyperLogLog sketches instead of the id sets. See
+`figures.hll`
+"""
+
+from __future__ import absolute_import
+from collections import defaultdict
+import datetime
+
+from figures.helpers import (
+    as_course_key,
+    as_date,
+    as_datetime,
+    next_day,
+    unpack_int_set,
+)
+from figures.hll import HyperLogLog, precision_for_error
+from figures.models import DailyActiveUsers
+from figures.settings import approximate_mau_error, use_approximate_mau
+from figures.sites import get_student_modules_for_site
+
+
+def stored_dates(site, start_date, end_date):
+    """Return the set of dates in the window the pipeline stored for the site
+    """
+    return set(DailyActiveUsers.objects.for_period(
+        site, as_date(start_date), as_date(end_date)).values_list('date_for', flat=True))
+
+
+def missing_date_ranges(start_date, end_date, dates):
+    """Return a list of (start, end) tuples of consecutive dates in the window
+    that are not in `dates`
+    """
+    ranges = []
+    range_start = None
+    day = start_date
+    while day <= end_date:
+        if day in dates:
+            if range_start is not None:
+                ranges.append((range_start, day - datetime.timedelta(days=1)))
+                range_start = None
+        elif range_start is None:
+            range_start = day
+        day = next_day(day)
+    if range_start is not None:
+        ranges.append((range_start, end_date))
+    return ranges
+
+
+def _live_student_modules(site, date_ranges, student_modules=None, course_ids=None):
+    """Return StudentModule querysets for the date ranges we did not store
+    """
+    if student_modules is None:
+        student_modules = get_student_modules_for_site(site)
+    if course_ids is not None:
+        student_modules = student_modules.filter(
+            course_id__in=[as_course_key(cid) for cid in course_ids])
+    for range_start, range_end in date_ranges:
+        yield student_modules.filter(modified__gte=as_datetime(range_start),
+                                     modified__lt=as_datetime(next_day(range_end)))
+
+
+def _stored_and_live(site, start_date, end_date, course_ids, student_modules, fields):
+    """Return the stored records and the live StudentModule querysets for a window
+
+    Returns a tuple. The first item is a list of `fields` value tuples for the
+    stored records. The second item is an iterator of StudentModule querysets
+    for the days we did not store
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date)
+    site_records = DailyActiveUsers.objects.for_period(site, start_date, end_date)
+    if course_ids is None:
+        rows = list(site_records.values_list('date_for', *fields))
+        dates = set(row[0] for row in rows)
+        rows = [row[1:] for row in rows]
+    else:
+        dates = set(site_records.values_list('date_for', flat=True))
+        rows = list(DailyActiveUsers.objects.for_period(
+            site, start_date, end_date, course_ids=course_ids).values_list(*fields))
+
+    date_ranges = missing_date_ranges(start_date, end_date, dates)
+    return rows, _live_student_modules(site, date_ranges,
+                                       student_modules=student_modules,
+                                       course_ids=course_ids)
+
+
+def get_active_user_ids(site, start_date, end_date, course_ids=None,
+                        student_modules=None):
+    """Return the set of user ids active in the site between the dates, inclusive
+
+    If `course_ids` is given, only activity in those courses is counted.
+
+    `student_modules` is the StudentModule queryset we use for days we did not
+    store. It defaults to the site's StudentModule records
+    """
+    rows, live_querysets = _stored_and_live(site, start_date, end_date,
+                                            course_ids=course_ids,
+                                            student_modules=student_modules,
+                                            fields=['packed_user_ids'])
+    user_ids = set()
+    for (packed,) in rows:
+        user_ids.update(unpack_int_set(packed))
+    for live_sm in live_querysets:
+        user_ids.update(live_sm.values_list('student_id', flat=True).distinct())
+    return user_ids
+
+
+def new_sketch():
+    """Return an empty sketch with the precision for the configured error
+    """
+    return HyperLogLog(precision=precision_for_error(approximate_mau_error()))
+
+
+def get_active_user_sketch(site, start_date, end_date, course_ids=None,
+                           student_modules=None):
+    """Return a HyperLogLog sketch of the users active between the dates, inclusive
+
+    We merge the stored sketches. Stored records without a sketch of the
+    configured precision, such as days stored before the site used
+    approximate counts, are added from their id sets. Days we did not store
+    are added from StudentModule.
+
+    See `get_active_user_ids` for the parameters
+    """
+    sketch = new_sketch()
+    rows, live_querysets = _stored_and_live(site, start_date, end_date,
+                                            course_ids=course_ids,
+                                            student_modules=student_modules,
+                                            fields=['sketch', 'packed_user_ids'])
+    for stored_sketch, packed in rows:
+        if stored_sketch:
+            day_sketch = HyperLogLog.from_bytes(stored_sketch)
+            if day_sketch.precision == sketch.precision:
+                sketch.merge(day_sketch)
+                continue
+        sketch.update(unpack_int_set(packed))
+    for live_sm in live_querysets:
+        sketch.update(live_sm.values_list('student_id', flat=True).distinct())
+    return sketch
+
+
+def get_active_user_count(site, start_date, end_date, course_ids=None,
+                          student_modules=None, approximate=None):
+    """Return the count of users active in the site between the dates, inclusive
+
+    If `approximate` is None, we use the site's setting. See
+    `figures.settings.use_approximate_mau`
+
+    See `get_active_user_ids` for the other parameters
+    """
+    if approximate is None:
+        approximate = use_approximate_mau(site)
+    if approximate:
+        return get_active_user_sketch(site, start_date, end_date,
+                                      course_ids=course_ids,
+                                      student_modules=student_modules).count()
+    return len(get_active_user_ids(site, start_date, end_date,
+                                   course_ids=course_ids,
+                                   student_modules=student_modules))
+
+
+def _course_stored_and_live(site, start_date, end_date, student_modules, fields):
+    """Return the stored course records and the live StudentModule querysets
+    for a window
+
+    Like `_stored_and_live` for all the site's courses at once. The stored
+    rows are tuples of the course id and the `fields` values
+    """
+    start_date = as_date(start_date)
+    end_date = as_date(end_date)
+    dates = stored_dates(site, start_date, end_date)
+    course_records = DailyActiveUsers.objects.filter(
+        site=site,
+        date_for__gte=start_date,
+        date_for__lte=end_date).exclude(course_id=DailyActiveUsers.SITE_COURSE_ID)
+    rows = course_records.values_list('course_id', *fields)
+    date_ranges = missing_date_ranges(start_date, end_date, dates)
+    return rows, _live_student_modules(site, date_ranges, student_modules=student_modules)
+
+
+def _live_course_user_ids(live_querysets):
+    """Yield (course id string, user id) tuples from the live querysets
+    """
+    for live_sm in live_querysets:
+        for course_id, user_id in live_sm.order_by().values_list(
+                'course_id', 'student_id').distinct():
+            yield str(course_id), user_id
+
+
+def get_active_user_ids_by_course(site, start_date, end_date, student_modules=None):
+    """Return a dict of course id strings to the sets of user ids active in
+    each course between the dates, inclusive
+
+    Courses without active users are not included
+    """
+    rows, live_querysets = _course_stored_and_live(site, start_date, end_date,
+                                                   student_modules=student_modules,
+                                                   fields=['packed_user_ids'])
+    course_users = defaultdict(set)
+    for course_id, packed in rows:
+        course_users[course_id].update(unpack_int_set(packed))
+    for course_id, user_id in _live_course_user_ids(live_querysets):
+        course_users[course_id].add(user_id)
+    return dict(course_users)
+
+
+def get_active_user_count_by_course(site, start_date, end_date, student_modules=None,
+                                    approximate=None):
+    """Return a dict of course id strings to the count of users active in each
+    course between the dates, inclusive
+
+    If `approximate` is None, we use the site's setting. Approximate counts
+    merge the stored course sketches. See `get_active_user_sketch`
+
+    Courses without active users are not included
+    """
+    if approximate is None:
+        approximate = use_approximate_mau(site)
+    if not approximate:
+        return {course_id: len(user_ids) for course_id, user_ids in
+                get_active_user_ids_by_course(site, start_date, end_date,
+                                              student_modules=student_modules).items()}
+
+    rows, live_querysets = _course_stored_and_live(site, start_date, end_date,
+                                                   student_modules=student_modules,
+                                                   fields=['sketch', 'packed_user_ids'])
+    course_sketches = defaultdict(new_sketch)
+    for course_id, stored_sketch, packed in rows:
+        sketch = course_sketches[course_id]
+        if stored_sketch:
+            day_sketch = HyperLogLog.from_bytes(stored_sketch)
+            if day_sketch.precision == sketch.precision:
+                sketch.merge(day_sketch)
+                continue
+        sketch.update(unpack_int_set(packed))
+    for course_id, user_id in _live_course_user_ids(live_querysets):
+        course_sketches[course_id].update([user_id])
+    return {course_id: sketch.count() for course_id, sketch in course_sketches.items()}
@@ -61,7 +61,8 @@ class SiteDailyMetricsAdmin(admin.ModelAdmin):
 class SiteMonthlyMetricsAdmin(admin.ModelAdmin):
     """Defines the admin interface for the SiteMonthlyMetrics model
     """
-    list_display = ('id', 'month_for', 'site', 'active_user_count')
+    list_display = ('id', 'month_for', 'site', 'active_user_count', 'registered_users',
+                    'course_enrollments', 'course_completions')
     list_filter = (
         ('site', RelatedOnlyDropdownFilter),
         'month_for')
@@ -142,3 +143,64 @@ class CourseMauMetricsAdmin(admin.ModelAdmin):
         ('site', RelatedOnlyDropdownFilter),
         ('course_id', AllValuesDropdownFilter),
         'date_for')
+
+
+@admin.register(figures.models.CourseData)
+class CourseDataAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the CourseData model
+    """
+    list_display = ('id', 'course_id', 'sections_possible', 'points_possible',
+                    'structure_hash', 'modified')
+    search_fields = ('course_id',)
+
+
+@admin.register(figures.models.DirtyEnrollment)
+class DirtyEnrollmentAdmin(UserRelatedMixin, admin.ModelAdmin):
+    """Defines the admin interface for the DirtyEnrollment model
+    """
+    list_display = ('id', 'modified', 'site', 'user_link', 'course_id')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+    read_only_fields = ('user', 'user_link')
+
+
+@admin.register(figures.models.PipelineWatermark)
+class PipelineWatermarkAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the PipelineWatermark model
+    """
+    list_display = ('id', 'site', 'name', 'value', 'modified')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        'name')
+
+
+@admin.register(figures.models.SiteActivity)
+class SiteActivityAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the SiteActivity model
+    """
+    list_display = ('id', 'site', 'last_enrollment', 'last_student_module', 'last_login',
+                    'modified')
+
+
+@admin.register(figures.models.EnrollmentDataBackfillChunk)
+class EnrollmentDataBackfillChunkAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the EnrollmentDataBackfillChunk model
+    """
+    list_display = ('id', 'site', 'course_id', 'after_id', 'through_id', 'completed',
+                    'processed', 'updated', 'error_count')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        ('course_id', AllValuesDropdownFilter))
+
+
+@admin.register(figures.models.ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    """Defines the admin interface for the ReportJob model
+    """
+    list_display = ('id', 'created', 'site', 'report_type', 'status',
+                    'progress_percent', 'row_count', 'data_version')
+    list_filter = (
+        ('site', RelatedOnlyDropdownFilter),
+        'report_type',
+        'status')
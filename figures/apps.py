@@ -7,6 +7,7 @@ add entries to the Django conf settings needed to run Figures.
 
 from __future__ import absolute_import
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 try:
     from openedx.core.djangoapps.plugins.constants import (
@@ -17,7 +18,6 @@ except ImportError:
     # pre-hawthorn
     PLATFORM_PLUGIN_SUPPORT = False
 
-
 if PLATFORM_PLUGIN_SUPPORT:
     def production_settings_name():
         """
@@ -58,3 +58,61 @@ class FiguresConfig(AppConfig):
                 }
             },
         }
+
+    def ready(self):
+        self.connect_enrollment_change_capture_signals()
+        self.connect_site_membership_signals()
+
+    def connect_enrollment_change_capture_signals(self):
+        """Connects the enrollment change capture handlers if the feature is on
+
+        The handlers run when the platform saves learner data, so we don't
+        connect them when the feature is off. See `figures.signals`
+        """
+        # The handlers use Figures and platform models, which are not loaded
+        # until now
+        from figures.compat import CourseEnrollment, StudentModule
+        from figures.settings import enrollment_change_capture
+        from figures.signals import (
+            capture_course_enrollment_change,
+            capture_student_module_change,
+        )
+        if not enrollment_change_capture():
+            return
+        post_save.connect(capture_student_module_change,
+                          sender=StudentModule,
+                          dispatch_uid='figures.signals.capture_student_module_change')
+        post_save.connect(capture_course_enrollment_change,
+                          sender=CourseEnrollment,
+                          dispatch_uid='figures.signals.capture_course_enrollment_change')
+
+    def connect_site_membership_signals(self):
+        """Connects the cached site membership invalidation handlers
+
+        Standalone installs may not have edx-organizations. `UserOrganizationMapping`
+        and `Organization.sites` are only in Appsembler's fork of edx-organizations
+        """
+        from django.contrib.sites.models import Site
+        from figures.signals import invalidate_site_membership, invalidate_site_user_count
+        try:
+            import organizations.models
+        except ImportError:
+            return
+
+        Organization = organizations.models.Organization
+        UserOrganizationMapping = getattr(organizations.models, 'UserOrganizationMapping', None)
+        for signal in (post_save, post_delete):
+            signal.connect(invalidate_site_membership,
+                           sender=organizations.models.OrganizationCourse,
+                           dispatch_uid='figures.signals.invalidate_site_membership')
+            signal.connect(invalidate_site_membership,
+                           sender=Site,
+                           dispatch_uid='figures.signals.invalidate_site_membership.site')
+            if UserOrganizationMapping is not None:
+                signal.connect(invalidate_site_user_count,
+                               sender=UserOrganizationMapping,
+                               dispatch_uid='figures.signals.invalidate_site_user_count')
+        if hasattr(Organization, 'sites'):
+            m2m_changed.connect(invalidate_site_membership,
+                                sender=Organization.sites.through,
+                                dispatch_uid='figures.signals.invalidate_site_membership.sites')
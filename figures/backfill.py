@@ -4,35 +4,75 @@ Initially developed to support API performance improvements
 """
 
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import datetime, timedelta
+import logging
+import multiprocessing
+
 from dateutil.rrule import rrule, MONTHLY
 from dateutil.relativedelta import relativedelta
 
-from django.utils.timezone import utc
+from django.db import connections
+from django.db.models import Min
+from django.utils.timezone import now, utc
 
-from figures.compat import CourseNotFound
+from figures.compat import CourseEnrollment, CourseNotFound
+from figures.helpers import as_course_key
 from figures.sites import (
   get_course_enrollments_for_site,
   get_student_modules_for_site
 )
-from figures.pipeline.site_monthly_metrics import fill_month
-from figures.models import EnrollmentData
+from figures.pipeline.site_monthly_metrics import fill_month, fill_months
+from figures.models import (
+    DirtyEnrollment,
+    EnrollmentData,
+    EnrollmentDataBackfillChunk,
+    LearnerCourseGradeMetrics,
+)
+
+
+ENROLLMENT_BATCH_SIZE = 500
+
+# A backfill plan older than this is from an earlier run and is not resumed
+ENROLLMENT_BACKFILL_PLAN_MAX_AGE = timedelta(days=1)
+
+logger = logging.getLogger(__name__)
 
 
-def backfill_monthly_metrics_for_site(site, overwrite=False):
+def backfill_monthly_metrics_for_site(site, overwrite=False, single_pass=True,
+                                      progress_callback=None):
     """Backfill all historical site metrics for the specified site
+
+    By default, we read the active users for all the months together and save
+    them together. See `figures.pipeline.site_monthly_metrics.fill_months`. Set
+    `single_pass` to False to fill each month on its own instead.
+
+    `progress_callback` is passed to `fill_months`. It is not called when
+    `single_pass` is False
     """
     site_sm = get_student_modules_for_site(site)
-    if not site_sm:
+    first_sm = site_sm.order_by('created').first()
+    if not first_sm:
         return None
 
-    first_created = site_sm.order_by('created').first().created
+    first_created = first_sm.created
 
     start_month = datetime(year=first_created.year,
                            month=first_created.month,
                            day=1,
                            tzinfo=utc)
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
+    if single_pass:
+        if start_month > last_month:
+            return []
+        results = fill_months(site=site,
+                              first_month=start_month,
+                              last_month=last_month,
+                              student_modules=site_sm,
+                              overwrite=overwrite,
+                              progress_callback=progress_callback)
+        return [dict(obj=obj, created=created, dt=start_month + relativedelta(months=i))
+                for i, (obj, created) in enumerate(results)]
+
     backfilled = []
     for dt in rrule(freq=MONTHLY, dtstart=start_month, until=last_month):
         obj, created = fill_month(site=site,
@@ -44,31 +84,226 @@ def backfill_monthly_metrics_for_site(site, overwrite=False):
     return backfilled
 
 
-def backfill_enrollment_data_for_site(site):
-    """Convenience function to fill EnrollmentData records
+def plan_enrollment_data_backfill(site, chunk_size=ENROLLMENT_BATCH_SIZE, resume=False):
+    """Returns the ids of the site's EnrollmentData backfill chunks not completed
+
+    By default we discard the site's existing chunks and start a new backfill,
+    so that every enrollment is updated. If `resume` is True, we keep the
+    chunks of the site's unfinished backfill, unless the backfill started more
+    than `ENROLLMENT_BACKFILL_PLAN_MAX_AGE` ago.
+
+    For a new backfill, we split each course's enrollments into chunks of up to
+    `chunk_size` enrollments and add a `EnrollmentDataBackfillChunk` record for
+    each. We read only the id bounding each chunk, so planning does not load
+    the site's enrollments
+    """
+    chunks = EnrollmentDataBackfillChunk.objects.filter(site=site)
+    if resume:
+        started = chunks.aggregate(started=Min('created'))['started']
+        if started and started < now() - ENROLLMENT_BACKFILL_PLAN_MAX_AGE:
+            chunks.delete()
+    else:
+        chunks.delete()
+    if not chunks.exists():
+        site_course_enrollments = get_course_enrollments_for_site(site)
+        course_ids = site_course_enrollments.order_by().values_list(
+            'course_id', flat=True).distinct()
+        new_chunks = []
+        for course_id in sorted(set(str(course_id) for course_id in course_ids)):
+            course_enrollments = site_course_enrollments.filter(
+                course_id=as_course_key(course_id)).order_by('id')
+            after_id = 0
+            while after_id is not None:
+                # The last id of this chunk, if there are more enrollments after it
+                ids = list(course_enrollments.filter(id__gt=after_id).values_list(
+                    'id', flat=True)[chunk_size - 1:chunk_size + 1])
+                through_id = ids[0] if len(ids) == 2 else None
+                new_chunks.append(EnrollmentDataBackfillChunk(site=site,
+                                                              course_id=course_id,
+                                                              after_id=after_id,
+                                                              through_id=through_id))
+                after_id = through_id
+        EnrollmentDataBackfillChunk.objects.bulk_create(new_chunks)
+    return list(chunks.filter(completed__isnull=True).order_by('id').values_list(
+        'id', flat=True))
+
+
+def backfill_enrollment_data_chunk(chunk_id):
+    """Updates EnrollmentData for the enrollments in the backfill chunk
+
+    Then we mark the chunk completed with its counters. A completed chunk is
+    not processed again. Enrollments with a `CourseNotFound` error are
+    reported in the errors. Other errors are raised and leave the chunk for a
+    rerun
+
+    Returns a dict of counters and the error messages
+    """
+    chunk = EnrollmentDataBackfillChunk.objects.select_related('site').get(id=chunk_id)
+    if chunk.completed:
+        return dict(processed=0, updated=0, errors=[])
+    course_enrollments = get_course_enrollments_for_site(chunk.site).filter(
+        course_id=as_course_key(chunk.course_id),
+        id__gt=chunk.after_id)
+    if chunk.through_id is not None:
+        course_enrollments = course_enrollments.filter(id__lte=chunk.through_id)
+    course_enrollments = list(course_enrollments.select_related('user').order_by('id'))
+    enrollment_data = []
+    errors = []
+    _set_enrollment_data_batch(chunk.site, course_enrollments, enrollment_data, errors)
+    EnrollmentDataBackfillChunk.objects.filter(id=chunk.id).update(
+        completed=now(),
+        processed=len(course_enrollments),
+        updated=len(enrollment_data),
+        error_count=len(errors))
+    return dict(processed=len(course_enrollments), updated=len(enrollment_data), errors=errors)
+
+
+def finish_enrollment_data_backfill(site):
+    """Removes the site's backfill chunks if every chunk is completed
+
+    The backfill updated every enrollment in the site, so it also covered the
+    enrollments queued by change capture before it started. We remove those
+    from the queue. See `update_dirty_enrollment_data`
+
+    Returns True if the backfill is finished
+    """
+    chunks = EnrollmentDataBackfillChunk.objects.filter(site=site)
+    if chunks.filter(completed__isnull=True).exists():
+        return False
+    started = chunks.aggregate(started=Min('created'))['started']
+    if started:
+        DirtyEnrollment.objects.filter(site=site, modified__lt=started).delete()
+    chunks.delete()
+    return True
+
+
+def _run_enrollment_data_chunk(chunk_id):
+    """Runs a backfill chunk and returns its results, with `failed` set
+
+    A failing chunk is logged and left not completed, so that it does not stop
+    the chunks after it
+    """
+    try:
+        results = backfill_enrollment_data_chunk(chunk_id)
+        results['failed'] = False
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('EnrollmentData backfill chunk {} failed'.format(chunk_id))
+        results = dict(processed=0, updated=0, errors=[], failed=True)
+    return results
+
+
+def _chunk_results(chunk_ids, workers):
+    """Generator of the chunk results, running the chunks in this process or
+    in a pool of `workers` processes
+    """
+    if workers <= 1:
+        for chunk_id in chunk_ids:
+            yield _run_enrollment_data_chunk(chunk_id)
+        return
+    # Forked processes must not share the parent's database connections
+    for conn in connections.all():
+        conn.close()
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for results in pool.imap_unordered(_run_enrollment_data_chunk, chunk_ids):
+            yield results
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def backfill_enrollment_data_for_site(site, chunk_size=ENROLLMENT_BATCH_SIZE,
+                                      workers=1, resume=False):
+    """Fills EnrollmentData records for the site's enrollments
 
     This backfills EnrollmentData records for existing CourseEnrollment
     and LearnerCourseGradeMetrics records
 
-    ```
+    We split the work per course into chunks of up to `chunk_size` enrollments
+    and record a checkpoint as each chunk completes. A chunk that fails is
+    counted in `failed` and the other chunks still run. By default we start a
+    new backfill. If `resume` is True, we continue the site's unfinished
+    backfill with the chunks not completed. See `plan_enrollment_data_backfill`
 
-    Potential improvements: iterate by course id within site, have a function
-    specific to a course. more queries, but breaks up the work
+    The chunks run in this process or, when `workers` is more than one, in a
+    local process pool. `figures.tasks.backfill_enrollment_data_parallel` runs
+    the chunks as Celery tasks instead
+
+    Returns a dict of counters and the error messages
     """
-    enrollment_data = []
+    chunk_ids = plan_enrollment_data_backfill(site, chunk_size=chunk_size, resume=resume)
+    processed = updated = failed = 0
     errors = []
-    site_course_enrollments = get_course_enrollments_for_site(site)
-    for rec in site_course_enrollments:
+    for results in _chunk_results(chunk_ids, workers=workers):
+        processed += results['processed']
+        updated += results['updated']
+        errors += results['errors']
+        failed += results['failed']
+    finish_enrollment_data_backfill(site)
+    return dict(chunks=len(chunk_ids), failed=failed, processed=processed,
+                updated=updated, errors=errors)
+
+
+def update_dirty_enrollment_data(site, batch_size=ENROLLMENT_BATCH_SIZE):
+    """Updates EnrollmentData records for the site's queued enrollments
+
+    `figures.signals` queues enrollments in `DirtyEnrollment` when their
+    StudentModule or CourseEnrollment records change. We update them in
+    batches of `batch_size`, then remove the batch from the queue. If an
+    enrollment is queued again while we update it, it stays in the queue for
+    the next run.
+
+    Queued enrollments without a CourseEnrollment record, like a staff user
+    viewing a course they are not enrolled in, are removed without an update.
+
+    Returns a dict of counters and the error messages
+    """
+    processed = updated = 0
+    errors = []
+    last_id = 0
+    while True:
+        batch_started = now()
+        batch = list(DirtyEnrollment.objects.filter(
+            site=site, id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].id
+        keys = set((rec.user_id, rec.course_id) for rec in batch)
+        course_enrollments = [
+            rec for rec in CourseEnrollment.objects.filter(
+                user_id__in=set(key[0] for key in keys),
+                course_id__in=[as_course_key(course_id)
+                               for course_id in set(key[1] for key in keys)]
+            ).select_related('user')
+            if (rec.user_id, str(rec.course_id)) in keys]
+        enrollment_data = []
+        _set_enrollment_data_batch(site, course_enrollments, enrollment_data, errors)
+        DirtyEnrollment.objects.filter(id__in=[rec.id for rec in batch],
+                                       modified__lte=batch_started).delete()
+        processed += len(batch)
+        updated += len(enrollment_data)
+    return dict(processed=processed, updated=updated, errors=errors)
+
+
+def _set_enrollment_data_batch(site, course_enrollments, enrollment_data, errors):
+    """Set the EnrollmentData records for a batch of enrollments
+
+    Appends the (obj, created) results to `enrollment_data` and error messages
+    to `errors`
+    """
+    latest_lcgms = LearnerCourseGradeMetrics.objects.latest_lcgms(
+        (rec.user_id, rec.course_id) for rec in course_enrollments)
+    for rec in course_enrollments:
         try:
             obj, created = EnrollmentData.objects.set_enrollment_data(
                 site=site,
                 user=rec.user,
-                course_id=rec.course_id)
+                course_id=rec.course_id,
+                course_enrollment=rec,
+                latest_lcgms=latest_lcgms)
             enrollment_data.append((obj, created))
         except CourseNotFound:
             msg = ('CourseNotFound for course "{course}". '
                    ' CourseEnrollment ID={ce_id}')
             errors.append(msg.format(course=str(rec.course_id),
                                      ce_id=rec.id))
-
-    return dict(results=enrollment_data, errors=errors)
@@ -26,6 +26,7 @@ TODO: Consider wrapping edx-platform's `get_course_by_id` in a function as it
 from __future__ import absolute_import
 from django.http import Http404
 from figures.helpers import as_course_key
+import figures.course_structure
 
 
 class UnsuportedOpenedXRelease(Exception):
@@ -92,27 +93,50 @@ def course_grade(learner, course):
         return CourseGradeFactory().read(learner, course)
 
 
-def course_grade_from_course_id(learner, course_id):
-    """Get the edx-platform's course grade for this enrollment
-
-    IMPORTANT: Do not use in API calls as this is an expensive operation.
-    Only use in async or pipeline.
+def course_for_grading(course_id):
+    """Load the edx-platform course with its grading policy set
 
     We handle the exception so that we return a specific `CourseNotFound`
     instead of the non-specific `Http404`
     edx-platform `get_course_by_id` function raises a generic `Http404` if it
     cannot find a course in modulestore. We trap this and raise our own
     `CourseNotFound` exception as it is more specific.
-
-    TODO: Consider optional kwarg param or Figures setting to log performance.
-          Bonus points: Make id a decorator
     """
     try:
         course = get_course_by_id(course_key=as_course_key(course_id))
     except Http404:
         raise CourseNotFound('{}'.format(str(course_id)))
-    course._field_data_cache = {}  # pylint: disable=protected-access
     course.set_grading_policy(course.grading_policy)
+    return course
+
+
+def cached_course_for_grading(course_id):
+    """Get the course for grading from the pipeline course structure cache
+
+    When there is no active cache, this loads the course on every call.
+    See `figures.course_structure`
+
+    We clear the course's field data cache as it is learner specific
+    """
+    course = figures.course_structure.get_course(course_id,
+                                                 loader=course_for_grading)
+    course._field_data_cache = {}  # pylint: disable=protected-access
+    return course
+
+
+def course_grade_from_course_id(learner, course_id):
+    """Get the edx-platform's course grade for this enrollment
+
+    IMPORTANT: Do not use in API calls as this is an expensive operation.
+    Only use in async or pipeline.
+
+    Raises `CourseNotFound` if the course is not in modulestore. See
+    `course_for_grading`
+
+    TODO: Consider optional kwarg param or Figures setting to log performance.
+          Bonus points: Make id a decorator
+    """
+    course = cached_course_for_grading(course_id)
     return course_grade(learner, course)
 
 
@@ -0,0 +1,177 @@
+"""Caches course structure objects shared across learners in a pipeline run
+
+The pipeline collects learner progress one learner at a time. Each learner's
+grade read needs the course loaded from modulestore with its grading policy
+set. Without caching, we reload the same course for every learner.
+
+This module provides a least recently used (LRU) cache for these loaded
+courses. It also holds each course's grading totals, the sections and points
+possible stored in `figures.models.CourseData`, so we read or write them once
+per course instead of once per learner. The cache is bounded by the number of
+courses, not by memory. See `figures.settings.course_structure_cache_size`.
+
+The cache is only active inside a `course_structure_cache` block, so
+API calls and other code paths keep loading courses as before. The cache is
+per run. Entries do not outlive the block, so we don't need to handle course
+publishing events here.
+
+Example:
+
+```
+with course_structure_cache(logger=logger):
+    for course_id in course_ids:
+        bulk_calculate_course_progress_data(course_id)
+```
+
+The block logs the hit and miss counters when it exits.
+"""
+
+from __future__ import absolute_import
+from collections import OrderedDict
+from contextlib import contextmanager
+import logging
+import threading
+
+from figures.settings import course_structure_cache_size
+
+
+default_logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class CourseStructureCache(object):
+    """LRU cache of loaded course objects and their grading totals
+
+    Entries are keyed on the course id string only. A course published during
+    a run is not reloaded until the next run. This is safe because the cache is
+    scoped to a run. See `course_structure_cache`
+
+    The cache is bounded by the number of courses it holds, not by memory.
+    Course objects do not expose their memory footprint, so the number of
+    courses is the bound we can enforce. The courses and the totals each hold
+    at most `max_size` entries.
+    """
+    def __init__(self, max_size):
+        self.max_size = max(int(max_size), 1)
+        self._entries = OrderedDict()
+        self._totals = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _put(self, entries, course_id, value):
+        entries.pop(course_id, None)
+        entries[course_id] = value
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, course_id, loader):
+        """Return the course for `course_id`, calling `loader` on a miss
+
+        `loader` is a callable that takes the course id and returns the loaded
+        course
+        """
+        course_id = str(course_id)
+        if course_id in self._entries:
+            self.hits += 1
+            course = self._entries[course_id]
+            # Move to the end so it is the most recently used
+            self._put(self._entries, course_id, course)
+            return course
+
+        self.misses += 1
+        course = loader(course_id)
+        self._put(self._entries, course_id, course)
+        return course
+
+    def get_totals(self, course_id, loader):
+        """Return the grading totals for `course_id`, calling `loader` on a miss
+
+        `loader` takes the course id. It may return None for a course without
+        totals. We cache that too
+        """
+        course_id = str(course_id)
+        if course_id in self._totals:
+            totals = self._totals[course_id]
+        else:
+            totals = loader(course_id)
+        self._put(self._totals, course_id, totals)
+        return totals
+
+    def set_totals(self, course_id, totals):
+        self._put(self._totals, str(course_id), totals)
+
+    def invalidate(self, course_id):
+        self._entries.pop(str(course_id), None)
+        self._totals.pop(str(course_id), None)
+
+    def stats(self):
+        return dict(hits=self.hits,
+                    misses=self.misses,
+                    evictions=self.evictions,
+                    size=len(self._entries),
+                    max_size=self.max_size)
+
+
+def active_cache():
+    """Returns the cache for the current run or `None` if not in a run
+    """
+    return getattr(_local, 'cache', None)
+
+
+@contextmanager
+def course_structure_cache(description='figures course structure cache',
+                           max_size=None,
+                           logger=None):
+    """Context manager to share loaded courses during a pipeline run
+
+    If a cache is already active, we reuse it so that nested pipeline calls,
+    like a single CDM task called from the daily metrics task, share entries.
+    Only the outermost block logs the counters
+    """
+    cache = active_cache()
+    if cache is not None:
+        yield cache
+        return
+
+    logger = logger if logger else default_logger
+    cache = CourseStructureCache(max_size=max_size or course_structure_cache_size())
+    _local.cache = cache
+    try:
+        yield cache
+    finally:
+        _local.cache = None
+        msg = '{}: hits={hits}, misses={misses}, evictions={evictions}, size={size}'
+        logger.info(msg.format(description, **cache.stats()))
+
+
+def get_course(course_id, loader):
+    """Get the course from the active cache, or load it if there is no cache
+    """
+    cache = active_cache()
+    if cache is not None:
+        return cache.get(course_id, loader)
+    return loader(course_id)
+
+
+def get_course_totals(course_id, loader):
+    """Get the course's grading totals from the active cache, or load them if
+    there is no cache
+    """
+    cache = active_cache()
+    if cache is not None:
+        return cache.get_totals(course_id, loader)
+    return loader(course_id)
+
+
+def set_course_totals(course_id, totals):
+    """Store the course's grading totals in the active cache, if any
+    """
+    cache = active_cache()
+    if cache is not None:
+        cache.set_totals(course_id, totals)
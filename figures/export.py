@@ -0,0 +1,137 @@
+"""Streams learner metrics exports
+
+Admins export the learner progress for a whole site. Paging through the
+learner metrics API serializes full objects and reruns the user query for each
+page. Instead, we read `EnrollmentData` joined with the user and user profile
+as flat value rows and write them as CSV or newline delimited JSON (NDJSON).
+
+We read the rows in chunks of `EXPORT_CHUNK_SIZE`, selecting each chunk on the
+record id (keyset pagination). Database drivers like MySQLdb load the full
+result of a query into memory, so we don't rely on `QuerySet.iterator`. Memory
+use stays flat no matter how many rows we export.
+"""
+
+from __future__ import absolute_import
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+import six
+
+from figures.models import EnrollmentData
+
+
+EXPORT_CHUNK_SIZE = 1000
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# Tuples of export column names and the `EnrollmentData` lookups we read them from
+EXPORT_COLUMNS = (
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('email', 'user__email'),
+    ('fullname', 'user__profile__name'),
+    ('is_active', 'user__is_active'),
+    ('date_joined', 'user__date_joined'),
+    ('course_id', 'course_id'),
+    ('date_enrolled', 'date_enrolled'),
+    ('is_enrolled', 'is_enrolled'),
+    ('is_completed', 'is_completed'),
+    ('progress_percent', 'progress_percent'),
+    ('points_possible', 'points_possible'),
+    ('points_earned', 'points_earned'),
+    ('sections_worked', 'sections_worked'),
+    ('sections_possible', 'sections_possible'),
+    ('date_for', 'date_for'),
+)
+
+EXPORT_FIELDNAMES = [column[0] for column in EXPORT_COLUMNS]
+
+
+def learner_metrics_queryset(site, course_ids=None, search=None):
+    """Returns the site's EnrollmentData queryset with the export filters
+
+    `course_ids` limits the rows to the given courses. `search` matches each
+    whitespace separated term against the username, email and full name, the
+    same way the learner metrics API search does
+    """
+    queryset = EnrollmentData.objects.filter(site=site)
+    if course_ids:
+        queryset = queryset.filter(course_id__in=[str(cid) for cid in course_ids])
+    if search:
+        for term in search.split():
+            queryset = queryset.filter(Q(user__username__icontains=term) |
+                                       Q(user__email__icontains=term) |
+                                       Q(user__profile__name__icontains=term))
+    return queryset
+
+
+def keyset_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE, key='id'):
+    """Generator of lists of value tuples for `fields`, read in chunks
+
+    We select each chunk on `key`, which must be unique, instead of with an
+    `OFFSET`. So reading the last chunk costs the same as reading the first
+    """
+    lookups = [key] + list(fields)
+    last_key = None
+    while True:
+        chunk_qs = queryset if last_key is None else queryset.filter(
+            **{key + '__gt': last_key})
+        chunk = list(chunk_qs.order_by(key).values_list(*lookups)[:chunk_size])
+        if chunk:
+            yield [row[1:] for row in chunk]
+        if len(chunk) < chunk_size:
+            return
+        last_key = chunk[-1][0]
+
+
+def learner_metrics_rows(site, course_ids=None, search=None,
+                         chunk_size=EXPORT_CHUNK_SIZE):
+    """Generator of export rows as tuples in `EXPORT_COLUMNS` order
+
+    Rows are ordered by EnrollmentData id. We run one query for each chunk of
+    `chunk_size` rows
+    """
+    queryset = learner_metrics_queryset(site, course_ids=course_ids, search=search)
+    for chunk in keyset_chunks(queryset,
+                               fields=[column[1] for column in EXPORT_COLUMNS],
+                               chunk_size=chunk_size):
+        for row in chunk:
+            yield row
+
+
+class _EchoBuffer(object):
+    """File-like object that returns what is written to it
+
+    This lets `csv.writer` format one row at a time for streaming
+    """
+    def write(self, value):
+        return value
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if six.PY2 and isinstance(value, six.text_type):
+        return value.encode('utf-8')
+    return value
+
+
+def csv_lines(rows, fieldnames=EXPORT_FIELDNAMES, header=True):
+    """Generator of CSV lines for the rows, starting with the header row of
+    `fieldnames` if `header` is True
+    """
+    writer = csv.writer(_EchoBuffer())
+    if header:
+        yield writer.writerow([_csv_value(name) for name in fieldnames])
+    for row in rows:
+        yield writer.writerow([_csv_value(value) for value in row])
+
+
+def ndjson_lines(rows):
+    """Generator of JSON object lines for the rows
+    """
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_FIELDNAMES, row)),
+                         cls=DjangoJSONEncoder) + '\n'
@@ -48,6 +48,8 @@ home for functionality.
 from __future__ import absolute_import
 import calendar
 import datetime
+import struct
+import zlib
 from django.conf import settings
 from django.utils.timezone import utc
 
@@ -208,3 +210,28 @@ def first_last_days_for_month(month_for):
                              month=month,
                              day=days_in_month(first_day))
     return first_day, last_day
+
+
+def pack_int_set(values):
+    """Pack a collection of non-negative ints into a compact byte string
+
+    We sort and dedupe the values, store the deltas between consecutive values
+    as unsigned 32 bit ints, then compress. User ids are dense, so the deltas
+    are small and compress well. Use `unpack_int_set` to get the values back
+    """
+    values = sorted(set(values))
+    deltas = [value - prev for prev, value in zip([0] + values[:-1], values)]
+    return zlib.compress(struct.pack('<{}I'.format(len(deltas)), *deltas))
+
+
+def unpack_int_set(packed):
+    """Return the sorted list of ints packed by `pack_int_set`
+    """
+    data = zlib.decompress(bytes(packed))
+    deltas = struct.unpack('<{}I'.format(len(data) // 4), data)
+    values = []
+    total = 0
+    for delta in deltas:
+        total += delta
+        values.append(total)
+    return values
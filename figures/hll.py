@@ -0,0 +1,107 @@
+"""HyperLogLog sketches for approximate distinct counts
+
+A sketch estimates how many distinct values were added to it using a fixed
+amount of memory. Sketches with the same precision can be merged, and the
+merged sketch estimates the count of the union. This lets us store a small
+sketch per site, course and day and get approximate counts for any window by
+merging the day sketches.
+
+The relative standard error is about `1.04 / sqrt(2 ** precision)`. Use
+`precision_for_error` to get the precision for an error bound.
+
+References:
+
+* Flajolet et al. "HyperLogLog: the analysis of a near-optimal cardinality
+  estimation algorithm"
+"""
+
+from __future__ import absolute_import
+import hashlib
+import math
+import zlib
+
+import six
+
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+HASH_BITS = 64
+
+
+class SketchMismatchError(Exception):
+    """Raised when we try to merge sketches with different precisions
+    """
+
+
+def precision_for_error(error):
+    """Return the smallest precision with a standard error at or under `error`
+    """
+    precision = int(math.ceil(math.log((1.04 / error) ** 2, 2)))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def _hash(value):
+    """Return a 64 bit hash of the value
+    """
+    return int(hashlib.sha1(six.text_type(value).encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HyperLogLog(object):
+    """Mergeable approximate distinct counter
+    """
+    def __init__(self, precision=14, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError('precision must be between {} and {}'.format(
+                MIN_PRECISION, MAX_PRECISION))
+        self.precision = precision
+        self.num_registers = 1 << precision
+        if registers is None:
+            registers = bytearray(self.num_registers)
+        self.registers = registers
+
+    def add(self, value):
+        hashed = _hash(value)
+        index = hashed >> (HASH_BITS - self.precision)
+        remaining = (hashed << self.precision) & ((1 << HASH_BITS) - 1)
+        rank = HASH_BITS - remaining.bit_length() + 1
+        rank = min(rank, HASH_BITS - self.precision + 1)
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other):
+        """Merge `other` into this sketch. Both must have the same precision
+        """
+        if other.precision != self.precision:
+            raise SketchMismatchError('Cannot merge precision {} into {}'.format(
+                other.precision, self.precision))
+        self.registers = bytearray(
+            max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        """Return the estimated number of distinct values added
+        """
+        num_registers = self.num_registers
+        if num_registers >= 128:
+            alpha = 0.7213 / (1 + 1.079 / num_registers)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[num_registers]
+        estimate = alpha * num_registers ** 2 / sum(
+            2.0 ** -rank for rank in self.registers)
+        # Python 2 bytearray.count only takes a byte string
+        zeros = self.registers.count(b'\x00')
+        if estimate <= 2.5 * num_registers and zeros:
+            # Small range correction
+            estimate = num_registers * math.log(float(num_registers) / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        return zlib.compress(bytes(bytearray([self.precision]) + self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytearray(zlib.decompress(bytes(data)))
+        return cls(precision=data[0], registers=data[1:])
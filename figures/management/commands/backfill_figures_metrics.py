@@ -24,13 +24,19 @@ def get_site(identifier):
     return Site.objects.get(**filter_arg)
 
 
-def backfill_site(site, overwrite):
+def print_progress(rows_read):
+    print('Read {} monthly active user rows'.format(rows_read))
+
+
+def backfill_site(site, overwrite, single_pass=True):
 
     print('Backfilling monthly metrics for site id="{}" domain={}'.format(
         site.id,
         site.domain))
     backfilled = backfill_monthly_metrics_for_site(site=site,
-                                                   overwrite=overwrite)
+                                                   overwrite=overwrite,
+                                                   single_pass=single_pass,
+                                                   progress_callback=print_progress)
     if backfilled:
         for rec in backfilled:
             obj = rec['obj']
@@ -56,6 +62,11 @@ class Command(BaseCommand):
                             help='overwrite existing data in SiteMonthlyMetrics')
         parser.add_argument('--site',
                             help='backfill a specific site. provide id or domain name')
+        parser.add_argument('--by-month',
+                            action='store_true',
+                            default=False,
+                            help=('fill each month on its own instead of '
+                                  'reading all months together'))
 
     def handle(self, *args, **options):
         print('BEGIN: Backfill Figures Metrics')
@@ -69,7 +80,10 @@ class Command(BaseCommand):
             # Would be really Really REALLY great to be able to filter out dead sites
 
             sites = Site.objects.all()
-        for site in sites:
-            backfill_site(site, overwrite=options['overwrite'])
+        for i, site in enumerate(sites, 1):
+            print('Site {} of {}'.format(i, len(sites)))
+            backfill_site(site,
+                          overwrite=options['overwrite'],
+                          single_pass=not options['by_month'])
 
         print('DONE: Backfill Figures Metrics')
@@ -12,7 +12,7 @@ from django.core.management.base import BaseCommand
 
 from figures.tasks import (
     populate_daily_metrics,
-    experimental_populate_daily_metrics,
+    populate_daily_metrics_parallel,
     populate_all_mau,
 )
 
@@ -36,11 +36,14 @@ class Command(BaseCommand):
                             action='store_true',
                             default=False,
                             help='Overwrite metrics records if they exist for the given date')
+        parser.add_argument('--parallel',
+                            action='store_true',
+                            default=False,
+                            help=('Run courses in parallel with a Celery chord per site'))
         parser.add_argument('--experimental',
                             action='store_true',
                             default=False,
-                            help=('Run with Celery workflows (Warning: This is still under' +
-                                  ' development and likely to get stuck/hung jobs'))
+                            help='Deprecated. Same as "--parallel"')
         parser.add_argument('--mau',
                             action='store_true',
                             default=False,
@@ -68,14 +71,14 @@ class Command(BaseCommand):
             else:
                 populate_all_mau.delay()  # pragma: no cover
         else:
-            experimental = options['experimental']
+            parallel = options['parallel'] or options['experimental']
             options.pop('experimental')
 
-            if experimental:
+            if parallel:
                 if options['no_delay']:
-                    experimental_populate_daily_metrics(**kwargs)
+                    populate_daily_metrics_parallel(**kwargs)
                 else:
-                    experimental_populate_daily_metrics.delay(**kwargs)  # pragma: no cover
+                    populate_daily_metrics_parallel.delay(**kwargs)  # pragma: no cover
             else:
                 if options['no_delay']:
                     populate_daily_metrics(**kwargs)
@@ -0,0 +1,46 @@
+"""Reports which sites the Figures pipeline runs for and which it skips
+
+This updates each site's activity summary and prints the latest enrollment,
+StudentModule change and login for the site. Dormant sites are reported with
+the reason. The site level pipeline tasks skip them when
+FIGURES_SKIP_DORMANT_SITES is set in the Open edX FEATURES
+
+Sites are listed with the most recently active first, the order the pipeline
+tasks run them in
+"""
+
+from __future__ import print_function
+
+from __future__ import absolute_import
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand
+
+from figures.settings import site_dormant_days, skip_dormant_sites
+from figures.pipeline.site_activity import site_activity_report
+
+
+class Command(BaseCommand):
+    """Report the Figures site activity
+    """
+    help = dedent(__doc__).strip()
+
+    def handle(self, *args, **options):
+        if skip_dormant_sites():
+            print('Skipping sites without activity for {} days'.format(site_dormant_days()))
+        else:
+            print('Dormant site skipping is disabled. Sites without activity for {} days'
+                  ' would be skipped'.format(site_dormant_days()))
+
+        report = site_activity_report()
+        for site, activity, reason in report:
+            print('site[{}]:{} {}. last enrollment={}, last student module={},'
+                  ' last login={}'.format(site.id,
+                                          site.domain,
+                                          'dormant, ' + reason if reason else 'active',
+                                          activity.last_enrollment,
+                                          activity.last_student_module,
+                                          activity.last_login))
+        print('{} active, {} dormant'.format(
+            len([rec for rec in report if not rec[2]]),
+            len([rec for rec in report if rec[2]])))
@@ -2,13 +2,21 @@
 
 Running this will trigger figures.tasks.update_enrollment_data for every site
 unless the '--site' option is used. Then it will update just that site
+
+Use '--full-scan' to update every enrollment when enrollment change capture is
+enabled. This reconciles changes the capture missed
+
+A full scan starts over for the site. Use '--resume' to continue the site's
+unfinished full scan instead. Use '--parallel' to run the full scan as a Celery
+task per chunk of enrollments, or '--workers' with '--no-delay' to run it in a local process pool
 """
 from __future__ import print_function
 from __future__ import absolute_import
 from textwrap import dedent
 from django.contrib.sites.models import Site
 from django.core.management.base import BaseCommand
-from figures.tasks import update_enrollment_data
+from figures.backfill import backfill_enrollment_data_for_site
+from figures.tasks import backfill_enrollment_data_parallel, update_enrollment_data
 
 
 def get_site(identifier):
@@ -36,6 +44,22 @@ class Command(BaseCommand):
                             help='Disable the celery "delay" directive')
         parser.add_argument('--site',
                             help='backfill a specific site. provide id or domain name')
+        parser.add_argument('--full-scan',
+                            action='store_true',
+                            default=False,
+                            help='Update every enrollment instead of only the changed ones')
+        parser.add_argument('--parallel',
+                            action='store_true',
+                            default=False,
+                            help='Run the full scan as a Celery task per chunk of enrollments')
+        parser.add_argument('--workers',
+                            type=int,
+                            default=1,
+                            help='Processes to run the full scan with "--no-delay"')
+        parser.add_argument('--resume',
+                            action='store_true',
+                            default=False,
+                            help='Resume the unfinished full scan instead of starting over')
 
     def handle(self, *args, **options):
         print('BEGIN: Update Figures EnrollmentData')
@@ -51,9 +75,26 @@ class Command(BaseCommand):
             sites = Site.objects.all()
         for site in sites:
             print('Updating EnrollmentData for site "{}"'.format(site.domain))
+            if options['parallel']:
+                backfill_enrollment_data_parallel.delay(site_id=site.id,
+                                                        resume=options['resume'])
+                continue
+            if options['no_delay'] and options['workers'] > 1:
+                results = backfill_enrollment_data_for_site(site,
+                                                            workers=options['workers'],
+                                                            resume=options['resume'])
+                print('Updated {updated} of {processed} enrollments in {chunks} chunks'.format(
+                    **results))
+                continue
+            # When not a full scan, the task decides from the change capture setting
+            full_scan = True if options['full_scan'] or options['resume'] else None
             if options['no_delay']:
-                update_enrollment_data(site_id=site.id)
+                update_enrollment_data(site_id=site.id,
+                                       full_scan=full_scan,
+                                       resume=options['resume'])
             else:
-                update_enrollment_data.delay(site_id=site.id)  # pragma: no cover
+                update_enrollment_data.delay(site_id=site.id,
+                                             full_scan=full_scan,
+                                             resume=options['resume'])  # pragma: no cover
 
         print('DONE: Update Figures EnrollmentData')
@@ -4,10 +4,13 @@ This module provides MAU metrics retrieval functionality
 
 from __future__ import absolute_import
 from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Count
 from django.utils.timezone import utc
 
-from figures.compat import RELEASE_LINE
-
+from figures.active_users import get_active_user_count, get_active_user_count_by_course
+from figures.compat import RELEASE_LINE, StudentModule
+from figures.helpers import as_course_key, days_in_month
 from figures.models import CourseMauMetrics, SiteMauMetrics
 from figures.sites import (
     get_course_keys_for_site,
@@ -16,6 +19,13 @@ from figures.sites import (
 )
 
 
+def month_date_range(date_for):
+    """Return the first and last days of the month for `date_for`
+    """
+    month_start = date_for.replace(day=1)
+    return month_start, month_start.replace(day=days_in_month(month_start))
+
+
 def get_mau_from_student_modules(student_modules, year, month):
     """
     Return records modified in year and month
@@ -42,19 +52,38 @@ def get_mau_from_site_course(site, course_id, year, month):
                                         month=month)
 
 
+def get_mau_by_course(course_ids, year, month):
+    """Return a dict of course id strings to the count of distinct active users
+    in the course for the year and month
+
+    This runs one grouped query for all the courses. Courses without activity
+    in the month are not included
+    """
+    student_modules = StudentModule.objects.filter(
+        course_id__in=[as_course_key(course_id) for course_id in course_ids],
+        modified__year=year,
+        modified__month=month)
+    rows = student_modules.order_by().values('course_id').annotate(
+        mau=Count('student_id', distinct=True))
+    return {str(row['course_id']): row['mau'] for row in rows}
+
+
 def retrieve_live_site_mau_data(site):
     """
     Used this when we need to retrieve unique active users for the
     whole site
+
+    Days stored by the daily pipeline are read from the daily active user
+    sets. We only query StudentModule for the other days, usually just today
     """
-    student_modules = get_student_modules_for_site(site)
-    today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    today = datetime.utcnow().date()
+    month_start, month_end = month_date_range(today)
+    count = get_active_user_count(site=site,
+                                  start_date=month_start,
+                                  end_date=month_end)
     return dict(
-        count=users.count(),
-        month_for=today.date(),
+        count=count,
+        month_for=today,
         domain=site.domain,
     )
 
@@ -63,15 +92,20 @@ def retrieve_live_course_mau_data(site, course_id):
     """
     Used this when we need to retrieve unique active users for a given course
     in the site
+
+    See `retrieve_live_site_mau_data`
     """
-    student_modules = get_student_modules_for_course_in_site(site, course_id)
-    today = datetime.utcnow()
-    users = get_mau_from_student_modules(student_modules=student_modules,
-                                         year=today.year,
-                                         month=today.month)
+    today = datetime.utcnow().date()
+    month_start, month_end = month_date_range(today)
+    count = get_active_user_count(
+        site=site,
+        start_date=month_start,
+        end_date=month_end,
+        course_ids=[course_id],
+        student_modules=get_student_modules_for_course_in_site(site, course_id))
     return dict(
-        count=users.count(),
-        month_for=today.date(),
+        count=count,
+        month_for=today,
         course_id=str(course_id),
         domain=site.domain,
     )
@@ -138,38 +172,49 @@ def site_mau_1g_for_month_as_of_day(site, date_for):
                                       date_for=date_for)
 
 
-def store_mau_metrics(site, overwrite=False):
+def save_site_mau(site, month_for, site_mau, course_mau, overwrite=False):
+    """
+    Stores the site MAU and every course MAU in one transaction
+
+    Course records are written in bulk. See `CourseMauMetrics.bulk_save_metrics`
+
+    Returns a dict with the `SiteMauMetrics` record as `smo` and the list of
+    `CourseMauMetrics` records as `cmos`
+    """
+    with transaction.atomic():
+        site_mau_obj, _created = SiteMauMetrics.save_metrics(site=site,
+                                                             date_for=month_for,
+                                                             data=dict(mau=site_mau),
+                                                             overwrite=overwrite)
+        course_mau_objs = CourseMauMetrics.bulk_save_metrics(site=site,
+                                                             date_for=month_for,
+                                                             course_mau=course_mau,
+                                                             overwrite=overwrite)
+    return dict(smo=site_mau_obj, cmos=course_mau_objs)
+
+
+def store_mau_metrics(site, month_for=None, overwrite=False):
     """
     Save "snapshot" of MAU metrics
+
+    We read the month's active users for the site and for all the site's
+    courses at once from the daily active user store. See
+    `figures.active_users`. Sites using approximate counts get approximate
+    MAU. Then we save the site and course records together
+
+    `month_for` defaults to today
     """
-    today = datetime.utcnow()
-
-    # get site data
-    student_modules = get_student_modules_for_site(site)
-    site_mau = get_mau_from_student_modules(student_modules=student_modules,
-                                            year=today.year,
-                                            month=today.month)
-
-    # store site data
-    site_mau_obj, _created = SiteMauMetrics.save_metrics(site=site,
-                                                         date_for=today.date(),
-                                                         data=dict(mau=site_mau.count()),
-                                                         overwrite=overwrite)
-    course_mau_objects = []
-    for course_key in get_course_keys_for_site(site):
-        course_student_modules = student_modules.filter(course_id=course_key)
-        course_mau = get_mau_from_student_modules(
-            student_modules=course_student_modules,
-            year=today.year,
-            month=today.month)
-        course_mau_obj, _created = CourseMauMetrics.save_metrics(
-                site=site,
-                course_id=str(course_key),
-                date_for=today.date(),
-                data=dict(mau=course_mau.count()),
-                overwrite=overwrite)
-
-        course_mau_objects.append(course_mau_obj)
-
-    return dict(smo=site_mau_obj,
-                cmos=course_mau_objects)
+    month_for = month_for or datetime.utcnow().date()
+    month_start, month_end = month_date_range(month_for)
+
+    site_mau = get_active_user_count(site=site, start_date=month_start, end_date=month_end)
+    active_course_mau = get_active_user_count_by_course(site=site,
+                                                        start_date=month_start,
+                                                        end_date=month_end)
+    course_mau = {str(course_key): active_course_mau.get(str(course_key), 0)
+                  for course_key in get_course_keys_for_site(site)}
+    return save_site_mau(site=site,
+                         month_for=month_for,
+                         site_mau=site_mau,
+                         course_mau=course_mau,
+                         overwrite=overwrite)
@@ -31,22 +31,21 @@ from django.db.models import Avg, Max, Sum
 
 from figures.compat import (
     GeneratedCertificate,
+    cached_course_for_grading,
     chapter_grade_values,
     course_grade,
     StudentModule,
-    get_course_by_id
 )
 from figures.helpers import (
-    as_course_key,
     as_date,
     as_datetime,
-    days_in_month,
     next_day,
     prev_day,
     previous_months_iterator,
     first_last_days_for_month,
 )
-from figures.mau import get_mau_from_site_course
+from figures.active_users import get_active_user_count
+from figures.mau import get_mau_by_course, get_mau_from_site_course
 from figures.models import (
     CourseDailyMetrics,
     SiteDailyMetrics,
@@ -106,9 +105,7 @@ class LearnerCourseGrades(object):
                 "User does not have access to this course")
         """
         self.learner = get_user_model().objects.get(id=user_id)
-        self.course = get_course_by_id(course_key=as_course_key(course_id))
-        self.course._field_data_cache = {}  # pylint: disable=protected-access
-        self.course.set_grading_policy(self.course.grading_policy)
+        self.course = cached_course_for_grading(course_id)
         self.course_grade = course_grade(self.learner, self.course)
 
     def __str__(self):
@@ -272,24 +269,18 @@ def get_active_users_for_time_period(site, start_date, end_date, course_ids=None
     Returns the number of users active in the time period.
 
     This is determined by finding the unique user ids for StudentModule records
-    modified in a time period
-
-    We don't do this only because it raises timezone warnings
-        modified__range=(as_date(start_date), as_date(end_date)),
+    modified in a time period. Days stored by the daily pipeline are read from
+    the daily active user sets instead. See `figures.active_users`
     """
     # Get list of learners for the site
 
     user_ids = figures.sites.get_user_ids_for_site(site)
-    filter_args = dict(
-        modified__gt=as_datetime(prev_day(start_date)),
-        modified__lt=as_datetime(next_day(end_date)),
-        student_id__in=user_ids,
-    )
-    if course_ids:
-        filter_args['course_ids__in'] = course_ids
-
-    return StudentModule.objects.filter(
-        **filter_args).values('student__id').distinct().count()
+    return get_active_user_count(
+        site=site,
+        start_date=start_date,
+        end_date=end_date,
+        course_ids=course_ids or None,
+        student_modules=StudentModule.objects.filter(student_id__in=user_ids))
 
 
 def get_total_site_users_for_time_period(site, start_date, end_date, **_kwargs):
@@ -438,6 +429,63 @@ def get_total_course_completions_for_time_period(site, end_date, **_kwargs):
     return total_site_certificates_as_of_date(site=site, date_for=end_date)
 
 
+# Maps the `SiteMonthlyMetrics` fields to the functions that calculate them
+# from the daily metrics and platform models
+SITE_MONTH_METRICS_FUNCTIONS = dict(
+    registered_users=get_total_site_users_for_time_period,
+    new_users=get_total_site_users_joined_for_time_period,
+    site_courses=get_total_site_courses_for_time_period,
+    course_enrollments=get_total_enrollments_for_time_period,
+    course_completions=get_total_course_completions_for_time_period,
+)
+
+
+def get_site_month_metrics(site, start_date, end_date):
+    """Calculates the `SiteMonthlyMetrics` values, except active users
+
+    Returns a dict with the `SiteMonthlyMetrics` field names as keys
+    """
+    return {field: func(site=site, start_date=start_date, end_date=end_date)
+            for field, func in SITE_MONTH_METRICS_FUNCTIONS.items()}
+
+
+def get_site_monthly_history(site, date_for, months_back, fields):
+    """Reads monthly history for the site from `SiteMonthlyMetrics`
+
+    Returns a dict with the field names as keys. Each value has the same
+    structure as the return value of `get_monthly_history_metric`.
+
+    We read the stored months with one query. The pipeline fills last month
+    at the start of each month and refreshes the current month every day. If
+    a month is missing, or was saved before we stored all the fields, we
+    calculate it the same way as `get_monthly_history_metric`
+    """
+    date_for = as_date(date_for)
+    months = list(previous_months_iterator(month_for=date_for, months_back=months_back))
+    month_dates = [datetime.date(month[0], month[1], 1) for month in months]
+    stored = {obj.month_for: obj for obj in SiteMonthlyMetrics.objects.filter(
+        site=site, month_for__in=month_dates)}
+    live_funcs = dict(SITE_MONTH_METRICS_FUNCTIONS,
+                      active_user_count=get_active_users_for_time_period)
+
+    history = {field: [] for field in fields}
+    for month, month_date in zip(months, month_dates):
+        obj = stored.get(month_date)
+        for field in fields:
+            if obj and getattr(obj, field) is not None:
+                value = getattr(obj, field)
+            else:
+                value = live_funcs[field](
+                    site=site,
+                    start_date=month_date,
+                    end_date=datetime.date(month[0], month[1], month[2]))
+            history[field].append(dict(period=period_str(month), value=value))
+
+    return {field: dict(current_month=values[-1]['value'] if values else 0,
+                        history=values)
+            for field, values in history.items()}
+
+
 # -------------------------
 # Course metrics collectors
 # -------------------------
@@ -630,42 +678,77 @@ def get_month_course_metrics(site, course_id, month_for, **_kwargs):
         )
 
 
-def get_current_month_site_metrics(site, **_kwargs):
-    """
-    TODO: put the metric names and functions in a dict and iterate. This then
-    will let up dynamically retrieve fields for the monthly metrics this function
+def get_month_course_metrics_for_courses(site, course_ids, month_for):
+    """Returns a list of the monthly metrics for the given courses
+
+    This is the batched version of `get_month_course_metrics`. We run one
+    grouped `CourseDailyMetrics` aggregate and one grouped MAU query for all
+    the courses instead of five queries per course. The list is in the order
+    of `course_ids` and each item is the same dict `get_month_course_metrics`
     returns
     """
+    first_day, last_day = first_last_days_for_month(month_for)
+    course_ids = [str(course_id) for course_id in course_ids]
+    if not course_ids:
+        return []
+
+    cdm_qs = CourseDailyMetrics.objects.filter(
+        site=site,
+        date_for__gt=prev_day(first_day),
+        date_for__lt=next_day(last_day),
+        course_id__in=course_ids)
+    cdm_rows = cdm_qs.order_by().values('course_id').annotate(
+        course_enrollments=Max('enrollment_count'),
+        num_learners_completed=Max('num_learners_completed'),
+        avg_days_to_complete=Avg('average_days_to_complete'),
+        avg_progress=Avg('average_progress'))
+    cdm_data = {row['course_id']: row for row in cdm_rows}
+    mau_data = get_mau_by_course(course_ids=course_ids,
+                                 year=first_day.year,
+                                 month=first_day.month)
+
+    data = []
+    for course_id in course_ids:
+        row = cdm_data.get(course_id)
+        if row:
+            course_enrollments = row['course_enrollments']
+            num_learners_completed = row['num_learners_completed']
+            avg_days_to_complete = int(math.ceil(row['avg_days_to_complete'] or 0))
+            avg_progress = float(Decimal(row['avg_progress'] or 0).quantize(Decimal('.00')))
+        else:
+            course_enrollments = 0
+            num_learners_completed = 0
+            avg_days_to_complete = 0
+            avg_progress = 0.0
+        data.append(dict(
+            course_id=course_id,
+            month_for=month_for,
+            active_users=mau_data.get(course_id, 0),
+            course_enrollments=course_enrollments,
+            num_learners_completed=num_learners_completed,
+            avg_days_to_complete=avg_days_to_complete,
+            avg_progress=avg_progress,
+        ))
+    return data
+
+
+def get_current_month_site_metrics(site, **_kwargs):
+    """Returns the site metrics for the current month
+
+    Reads the current month's `SiteMonthlyMetrics` record, which the daily
+    pipeline refreshes. If there isn't one, we calculate the metrics
+    """
     date_for = datetime.datetime.utcnow().date()
-    start_date = datetime.date(year=date_for.year, month=date_for.month, day=1)
-    end_date = datetime.date(year=date_for.year,
-                             month=date_for.month,
-                             day=days_in_month(date_for))
-
-    active_users = get_active_users_for_time_period(site=site,
-                                                    start_date=start_date,
-                                                    end_date=end_date)
-    registered_users = get_total_site_users_for_time_period(site=site,
-                                                            start_date=start_date,
-                                                            end_date=end_date)
-    new_users = get_total_site_users_joined_for_time_period(site=site,
-                                                            start_date=start_date,
-                                                            end_date=end_date)
-    site_courses = get_total_site_courses_for_time_period(site=site,
-                                                          start_date=start_date,
-                                                          end_date=end_date)
-    course_enrollments = get_total_enrollments_for_time_period(site=site,
-                                                               start_date=start_date,
-                                                               end_date=end_date)
-    course_completions = get_total_course_completions_for_time_period(site=site,
-                                                                      start_date=start_date,
-                                                                      end_date=end_date)
-    return dict(active_users=active_users,
-                registered_users=registered_users,
-                new_users=new_users,
-                site_courses=site_courses,
-                course_enrollments=course_enrollments,
-                course_completions=course_completions)
+    history = get_site_monthly_history(site=site,
+                                       date_for=date_for,
+                                       months_back=0,
+                                       fields=SiteMonthlyMetrics.METRIC_FIELDS)
+    return dict(active_users=history['active_user_count']['current_month'],
+                registered_users=history['registered_users']['current_month'],
+                new_users=history['new_users']['current_month'],
+                site_courses=history['site_courses']['current_month'],
+                course_enrollments=history['course_enrollments']['current_month'],
+                course_completions=history['course_completions']['current_month'])
 
 
 def get_monthly_site_metrics(site, date_for=None, **kwargs):
@@ -748,50 +831,16 @@ def get_monthly_site_metrics(site, date_for=None, **kwargs):
 
     months_back = kwargs.get('months_back', 6)  # Warning: magic number
 
-    ##
-    # Brute force this for now. Later, refactor to define getters externally,
-    # and rely more on the serializers to stitch data together to respond
-    ##
-    # Then, we can put the method calls into a dict, load the dict from
-    # settings, for example, or a Django model
-
-    # We are retrieving data here in series before constructing the return dict
-    # This makes it easier to inspect
-    monthly_active_users = get_monthly_history_metric(
-        func=get_active_users_for_time_period,
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-    )
-    total_site_users = get_monthly_history_metric(
-        func=get_total_site_users_for_time_period,
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-    )
-    total_site_courses = get_monthly_history_metric(
-        func=get_total_site_courses_for_time_period,
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-    )
-    total_course_enrollments = get_monthly_history_metric(
-        func=get_total_enrollments_for_time_period,
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-    )
-    total_course_completions = get_monthly_history_metric(
-        func=get_total_course_completions_for_time_period,
-        site=site,
-        date_for=date_for,
-        months_back=months_back,
-    )
-
+    # We read the months stored by the monthly pipeline. See
+    # `get_site_monthly_history`
+    history = get_site_monthly_history(site=site,
+                                       date_for=date_for,
+                                       months_back=months_back,
+                                       fields=SiteMonthlyMetrics.METRIC_FIELDS)
     return dict(
-        monthly_active_users=monthly_active_users,
-        total_site_users=total_site_users,
-        total_site_courses=total_site_courses,
-        total_course_enrollments=total_course_enrollments,
-        total_course_completions=total_course_completions,
+        monthly_active_users=history['active_user_count'],
+        total_site_users=history['registered_users'],
+        total_site_courses=history['site_courses'],
+        total_course_enrollments=history['course_enrollments'],
+        total_course_completions=history['course_completions'],
     )
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django import VERSION as DJANGO_VERSION
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import figures.models
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    if DJANGO_VERSION[0:2] == (1,8):
+        dependencies = [
+            ('sites', '0001_initial'),
+            ('figures', '0015_add_enrollment_data_model'),
+        ]
+    else:  # Assuming 1.11+
+        dependencies = [
+            ('sites', '0002_alter_domain_unique'),
+            ('figures', '0015_add_enrollment_data_model'),
+        ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyActiveUsers',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('date_for', models.DateField()),
+                ('course_id', models.CharField(blank=True, default='', max_length=255)),
+                ('user_count', models.IntegerField()),
+                ('packed_user_ids', models.BinaryField()),
+                ('site', models.ForeignKey(default=figures.models.default_site, on_delete=django.db.models.deletion.CASCADE, to='sites.Site')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailyactiveusers',
+            unique_together=set([('site', 'course_id', 'date_for')]),
+        ),
+    ]
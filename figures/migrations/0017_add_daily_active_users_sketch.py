@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0016_add_daily_active_users'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyactiveusers',
+            name='sketch',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
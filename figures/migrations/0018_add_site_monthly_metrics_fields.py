@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0017_add_daily_active_users_sketch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='course_completions',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='course_enrollments',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='new_users',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='registered_users',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='sitemonthlymetrics',
+            name='site_courses',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
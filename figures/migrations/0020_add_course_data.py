@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.utils.timezone
+import model_utils.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('figures', '0019_add_report_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseData',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', model_utils.fields.AutoCreatedField(default=django.utils.timezone.now, editable=False, verbose_name='created')),
+                ('modified', model_utils.fields.AutoLastModifiedField(default=django.utils.timezone.now, editable=False, verbose_name='modified')),
+                ('course_id', models.CharField(max_length=255, unique=True)),
+                ('sections_possible', models.IntegerField(default=0)),
+                ('points_possible', models.FloatField(default=0.0)),
+                ('structure_hash', models.CharField(blank=True, max_length=64)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
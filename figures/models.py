@@ -8,16 +8,18 @@ from datetime import date
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.db.models import F
 from django.utils.encoding import python_2_unicode_compatible
+from django.utils.timezone import now
 
 from jsonfield import JSONField
 
 from model_utils.models import TimeStampedModel
 
-from figures.compat import CourseEnrollment
-from figures.helpers import as_course_key
+from figures.compat import CourseEnrollment, StudentModule
+import figures.course_structure
+from figures.helpers import as_course_key, pack_int_set, unpack_int_set
 from figures.progress import EnrollmentProgress
 
 
@@ -169,6 +171,24 @@ class SiteMonthlyMetrics(TimeStampedModel):
     month_for = models.DateField()
     active_user_count = models.IntegerField()
 
+    # The monthly values served by the site metrics API. See
+    # `figures.metrics.get_site_month_metrics`. These are null for records
+    # saved before we stored them
+    registered_users = models.IntegerField(blank=True, null=True)
+    new_users = models.IntegerField(blank=True, null=True)
+    site_courses = models.IntegerField(blank=True, null=True)
+    course_enrollments = models.IntegerField(blank=True, null=True)
+    course_completions = models.IntegerField(blank=True, null=True)
+
+    METRIC_FIELDS = (
+        'active_user_count',
+        'registered_users',
+        'new_users',
+        'site_courses',
+        'course_enrollments',
+        'course_completions',
+    )
+
     class Meta:
         ordering = ['-month_for', 'site']
         unique_together = ['month_for', 'site']
@@ -177,9 +197,16 @@ class SiteMonthlyMetrics(TimeStampedModel):
         return "id:{}, month_for:{}, site:{}".format(
             self.id, self.month_for, self.site.domain)
 
-    @classmethod
-    def add_month(cls, site, year, month, active_user_count, overwrite=False):
+    @property
+    def has_all_metrics(self):
+        return all(getattr(self, field) is not None for field in self.METRIC_FIELDS)
 
+    @classmethod
+    def add_month(cls, site, year, month, active_user_count, overwrite=False,
+                  **month_metrics):
+        """
+        `month_metrics` are optional values for the other metric fields
+        """
         month_for = date(year=year, month=month, day=1)
         if not overwrite:
             try:
@@ -190,11 +217,39 @@ class SiteMonthlyMetrics(TimeStampedModel):
             except SiteMonthlyMetrics.DoesNotExist:
                 pass
 
-        defaults = dict(active_user_count=active_user_count)
+        defaults = dict(active_user_count=active_user_count, **month_metrics)
         return SiteMonthlyMetrics.objects.update_or_create(site=site,
                                                            month_for=month_for,
                                                            defaults=defaults)
 
+    @classmethod
+    def bulk_add_months(cls, site, month_data, overwrite=False):
+        """
+        Add many months for the site with a fixed number of queries
+
+        `month_data` is a dict of first of the month dates to dicts of metric
+        field values. Existing records are kept unless `overwrite` is True,
+        same as `add_month`. With `overwrite`, we replace the existing records.
+        Call this in a transaction
+
+        Returns a list of (obj, created) tuples ordered by month
+        """
+        existing = SiteMonthlyMetrics.objects.filter(site=site,
+                                                     month_for__in=list(month_data))
+        if overwrite:
+            existing.delete()
+            kept = {}
+        else:
+            kept = {obj.month_for: obj for obj in existing}
+
+        new_objs = [SiteMonthlyMetrics(site=site, month_for=month_for, **data)
+                    for month_for, data in month_data.items()
+                    if month_for not in kept]
+        SiteMonthlyMetrics.objects.bulk_create(new_objs)
+        results = [(obj, False) for obj in kept.values()]
+        results += [(obj, True) for obj in new_objs]
+        return sorted(results, key=lambda result: result[0].month_for)
+
 
 class EnrollmentDataManager(models.Manager):
     """Custom model manager for EnrollmentData
@@ -203,10 +258,19 @@ class EnrollmentDataManager(models.Manager):
     EnrollmentData instances.
 
     """
-    def set_enrollment_data(self, site, user, course_id, course_enrollment=False):
+    def set_enrollment_data(self, site, user, course_id, course_enrollment=False,
+                            latest_lcgms=None, recompute=False):
         """
         This is an expensive call as it needs to call CourseGradeFactory if
         there is not already a LearnerCourseGradeMetrics record for the learner
+
+        Callers updating many enrollments can pass `latest_lcgms`, the result
+        of `LearnerCourseGradeMetrics.objects.latest_lcgms` for the
+        enrollments, so that we don't query for each enrollment
+
+        Set `recompute` to True to read the learner's grade even when there is
+        a LearnerCourseGradeMetrics record. The record is from the last daily
+        pipeline run, so it does not have more recent progress
         """
         if not course_enrollment:
             # For now, let it raise a `CourseEnrollment.DoesNotExist
@@ -222,9 +286,14 @@ class EnrollmentDataManager(models.Manager):
         )
 
         # Note: doesn't use site for filtering
-        lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
-            user=user,
-            course_id=str(course_id))
+        if recompute:
+            lcgm = None
+        elif latest_lcgms is None:
+            lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
+                user=user,
+                course_id=str(course_id))
+        else:
+            lcgm = latest_lcgms.get((user.id, str(course_id)))
         if lcgm:
             # do we already have an enrollment data record
             # We may change this to use
@@ -238,18 +307,36 @@ class EnrollmentDataManager(models.Manager):
                 sections_worked=lcgm.sections_worked
             )
         else:
-            ep = EnrollmentProgress(user=user, course_id=course_id)
-            # TODO: If we get progress worked and there is no LCGM, then we have
-            # a bug OR there was progress after the last daily metrics collection
-            progress_data = dict(
-                date_for=date.today(),
-                is_completed=ep.is_completed(),
-                progress_percent=ep.progress_percent(),
-                points_possible=ep.progress.get('points_possible', 0),
-                points_earned=ep.progress.get('points_earned', 0),
-                sections_possible=ep.progress.get('sections_possible', 0),
-                sections_worked=ep.progress.get('sections_worked', 0)
-            )
+            course_data = CourseData.objects.for_course(course_id)
+            if course_data and not StudentModule.objects.filter(
+                    student_id=user.id,
+                    course_id=as_course_key(course_id)).exists():
+                # The learner has not started the course, so we don't need a
+                # grade read to get the course totals
+                progress_data = dict(
+                    date_for=date.today(),
+                    is_completed=False,
+                    progress_percent=0.0,
+                    points_possible=course_data.points_possible,
+                    points_earned=0,
+                    sections_possible=course_data.sections_possible,
+                    sections_worked=0
+                )
+            else:
+                ep = EnrollmentProgress(user=user, course_id=course_id)
+                CourseData.objects.update_totals(course_id=course_id,
+                                                 **ep.course_totals())
+                # TODO: If we get progress worked and there is no LCGM, then we have
+                # a bug OR there was progress after the last daily metrics collection
+                progress_data = dict(
+                    date_for=date.today(),
+                    is_completed=ep.is_completed(),
+                    progress_percent=ep.progress_percent(),
+                    points_possible=ep.progress.get('points_possible', 0),
+                    points_earned=ep.progress.get('points_earned', 0),
+                    sections_possible=ep.progress.get('sections_possible', 0),
+                    sections_worked=ep.progress.get('sections_worked', 0)
+                )
         defaults.update(progress_data)
 
         obj, created = self.update_or_create(
@@ -326,6 +413,10 @@ class EnrollmentData(TimeStampedModel):
 class LearnerCourseGradeMetricsManager(models.Manager):
     """Custom model manager for LearnerCourseGrades model
     """
+    # Most query parameters `latest_lcgms` uses in one query. SQLite allows
+    # 999 by default
+    LATEST_LCGMS_MAX_PARAMS = 500
+
     def latest_lcgm(self, user, course_id):
         """Gets the most recent record for the given user and course
 
@@ -334,8 +425,8 @@ class LearnerCourseGradeMetricsManager(models.Manager):
         learners may not have the same "most recent date"
 
         This means we have to be careful of where we use this method in our
-        API as it costs a query per call. We will likely require restructuring
-        or augmenting our data if we need to bulk retrieve
+        API as it costs a query per call. Use `latest_lcgms` to get the records
+        for many enrollments in one query
 
         TODO: Consider if we want to add 'site' as a parameter and update the
         uniqueness constraint to be: site, course_id, user, date_for
@@ -344,14 +435,94 @@ class LearnerCourseGradeMetricsManager(models.Manager):
                                course_id=str(course_id)).order_by('-date_for')
         return queryset[0] if queryset else None
 
-    def most_recent_for_course(self, course_id):
+    def latest_lcgms(self, user_course_pairs):
+        """Gets the most recent record for each of the given enrollments
+
+        `user_course_pairs` is an iterable of (user_id, course_id) tuples.
+        Course ids can be strings or CourseKey instances
+
+        This is the bulk version of `latest_lcgm`. It runs one "greatest per
+        group" query like `most_recent_for_course` for each chunk of the
+        pairs. See `_latest_lcgms_chunks`. The derived table filters on the
+        users and courses in the chunk, so it may include enrollments not in
+        the pairs. We leave those out of the result
+
+        Returns a dict of (user_id, course id string) tuples to
+        LearnerCourseGradeMetrics instances. Enrollments without records are
+        not included
+        """
+        pairs = set((int(user_id), str(course_id))
+                    for user_id, course_id in user_course_pairs)
+        latest = {}
+        for chunk in self._latest_lcgms_chunks(pairs):
+            latest.update(self._latest_lcgms_for_chunk(chunk))
+        return latest
+
+    def _latest_lcgms_chunks(self, pairs):
+        """Splits the pairs so each query has at most `LATEST_LCGMS_MAX_PARAMS`
+        user and course id parameters
+
+        We sort by course so that a chunk repeats as few courses as possible
+        """
+        chunk, user_ids, course_ids = [], set(), set()
+        for user_id, course_id in sorted(pairs, key=lambda pair: (pair[1], pair[0])):
+            new_params = (user_id not in user_ids) + (course_id not in course_ids)
+            if chunk and len(user_ids) + len(course_ids) + new_params > self.LATEST_LCGMS_MAX_PARAMS:
+                yield chunk
+                chunk, user_ids, course_ids = [], set(), set()
+            chunk.append((user_id, course_id))
+            user_ids.add(user_id)
+            course_ids.add(course_id)
+        if chunk:
+            yield chunk
+
+    def _latest_lcgms_for_chunk(self, pairs):
+        pairs = set(pairs)
+        user_ids = sorted(set(pair[0] for pair in pairs))
+        course_ids = sorted(set(pair[1] for pair in pairs))
         statement = """ \
-        SELECT id, user_id, course_id, MAX(date_for)
-        FROM figures_learnercoursegrademetrics lcgm
-        WHERE course_id = {course_id} AND
-        GROUP BY user_id, course_id
+        SELECT lcgm.*
+        FROM {table} lcgm
+        INNER JOIN (
+            SELECT user_id, course_id, MAX(date_for) AS latest_date_for
+            FROM {table}
+            WHERE user_id IN ({user_params}) AND course_id IN ({course_params})
+            GROUP BY user_id, course_id
+        ) latest
+        ON lcgm.user_id = latest.user_id AND
+        lcgm.course_id = latest.course_id AND
+        lcgm.date_for = latest.latest_date_for
+        """.format(table=self.model._meta.db_table,
+                   user_params=', '.join(['%s'] * len(user_ids)),
+                   course_params=', '.join(['%s'] * len(course_ids)))
+        records = self.raw(statement, user_ids + course_ids)
+        return {(rec.user_id, rec.course_id): rec for rec in records
+                if (rec.user_id, rec.course_id) in pairs}
+
+    def most_recent_for_course(self, course_id):
+        """Returns the most recent record for each learner in the course
+
+        This is a "greatest per group" query. We join on a derived table of the
+        latest `date_for` per learner instead of using a correlated subquery so
+        that it runs on MySQL 5.6 and SQLite. Since we have a uniqueness
+        constraint on user, course_id and date_for, we get one row per learner
+
+        Returns a RawQuerySet of LearnerCourseGradeMetrics instances
         """
-        return self.raw(statement.format(course_id=str(course_id)))
+        statement = """ \
+        SELECT lcgm.*
+        FROM {table} lcgm
+        INNER JOIN (
+            SELECT user_id, MAX(date_for) AS latest_date_for
+            FROM {table}
+            WHERE course_id = %s
+            GROUP BY user_id
+        ) latest
+        ON lcgm.user_id = latest.user_id AND
+        lcgm.date_for = latest.latest_date_for
+        WHERE lcgm.course_id = %s
+        """.format(table=self.model._meta.db_table)
+        return self.raw(statement, [str(course_id), str(course_id)])
 
     def completed_for_site(self, site, **_kwargs):
         """Return course_id/user_id pairs that have completed
@@ -648,9 +819,384 @@ class CourseMauMetrics(BaseDateMetricsModel):
                                                          defaults=dict(
                                                             mau=data['mau']))
 
+    @classmethod
+    def bulk_save_metrics(cls, site, date_for, course_mau, overwrite=False):
+        """
+        Save the MAU for many courses in the site with a fixed number of queries
+
+        `course_mau` is a dict of course id strings to MAU counts
+
+        Existing records are kept unless `overwrite` is True, same as
+        `save_metrics`. With `overwrite`, we replace the existing records
+        instead of updating them one by one. Call this in a transaction so
+        readers do not see the course missing between the delete and insert
+
+        Returns a list of the records for the courses in `course_mau`
+        """
+        existing = CourseMauMetrics.objects.filter(site=site,
+                                                   date_for=date_for,
+                                                   course_id__in=list(course_mau))
+        if overwrite:
+            existing.delete()
+            kept = {}
+        else:
+            kept = {obj.course_id: obj for obj in existing}
+
+        new_objs = [CourseMauMetrics(site=site,
+                                     course_id=course_id,
+                                     date_for=date_for,
+                                     mau=mau)
+                    for course_id, mau in course_mau.items()
+                    if course_id not in kept]
+        CourseMauMetrics.objects.bulk_create(new_objs)
+        return list(kept.values()) + new_objs
+
     def __str__(self):
         return '{}, {}, {}, {}, {}'.format(self.id,
                                            self.site.domain,
                                            self.course_id,
                                            self.date_for,
                                            self.mau)
+
+
+class DailyActiveUsersManager(models.Manager):
+    """Custom model manager for DailyActiveUsers model
+    """
+    def for_period(self, site, start_date, end_date, course_ids=None):
+        """Return the records for the site and dates, inclusive
+
+        If `course_ids` is None, returns the site records. Otherwise returns
+        the records for the given courses
+        """
+        queryset = self.filter(site=site,
+                               date_for__gte=start_date,
+                               date_for__lte=end_date)
+        if course_ids is None:
+            return queryset.filter(course_id=DailyActiveUsers.SITE_COURSE_ID)
+        return queryset.filter(course_id__in=[str(cid) for cid in course_ids])
+
+
+@python_2_unicode_compatible
+class DailyActiveUsers(BaseDateMetricsModel):
+    """The set of user ids active on a day for a site or a course in the site
+
+    Site records have a blank `course_id` and hold the union of the course
+    records for the day. A site record also tells us that the pipeline stored
+    the day for the site. Course records only exist for courses with active
+    users on that day.
+
+    User ids are stored packed. See `figures.helpers.pack_int_set`
+
+    For sites using approximate active user counts, we also store a
+    HyperLogLog sketch of the user ids. See `figures.hll`
+    """
+    SITE_COURSE_ID = ''
+
+    course_id = models.CharField(max_length=255, blank=True, default=SITE_COURSE_ID)
+    user_count = models.IntegerField()
+    packed_user_ids = models.BinaryField()
+    sketch = models.BinaryField(blank=True, null=True)
+    objects = DailyActiveUsersManager()
+
+    class Meta:
+        unique_together = ('site', 'course_id', 'date_for',)
+
+    @classmethod
+    def build(cls, site, date_for, user_ids, course_id=SITE_COURSE_ID, sketch=None):
+        """Return a new unsaved record for the given user ids
+
+        `sketch` is an optional `figures.hll.HyperLogLog` instance
+        """
+        user_ids = set(user_ids)
+        return cls(site=site,
+                   date_for=date_for,
+                   course_id=str(course_id),
+                   user_count=len(user_ids),
+                   packed_user_ids=pack_int_set(user_ids),
+                   sketch=sketch.to_bytes() if sketch else None)
+
+    @property
+    def user_ids(self):
+        return unpack_int_set(self.packed_user_ids)
+
+    def __str__(self):
+        return '{}, {}, {}, {}, {}'.format(self.id,
+                                           self.site.domain,
+                                           self.course_id,
+                                           self.date_for,
+                                           self.user_count)
+
+
+class CourseDataManager(models.Manager):
+    """Custom model manager for CourseData model
+    """
+    def update_totals(self, course_id, sections_possible, points_possible,
+                      structure_hash):
+        """Saves the course totals from a grade read
+
+        We only write to the database when the structure hash differs from
+        the stored one. See `figures.progress.course_totals`
+
+        Returns the `CourseData` record
+        """
+        course_id = str(course_id)
+        obj = self.for_course(course_id)
+        if obj and obj.structure_hash == structure_hash:
+            return obj
+        obj, _created = self.update_or_create(
+            course_id=course_id,
+            defaults=dict(sections_possible=sections_possible,
+                          points_possible=points_possible,
+                          structure_hash=structure_hash))
+        figures.course_structure.set_course_totals(course_id, obj)
+        return obj
+
+    def for_course(self, course_id):
+        """Returns the course's `CourseData` record or None
+
+        In a pipeline run, the record is cached with the course structure. See
+        `figures.course_structure`
+        """
+        return figures.course_structure.get_course_totals(
+            course_id, loader=lambda cid: self.filter(course_id=cid).first())
+
+
+@python_2_unicode_compatible
+class CourseData(TimeStampedModel):
+    """Stores the learner independent totals of a course
+
+    The number of graded sections and the points possible are the same for
+    all learners in a course. We store them from a grade read so that progress
+    for learners who have not started the course and the course details API
+    don't need a grade read.
+
+    `structure_hash` identifies the graded structure the totals came from. We
+    update the totals when a grade read gets a different hash.
+
+    Figures runs in the LMS, which does not receive the Studio course published
+    signal. So after a course is changed, the totals are only refreshed by the
+    next grade read for the course. Until then, learners who have not started
+    the course get the earlier totals
+    """
+    course_id = models.CharField(max_length=255, unique=True)
+    sections_possible = models.IntegerField(default=0)
+    points_possible = models.FloatField(default=0.0)
+    structure_hash = models.CharField(max_length=64, blank=True)
+
+    objects = CourseDataManager()
+
+    def __str__(self):
+        return '{}, {}, {}, {}'.format(self.id,
+                                       self.course_id,
+                                       self.sections_possible,
+                                       self.points_possible)
+
+
+class DirtyEnrollmentManager(models.Manager):
+    """Custom model manager for DirtyEnrollment model
+    """
+    def mark(self, site_id, user_id, course_id):
+        """Queues the enrollment for an EnrollmentData update
+
+        If the enrollment is already queued, we update its `modified` time so
+        that a run processing it does not remove it from the queue.
+
+        This runs when the platform saves learner data. An enrollment is
+        usually already queued, so we try a single UPDATE first and only
+        insert when it matches no row. We don't use `update_or_create` as it
+        reads the row with a lock before writing
+        """
+        queued = self.filter(site_id=site_id, user_id=user_id, course_id=str(course_id))
+        if queued.update(modified=now()):
+            return
+        try:
+            with transaction.atomic():
+                self.create(site_id=site_id, user_id=user_id, course_id=str(course_id))
+        except IntegrityError:
+            # Another request queued it after our update
+            queued.update(modified=now())
+
+
+@python_2_unicode_compatible
+class DirtyEnrollment(TimeStampedModel):
+    """Queues an enrollment whose progress data changed
+
+    When enrollment change capture is enabled, `figures.signals` adds a record
+    when a StudentModule or CourseEnrollment record for the enrollment is
+    saved. The pipeline then updates EnrollmentData for the queued enrollments
+    only and removes them from the queue. See
+    `figures.backfill.update_dirty_enrollment_data`
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255)
+
+    objects = DirtyEnrollmentManager()
+
+    class Meta:
+        unique_together = ('site', 'user', 'course_id')
+
+    def __str__(self):
+        return '{}, {}, {}, {}'.format(self.id,
+                                       self.site.domain,
+                                       self.user_id,
+                                       self.course_id)
+
+
+@python_2_unicode_compatible
+class PipelineWatermark(TimeStampedModel):
+    """Stores how far an incremental pipeline task has read for a site
+
+    `value` is the time up to which the task has processed changes. The next
+    run reads changes made after it
+    """
+    ENROLLMENT_DATA = 'enrollment_data'
+
+    NAME_CHOICES = (
+        (ENROLLMENT_DATA, 'Enrollment data micro-batch'),
+    )
+
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    name = models.CharField(max_length=64, choices=NAME_CHOICES)
+    value = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('site', 'name')
+
+    def __str__(self):
+        return '{}, {}, {}, {}'.format(self.id,
+                                       self.site.domain,
+                                       self.name,
+                                       self.value)
+
+
+@python_2_unicode_compatible
+class SiteActivity(TimeStampedModel):
+    """Summary of the latest activity in a site
+
+    The pipeline updates it before running the site level tasks and uses it to
+    find dormant sites. See `figures.pipeline.site_activity`
+    """
+    site = models.OneToOneField(Site, on_delete=models.CASCADE)
+    last_enrollment = models.DateTimeField(null=True, blank=True)
+    last_student_module = models.DateTimeField(null=True, blank=True)
+    last_login = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return '{}, {}, {}'.format(self.id, self.site.domain, self.last_activity)
+
+    @property
+    def last_activity(self):
+        """Returns the time of the latest activity or None if there is none
+        """
+        times = [value for value in (self.last_enrollment,
+                                     self.last_student_module,
+                                     self.last_login) if value]
+        return max(times) if times else None
+
+
+@python_2_unicode_compatible
+class EnrollmentDataBackfillChunk(TimeStampedModel):
+    """Checkpoint for a chunk of a site's EnrollmentData backfill
+
+    A chunk is a range of CourseEnrollment ids in one course, after `after_id`
+    and up to `through_id`. The last chunk of a course has no `through_id` so
+    it also covers enrollments made after the backfill started.
+
+    We set `completed` and the counters when the chunk is done. The chunks of
+    an unfinished backfill remain until the next backfill starts over, or a
+    resumed backfill processes the chunks not completed. See
+    `figures.backfill.backfill_enrollment_data_for_site`
+    """
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    course_id = models.CharField(max_length=255)
+    after_id = models.IntegerField()
+    through_id = models.IntegerField(null=True, blank=True)
+    completed = models.DateTimeField(null=True, blank=True)
+    processed = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('site', 'course_id', 'after_id')
+
+    def __str__(self):
+        return '{}, {}, {}, {}-{}'.format(self.id,
+                                          self.site.domain,
+                                          self.course_id,
+                                          self.after_id,
+                                          self.through_id)
+
+
+class ReportJobManager(models.Manager):
+    """Custom model manager for ReportJob model
+    """
+    def reusable(self, site, report_type, data_version):
+        """Returns the most recent job for the site and report type we can reuse
+
+        We can reuse a job built for the same data version that has not failed
+        """
+        return self.filter(site=site,
+                           report_type=report_type,
+                           data_version=data_version).exclude(
+            status=ReportJob.FAILED).order_by('-created').first()
+
+
+@python_2_unicode_compatible
+class ReportJob(TimeStampedModel):
+    """Tracks a report built on the server and its stored file
+
+    A Celery task builds the report in chunks and writes a compressed CSV file
+    to the default storage. See `figures.reports`
+
+    `data_version` is the site's response cache data version when the job was
+    requested. See `figures.response_cache.get_data_version`. The version
+    changes when the pipeline updates the site's metrics, so requests for the
+    same report and version can reuse the job's file
+    """
+    LEARNER_REPORT = 'learner'
+    COURSE_REPORT = 'course'
+    ENROLLMENT_REPORT = 'enrollment'
+
+    REPORT_TYPE_CHOICES = (
+        (LEARNER_REPORT, 'Learner report'),
+        (COURSE_REPORT, 'Course report'),
+        (ENROLLMENT_REPORT, 'Enrollment report'),
+    )
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    )
+
+    site = models.ForeignKey(Site, on_delete=models.CASCADE)
+    report_type = models.CharField(max_length=32, choices=REPORT_TYPE_CHOICES)
+    status = models.CharField(max_length=32, choices=STATUS_CHOICES, default=PENDING)
+    data_version = models.CharField(max_length=64, db_index=True)
+    progress_percent = models.FloatField(default=0.0,
+                                         validators=[MinValueValidator(0.0),
+                                                     MaxValueValidator(100.0)])
+    row_count = models.IntegerField(default=0)
+    artifact = models.FileField(upload_to='figures/reports', blank=True)
+    error_message = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                     blank=True,
+                                     null=True,
+                                     on_delete=models.SET_NULL)
+    objects = ReportJobManager()
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return '{}, {}, {}, {}'.format(self.id,
+                                       self.site.domain,
+                                       self.report_type,
+                                       self.status)
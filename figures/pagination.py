@@ -3,7 +3,10 @@
 '''
 
 from __future__ import absolute_import
-from rest_framework.pagination import LimitOffsetPagination
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
 
 
 class FiguresLimitOffsetPagination(LimitOffsetPagination):
@@ -16,3 +19,85 @@ class FiguresKiloPagination(LimitOffsetPagination):
     '''Custom Figures paginator to make the number of records returned consistent
     '''
     default_limit = 1000
+
+
+class FiguresOptionalLimitOffsetPagination(LimitOffsetPagination):
+    '''Paginates only when the request has the ``limit`` query parameter
+
+    Without ``limit``, views return the full unpaginated list as before
+    '''
+    default_limit = None
+
+
+class FiguresCursorPagination(CursorPagination):
+    '''Keyset paginator for endpoints that can return many thousands of records
+
+    Pages are selected with a `WHERE` on the ordering field instead of an
+    `OFFSET`, so deep pages cost the same as the first page. The `next` and
+    `previous` links carry opaque cursors. We only run the `COUNT` query if the
+    request has ``count=true``.
+
+    The ordering must be stable and indexed. We always use `ordering` and ignore
+    ordering filter query parameters. An empty ``cursor`` parameter returns the
+    first page
+    '''
+    ordering = 'id'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+        return super(FiguresCursorPagination, self).paginate_queryset(
+            queryset, request, view=view)
+
+    def get_ordering(self, request, queryset, view):
+        if isinstance(self.ordering, (list, tuple)):
+            return tuple(self.ordering)
+        return (self.ordering,)
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super(FiguresCursorPagination, self).decode_cursor(request)
+
+    def get_paginated_response(self, data):
+        response_data = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            response_data['count'] = self.count
+        response_data['results'] = data
+        return Response(response_data)
+
+
+class CursorPaginationOptInMixin(object):
+    '''Viewset mixin to use `FiguresCursorPagination` when the request asks
+
+    Requests with the ``cursor`` query parameter get cursor pagination. Other
+    requests get the view's `pagination_class` as before, so existing clients
+    are not affected. Set `cursor_ordering` on the view to change the ordering
+
+    Only the actions in `cursor_pagination_actions` use cursor pagination
+    '''
+    cursor_pagination_class = FiguresCursorPagination
+    cursor_pagination_actions = ('list',)
+    cursor_ordering = 'id'
+
+    def use_cursor_pagination(self):
+        return (getattr(self, 'action', None) in self.cursor_pagination_actions and
+                self.cursor_pagination_class.cursor_query_param in self.request.query_params)
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+                self._paginator.ordering = self.cursor_ordering
+            else:
+                self._paginator = super(CursorPaginationOptInMixin, self).paginator
+        return self._paginator
@@ -0,0 +1,117 @@
+"""Finds courses with no activity for the daily metrics pipeline
+
+Most of the courses on a site can be archived courses nobody has touched in
+months. Extracting their course daily metrics (CDM) every night gives the same
+values as the day before.
+
+Instead, we get the time of the latest activity for all of the site's courses
+with one grouped query each over CourseEnrollment, StudentModule and
+GeneratedCertificate. The queries only read the rows after the oldest of the
+previous CDM records, so they scan the recent rows of the indexed date
+columns instead of the site's full history. A course with no activity since its previous CDM record
+is inactive. For an inactive course we copy the previous record's values to
+the new record, with ``active_learners_today`` set to zero.
+
+Changes we don't see as activity, like unenrollments or course staff role
+changes, are picked up on the full refresh day, when we extract every course.
+See `figures.settings.daily_metrics_full_refresh_weekday`
+"""
+
+from __future__ import absolute_import
+
+from django.db.models import Max
+
+from figures.compat import CourseEnrollment, GeneratedCertificate, StudentModule
+from figures.helpers import as_course_key, as_datetime, next_day
+from figures.models import CourseDailyMetrics
+from figures.pipeline.helpers import pipeline_date_for_rule
+from figures.query import latest_course_daily_metrics
+from figures.settings import (
+    daily_metrics_full_refresh_weekday,
+    daily_metrics_skip_inactive_courses,
+)
+
+
+# Tuples of the models and the datetime field we read the latest activity from
+ACTIVITY_SOURCES = (
+    (CourseEnrollment, 'created'),
+    (StudentModule, 'modified'),
+    (GeneratedCertificate, 'created_date'),
+)
+
+
+def course_last_activity(course_ids, since=None):
+    """Returns a dict of course id strings to the time of the latest activity
+    in each course
+
+    If `since` is given, we only read activity at or after it. Courses without
+    activity are not included
+    """
+    course_keys = [as_course_key(course_id) for course_id in course_ids]
+    last_activity = {}
+    for model, field in ACTIVITY_SOURCES:
+        filter_args = {'course_id__in': course_keys}
+        if since:
+            filter_args[field + '__gte'] = since
+        rows = model.objects.filter(**filter_args).order_by().values(
+            'course_id').annotate(last=Max(field)).values_list('course_id', 'last')
+        for course_id, last in rows:
+            course_id = str(course_id)
+            if last and (course_id not in last_activity or last > last_activity[course_id]):
+                last_activity[course_id] = last
+    return last_activity
+
+
+def inactive_courses(course_ids, date_for):
+    """Returns a dict of course id strings to the previous CDM record for the
+    courses with no activity since that record
+    """
+    previous_cdms = latest_course_daily_metrics(course_ids, before=date_for)
+    if not previous_cdms:
+        return {}
+    since = as_datetime(next_day(min(cdm.date_for for cdm in previous_cdms.values())))
+    last_activity = course_last_activity(list(previous_cdms.keys()), since=since)
+    inactive = {}
+    for course_id, cdm in previous_cdms.items():
+        last = last_activity.get(course_id)
+        if last is None or last < as_datetime(next_day(cdm.date_for)):
+            inactive[course_id] = cdm
+    return inactive
+
+
+def skip_inactive_courses(date_for, force_update=False):
+    """Returns True if the pipeline carries forward inactive courses for the date
+    """
+    if force_update or not daily_metrics_skip_inactive_courses():
+        return False
+    return date_for.weekday() != daily_metrics_full_refresh_weekday()
+
+
+def carry_forward_inactive_courses(course_ids, date_for=None, force_update=False):
+    """Adds the CDM records for the inactive courses from their previous records
+
+    Inactive courses that already have a record for the date are left as they
+    are. The daily metrics pipeline does not update an existing record unless
+    `force_update` is True, and then we don't skip any course.
+
+    Returns the set of inactive course id strings. The pipeline does not need
+    to extract them
+    """
+    date_for = pipeline_date_for_rule(date_for)
+    if not skip_inactive_courses(date_for, force_update=force_update):
+        return set()
+    inactive = inactive_courses(course_ids, date_for)
+    existing = set(CourseDailyMetrics.objects.filter(
+        course_id__in=list(inactive.keys()),
+        date_for=date_for).values_list('course_id', flat=True))
+    CourseDailyMetrics.objects.bulk_create([
+        CourseDailyMetrics(site_id=cdm.site_id,
+                           course_id=course_id,
+                           date_for=date_for,
+                           enrollment_count=cdm.enrollment_count,
+                           active_learners_today=0,
+                           average_progress=cdm.average_progress,
+                           average_days_to_complete=cdm.average_days_to_complete,
+                           num_learners_completed=cdm.num_learners_completed)
+        for course_id, cdm in inactive.items() if course_id not in existing])
+    return set(inactive.keys())
@@ -12,14 +12,17 @@ Future: add a remote mode to pull data via REST API
 # TODO: Move extractors to figures.pipeline.extract module
 """
 from __future__ import absolute_import
+from collections import defaultdict
 from decimal import Decimal
 import logging
 
 from django.db import transaction
+from django.db.models import Count
 
 from student.roles import CourseCcxCoachRole, CourseInstructorRole, CourseStaffRole  # noqa pylint: disable=import-error
 
-from figures.compat import (CourseEnrollment,
+from figures.compat import (CourseAccessRole,
+                            CourseEnrollment,
                             CourseOverview,
                             GeneratedCertificate,
                             StudentModule)
@@ -40,29 +43,94 @@ logger = logging.getLogger(__name__)
 # Extraction helper methods
 
 
-def get_enrolled_in_exclude_admins(course_id, date_for=None):
+# The course roles whose users we don't count as learners
+STAFF_ROLES = (CourseStaffRole.ROLE, CourseInstructorRole.ROLE, CourseCcxCoachRole.ROLE)
+
+
+def _roles_course_key(course_id):
+    """Returns the key of the course the roles are assigned on
+
+    CCX course roles are assigned on the parent course
+    """
+    course_key = as_course_key(course_id)
+    if getattr(course_key, 'ccx', None):
+        course_key = course_key.to_course_locator()
+    return course_key
+
+
+def get_course_staff_user_ids(course_ids):
+    """Returns a dict of course id strings to the set of ids of the users with
+    a staff, instructor or CCX coach role in the course
+
+    We read the roles for all the courses in one query
+    """
+    roles_keys = {str(course_id): _roles_course_key(course_id) for course_id in course_ids}
+    staff = defaultdict(set)
+    for course_key, user_id in CourseAccessRole.objects.filter(
+            course_id__in=set(roles_keys.values()),
+            role__in=STAFF_ROLES).values_list('course_id', 'user_id'):
+        staff[str(course_key)].add(user_id)
+    return {course_id: staff.get(str(roles_key), set())
+            for course_id, roles_key in roles_keys.items()}
+
+
+def _enrolled_filter_args(date_for):
+    filter_args = dict(is_active=1)
+    if date_for:
+        filter_args.update(dict(created__lt=as_datetime(next_day(date_for))))
+    return filter_args
+
+
+def get_enrolled_in_exclude_admins(course_id, date_for=None, staff_user_ids=None):
     """
     Copied over from CourseEnrollmentManager.num_enrolled_in_exclude_admins method
     and modified to filter on date LT
 
     If no date is provided then the date is not used as a filter
 
+    `staff_user_ids` is the set of the course's staff user ids from
+    `get_course_staff_user_ids`. If not provided, we read it for the course
     """
-    course_locator = as_course_key(course_id)
+    if staff_user_ids is None:
+        staff_user_ids = get_course_staff_user_ids([course_id])[str(course_id)]
+    enrollments = CourseEnrollment.objects.filter(course_id=_roles_course_key(course_id),
+                                                  **_enrolled_filter_args(date_for))
+    if staff_user_ids:
+        enrollments = enrollments.exclude(user_id__in=staff_user_ids)
+    return enrollments
 
-    if getattr(course_id, 'ccx', None):
-        course_locator = course_id.to_course_locator()
 
-    staff = CourseStaffRole(course_locator).users_with_role()
-    admins = CourseInstructorRole(course_locator).users_with_role()
-    coaches = CourseCcxCoachRole(course_locator).users_with_role()
-    filter_args = dict(course_id=course_locator, is_active=1)
+def get_enrollment_counts_exclude_admins(course_ids, date_for=None, course_staff=None):
+    """Returns a dict of course id strings to the course's enrollment count,
+    not counting staff. See `get_enrolled_in_exclude_admins`
 
-    if date_for:
-        filter_args.update(dict(created__lt=as_datetime(next_day(date_for))))
+    `course_staff` is the dict `get_course_staff_user_ids` returns for the
+    courses. If not provided, we read it
 
-    return CourseEnrollment.objects.filter(**filter_args).exclude(
-        user__in=staff).exclude(user__in=admins).exclude(user__in=coaches)
+    This runs one grouped count for all the courses, then one query for the
+    enrollments of the staff users, which we subtract
+    """
+    if course_staff is None:
+        course_staff = get_course_staff_user_ids(course_ids)
+    keys = {str(course_id): _roles_course_key(course_id) for course_id in course_ids}
+    enrollments = CourseEnrollment.objects.filter(course_id__in=set(keys.values()),
+                                                  **_enrolled_filter_args(date_for))
+    totals = {str(course_key): count for course_key, count in enrollments.order_by().values(
+        'course_id').annotate(count=Count('id')).values_list('course_id', 'count')}
+
+    staff_user_ids = set(user_id for user_ids in course_staff.values() for user_id in user_ids)
+    staff_enrollments = defaultdict(int)
+    if staff_user_ids:
+        for course_key, user_id in enrollments.filter(
+                user_id__in=staff_user_ids).values_list('course_id', 'user_id'):
+            staff_enrollments[(str(course_key), user_id)] += 1
+
+    counts = {}
+    for course_id, course_key in keys.items():
+        staff_count = sum(staff_enrollments.get((str(course_key), user_id), 0)
+                          for user_id in course_staff.get(course_id, ()))
+        counts[course_id] = totals.get(str(course_key), 0) - staff_count
+    return counts
 
 
 def get_active_learner_ids_today(course_id, date_for):
@@ -82,6 +150,41 @@ def get_active_learner_ids_today(course_id, date_for):
         ).values_list('student__id', flat=True).distinct()
 
 
+def get_active_learner_counts(course_ids, date_for):
+    """Returns a dict of course id strings to the number of learners active in
+    the course on the given date
+
+    This is `get_active_learner_ids_today` counted for all the courses in one
+    grouped query
+    """
+    date_for_as_datetime = as_datetime(date_for)
+    counts = {str(course_key): count for course_key, count in StudentModule.objects.filter(
+        course_id__in=[as_course_key(course_id) for course_id in course_ids],
+        modified__year=date_for_as_datetime.year,
+        modified__month=date_for_as_datetime.month,
+        modified__day=date_for_as_datetime.day,
+        ).order_by().values('course_id').annotate(
+            count=Count('student_id', distinct=True)).values_list('course_id', 'count')}
+    return {str(course_id): counts.get(str(course_id), 0) for course_id in course_ids}
+
+
+def get_average_progress(course_id, date_for):
+    """Returns the course's average progress or None if we can't calculate it
+    """
+    try:
+        progress_data = bulk_calculate_course_progress_data(course_id=course_id,
+                                                            date_for=date_for)
+        return progress_data['average_progress']
+    except Exception:  # pylint: disable=broad-except
+        # Broad exception for starters. Refine as we see what gets caught
+        # Make sure we set the average_progres to None so that upstream
+        # does not think things are normal
+        msg = ('FIGURES:FAIL bulk_calculate_course_progress_data'
+               ' date_for={date_for}, course_id="{course_id}"')
+        logger.exception(msg.format(date_for=date_for, course_id=course_id))
+        return None
+
+
 def get_average_progress_deprecated(course_id, date_for, course_enrollments):
     """Collects and aggregates raw course grades data
     """
@@ -132,8 +235,14 @@ def get_days_to_complete(course_id, date_for):
     * This means if a learner starts at midnight and finished just before
       midnight, then 0 days will be given
 
-    NOTE: This has limited scaling. We ought to test it with
-    1k, 10k, 100k cert records
+    We get the certificates joined with the learner's enrollments in the course
+    in one query. There is one row per certificate and enrollment. If a learner
+    has more than one enrollment in the course, we add an error for the learner
+    and use the earliest enrollment. Certificates without an enrollment in the
+    course are skipped.
+
+    See `tests/pipeline/test_course_daily_metrics.py` for the scaling benchmark
+    at 1k, 10k and 100k certificate records
 
     TODO: change to use start_date, end_date with defaults that
     start_date is open and end_date is today
@@ -141,28 +250,30 @@ def get_days_to_complete(course_id, date_for):
     TODO: Consider collecting the total seconds rather than days
     This will improve accuracy, but may actually not be that important
     TODO: Analyze the error based on number of completions
-
-    When we have to support scale, we can look into optimization
-    techinques.
     """
-    certificates = GeneratedCertificate.objects.filter(
-        course_id=as_course_key(course_id),
-        created_date__lte=as_datetime(date_for))
+    course_key = as_course_key(course_id)
+    rows = GeneratedCertificate.objects.filter(
+        course_id=course_key,
+        created_date__lte=as_datetime(date_for),
+        user__courseenrollment__course_id=course_key,
+    ).order_by('user_id', 'user__courseenrollment__created').values_list(
+        'user_id', 'created_date', 'user__courseenrollment__created')
 
     days = []
     errors = []
-    for cert in certificates:
-        ce = CourseEnrollment.objects.filter(
-            course_id=as_course_key(course_id),
-            user=cert.user)
-        # How do we want to handle multiples?
-        if ce.count() > 1:
-            errors.append(
-                dict(msg='Multiple CE records',
-                     course_id=course_id,
-                     user_id=cert.user.id,
-                     ))
-        days.append((cert.created_date - ce[0].created).days)
+    last_user_id = None
+    for user_id, cert_created, enrollment_created in rows:
+        if user_id == last_user_id:
+            # How do we want to handle multiples?
+            if not errors or errors[-1]['user_id'] != user_id:
+                errors.append(
+                    dict(msg='Multiple CE records',
+                         course_id=course_id,
+                         user_id=user_id,
+                         ))
+            continue
+        last_user_id = user_id
+        days.append((cert_created - enrollment_created).days)
     return dict(days=days, errors=errors)
 
 
@@ -198,6 +309,22 @@ def get_num_learners_completed(course_id, date_for):
         created_date__lt=as_datetime(next_day(date_for)))
     return certificates.count()
 
+
+def get_num_learners_completed_counts(course_ids, date_for):
+    """Returns a dict of course id strings to the number of certificates
+    generated for the course up to the 'date_for' date
+
+    This is `get_num_learners_completed` counted for all the courses in one
+    grouped query
+    """
+    counts = {str(course_key): count for course_key, count in
+              GeneratedCertificate.objects.filter(
+                  course_id__in=[as_course_key(course_id) for course_id in course_ids],
+                  created_date__lt=as_datetime(next_day(date_for)),
+              ).order_by().values('course_id').annotate(
+                  count=Count('id')).values_list('course_id', 'count')}
+    return {str(course_id): counts.get(str(course_id), 0) for course_id in course_ids}
+
 # Formal extractor classes
 
 
@@ -225,7 +352,7 @@ class CourseDailyMetricsExtractor(object):
     BUT, we will then need to find a transform
     """
 
-    def extract(self, course_id, date_for, **_kwargs):
+    def extract(self, course_id, date_for, enrollment_count=None, **_kwargs):
         """
             defaults = dict(
                 enrollment_count=data['enrollment_count'],
@@ -237,22 +364,24 @@ class CourseDailyMetricsExtractor(object):
         TODO: refactor this class
         Add lazy loading method to load course enrollments
         - Create a method for each metric field
+
+        The site level pipeline passes `enrollment_count`, counted for all the
+        site's courses at once. See `get_enrollment_counts_exclude_admins`
         """
 
         # We can turn this series of calls into a parallel
         # set of calls defined in a ruleset instead of hardcoded here after
         # retrieving the core quersets
 
-        course_enrollments = get_enrolled_in_exclude_admins(
-            course_id, date_for,)
-
         data = dict(date_for=date_for, course_id=course_id)
 
         # This is the transform step
         # After we get this working, we can then define them declaratively
         # we can do a lambda for course_enrollments to get the count
 
-        data['enrollment_count'] = course_enrollments.count()
+        if enrollment_count is None:
+            enrollment_count = get_enrolled_in_exclude_admins(course_id, date_for).count()
+        data['enrollment_count'] = enrollment_count
 
         active_learner_ids_today = get_active_learner_ids_today(
             course_id, date_for,)
@@ -262,19 +391,7 @@ class CourseDailyMetricsExtractor(object):
             active_learners_today = 0
         data['active_learners_today'] = active_learners_today
 
-        # Average progress
-        try:
-            progress_data = bulk_calculate_course_progress_data(course_id=course_id,
-                                                                date_for=date_for)
-            data['average_progress'] = progress_data['average_progress']
-        except Exception:  # pylint: disable=broad-except
-            # Broad exception for starters. Refine as we see what gets caught
-            # Make sure we set the average_progres to None so that upstream
-            # does not think things are normal
-            data['average_progress'] = None
-            msg = ('FIGURES:FAIL bulk_calculate_course_progress_data'
-                   ' date_for={date_for}, course_id="{course_id}"')
-            logger.exception(msg.format(date_for=date_for, course_id=course_id))
+        data['average_progress'] = get_average_progress(course_id, date_for)
 
         data['average_days_to_complete'] = get_average_days_to_complete(
             course_id, date_for,)
@@ -285,6 +402,38 @@ class CourseDailyMetricsExtractor(object):
         return data
 
 
+class SiteCourseDailyMetricsExtractor(object):
+    """
+    Extracts the data needed for CourseDailyMetrics for many courses at once
+
+    `CourseDailyMetricsExtractor` runs its queries once per course. Here we
+    count the enrollments, active learners and completions for all the courses
+    with one grouped query each. Average progress and average days to complete
+    are not extracted here. `load_site_course_daily_metrics` gets them per
+    course
+    """
+
+    def extract(self, course_ids, date_for, **_kwargs):
+        """Returns a dict of course id strings to a data dict with the counts
+        `CourseDailyMetricsExtractor.extract` returns for the course
+        """
+        course_ids = [str(course_id) for course_id in course_ids]
+        enrollment_counts = get_enrollment_counts_exclude_admins(course_ids, date_for)
+        active_learner_counts = get_active_learner_counts(course_ids, date_for)
+        completed_counts = get_num_learners_completed_counts(course_ids, date_for)
+
+        results = {}
+        for course_id in course_ids:
+            results[course_id] = dict(
+                date_for=date_for,
+                course_id=course_id,
+                enrollment_count=enrollment_counts[course_id],
+                active_learners_today=active_learner_counts[course_id],
+                num_learners_completed=completed_counts[course_id],
+            )
+        return results
+
+
 class CourseDailyMetricsLoader(object):
 
     def __init__(self, course_id):
@@ -293,10 +442,11 @@ class CourseDailyMetricsLoader(object):
         self.extractor = CourseDailyMetricsExtractor()
         self.site = figures.sites.get_site_for_course(self.course_id)
 
-    def get_data(self, date_for):
+    def get_data(self, date_for, **kwargs):
         return self.extractor.extract(
             course_id=self.course_id,
-            date_for=date_for)
+            date_for=date_for,
+            **kwargs)
 
     @transaction.atomic
     def save_metrics(self, date_for, data):
@@ -322,7 +472,7 @@ class CourseDailyMetricsLoader(object):
         cdm.clean_fields()
         return (cdm, created,)
 
-    def load(self, date_for=None, force_update=False, **_kwargs):
+    def load(self, date_for=None, force_update=False, enrollment_count=None, **_kwargs):
         """
         TODO: clean up how we do this. We want to be able to call the loader
         with an existing data set (not having to call the extractor) but we
@@ -336,6 +486,8 @@ class CourseDailyMetricsLoader(object):
 
         Raises ValidationError if invalid data is attempted to be saved to the
         course daily metrics model instance
+
+        `enrollment_count` is passed to the extractor
         """
         date_for = pipeline_date_for_rule(date_for)
         try:
@@ -348,5 +500,49 @@ class CourseDailyMetricsLoader(object):
             # record not found, move on to creating
             pass
 
-        data = self.get_data(date_for=date_for)
+        if enrollment_count is None:
+            data = self.get_data(date_for=date_for)
+        else:
+            data = self.get_data(date_for=date_for, enrollment_count=enrollment_count)
         return self.save_metrics(date_for=date_for, data=data)
+
+
+def load_site_course_daily_metrics(course_ids, date_for=None, force_update=False):
+    """Loads the CourseDailyMetrics records for the courses, extracting the
+    counts for all of them at once with `SiteCourseDailyMetricsExtractor`
+
+    Courses that already have a record for the date are skipped unless
+    `force_update` is True. For each course, we then get the average progress
+    and average days to complete and save the data with
+    `CourseDailyMetricsLoader.save_metrics`, so a course that fails does not
+    stop the others
+
+    Returns a dict with the `loaded` course id strings and the `failed` course
+    id strings mapped to the exception raised
+    """
+    date_for = pipeline_date_for_rule(date_for)
+    course_ids = [str(course_id) for course_id in course_ids]
+    if not force_update:
+        existing = set(str(course_id) for course_id in CourseDailyMetrics.objects.filter(
+            course_id__in=course_ids,
+            date_for=date_for).values_list('course_id', flat=True))
+        course_ids = [course_id for course_id in course_ids if course_id not in existing]
+
+    loaded = []
+    failed = {}
+    if not course_ids:
+        return dict(loaded=loaded, failed=failed)
+    course_data = SiteCourseDailyMetricsExtractor().extract(course_ids=course_ids,
+                                                            date_for=date_for)
+    for course_id in course_ids:
+        try:
+            data = course_data[course_id]
+            data['average_progress'] = get_average_progress(course_id, date_for)
+            data['average_days_to_complete'] = get_average_days_to_complete(
+                course_id, date_for)
+            CourseDailyMetricsLoader(course_id).save_metrics(date_for=date_for,
+                                                             data=data)
+            loaded.append(course_id)
+        except Exception as e:  # pylint: disable=broad-except
+            failed[course_id] = e
+    return dict(loaded=loaded, failed=failed)
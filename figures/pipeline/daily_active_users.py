@@ -0,0 +1,77 @@
+"""Stores the daily active user sets for a site
+
+We read StudentModule once per site and day to get the distinct
+(course, user) pairs active that day. Then we save a `DailyActiveUsers` record
+for each active course and one for the site.
+
+Readers use `figures.active_users` to count active users for any window of
+days from these records.
+"""
+
+from __future__ import absolute_import
+from collections import defaultdict
+
+from django.db import transaction
+
+from figures.active_users import new_sketch
+from figures.helpers import as_datetime, next_day
+from figures.models import DailyActiveUsers
+from figures.pipeline.helpers import pipeline_date_for_rule
+from figures.settings import use_approximate_mau
+from figures.sites import get_student_modules_for_site
+
+
+def extract_daily_active_users(site, date_for):
+    """Return a dict of course id strings to sets of user ids active in the
+    course on the given day
+    """
+    student_modules = get_student_modules_for_site(site).filter(
+        modified__gte=as_datetime(date_for),
+        modified__lt=as_datetime(next_day(date_for)))
+    course_users = defaultdict(set)
+    for course_id, user_id in student_modules.order_by().values_list(
+            'course_id', 'student_id').distinct():
+        course_users[str(course_id)].add(user_id)
+    return course_users
+
+
+def collect_daily_active_users(site, date_for=None, overwrite=False):
+    """Store the active user sets for the site for the day
+
+    If the site uses approximate active user counts, we also store a sketch for
+    each course. The site sketch is the union of the course sketches.
+
+    Returns a tuple of the site `DailyActiveUsers` record and a boolean, which
+    is True if we created the records
+    """
+    date_for = pipeline_date_for_rule(date_for)
+    if not overwrite:
+        site_rec = DailyActiveUsers.objects.for_period(site, date_for, date_for).first()
+        if site_rec:
+            return site_rec, False
+
+    course_users = extract_daily_active_users(site, date_for)
+    site_users = set()
+    site_sketch = new_sketch() if use_approximate_mau(site) else None
+    records = []
+    for course_id, user_ids in course_users.items():
+        site_users.update(user_ids)
+        course_sketch = None
+        if site_sketch:
+            course_sketch = new_sketch()
+            course_sketch.update(user_ids)
+            site_sketch.merge(course_sketch)
+        records.append(DailyActiveUsers.build(site=site,
+                                              date_for=date_for,
+                                              course_id=course_id,
+                                              user_ids=user_ids,
+                                              sketch=course_sketch))
+    site_rec = DailyActiveUsers.build(site=site,
+                                      date_for=date_for,
+                                      user_ids=site_users,
+                                      sketch=site_sketch)
+    records.append(site_rec)
+    with transaction.atomic():
+        DailyActiveUsers.objects.filter(site=site, date_for=date_for).delete()
+        DailyActiveUsers.objects.bulk_create(records)
+    return site_rec, True
@@ -14,9 +14,11 @@ field
 
 ```
 
-for each learner+course  # See bulk_calculate_course_progress_data
-    get newest lgcm record
-    get newest sm record
+# See bulk_calculate_course_progress_data
+get newest lcgm record for each learner in the course
+get newest sm modified date for each learner in the course
+
+for each learner+course
 
     # Check if update needed, see _enrollment_metrics_needs_update
     if not lcgm and not sm
@@ -47,29 +49,49 @@ for each learner+course  # See bulk_calculate_course_progress_data
 """
 
 from __future__ import absolute_import
+from collections import namedtuple
 from datetime import datetime
 from decimal import Decimal
 import logging
 
+from django.db.models import Max
 from django.utils.timezone import utc
 
+from figures.helpers import as_course_key
 from figures.metrics import LearnerCourseGrades
-from figures.models import LearnerCourseGradeMetrics
+from figures.models import CourseData, LearnerCourseGradeMetrics
+from figures.progress import course_totals
 from figures.sites import (get_site_for_course,
                            course_enrollments_for_course,
                            student_modules_for_course_enrollment,
+                           student_modules_for_course_enrollments,
                            UnlinkedCourseError)
 
 logger = logging.getLogger(__name__)
 
 
+# Stands in for the learner's most recent StudentModule record when we get the
+# last modified date from a grouped query. It has the fields that
+# `_enrollment_metrics_needs_update` and `_collect_progress_data` read
+LearnerActivity = namedtuple('LearnerActivity', ['student_id', 'course_id', 'modified'])
+
+
 def bulk_calculate_course_progress_data(course_id, date_for=None):
     """Calculates the average progress for a set of course enrollments
 
     How it works
-    1. collects progress percent for each course enrollment
-        1.1. If an up to date enrollment metrics record already exists, use that
-    2. calculate and return the average of these enrollments
+    1. Gets the most recent StudentModule modified date for each learner in
+       the course with a single grouped query
+    2. Gets the most recent LearnerCourseGradeMetrics record for each learner
+       in the course with a single query
+    3. Walks the course enrollments once to find the learners whose progress
+       needs to be updated. Only these learners are sent to
+       `_collect_progress_data`, which is the expensive grade read
+    4. calculate and return the average of these enrollments
+
+    The number of queries is constant for the course plus one insert for each
+    learner that needs a new LCGM record. We store the course totals from the
+    first grade read only, as they are the same for every learner
 
     TODO: Update to filter on active users
 
@@ -85,21 +107,38 @@ def bulk_calculate_course_progress_data(course_id, date_for=None):
     if not site:
         raise UnlinkedCourseError('No site found for course "{}"'.format(course_id))
 
-    # We might be able to make this more efficient by finding only the learners
-    # in the course with StudentModule (SM) records then get their course
-    # enrollment (CE) records as we can ignore any learners without SM records
-    # since that means they don't have any course progress
-    for ce in course_enrollments_for_course(course_id):
-        sm = student_modules_for_course_enrollment(
-            site=site,
-            course_enrollment=ce).order_by('-modified')
-        if sm:
-            metrics = collect_metrics_for_enrollment(site=site,
+    course_key = as_course_key(course_id)
+    sm_last_modified = dict(student_modules_for_course_enrollments(
+        site=site,
+        course_id=course_key).order_by().values('student_id').annotate(
+            last_modified=Max('modified')).values_list('student_id', 'last_modified'))
+    latest_lcgms = {
+        rec.user_id: rec for rec in
+        LearnerCourseGradeMetrics.objects.most_recent_for_course(course_key)
+    }
+
+    # We skip learners without StudentModule records as they don't have any
+    # course progress
+    course_totals_stored = False
+    for ce in course_enrollments_for_course(course_key).select_related('user'):
+        if ce.user_id not in sm_last_modified:
+            continue
+        most_recent_sm = LearnerActivity(student_id=ce.user_id,
+                                         course_id=course_key,
+                                         modified=sm_last_modified[ce.user_id])
+        most_recent_lcgm = latest_lcgms.get(ce.user_id)
+        if _enrollment_metrics_needs_update(most_recent_lcgm, most_recent_sm):
+            progress_data = _collect_progress_data(
+                most_recent_sm, store_course_totals=not course_totals_stored)
+            course_totals_stored = True
+            metrics = _new_enrollment_metrics_record(site=site,
                                                      course_enrollment=ce,
-                                                     date_for=date_for,
-                                                     student_modules=sm)
-            if metrics:
-                progress_percentages.append(metrics.progress_percent)
+                                                     progress_data=progress_data,
+                                                     date_for=date_for)
+        else:
+            metrics = most_recent_lcgm
+        if metrics:
+            progress_percentages.append(metrics.progress_percent)
 
     return dict(
         average_progress=calculate_average_progress(progress_percentages),
@@ -279,13 +318,20 @@ def _new_enrollment_metrics_record(site, course_enrollment, progress_data, date_
         )
 
 
-def _collect_progress_data(student_module):
+def _collect_progress_data(student_module, store_course_totals=True):
     """Get new progress data for the learner/course
 
     Uses `figures.metrics.LearnerCourseGrades` to retrieve progress data via
     `CourseGradeFactory().read(...)` and calculate progress percentage
+
+    If `store_course_totals` is True, we also store the course totals from the
+    grade read. See `figures.models.CourseData`
     """
     lcg = LearnerCourseGrades(user_id=student_module.student_id,
                               course_id=student_module.course_id)
     course_progress_details = lcg.progress()
+    if store_course_totals:
+        CourseData.objects.update_totals(
+            course_id=student_module.course_id,
+            **course_totals(lcg.sections(only_graded=True)))
     return course_progress_details
@@ -6,6 +6,10 @@ Course MAU is the total count of unique active learners for the requested month
 * Calculates MAU values for all courses (TBD filtering)
 * Stores calculated values in Figures MAU metric models
 
+`figures.mau.store_mau_metrics` does this for all the courses in a site at
+once from the daily active user store. Use it instead of calling
+`collect_course_mau` for each course.
+
 The core functionality to process MAU data should be in this module.
 
 See figures.tasks for the Celery tasks that run MAU jobs
@@ -88,3 +92,4 @@ def collect_course_mau(site, courselike, month_for, **kwargs):
                                    overwrite=overwrite)
 
     return obj, created
+
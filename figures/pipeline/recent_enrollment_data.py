@@ -0,0 +1,147 @@
+"""Keeps EnrollmentData current between daily pipeline runs
+
+The daily pipeline updates EnrollmentData once a day. The learner progress
+overview (LPO) reads EnrollmentData, so it shows progress as of the last run.
+
+`update_recent_enrollment_data` runs every few minutes from a Celery task. It
+finds the enrollments with StudentModule changes since the site's watermark,
+reads their grades and updates their EnrollmentData records. Then it moves
+the watermark forward. See `figures.models.PipelineWatermark`
+
+Each run updates at most `enrollment_data_micro_batch_limit()` enrollments,
+oldest changes first, in batches of `enrollment_data_micro_batch_size()`. If
+there are more, the next run continues from where this one stopped.
+
+Runs for a site do not overlap. A run slower than the schedule interval holds
+the site's lock and the next run for the site is skipped. See
+`micro_batch_lock`
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils.timezone import now, utc
+
+from figures.compat import CourseEnrollment
+from figures.helpers import as_course_key
+from figures.models import EnrollmentData, PipelineWatermark
+from figures.settings import (
+    enrollment_data_micro_batch_limit,
+    enrollment_data_micro_batch_size,
+)
+from figures.sites import get_student_modules_for_site
+
+
+# We don't read changes newer than this so that StudentModule saves still in
+# a transaction when we read are picked up by the next run
+WATERMARK_LAG_SECONDS = 60
+
+# Expires the lock of a run that died without releasing it
+MICRO_BATCH_LOCK_TIMEOUT = 60 * 60
+
+
+@contextmanager
+def micro_batch_lock(site):
+    """Context manager that yields True if we got the site's micro-batch lock
+
+    If another run for the site holds the lock, it yields False. We release
+    the lock when the block exits
+    """
+    key = 'figures:enrollment_data_micro_batch:lock:{}'.format(site.id)
+    acquired = cache.add(key, 1, timeout=MICRO_BATCH_LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(key)
+
+
+def initial_watermark():
+    """The first run for a site reads the changes made today
+
+    The daily pipeline covers changes before today
+    """
+    return datetime.combine(now().date(), time(0)).replace(tzinfo=utc)
+
+
+def changed_enrollments(site, since, until, limit):
+    """Returns the enrollments with StudentModule changes after `since` and
+    up to `until`, oldest change first
+
+    Returns a list of (user id, course key, last modified) tuples, at most
+    `limit` of them unless `limit` is None
+    """
+    return list(get_student_modules_for_site(site).filter(
+        modified__gt=since,
+        modified__lte=until).order_by().values('student_id', 'course_id').annotate(
+            last_modified=Max('modified')).order_by('last_modified').values_list(
+                'student_id', 'course_id', 'last_modified')[:limit])
+
+
+def _update_batch(site, batch, errors):
+    """Updates EnrollmentData for the batch of changed enrollments
+
+    Returns the number of records updated
+    """
+    keys = set((user_id, str(course_id)) for user_id, course_id, _ in batch)
+    course_enrollments = [
+        rec for rec in CourseEnrollment.objects.filter(
+            user_id__in=set(key[0] for key in keys),
+            course_id__in=[as_course_key(course_id)
+                           for course_id in set(key[1] for key in keys)]
+        ).select_related('user')
+        if (rec.user_id, str(rec.course_id)) in keys]
+    updated = 0
+    for rec in course_enrollments:
+        try:
+            EnrollmentData.objects.set_enrollment_data(site=site,
+                                                       user=rec.user,
+                                                       course_id=rec.course_id,
+                                                       course_enrollment=rec,
+                                                       recompute=True)
+            updated += 1
+        except Exception as e:  # pylint: disable=broad-except
+            msg = '{} for user_id={}, course_id="{}"'
+            errors.append(msg.format(e.__class__.__name__, rec.user_id, rec.course_id))
+    return updated
+
+
+def update_recent_enrollment_data(site, batch_size=None, limit=None):
+    """Updates EnrollmentData for the site's enrollments changed since the
+    site's watermark, then moves the watermark forward
+
+    A failed enrollment is reported in the errors and does not stop the run
+
+    Returns a dict of counters, the error messages and the new watermark
+    """
+    batch_size = batch_size or enrollment_data_micro_batch_size()
+    limit = limit or enrollment_data_micro_batch_limit()
+    watermark, _created = PipelineWatermark.objects.get_or_create(
+        site=site,
+        name=PipelineWatermark.ENROLLMENT_DATA,
+        defaults=dict(value=initial_watermark()))
+    until = now() - timedelta(seconds=WATERMARK_LAG_SECONDS)
+    changed = changed_enrollments(site, since=watermark.value, until=until, limit=limit + 1)
+    if len(changed) > limit:
+        # We stop before the change time of the first enrollment we leave for
+        # the next run, so enrollments sharing that time are not skipped
+        next_modified = changed[limit][2]
+        changed = [rec for rec in changed[:limit] if rec[2] < next_modified]
+        if not changed:
+            # More than `limit` enrollments share the oldest change time. We
+            # update all of them, as the next run only reads later changes
+            changed = changed_enrollments(site, since=watermark.value,
+                                          until=next_modified, limit=None)
+        until = changed[-1][2]
+
+    updated = 0
+    errors = []
+    for i in range(0, len(changed), batch_size):
+        updated += _update_batch(site, changed[i:i + batch_size], errors)
+
+    watermark.value = until
+    watermark.save()
+    return dict(processed=len(changed), updated=updated, errors=errors, watermark=until)
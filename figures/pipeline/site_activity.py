@@ -0,0 +1,110 @@
+"""Finds dormant sites for the site level pipeline tasks
+
+Many sites are trials or tenants nobody has used in months. Running the daily
+and monthly tasks for them adds to the pipeline run time without changing their
+metrics.
+
+`SiteActivity` stores the time of the latest enrollment, StudentModule change
+and login for each site. We update it before a site level task starts. Each
+update only reads the records newer than the stored times, so it stays cheap.
+
+A site without activity for `site_dormant_days()` days is dormant. The tasks
+run for the sites with the most recent activity first and, when
+`skip_dormant_sites()` is set, skip the dormant sites. Skipped sites get no
+metrics records for the run.
+"""
+
+from __future__ import absolute_import
+from datetime import datetime, timedelta
+import logging
+
+from django.contrib.sites.models import Site
+from django.db.models import Max
+from django.utils.timezone import now, utc
+
+from figures.settings import site_dormant_days, skip_dormant_sites
+from figures.models import SiteActivity
+from figures.sites import (
+    get_course_enrollments_for_site,
+    get_student_modules_for_site,
+    get_users_for_site,
+)
+
+
+logger = logging.getLogger(__name__)
+
+EARLIEST = datetime.min.replace(tzinfo=utc)
+
+
+def _latest(queryset, field, after):
+    """Returns the latest value of the field after `after`, or `after` if
+    there is none
+    """
+    if after:
+        queryset = queryset.filter(**{field + '__gt': after})
+    return queryset.aggregate(latest=Max(field))['latest'] or after
+
+
+def update_site_activity(site):
+    """Updates and returns the site's `SiteActivity` record
+    """
+    activity, _created = SiteActivity.objects.get_or_create(site=site)
+    activity.last_enrollment = _latest(get_course_enrollments_for_site(site),
+                                       'created',
+                                       activity.last_enrollment)
+    activity.last_student_module = _latest(get_student_modules_for_site(site),
+                                           'modified',
+                                           activity.last_student_module)
+    activity.last_login = _latest(get_users_for_site(site),
+                                  'last_login',
+                                  activity.last_login)
+    activity.save()
+    return activity
+
+
+def dormant_reason(activity, as_of=None):
+    """Returns why the site is dormant, or None if the site is active
+    """
+    last_activity = activity.last_activity
+    if last_activity is None:
+        return 'no activity'
+    if last_activity < (as_of or now()) - timedelta(days=site_dormant_days()):
+        return 'no activity since {}'.format(last_activity.date())
+    return None
+
+
+def site_activity_report():
+    """Updates the activity of every site
+
+    Returns a list of (site, `SiteActivity`, dormant reason) tuples, the sites
+    with the most recent activity first. The reason is None for active sites
+    """
+    report = []
+    for site in Site.objects.all():
+        activity = update_site_activity(site)
+        report.append((site, activity, dormant_reason(activity)))
+    return sorted(report, key=lambda rec: rec[1].last_activity or EARLIEST, reverse=True)
+
+
+def pipeline_sites(task_name):
+    """Returns the sites a site level task runs for, most recently active
+    first
+
+    Dormant sites are left out when `skip_dormant_sites()` is set. If we can't
+    get the site activity, we log the error and return every site
+    """
+    try:
+        report = site_activity_report()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('FIGURES:FAIL site activity for task {}'.format(task_name))
+        return list(Site.objects.all())
+    if not skip_dormant_sites():
+        return [site for site, _activity, _reason in report]
+    sites = []
+    for site, _activity, reason in report:
+        if reason:
+            logger.info('{} skipped dormant site[{}]:{}, {}'.format(
+                task_name, site.id, site.domain, reason))
+        else:
+            sites.append(site)
+    return sites
@@ -10,11 +10,13 @@ from __future__ import absolute_import
 
 from django.db.models import Sum
 
+from figures.active_users import get_active_user_count, stored_dates
 from figures.helpers import as_course_key, as_datetime, next_day
 from figures.mau import site_mau_1g_for_month_as_of_day
 from figures.models import CourseDailyMetrics, SiteDailyMetrics
 from figures.sites import (
     get_courses_for_site,
+    get_user_count_for_site,
     get_users_for_site,
     get_student_modules_for_site,
 )
@@ -114,22 +116,33 @@ class SiteDailyMetricsExtractor(object):
     def extract(self, site, date_for, **kwargs):  # pylint: disable=unused-argument
         '''
         We get the count from the User model since there can be registered users
-        who have not enrolled.
+        who have not enrolled. The site's user count is cached, so we only count
+        the users who joined after the day and subtract them. For the daily run
+        these are the users who joined today. See `get_user_count_for_site`
 
         TODO: Exclude non-students from the user count
         '''
         data = dict()
 
-        site_users = get_users_for_site(site)
-        user_count = site_users.filter(
-            date_joined__lt=as_datetime(next_day(date_for))).count()
+        joined_after = get_users_for_site(site).filter(
+            date_joined__gte=as_datetime(next_day(date_for))).distinct().count()
+        user_count = get_user_count_for_site(site) - joined_after
         site_courses = get_courses_for_site(site)
         course_count = site_courses.filter(
             created__lt=as_datetime(next_day(date_for))).count()
 
-        todays_active_users = get_site_active_users_for_date(site, date_for)
-        todays_active_user_count = todays_active_users.count()
-        mau = site_mau_1g_for_month_as_of_day(site, date_for)
+        # Read active users from the stored daily sets when we have them.
+        # Otherwise query StudentModule. See `figures.active_users`
+        if stored_dates(site, date_for, date_for):
+            todays_active_user_count = get_active_user_count(site, date_for, date_for)
+        else:
+            todays_active_user_count = get_site_active_users_for_date(
+                site, date_for).count()
+        month_start = date_for.replace(day=1)
+        if stored_dates(site, month_start, date_for):
+            mau_count = get_active_user_count(site, month_start, date_for)
+        else:
+            mau_count = site_mau_1g_for_month_as_of_day(site, date_for).count()
 
         data['todays_active_user_count'] = todays_active_user_count
         data['cumulative_active_user_count'] = get_previous_cumulative_active_user_count(
@@ -137,7 +150,7 @@ class SiteDailyMetricsExtractor(object):
         data['total_user_count'] = user_count
         data['course_count'] = course_count
         data['total_enrollment_count'] = get_total_enrollment_count(site, date_for)
-        data['mau'] = mau.count()
+        data['mau'] = mau_count
         return data
 
 
@@ -1,35 +1,56 @@
 """Populate Figures site monthly metrics data
 
+`fill_month` fills one month. `fill_months` fills a range of months with one
+distinct user query per month. Use it for backfills.
+
+We store every value the site metrics API serves for the month, so the API
+reads a record per month instead of calculating them. The monthly pipeline
+fills the previous month and the daily pipeline refreshes the current month
+with `fill_current_month`.
 """
 
 from __future__ import absolute_import
-from datetime import datetime
+from collections import defaultdict
+from datetime import date, datetime
+from django.db import transaction
 from django.utils.timezone import utc
 from dateutil.relativedelta import relativedelta
 
-from figures.models import SiteMonthlyMetrics
+from figures.active_users import get_active_user_count, missing_date_ranges
+from figures.helpers import as_datetime, days_in_month, next_day, unpack_int_set
+from figures.metrics import get_site_month_metrics
+from figures.models import DailyActiveUsers, SiteMonthlyMetrics
 from figures.sites import get_student_modules_for_site
 
 
+# How many distinct user rows we read between progress callbacks
+PROGRESS_INTERVAL = 100000
+
+
 def fill_month(site, month_for, student_modules=None, overwrite=False):
     """Fill a month's site monthly metrics for the specified site
     """
     if not student_modules:
         student_modules = get_student_modules_for_site(site)
 
-    if student_modules:
-        month_sm = student_modules.filter(modified__year=month_for.year,
-                                          modified__month=month_for.month)
-        mau_count = month_sm.values_list('student_id',
-                                         flat=True).distinct().count()
-    else:
-        mau_count = 0
+    # Days stored by the daily pipeline are read from the active user sets.
+    # We only query `student_modules` for the other days
+    first_day = date(year=month_for.year, month=month_for.month, day=1)
+    last_day = first_day.replace(day=days_in_month(first_day))
+    mau_count = get_active_user_count(site=site,
+                                      start_date=first_day,
+                                      end_date=last_day,
+                                      student_modules=student_modules)
 
+    month_metrics = get_site_month_metrics(site=site,
+                                           start_date=first_day,
+                                           end_date=last_day)
     obj, created = SiteMonthlyMetrics.add_month(site=site,
                                                 year=month_for.year,
                                                 month=month_for.month,
                                                 active_user_count=mau_count,
-                                                overwrite=overwrite)
+                                                overwrite=overwrite,
+                                                **month_metrics)
     return obj, created
 
 
@@ -39,3 +60,94 @@ def fill_last_month(site, overwrite=False):
     # Maybe we want to make 'last_month' a 'figures.helpers' method
     last_month = datetime.utcnow().replace(tzinfo=utc) - relativedelta(months=1)
     return fill_month(site=site, month_for=last_month, overwrite=overwrite)
+
+
+def fill_current_month(site, date_for=None):
+    """Refresh the site monthly metrics for the month so far
+
+    Called by the daily pipeline after it collects the day's metrics. Most of
+    the month is read from the stored daily records, so this is cheap to run
+    every day
+    """
+    month_for = date_for or datetime.utcnow().date()
+    return fill_month(site=site, month_for=month_for, overwrite=True)
+
+
+def get_monthly_active_user_ids(site, first_day, last_day, student_modules=None,
+                                progress_callback=None):
+    """Return a dict of first of the month dates to the sets of active user ids
+
+    Reads every month between the dates. Days stored by the daily pipeline are
+    read from the active user sets, like `fill_month`. For the other days, we
+    query `student_modules` for the distinct user ids of each month's unstored
+    date ranges, so the database removes the duplicates and we read at most
+    one row per user and month.
+
+    If given, `progress_callback` is called with the number of user id rows
+    read so far every `PROGRESS_INTERVAL` rows and at the end
+    """
+    if student_modules is None:
+        student_modules = get_student_modules_for_site(site)
+
+    month_users = defaultdict(set)
+    stored = DailyActiveUsers.objects.for_period(site, first_day, last_day)
+    stored_dates = set()
+    for date_for, packed in stored.values_list('date_for', 'packed_user_ids'):
+        stored_dates.add(date_for)
+        month_users[date_for.replace(day=1)].update(unpack_int_set(packed))
+
+    rows_read = 0
+    month_for = first_day.replace(day=1)
+    while month_for <= last_day:
+        month_start = max(month_for, first_day)
+        month_end = min(month_for.replace(day=days_in_month(month_for)), last_day)
+        for range_start, range_end in missing_date_ranges(month_start, month_end,
+                                                          stored_dates):
+            user_ids = student_modules.filter(
+                modified__gte=as_datetime(range_start),
+                modified__lt=as_datetime(next_day(range_end))).order_by().values_list(
+                    'student_id', flat=True).distinct()
+            for user_id in user_ids.iterator():
+                rows_read += 1
+                month_users[month_for].add(user_id)
+                if progress_callback and not rows_read % PROGRESS_INTERVAL:
+                    progress_callback(rows_read)
+        month_for += relativedelta(months=1)
+    if progress_callback:
+        progress_callback(rows_read)
+    return month_users
+
+
+def fill_months(site, first_month, last_month, student_modules=None,
+                overwrite=False, progress_callback=None):
+    """Fill the site monthly metrics for every month in the range, inclusive
+
+    Gives the same values as calling `fill_month` for each month. We read the
+    active users for all the months first and save the months together. See
+    `get_monthly_active_user_ids` for `progress_callback`
+
+    Returns a list of (obj, created) tuples ordered by month
+    """
+    first_day = date(year=first_month.year, month=first_month.month, day=1)
+    last_day = date(year=last_month.year,
+                    month=last_month.month,
+                    day=days_in_month(last_month))
+    month_users = get_monthly_active_user_ids(site=site,
+                                              first_day=first_day,
+                                              last_day=last_day,
+                                              student_modules=student_modules,
+                                              progress_callback=progress_callback)
+    month_data = {}
+    month_for = first_day
+    while month_for <= last_day:
+        month_data[month_for] = get_site_month_metrics(
+            site=site,
+            start_date=month_for,
+            end_date=month_for.replace(day=days_in_month(month_for)))
+        month_data[month_for]['active_user_count'] = len(month_users.get(month_for, []))
+        month_for += relativedelta(months=1)
+
+    with transaction.atomic():
+        return SiteMonthlyMetrics.bulk_add_months(site=site,
+                                                  month_data=month_data,
+                                                  overwrite=overwrite)
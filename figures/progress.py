@@ -1,24 +1,45 @@
 """
 This module exists as a quick fix to prevent cyclical dependencies
 """
+import hashlib
+
 from figures.compat import (
     chapter_grade_values,
     course_grade_from_course_id
 )
 
 
+def course_totals(graded_sections):
+    """Returns the course level totals for the graded sections of a course grade
+
+    The sections possible and points possible do not depend on the learner, so
+    we store them in `figures.models.CourseData` after a grade read.
+
+    The structure hash is a digest of the points possible for each graded
+    section in course order. It changes when the graded structure of the course
+    changes
+    """
+    possibles = [float(section.all_total.possible) for section in graded_sections]
+    digest = hashlib.sha1(','.join(repr(value) for value in possibles).encode('utf-8'))
+    return dict(
+        sections_possible=len(possibles),
+        points_possible=sum(possibles),
+        structure_hash=digest.hexdigest(),
+    )
+
+
 class EnrollmentProgress(object):
     """
     Quick hack class adapted from LearnerCourseGrades. Purpose is encapsulating
     logic we need to get the total sections and points of a course.
 
-    The proper fix is to have an API to query the course structure and cache
-    those data into a Figures "CourseData" type model to get course level data
-    like "sections_possible" and "points_possible" Non-learner specific course
-    data.
+    Course level data like "sections_possible" and "points_possible" are
+    stored in the `figures.models.CourseData` model after a grade read. See
+    `course_totals`. Learners who have not started a course don't need a
+    grade read when we have that record.
 
-    But until we do that, doing a stripped down version of LearnerCourseGrades
-    that does fewer operations to get to a learner's progress (grades) data
+    This is a stripped down version of LearnerCourseGrades that does fewer
+    operations to get to a learner's progress (grades) data
 
     TODO: After our performance improvement rollout, rework this functionality.
     Perhaps rework this class as a convenience wrapper around the platform's
@@ -62,6 +83,9 @@ class EnrollmentProgress(object):
                 if not only_graded or (only_graded and self.is_section_graded(section)):
                     yield section
 
+    def course_totals(self):
+        return course_totals(self.sections(only_graded=True))
+
     def is_completed(self):
         return self.progress['sections_worked'] > 0 and \
             self.progress['sections_worked'] == self.progress['sections_possible']
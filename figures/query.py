@@ -4,8 +4,14 @@ This module was created to simplify testing and debugging queries used in
 Figures API views. That is not its only goal, just where we're starting
 
 """
+from collections import defaultdict
+
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models import Max, Q
+
+from figures.compat import CourseAccessRole
+from figures.helpers import as_course_key
+from figures.models import CourseDailyMetrics, LearnerCourseGradeMetrics
 
 
 def site_users_enrollment_data(site, course_ids=None, user_term=None):
@@ -38,3 +44,62 @@ def site_users_enrollment_data(site, course_ids=None, user_term=None):
                        Q(profile__name__contains=user_term))
 
     return qs.distinct()
+
+
+def course_staff_roles(course_ids):
+    """Returns a dict of course id strings to lists of the courses'
+    CourseAccessRole records
+
+    We load the roles for all the courses in one query and include the user
+    and user profile records. Courses without roles are not included
+    """
+    roles = defaultdict(list)
+    qs = CourseAccessRole.objects.filter(
+        course_id__in=[as_course_key(course_id) for course_id in course_ids]
+    ).select_related('user', 'user__profile')
+    for role in qs:
+        roles[str(role.course_id)].append(role)
+    return dict(roles)
+
+
+def latest_course_daily_metrics(course_ids, before=None):
+    """Returns a dict of course id strings to the most recent
+    CourseDailyMetrics record for each course
+
+    If `before` is a date, we return the most recent records before it
+
+    This runs two queries no matter how many courses. The first gets the
+    latest date for each course. The second gets the records for those dates.
+    Courses without records are not included
+    """
+    queryset = CourseDailyMetrics.objects.filter(
+        course_id__in=[str(course_id) for course_id in course_ids])
+    if before:
+        queryset = queryset.filter(date_for__lt=before)
+    latest_dates = dict(queryset.order_by().values('course_id').annotate(
+        latest=Max('date_for')).values_list('course_id', 'latest'))
+    if not latest_dates:
+        return {}
+    qs = CourseDailyMetrics.objects.filter(course_id__in=list(latest_dates.keys()),
+                                           date_for__in=set(latest_dates.values()))
+    return {rec.course_id: rec for rec in qs
+            if rec.date_for == latest_dates[rec.course_id]}
+
+
+def enrollments_and_latest_lcgms(course_enrollments, users):
+    """Bulk loads the enrollments and their latest LCGM records for the users
+
+    `course_enrollments` is the CourseEnrollment queryset to read from
+
+    Returns a tuple. The first item is a dict of user ids to lists of the
+    user's enrollments. The second item is the dict that
+    `LearnerCourseGradeMetrics.objects.latest_lcgms` returns
+    """
+    user_enrollments = {user.id: [] for user in users}
+    for enrollment in course_enrollments.filter(
+            user_id__in=list(user_enrollments.keys())).select_related('user'):
+        user_enrollments[enrollment.user_id].append(enrollment)
+    latest_lcgms = LearnerCourseGradeMetrics.objects.latest_lcgms(
+        (ce.user_id, ce.course_id)
+        for enrollments in user_enrollments.values() for ce in enrollments)
+    return user_enrollments, latest_lcgms
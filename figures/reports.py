@@ -0,0 +1,163 @@
+"""Builds site reports on the server
+
+The Figures UI used to build CSV reports in the browser from paged API calls,
+which is slow for large sites. Instead, a `ReportJob` record tracks a report
+that a Celery task builds here. See `figures.tasks.run_report_job`.
+
+We read the report rows in chunks (see `figures.export.keyset_chunks`) and
+write them to a gzip compressed CSV file in Django's default storage. After
+each chunk we update the job's progress.
+
+Each report type has an entry in `REPORTS` with:
+
+* ``columns`` - the CSV column names
+* ``queryset`` - a function that takes a site and returns the queryset we count
+  and read
+* ``fields`` - the lookups we read from the queryset for each row
+* ``rows`` - a function that takes a chunk of value tuples and returns the CSV
+  rows. Reports use this to add data from other models for the chunk
+"""
+
+from __future__ import absolute_import
+import gzip
+import tempfile
+
+from django.core.files import File
+import six
+
+from figures.export import (
+    EXPORT_COLUMNS,
+    csv_lines,
+    keyset_chunks,
+    learner_metrics_queryset,
+)
+from figures.helpers import as_course_key
+from figures.models import ReportJob
+from figures.query import latest_course_daily_metrics
+from figures.response_cache import get_data_version
+import figures.sites
+
+
+REPORT_CHUNK_SIZE = 1000
+
+COURSE_METRICS_FIELDS = ('date_for', 'enrollment_count', 'active_learners_today',
+                         'average_progress', 'average_days_to_complete',
+                         'num_learners_completed')
+
+
+def _course_rows(chunk):
+    """Adds the course number and latest CourseDailyMetrics values to each
+    course row
+
+    We get the number from the course key since the CourseOverview field
+    differs between Open edX releases
+    """
+    metrics = latest_course_daily_metrics([row[0] for row in chunk])
+    rows = []
+    for row in chunk:
+        cdm = metrics.get(str(row[0]))
+        rows.append(tuple(row[:3]) + (as_course_key(row[0]).course,) + tuple(row[3:]) +
+                    tuple(getattr(cdm, field) if cdm else None
+                          for field in COURSE_METRICS_FIELDS))
+    return rows
+
+
+def _encoded(line):
+    if isinstance(line, six.text_type):
+        return line.encode('utf-8')
+    return line
+
+
+REPORTS = {
+    ReportJob.LEARNER_REPORT: dict(
+        columns=['user_id', 'username', 'email', 'fullname', 'is_active',
+                 'date_joined', 'last_login'],
+        queryset=figures.sites.get_users_for_site,
+        fields=['id', 'username', 'email', 'profile__name', 'is_active',
+                'date_joined', 'last_login'],
+        rows=lambda chunk: chunk),
+    ReportJob.COURSE_REPORT: dict(
+        columns=['course_id', 'course_name', 'org', 'number', 'start_date',
+                 'end_date', 'self_paced'] + [
+                     'metrics_' + field for field in COURSE_METRICS_FIELDS],
+        queryset=figures.sites.get_courses_for_site,
+        fields=['id', 'display_name', 'org', 'start', 'end', 'self_paced'],
+        rows=_course_rows),
+    ReportJob.ENROLLMENT_REPORT: dict(
+        columns=[column[0] for column in EXPORT_COLUMNS],
+        queryset=learner_metrics_queryset,
+        fields=[column[1] for column in EXPORT_COLUMNS],
+        rows=lambda chunk: chunk),
+}
+
+
+def request_report(site, report_type, requested_by=None):
+    """Returns a job for the site's report at the current data version
+
+    If there is a job for the same site, report type and data version that
+    has not failed, we return it so we don't build the same report twice.
+    Otherwise we create a pending job. The caller needs to start the task
+    for a new job
+
+    Returns a tuple of the `ReportJob` and a boolean, True if we created the job
+    """
+    if report_type not in REPORTS:
+        raise ValueError('Unknown report type "{}"'.format(report_type))
+    data_version = str(get_data_version(site))
+    job = ReportJob.objects.reusable(site=site,
+                                     report_type=report_type,
+                                     data_version=data_version)
+    if job:
+        return job, False
+    job = ReportJob.objects.create(site=site,
+                                   report_type=report_type,
+                                   data_version=data_version,
+                                   requested_by=requested_by)
+    return job, True
+
+
+def _update_job(job, **fields):
+    """Saves the fields on the job without overwriting other fields
+    """
+    for name, value in fields.items():
+        setattr(job, name, value)
+    ReportJob.objects.filter(pk=job.pk).update(**fields)
+
+
+def artifact_name(job):
+    return '{}/{}-{}-{}.csv.gz'.format(job.site_id,
+                                       job.report_type,
+                                       job.id,
+                                       job.data_version)
+
+
+def build_report(job, chunk_size=REPORT_CHUNK_SIZE):
+    """Builds the report for the job and saves it to the job's `artifact`
+
+    Updates the job's progress after each chunk of rows
+    """
+    report = REPORTS[job.report_type]
+    queryset = report['queryset'](job.site)
+    total = queryset.count()
+    _update_job(job, status=ReportJob.RUNNING, progress_percent=0.0, row_count=0)
+
+    row_count = 0
+    with tempfile.TemporaryFile() as artifact_file:
+        with gzip.GzipFile(fileobj=artifact_file, mode='wb') as gzip_file:
+            for line in csv_lines([], fieldnames=report['columns']):
+                gzip_file.write(_encoded(line))
+            for chunk in keyset_chunks(queryset, report['fields'], chunk_size=chunk_size):
+                for line in csv_lines(report['rows'](chunk), header=False):
+                    gzip_file.write(_encoded(line))
+                row_count += len(chunk)
+                _update_job(job,
+                            row_count=row_count,
+                            progress_percent=min(100.0 * row_count / total, 99.0))
+        artifact_file.seek(0)
+        job.artifact.save(artifact_name(job), File(artifact_file), save=False)
+
+    _update_job(job,
+                artifact=job.artifact.name,
+                status=ReportJob.COMPLETED,
+                progress_percent=100.0)
+    return job
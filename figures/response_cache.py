@@ -0,0 +1,168 @@
+"""Caches Figures API responses until the pipeline loads new data
+
+Most Figures API data only changes when the pipeline runs. Each site has a
+data version number. The pipeline calls `bump_data_version` when it finishes
+loading a site's metrics. Cached responses are keyed on the site's data
+version, so they are not served after the pipeline updates the site. Old
+entries are left to expire.
+
+Endpoints opt in to caching with the `cache_response` decorator and the
+``FIGURES_RESPONSE_CACHE_TIMEOUTS`` setting. See
+`figures.settings.response_cache_timeout`. Endpoints not in the setting are
+not cached.
+
+Example:
+
+```
+class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
+
+    @cache_response('site_monthly_metrics')
+    def list(self, request):
+        ...
+```
+
+The decorated method runs after DRF checks authentication and permissions,
+so the cache is only read for authorized requests.
+
+We count hits and misses for each endpoint in the cache. See `get_stats`. The
+daily pipeline logs them with `log_stats`
+"""
+
+from __future__ import absolute_import
+from functools import wraps
+import hashlib
+import time
+
+from django.core.cache import caches
+import django.contrib.sites.shortcuts
+from rest_framework.response import Response
+
+from figures.settings import (
+    response_cache_alias,
+    response_cache_endpoints,
+    response_cache_timeout,
+)
+
+
+KEY_PREFIX = 'figures:response_cache'
+
+
+def get_cache():
+    return caches[response_cache_alias()]
+
+
+def data_version_key(site):
+    return '{}:data_version:{}'.format(KEY_PREFIX, site.id)
+
+
+def get_data_version(site):
+    """Return the site's data version
+
+    If the cache has no version for the site, we start one from the current
+    time in milliseconds. This way an evicted version never restarts at a
+    number that old responses were cached under
+    """
+    cache = get_cache()
+    key = data_version_key(site)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(site):
+    """Invalidate the site's cached responses
+
+    Call this when the pipeline finishes loading new data for the site
+    """
+    cache = get_cache()
+    key = data_version_key(site)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # No version yet, so nothing was cached under one
+        return get_data_version(site)
+
+
+def response_cache_key(site, endpoint, request, view_kwargs):
+    """Return the cache key for the request
+
+    The key includes the path, so it covers the view action and any detail
+    route, and the sorted query parameters
+    """
+    query = sorted((key, sorted(request.query_params.getlist(key)))
+                   for key in request.query_params)
+    request_id = '{}|{}|{}'.format(request.path,
+                                   sorted(view_kwargs.items()),
+                                   query)
+    return '{prefix}:{site}:{version}:{endpoint}:{digest}'.format(
+        prefix=KEY_PREFIX,
+        site=site.id,
+        version=get_data_version(site),
+        endpoint=endpoint,
+        digest=hashlib.md5(request_id.encode('utf-8')).hexdigest())
+
+
+def stats_key(endpoint, stat):
+    return '{}:stats:{}:{}'.format(KEY_PREFIX, endpoint, stat)
+
+
+def _count(endpoint, stat):
+    cache = get_cache()
+    key = stats_key(endpoint, stat)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between the add and the incr. Stats are best effort
+        pass
+
+
+def get_stats(endpoints):
+    """Return a dict of endpoint names to dicts with the hit and miss counts
+    """
+    cache = get_cache()
+    return {endpoint: dict(hits=cache.get(stats_key(endpoint, 'hits'), 0),
+                           misses=cache.get(stats_key(endpoint, 'misses'), 0))
+            for endpoint in endpoints}
+
+
+def log_stats(logger):
+    """Log the hit and miss counts of the endpoints with cached responses
+
+    The counts are totals since the stats entered the cache
+    """
+    msg = 'figures response cache {}: hits={hits}, misses={misses}'
+    for endpoint, stats in sorted(get_stats(response_cache_endpoints()).items()):
+        logger.info(msg.format(endpoint, **stats))
+
+
+def cache_response(endpoint):
+    """Decorator for API view methods to cache the response data
+
+    `endpoint` is the name used for the timeout setting and the stats. Only
+    successful responses are cached
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            timeout = response_cache_timeout(endpoint)
+            if timeout is None:
+                return func(view, request, *args, **kwargs)
+
+            site = django.contrib.sites.shortcuts.get_current_site(request)
+            key = response_cache_key(site, endpoint, request, kwargs)
+            cache = get_cache()
+            data = cache.get(key)
+            if data is not None:
+                _count(endpoint, 'hits')
+                return Response(data)
+
+            _count(endpoint, 'misses')
+            response = func(view, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout)
+            return response
+        return wrapper
+    return decorator
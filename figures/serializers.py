@@ -44,14 +44,17 @@ from figures.metrics import (
     )
 from figures.models import (
     CourseDailyMetrics,
+    CourseData,
     CourseMauMetrics,
     EnrollmentData,
     SiteDailyMetrics,
     SiteMauMetrics,
     LearnerCourseGradeMetrics,
     PipelineError,
+    ReportJob,
     )
 from figures.pipeline.logger import log_error
+import figures.query
 import figures.sites
 
 
@@ -220,6 +223,24 @@ class CourseAccessRoleForGCDSerializer(serializers.ModelSerializer):
         fields = ['user_id', 'username', 'fullname', 'role']
 
 
+class GeneralCourseDataListSerializer(serializers.ListSerializer):
+    """Bulk loads the staff roles and latest metrics for the listed courses
+
+    Without this, each course runs its own staff and metrics queries. We load
+    them for all the courses in the list, usually a page, and pass them to
+    `GeneralCourseDataSerializer` through the serializer context
+    """
+    def __init__(self, instance=None, data=empty, **kwargs):
+        if instance is not None:
+            course_ids = [str(course.id) for course in instance]
+            kwargs['context'] = dict(
+                kwargs.get('context', {}),
+                course_staff=figures.query.course_staff_roles(course_ids),
+                course_metrics=figures.query.latest_course_daily_metrics(course_ids))
+        super(GeneralCourseDataListSerializer, self).__init__(
+            instance=instance, data=data, **kwargs)
+
+
 class GeneralCourseDataSerializer(serializers.Serializer):
     """
 
@@ -280,13 +301,18 @@ class GeneralCourseDataSerializer(serializers.Serializer):
 
     metrics = serializers.SerializerMethodField()
 
+    class Meta:
+        list_serializer_class = GeneralCourseDataListSerializer
+
     def to_representation(self, instance):
         """
         This is a hack to get the site for this course
         We do this because the figures.metrics calls we are making require the
         site object as a parameter
+
+        We use the site in the context if the view provides it
         """
-        self.site = figures.sites.get_site_for_course(instance)
+        self.site = self.context.get('site') or figures.sites.get_site_for_course(instance)
         ret = super(GeneralCourseDataSerializer, self).to_representation(instance)
         return ret
 
@@ -294,11 +320,12 @@ class GeneralCourseDataSerializer(serializers.Serializer):
     #     return figures.sites.get_site_for_course(str(obj.id))
 
     def get_staff(self, obj):
-        qs = CourseAccessRole.objects.filter(course_id=obj.id)
-        if qs:
-            return [CourseAccessRoleForGCDSerializer(data).data for data in qs]
+        course_staff = self.context.get('course_staff')
+        if course_staff is None:
+            qs = CourseAccessRole.objects.filter(course_id=obj.id)
         else:
-            return []
+            qs = course_staff.get(str(obj.id), [])
+        return [CourseAccessRoleForGCDSerializer(data).data for data in qs]
 
     def get_metrics(self, obj):
         """
@@ -310,11 +337,13 @@ class GeneralCourseDataSerializer(serializers.Serializer):
         TODO:  Add unit tests for this and decide if we want to continue to
         return None or if we return "zero" data
         """
-        qs = CourseDailyMetrics.objects.filter(course_id=str(obj.id))
-        if qs:
-            return CourseDailyMetricsSerializer(qs.order_by('-date_for')[0]).data
+        course_metrics = self.context.get('course_metrics')
+        if course_metrics is None:
+            cdm = CourseDailyMetrics.objects.filter(
+                course_id=str(obj.id)).order_by('-date_for').first()
         else:
-            return None
+            cdm = course_metrics.get(str(obj.id))
+        return CourseDailyMetricsSerializer(cdm).data if cdm else None
 
 
 def get_course_history_metric(site, course_id, func, date_for, months_back):
@@ -363,6 +392,7 @@ class CourseDetailsSerializer(serializers.ModelSerializer):
     relationship to CourseOverview
     """
     site = None
+    course_data = None
     course_id = serializers.CharField(source='id', read_only=True)
     course_name = serializers.CharField(
         source='display_name_with_default_escaped', read_only=True)
@@ -382,6 +412,8 @@ class CourseDetailsSerializer(serializers.ModelSerializer):
     average_progress = serializers.SerializerMethodField()
     average_days_to_complete = serializers.SerializerMethodField()
     users_completed = serializers.SerializerMethodField()
+    sections_possible = serializers.SerializerMethodField()
+    points_possible = serializers.SerializerMethodField()
 
     # TODO: Consider if we want to add a hyperlink field to the learner details endpoint
 
@@ -389,7 +421,8 @@ class CourseDetailsSerializer(serializers.ModelSerializer):
         model = CourseOverview
         fields = ['course_id', 'course_name', 'course_code', 'org', 'start_date',
                   'end_date', 'self_paced', 'staff', 'learners_enrolled',
-                  'average_progress', 'average_days_to_complete', 'users_completed', ]
+                  'average_progress', 'average_days_to_complete', 'users_completed',
+                  'sections_possible', 'points_possible', ]
         read_only_fields = fields
 
     def to_representation(self, instance):
@@ -397,11 +430,21 @@ class CourseDetailsSerializer(serializers.ModelSerializer):
         This is a hack to get the site for this course
         We do this because the figures.metrics calls we are making require the
         site object as a parameter
+
+        We also get the stored course totals. They are `None` until the
+        pipeline has read a grade for the course. See `figures.models.CourseData`
         """
         self.site = figures.sites.get_site_for_course(instance)
+        self.course_data = CourseData.objects.filter(course_id=str(instance.id)).first()
         ret = super(CourseDetailsSerializer, self).to_representation(instance)
         return ret
 
+    def get_sections_possible(self, course_overview):  # pylint: disable=unused-argument
+        return self.course_data.sections_possible if self.course_data else None
+
+    def get_points_possible(self, course_overview):  # pylint: disable=unused-argument
+        return self.course_data.points_possible if self.course_data else None
+
     def get_staff(self, course_overview):
         qs = CourseAccessRole.objects.filter(course_id=course_overview.id)
         if qs:
@@ -605,9 +648,14 @@ class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
         course_progress_details = None
 
         try:
-            obj = LearnerCourseGradeMetrics.objects.latest_lcgm(
-                user=course_enrollment.user,
-                course_id=str(course_enrollment.course_id))
+            latest_lcgms = self.context.get('latest_lcgms')
+            if latest_lcgms is None:
+                obj = LearnerCourseGradeMetrics.objects.latest_lcgm(
+                    user=course_enrollment.user,
+                    course_id=str(course_enrollment.course_id))
+            else:
+                obj = latest_lcgms.get((course_enrollment.user_id,
+                                        str(course_enrollment.course_id)))
             if obj:
                 progress_percent = obj.progress_percent
                 course_progress_details = obj.progress_details
@@ -637,6 +685,24 @@ class LearnerCourseDetailsSerializer(serializers.ModelSerializer):
         return data
 
 
+class LearnerDetailsListSerializer(serializers.ListSerializer):
+    """Bulk loads the enrollments and progress for the listed learners
+
+    We load them once for the page instead of for each learner and enrollment
+    """
+    def __init__(self, instance=None, data=empty, **kwargs):
+        self.user_enrollments = None
+        self.latest_lcgms = None
+        if instance is not None:
+            instance = list(instance)
+            site = kwargs.get('context', {}).get('site')
+            self.user_enrollments, self.latest_lcgms = figures.query.enrollments_and_latest_lcgms(
+                course_enrollments=figures.sites.get_course_enrollments_for_site(site),
+                users=instance)
+        super(LearnerDetailsListSerializer, self).__init__(
+            instance=instance, data=data, **kwargs)
+
+
 class LearnerDetailsSerializer(serializers.ModelSerializer):
 
     """
@@ -706,6 +772,7 @@ class LearnerDetailsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = get_user_model()
+        list_serializer_class = LearnerDetailsListSerializer
         editable = False
         fields = (
             'id', 'username', 'name', 'email', 'country', 'is_active',
@@ -727,6 +794,12 @@ class LearnerDetailsSerializer(serializers.ModelSerializer):
 
         """
 
+        if getattr(self.parent, 'user_enrollments', None) is not None:
+            return LearnerCourseDetailsSerializer(
+                self.parent.user_enrollments.get(user.id, []),
+                many=True,
+                context=dict(latest_lcgms=self.parent.latest_lcgms)).data
+
         course_enrollments = figures.sites.get_course_enrollments_for_site(
             self.context.get('site')).filter(user=user)
         return LearnerCourseDetailsSerializer(course_enrollments, many=True).data
@@ -828,9 +901,15 @@ class EnrollmentMetricsSerializerV2(serializers.ModelSerializer):
     def to_representation(self, instance):
         """
         Get the most recent LCGM record for the enrollment, if it exists
+
+        We use the records in the context if the parent serializer loaded them
         """
-        self._lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
-            user=instance.user, course_id=str(instance.course_id))
+        latest_lcgms = self.context.get('latest_lcgms')
+        if latest_lcgms is None:
+            self._lcgm = LearnerCourseGradeMetrics.objects.latest_lcgm(
+                user=instance.user, course_id=str(instance.course_id))
+        else:
+            self._lcgm = latest_lcgms.get((instance.user_id, str(instance.course_id)))
         return super(EnrollmentMetricsSerializerV2, self).to_representation(instance)
 
     def get_progress_percent(self, obj):  # pylint: disable=unused-argument
@@ -858,6 +937,17 @@ class LearnerMetricsListSerializer(serializers.ListSerializer):
         if not self.course_keys:
             self.course_keys = figures.sites.get_course_keys_for_site(self.site)
 
+        # Load the page's enrollments and their progress up front instead of
+        # for each learner and enrollment
+        self.user_enrollments = None
+        self.latest_lcgms = None
+        if instance is not None:
+            instance = list(instance)
+            self.user_enrollments, self.latest_lcgms = figures.query.enrollments_and_latest_lcgms(
+                course_enrollments=CourseEnrollment.objects.filter(
+                    course_id__in=self.course_keys),
+                users=instance)
+
         super(LearnerMetricsListSerializer, self).__init__(
             instance=instance, data=data, **kwargs)
 
@@ -878,6 +968,12 @@ class LearnerMetricsSerializer(serializers.ModelSerializer):
         Use the course ids identified in this serializer's list serializer to
         filter enrollments
         """
+        if self.parent.user_enrollments is not None:
+            return EnrollmentMetricsSerializerV2(
+                self.parent.user_enrollments.get(user.id, []),
+                many=True,
+                context=dict(latest_lcgms=self.parent.latest_lcgms)).data
+
         user_enrollments = user.courseenrollment_set.filter(
             course_id__in=self.parent.course_keys)
 
@@ -919,3 +1015,17 @@ class LearnerMetricsSerializerV2(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'fullname', 'is_active',
                   'date_joined', 'enrollmentdata_set')
         read_only_fields = fields
+
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Provides the state of a server side report job
+
+    We don't include the artifact path. Clients download the report from the
+    job's ``download`` endpoint
+    """
+    class Meta:
+        model = ReportJob
+        fields = ('id', 'report_type', 'status', 'progress_percent',
+                  'row_count', 'data_version', 'error_message',
+                  'created', 'modified')
+        read_only_fields = fields
@@ -1,3 +1,193 @@
 """
 Settings plugins for Figures.
+
+The functions here read the Figures settings in the Open edX ``FEATURES``.
 """
+
+from __future__ import absolute_import
+from django.conf import settings
+
+
+def course_structure_cache_size():
+    """
+    Maximum number of courses held in the pipeline course structure cache. The
+    cache is bounded by this count, not by memory. See `figures.course_structure`
+
+    Override by setting ``FIGURES_COURSE_STRUCTURE_CACHE_SIZE`` in the Open edX FEATURES.
+    """
+    return int(settings.FEATURES.get('FIGURES_COURSE_STRUCTURE_CACHE_SIZE', 32))
+
+
+def daily_metrics_site_concurrency():
+    """
+    Maximum number of course daily metrics tasks run at the same time for a site
+    in the parallel daily metrics pipeline.
+
+    Override by setting ``FIGURES_DAILY_METRICS_SITE_CONCURRENCY`` in the Open edX FEATURES.
+    """
+    return max(int(settings.FEATURES.get('FIGURES_DAILY_METRICS_SITE_CONCURRENCY', 4)), 1)
+
+
+def daily_metrics_cdm_max_retries():
+    """
+    Number of times the parallel daily metrics pipeline retries a failed course.
+
+    Override by setting ``FIGURES_DAILY_METRICS_CDM_MAX_RETRIES`` in the Open edX FEATURES.
+    """
+    return int(settings.FEATURES.get('FIGURES_DAILY_METRICS_CDM_MAX_RETRIES', 3))
+
+
+def daily_metrics_cdm_retry_backoff():
+    """
+    Base delay in seconds before retrying a failed course. The delay doubles
+    with each retry.
+
+    Override by setting ``FIGURES_DAILY_METRICS_CDM_RETRY_BACKOFF`` in the Open edX FEATURES.
+    """
+    return int(settings.FEATURES.get('FIGURES_DAILY_METRICS_CDM_RETRY_BACKOFF', 60))
+
+
+def daily_metrics_skip_inactive_courses():
+    """
+    Return True if the daily metrics pipeline carries forward the previous
+    course daily metrics for courses with no activity instead of extracting
+    them again. See `figures.pipeline.course_activity`
+
+    Disable by setting ``FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES`` to false in the Open edX
+    FEATURES.
+    """
+    return bool(settings.FEATURES.get('FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES', True))
+
+
+def daily_metrics_full_refresh_weekday():
+    """
+    Day of the week, 0 for Monday to 6 for Sunday, on which the daily metrics
+    pipeline extracts every course, including courses with no activity. None
+    means never.
+
+    Override by setting ``FIGURES_DAILY_METRICS_FULL_REFRESH_WEEKDAY`` in the Open edX FEATURES.
+    """
+    weekday = settings.FEATURES.get('FIGURES_DAILY_METRICS_FULL_REFRESH_WEEKDAY', 6)
+    return None if weekday is None else int(weekday)
+
+
+def daily_metrics_site_extraction():
+    """
+    Return True if the daily metrics pipeline extracts the course daily
+    metrics for all of a site's courses at once. See
+    `figures.pipeline.course_daily_metrics.SiteCourseDailyMetricsExtractor`
+
+    Enable by setting ``FIGURES_DAILY_METRICS_SITE_EXTRACTION`` to true in the Open edX
+    FEATURES.
+    """
+    return bool(settings.FEATURES.get('FIGURES_DAILY_METRICS_SITE_EXTRACTION', False))
+
+
+def skip_dormant_sites():
+    """
+    Return True if the site level pipeline tasks skip dormant sites. See
+    `figures.pipeline.site_activity`
+
+    Enable by setting ``FIGURES_SKIP_DORMANT_SITES`` to true in the Open edX FEATURES.
+    """
+    return bool(settings.FEATURES.get('FIGURES_SKIP_DORMANT_SITES', False))
+
+
+def site_dormant_days():
+    """
+    Number of days without activity after which a site is dormant.
+
+    Override by setting ``FIGURES_SITE_DORMANT_DAYS`` in the Open edX FEATURES.
+    """
+    return int(settings.FEATURES.get('FIGURES_SITE_DORMANT_DAYS', 90))
+
+
+def enrollment_change_capture():
+    """
+    Return True if we queue enrollments with changed progress data and update
+    only those in the daily pipeline. See `figures.signals`
+
+    Enable by setting ``FIGURES_ENROLLMENT_CHANGE_CAPTURE`` to true in the Open edX FEATURES.
+    """
+    return bool(settings.FEATURES.get('FIGURES_ENROLLMENT_CHANGE_CAPTURE', False))
+
+
+def enrollment_data_micro_batch_size():
+    """
+    Number of enrollments the EnrollmentData micro-batch task updates per batch.
+
+    Override by setting ``FIGURES_ENROLLMENT_DATA_MICRO_BATCH_SIZE`` in the Open edX FEATURES.
+    """
+    return max(int(settings.FEATURES.get('FIGURES_ENROLLMENT_DATA_MICRO_BATCH_SIZE', 100)), 1)
+
+
+def enrollment_data_micro_batch_limit():
+    """
+    Maximum number of enrollments the EnrollmentData micro-batch task updates
+    for a site in one run. The next run continues from where this one stopped.
+
+    Override by setting ``FIGURES_ENROLLMENT_DATA_MICRO_BATCH_LIMIT`` in the Open edX FEATURES.
+    """
+    return max(int(settings.FEATURES.get('FIGURES_ENROLLMENT_DATA_MICRO_BATCH_LIMIT', 1000)), 1)
+
+
+def use_approximate_mau(site):
+    """
+    Return True if we count active users for the site with HyperLogLog sketches
+    instead of exact id sets.
+
+    Set ``FIGURES_APPROXIMATE_MAU_SITES`` in the Open edX FEATURES to a list of
+    site domains. Include ``*`` to use approximate counts for all sites.
+    """
+    domains = settings.FEATURES.get('FIGURES_APPROXIMATE_MAU_SITES', [])
+    return '*' in domains or site.domain in domains
+
+
+def approximate_mau_error():
+    """
+    Relative standard error for approximate active user counts.
+
+    Override by setting ``FIGURES_APPROXIMATE_MAU_ERROR`` in the Open edX FEATURES.
+    """
+    return float(settings.FEATURES.get('FIGURES_APPROXIMATE_MAU_ERROR', 0.01))
+
+
+def response_cache_timeout(endpoint):
+    """
+    Return the API response cache timeout in seconds for the endpoint, or
+    None if the endpoint's responses are not cached.
+
+    Endpoints opt in by name. Set ``FIGURES_RESPONSE_CACHE_TIMEOUTS`` in the
+    Open edX FEATURES to a dict of endpoint names to timeouts. See
+    `figures.response_cache`
+    """
+    timeout = settings.FEATURES.get('FIGURES_RESPONSE_CACHE_TIMEOUTS', {}).get(endpoint)
+    return None if timeout is None else int(timeout)
+
+
+def response_cache_endpoints():
+    """
+    Return the sorted names of the endpoints whose responses are cached.
+
+    See `response_cache_timeout`
+    """
+    return sorted(settings.FEATURES.get('FIGURES_RESPONSE_CACHE_TIMEOUTS', {}))
+
+
+def response_cache_alias():
+    """
+    Name of the Django cache used for API responses.
+
+    Override by setting ``FIGURES_RESPONSE_CACHE_ALIAS`` in the Open edX FEATURES.
+    """
+    return settings.FEATURES.get('FIGURES_RESPONSE_CACHE_ALIAS', 'default')
+
+
+def site_membership_cache_timeout():
+    """
+    Seconds the Django cache keeps the multisite course and user membership.
+    Zero disables the Django cache tier. See `figures.site_membership`
+
+    Override by setting ``FIGURES_SITE_MEMBERSHIP_CACHE_TIMEOUT`` in the Open edX FEATURES.
+    """
+    return int(settings.FEATURES.get('FIGURES_SITE_MEMBERSHIP_CACHE_TIMEOUT', 600))
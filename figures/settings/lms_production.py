@@ -28,13 +28,21 @@ def update_celerybeat_schedule(celerybeat_schedule_settings, figures_env_tokens)
     Figures pipeline job schedule configuration in CELERYBEAT_SCHEDULE.
 
     Daily metrics pipeline scheduler is on by default
+    Set ``DAILY_METRICS_PARALLEL`` to run the daily metrics pipeline with a
+    Celery chord per site instead of one serial task
     Course MAU metrics pipeline scheduler is off by default
+    Set ``ENABLE_ENROLLMENT_DATA_MICRO_BATCH`` to update EnrollmentData for
+    recently active enrollments every ``ENROLLMENT_DATA_MICRO_BATCH_MINUTES``
 
     TODO: Language improvement: Change the "IMPORT" to "CAPTURE" or "EXTRACT"
     """
     if figures_env_tokens.get('ENABLE_DAILY_METRICS_IMPORT', True):
+        if figures_env_tokens.get('DAILY_METRICS_PARALLEL', False):
+            daily_metrics_task = 'figures.tasks.populate_daily_metrics_parallel'
+        else:
+            daily_metrics_task = 'figures.tasks.populate_daily_metrics'
         celerybeat_schedule_settings['figures-populate-daily-metrics'] = {
-            'task': 'figures.tasks.populate_daily_metrics',
+            'task': daily_metrics_task,
             'schedule': crontab(
                 hour=figures_env_tokens.get('DAILY_METRICS_IMPORT_HOUR', 2),
                 minute=figures_env_tokens.get('DAILY_METRICS_IMPORT_MINUTE', 0),
@@ -50,6 +58,13 @@ def update_celerybeat_schedule(celerybeat_schedule_settings, figures_env_tokens)
                 ),
             }
 
+    if figures_env_tokens.get('ENABLE_ENROLLMENT_DATA_MICRO_BATCH', False):
+        celerybeat_schedule_settings['figures-enrollment-data-micro-batch'] = {
+            'task': 'figures.tasks.run_enrollment_data_micro_batch',
+            'schedule': crontab(minute='*/{}'.format(
+                figures_env_tokens.get('ENROLLMENT_DATA_MICRO_BATCH_MINUTES', 5))),
+            }
+
     if figures_env_tokens.get('ENABLE_FIGURES_MONTHLY_METRICS', True):
         celerybeat_schedule_settings['figures-monthly-metrics'] = {
             'task': 'figures.tasks.run_figures_monthly_metrics',
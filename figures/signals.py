@@ -0,0 +1,80 @@
+"""Figures handlers for edx-platform signals
+
+`figures.apps.FiguresConfig.ready` connects these
+
+# Enrollment change capture
+
+When ``FIGURES_ENROLLMENT_CHANGE_CAPTURE`` is enabled, saving a StudentModule
+or CourseEnrollment record queues the enrollment in `DirtyEnrollment`. The
+receivers are only connected when the setting is enabled. Queueing costs one
+UPDATE for an enrollment already queued. See `DirtyEnrollmentManager.mark`. The
+daily pipeline then updates EnrollmentData for the queued enrollments instead
+of every enrollment in the site. See `figures.tasks.update_enrollment_data`
+
+Changes made without a model save, like queryset updates, are not captured.
+Run `update_figures_enrollment_data --full-scan` from time to time to
+reconcile them
+
+# Site membership
+
+Changes to the organizations mapping of courses and users to sites invalidate
+the cached membership. See `figures.site_membership`
+"""
+
+from __future__ import absolute_import
+import logging
+
+from figures.settings import enrollment_change_capture
+from figures.models import DirtyEnrollment
+from figures.site_membership import invalidate_course_membership, invalidate_site_users
+from figures.sites import get_site_id_for_course
+
+
+logger = logging.getLogger(__name__)
+
+
+def mark_enrollment_dirty(user_id, course_id):
+    """Queues the enrollment if change capture is enabled
+
+    We never raise here as this runs when the platform saves learner data
+    """
+    if not enrollment_change_capture():
+        return
+    try:
+        site_id = get_site_id_for_course(course_id)
+        if site_id:
+            DirtyEnrollment.objects.mark(site_id=site_id, user_id=user_id, course_id=course_id)
+    except Exception:  # pylint: disable=broad-except
+        msg = 'FIGURES:FAIL enrollment change capture. user_id={}, course_id={}'
+        logger.exception(msg.format(user_id, course_id))
+
+
+def capture_student_module_change(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    mark_enrollment_dirty(user_id=instance.student_id, course_id=instance.course_id)
+
+
+def capture_course_enrollment_change(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    mark_enrollment_dirty(user_id=instance.user_id, course_id=instance.course_id)
+
+
+def invalidate_site_membership(sender, **kwargs):  # pylint: disable=unused-argument
+    """Invalidates the cached membership when a course or organization moves
+    between sites
+
+    We never raise here as this runs when the platform saves organization data
+    """
+    try:
+        invalidate_course_membership()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('FIGURES:FAIL site membership invalidation')
+
+
+def invalidate_site_user_count(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Invalidates the cached user counts of the sites of the user's organization
+    """
+    try:
+        organization = instance.organization
+        invalidate_site_users(organization.sites.values_list('id', flat=True))
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('FIGURES:FAIL site user count invalidation. user_id={}'.format(
+            instance.user_id))
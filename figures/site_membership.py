@@ -0,0 +1,241 @@
+"""Caches which site each course and user belongs to in multisite mode
+
+In multisite mode, courses and users are mapped to sites through the
+organizations tables. `figures.sites` reads the mapping on nearly every API
+call and pipeline step. The mapping rarely changes, so we cache it in two
+tiers:
+
+* The Django cache, shared by all processes. Entries expire after
+  `site_membership_cache_timeout()` seconds. A timeout of zero disables this
+  tier
+* A per-process in-memory tier, only active inside a `site_membership_cache`
+  block. The pipeline uses it so each course and site is resolved once per
+  run. Entries do not outlive the block
+
+`figures.signals` invalidates the cache when OrganizationCourse,
+UserOrganizationMapping or Organization sites records change. Course
+membership changes bump a version number in the cache key, like the response
+cache data version. See `figures.response_cache`. User membership changes
+remove the user counts of the organization's sites.
+
+The in-memory tier only sees the invalidations made by its own process. The
+pipeline tolerates that for the length of a run.
+
+The Django cache holds site ids, course id strings and counts, not model
+objects.
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+import logging
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+from django.core.cache import caches
+
+# TODO: Add exception handling
+import organizations
+
+from figures.settings import response_cache_alias, site_membership_cache_timeout
+
+
+default_logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'figures:site_membership'
+
+# Cached for courses not mapped to a site, as None means a cache miss
+NO_SITE = 0
+
+_local = threading.local()
+
+
+def get_cache():
+    return caches[response_cache_alias()]
+
+
+def version_key():
+    return '{}:version'.format(KEY_PREFIX)
+
+
+def get_version():
+    """Returns the course membership version, starting one if there is none
+    """
+    cache = get_cache()
+    version = cache.get(version_key())
+    if version is None:
+        cache.add(version_key(), int(time.time() * 1000), timeout=None)
+        version = cache.get(version_key())
+    return version
+
+
+def cache_key(name):
+    return '{}:{}:{}'.format(KEY_PREFIX, get_version(), name)
+
+
+class MembershipCache(object):
+    """In-memory tier for a pipeline run
+    """
+    def __init__(self):
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, loader):
+        if name in self.entries:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.entries[name] = loader()
+        return self.entries[name]
+
+    def clear(self):
+        self.entries = {}
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self.entries))
+
+
+def active_cache():
+    """Returns the in-memory tier for the current run or `None` if not in a run
+    """
+    return getattr(_local, 'cache', None)
+
+
+@contextmanager
+def site_membership_cache(description='figures site membership cache', logger=None):
+    """Context manager to resolve each course and site once during a
+    pipeline run
+
+    If a cache is already active, we reuse it. Only the outermost block logs
+    the counters
+    """
+    cache = active_cache()
+    if cache is not None:
+        yield cache
+        return
+
+    logger = logger if logger else default_logger
+    cache = MembershipCache()
+    _local.cache = cache
+    try:
+        yield cache
+    finally:
+        _local.cache = None
+        msg = '{}: hits={hits}, misses={misses}, size={size}'
+        logger.info(msg.format(description, **cache.stats()))
+
+
+def _shared(name, loader):
+    """Returns the value from the Django cache, calling `loader` on a miss
+    """
+    timeout = site_membership_cache_timeout()
+    if not timeout:
+        return loader()
+    cache = get_cache()
+    key = cache_key(name)
+    value = cache.get(key)
+    if value is None:
+        value = loader()
+        cache.set(key, value, timeout)
+    return value
+
+
+def _cached(name, loader):
+    """Returns the value from the in-memory tier, then the Django cache, then
+    `loader`
+    """
+    local = active_cache()
+    if local is not None:
+        return local.get(name, lambda: _shared(name, loader))
+    return _shared(name, loader)
+
+
+def _load_course_site_id(course_id):
+    """Reads the id of the course's site from the organizations tables
+
+    There should be only one organization per course and one site per
+    organization
+    """
+    org_ids = list(organizations.models.OrganizationCourse.objects.filter(
+        course_id=str(course_id)).values_list('organization_id', flat=True))
+    if not org_ids:
+        return NO_SITE
+    # Keep until this assumption analyzed
+    assert len(org_ids) == 1, 'Multiple orgs found for course: {}'.format(course_id)
+    if not hasattr(organizations.models.Organization, 'sites'):
+        return NO_SITE
+    site_ids = [site_id for site_id in organizations.models.Organization.objects.filter(
+        id=org_ids[0]).values_list('sites', flat=True) if site_id is not None]
+    msg = 'Must have one and only one site. Org id is "{}"'
+    assert len(site_ids) == 1, msg.format(org_ids[0])
+    return site_ids[0]
+
+
+def course_site_id(course_id):
+    """Returns the id of the course's site or None if the course has no site
+    """
+    return _cached('course_site:{}'.format(course_id),
+                   lambda: _load_course_site_id(course_id)) or None
+
+
+def course_site(course_id):
+    """Returns the course's site or None if the course has no site
+
+    The in-memory tier also holds the site record, so a pipeline run reads
+    each site once
+    """
+    site_id = course_site_id(course_id)
+    if not site_id:
+        return None
+    local = active_cache()
+    if local is not None:
+        return local.get('site:{}'.format(site_id), lambda: Site.objects.get(id=site_id))
+    return Site.objects.get(id=site_id)
+
+
+def site_course_ids(site):
+    """Returns the list of the site's course id strings
+    """
+    return _cached('site_course_ids:{}'.format(site.id), lambda: [
+        str(course_id) for course_id in
+        organizations.models.OrganizationCourse.objects.filter(
+            organization__sites__in=[site]).values_list('course_id', flat=True)])
+
+
+def site_user_count(site):
+    """Returns the number of users in the site
+    """
+    return _cached('site_user_count:{}'.format(site.id),
+                   lambda: get_user_model().objects.filter(
+                       organizations__sites__in=[site]).distinct().count())
+
+
+def invalidate_course_membership():
+    """Invalidates all the cached membership
+
+    Call this when a course or organization moves between sites
+    """
+    cache = get_cache()
+    try:
+        cache.incr(version_key())
+    except ValueError:
+        # No version yet, so nothing was cached under one
+        get_version()
+    local = active_cache()
+    if local is not None:
+        local.clear()
+
+
+def invalidate_site_users(site_ids):
+    """Invalidates the cached user counts of the sites
+
+    Call this when users are added to or removed from the sites
+    """
+    get_cache().delete_many([cache_key('site_user_count:{}'.format(site_id))
+                             for site_id in site_ids])
+    local = active_cache()
+    if local is not None:
+        for site_id in site_ids:
+            local.entries.pop('site_user_count:{}'.format(site_id), None)
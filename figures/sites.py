@@ -25,6 +25,7 @@ from figures.compat import (
     StudentModule,
 )
 from figures.helpers import as_course_key, is_multisite
+import figures.site_membership
 
 
 class CrossSiteResourceError(Exception):
@@ -107,29 +108,25 @@ def get_site_for_course(course_id):
     whether to let it raise back up raw or handle with a custom exception
     """
     if is_multisite():
-        org_courses = organizations.models.OrganizationCourse.objects.filter(
-            course_id=str(course_id))
-        if org_courses:
-            # Keep until this assumption analyzed
-            msg = 'Multiple orgs found for course: {}'
-            assert org_courses.count() == 1, msg.format(course_id)
-            first_org = org_courses.first().organization
-            if hasattr(first_org, 'sites'):
-                msg = 'Must have one and only one site. Org is "{}"'
-                assert first_org.sites.count() == 1, msg.format(first_org.name)
-                site = first_org.sites.first()
-            else:
-                site = None
-        else:
-            # We don't want to make assumptions of who our consumers are
-            # TODO: handle no organizations found for the course
-            site = None
+        site = figures.site_membership.course_site(course_id)
     else:
         # Operating in single site / standalone mode, return the default site
         site = Site.objects.get(id=settings.SITE_ID)
     return site
 
 
+def get_site_id_for_course(course_id):
+    """
+    Like `get_site_for_course` but returns the site id or None
+
+    It does not read the site record. In multisite mode the course's site id
+    comes from the cached site membership. See `figures.site_membership`
+    """
+    if is_multisite():
+        return figures.site_membership.course_site_id(course_id)
+    return settings.SITE_ID
+
+
 def get_organizations_for_site(site):
     """
     TODO: Refactor the functions in this module that make this call
@@ -145,8 +142,7 @@ def site_course_ids(site):
     """Return a list of string course ids for the site
     """
     if is_multisite():
-        return organizations.models.OrganizationCourse.objects.filter(
-                organization__sites__in=[site]).values_list('course_id', flat=True)
+        return figures.site_membership.site_course_ids(site)
     else:
         # Needs work. See about returning a queryset
         return [str(key) for key in CourseOverview.objects.all().values_list(
@@ -154,12 +150,10 @@ def site_course_ids(site):
 
 
 def get_course_keys_for_site(site):
-    """
-
-    Developer note: We could improve this function with caching
-    Question is which is the most efficient way to know cache expiry
+    """Return a list of the site's course keys
 
-    We may also be able to reduce the queries here to also improve performance
+    In multisite mode, the site's course ids are cached. See
+    `figures.site_membership`
     """
     if is_multisite():
         course_ids = site_course_ids(site)
@@ -197,6 +191,16 @@ def get_users_for_site(site):
     return users
 
 
+def get_user_count_for_site(site):
+    """Return the number of users in the site
+
+    In multisite mode, the count is cached. See `figures.site_membership`
+    """
+    if is_multisite():
+        return figures.site_membership.site_user_count(site)
+    return get_user_model().objects.count()
+
+
 def get_course_enrollments_for_site(site):
     if is_multisite():
         course_enrollments = CourseEnrollment.objects.filter(
@@ -259,6 +263,19 @@ def student_modules_for_course_enrollment(site, course_enrollment):
     return qs
 
 
+def student_modules_for_course_enrollments(site, course_id):
+    """Return a queryset of `StudentModule` records for all learners in a course
+
+    This is the set based counterpart to `student_modules_for_course_enrollment`.
+    It applies the same site filtering so that callers can group the results
+    by learner instead of querying once per enrollment
+    """
+    qs = StudentModule.objects.filter(course_id=as_course_key(course_id))
+    if is_multisite():
+        qs = qs.filter(student__organizations__sites__in=[site])
+    return qs
+
+
 def site_certificates(site):
     """
     If we want to be clever, we can abstract a function:
@@ -11,21 +11,55 @@ import six
 from django.contrib.sites.models import Site
 from django.utils.timezone import utc
 
-from celery import chord
+from celery import chain, chord
 from celery.app import shared_task
 from celery.utils.log import get_task_logger
 
-from figures.backfill import backfill_enrollment_data_for_site
-from figures.compat import CourseEnrollment, CourseOverview
+from figures.backfill import (
+    ENROLLMENT_BATCH_SIZE,
+    backfill_enrollment_data_chunk,
+    backfill_enrollment_data_for_site,
+    finish_enrollment_data_backfill,
+    plan_enrollment_data_backfill,
+    update_dirty_enrollment_data,
+)
+from figures.compat import CourseEnrollment
+from figures.course_structure import course_structure_cache
 from figures.helpers import as_course_key, as_date
 from figures.log import log_exec_time
-from figures.models import PipelineError
-from figures.pipeline.course_daily_metrics import CourseDailyMetricsLoader
+from figures.mau import store_mau_metrics
+from figures.models import PipelineError, ReportJob
+from figures.pipeline.course_activity import carry_forward_inactive_courses
+from figures.pipeline.course_daily_metrics import (
+    CourseDailyMetricsLoader,
+    get_enrollment_counts_exclude_admins,
+    load_site_course_daily_metrics,
+)
+from figures.pipeline.daily_active_users import collect_daily_active_users
+from figures.pipeline.helpers import pipeline_date_for_rule
 from figures.pipeline.site_daily_metrics import SiteDailyMetricsLoader
 import figures.sites
 from figures.pipeline.mau_pipeline import collect_course_mau
-from figures.pipeline.site_monthly_metrics import fill_last_month as fill_last_smm_month
+from figures.pipeline.site_monthly_metrics import (
+    fill_current_month,
+    fill_last_month as fill_last_smm_month,
+)
 from figures.pipeline.logger import log_error_to_db
+from figures.pipeline.recent_enrollment_data import (
+    micro_batch_lock,
+    update_recent_enrollment_data,
+)
+from figures.pipeline.site_activity import pipeline_sites
+from figures.reports import build_report
+from figures.settings import (
+    daily_metrics_cdm_max_retries,
+    daily_metrics_cdm_retry_backoff,
+    daily_metrics_site_extraction,
+    daily_metrics_site_concurrency,
+    enrollment_change_capture,
+)
+from figures.site_membership import site_membership_cache
+from figures.response_cache import bump_data_version, log_stats as log_response_cache_stats
 
 
 logger = get_task_logger(__name__)
@@ -40,9 +74,12 @@ logger = get_task_logger(__name__)
 
 
 @shared_task
-def populate_single_cdm(course_id, date_for=None, force_update=False):
+def populate_single_cdm(course_id, date_for=None, force_update=False, enrollment_count=None):
     '''Populates a CourseDailyMetrics record for the given date and course
 
+    The site level tasks pass `enrollment_count`, counted for all the site's
+    courses at once. See `site_enrollment_counts`
+
     TODO: cdm needs to handle course_id as the string
     '''
     if date_for:
@@ -57,8 +94,12 @@ def populate_single_cdm(course_id, date_for=None, force_update=False):
 
     start_time = time.time()
 
-    cdm_obj, _created = CourseDailyMetricsLoader(
-        course_id).load(date_for=date_for, force_update=force_update)
+    with course_structure_cache(description='populate_single_cdm', logger=logger), \
+            site_membership_cache(description='populate_single_cdm', logger=logger):
+        cdm_obj, _created = CourseDailyMetricsLoader(
+            course_id).load(date_for=date_for,
+                            force_update=force_update,
+                            enrollment_count=enrollment_count)
     elapsed_time = time.time() - start_time
     logger.info('done. Elapsed time (seconds)={}. cdm_obj={}'.format(
         elapsed_time, cdm_obj))
@@ -80,13 +121,63 @@ def populate_site_daily_metrics(site_id, **kwargs):
 
 
 @shared_task
-def update_enrollment_data(site_id, **_kwargs):
+def populate_daily_active_users(site_id, date_for=None, force_update=False):
+    """Store the site's active user sets for the day
+
+    We run this before `populate_site_daily_metrics` so that the site daily
+    metrics can read the day's active users from the stored sets
     """
-    This can be an expensive task as it iterates over all th
+    try:
+        site = Site.objects.get(id=site_id)
+        collect_daily_active_users(site=site, date_for=date_for, overwrite=force_update)
+    except Exception:  # pylint: disable=broad-except
+        msg = ('FIGURES:FAIL daily metrics:populate_daily_active_users'
+               ' for site_id={}'.format(site_id))
+        logger.exception(msg)
+
+
+@shared_task
+def populate_current_month_site_metrics(site_id, date_for=None):
+    """Refresh the site's monthly metrics for the month of `date_for`
+
+    We run this after `populate_site_daily_metrics` so that the month's record
+    includes the day's site metrics
     """
     try:
         site = Site.objects.get(id=site_id)
-        results = backfill_enrollment_data_for_site(site)
+        fill_current_month(site=site, date_for=as_date(date_for) if date_for else None)
+    except Exception:  # pylint: disable=broad-except
+        msg = ('FIGURES:FAIL daily metrics:populate_current_month_site_metrics'
+               ' for site_id={}'.format(site_id))
+        logger.exception(msg)
+
+
+@shared_task
+def update_enrollment_data(site_id, full_scan=None, resume=False, **_kwargs):
+    """Updates the site's EnrollmentData records
+
+    When enrollment change capture is enabled, we only update the enrollments
+    queued since the last run. See `figures.signals`. Otherwise, or when
+    `full_scan` is True, we update every enrollment in the site. This can be
+    an expensive task as it iterates over all the site's enrollments. Run a
+    full scan from time to time to reconcile changes the capture missed
+
+    A full scan starts over, unless `resume` is True. Then it continues the
+    site's unfinished full scan. See
+    `figures.backfill.backfill_enrollment_data_for_site`
+    """
+    if full_scan is None:
+        full_scan = not enrollment_change_capture()
+    try:
+        site = Site.objects.get(id=site_id)
+        with course_structure_cache(description='update_enrollment_data', logger=logger), \
+                site_membership_cache(description='update_enrollment_data', logger=logger):
+            if full_scan:
+                results = backfill_enrollment_data_for_site(site, resume=resume)
+            else:
+                results = update_dirty_enrollment_data(site)
+        msg = 'figures.tasks.update_enrollment_data site[{}]: processed={}, updated={}'
+        logger.info(msg.format(site_id, results['processed'], results['updated']))
         if results.get('errors'):
             for rec in results['errors']:
                 logger.error('figures.tasks.update_enrollment_data. Error:{}'.format(rec))
@@ -100,6 +191,213 @@ def update_enrollment_data(site_id, **_kwargs):
         logger.exception(msg)
 
 
+@shared_task
+def backfill_enrollment_data_chunk_task(chunk_id):
+    """Runs a chunk of the parallel EnrollmentData backfill
+
+    This task never raises, so that a failing chunk does not break the site's
+    chord. The failed chunk is not marked completed, so the next backfill for
+    the site runs it again
+    """
+    try:
+        results = backfill_enrollment_data_chunk(chunk_id)
+        return dict(chunk_id=chunk_id,
+                    status='ok',
+                    processed=results['processed'],
+                    updated=results['updated'],
+                    errors=results['errors'])
+    except Exception:  # pylint: disable=broad-except
+        logger.exception(
+            'figures.tasks.backfill_enrollment_data_chunk_task failed for chunk {}'.format(
+                chunk_id))
+        return dict(chunk_id=chunk_id, status='failed', processed=0, updated=0, errors=[])
+
+
+@shared_task
+def finish_enrollment_data_backfill_for_site(chunk_results, site_id):
+    """Chord callback for the parallel EnrollmentData backfill of a site
+
+    Logs the chunk counters and errors. If every chunk completed, we remove the
+    site's checkpoints and bump the site's data version
+    """
+    chunk_results = chunk_results or []
+    for rec in chunk_results:
+        for error in rec['errors']:
+            logger.error('figures.tasks.backfill_enrollment_data_parallel. Error:{}'.format(
+                error))
+    msg = ('figures.tasks.finish_enrollment_data_backfill_for_site site[{}]:'
+           ' chunks={}, failed={}, processed={}, updated={}')
+    logger.info(msg.format(site_id,
+                           len(chunk_results),
+                           len([rec for rec in chunk_results if rec['status'] != 'ok']),
+                           sum(rec['processed'] for rec in chunk_results),
+                           sum(rec['updated'] for rec in chunk_results)))
+    site = Site.objects.get(id=site_id)
+    finished = finish_enrollment_data_backfill(site)
+    if finished:
+        bump_data_version(site)
+    return dict(site_id=site_id, chunks=len(chunk_results), finished=finished)
+
+
+@shared_task
+def backfill_enrollment_data_parallel(site_id, chunk_size=None, resume=False):
+    """Backfills the site's EnrollmentData records with a Celery task per chunk
+
+    See `figures.backfill.backfill_enrollment_data_for_site` for how we split
+    the work into chunks and, with `resume`, continue an unfinished backfill.
+    The chord callback finishes the backfill once all the chunks are done
+    """
+    site = Site.objects.get(id=site_id)
+    chunk_ids = plan_enrollment_data_backfill(
+        site, chunk_size=chunk_size or ENROLLMENT_BATCH_SIZE, resume=resume)
+    callback = finish_enrollment_data_backfill_for_site.s(site_id=site_id)
+    if not chunk_ids:
+        return callback.delay([])
+    logger.info(
+        'figures.tasks.backfill_enrollment_data_parallel site[{}]: {} chunks'.format(
+            site_id, len(chunk_ids)))
+    return chord([backfill_enrollment_data_chunk_task.s(chunk_id=chunk_id)
+                  for chunk_id in chunk_ids])(callback)
+
+
+@shared_task
+def update_recent_enrollment_data_for_site(site_id):
+    """Updates EnrollmentData for the site's enrollments with recent activity
+
+    See `figures.pipeline.recent_enrollment_data`. We bump the site's data
+    version when records are updated so the API serves the new data
+
+    If a run for the site is still going, we skip this one
+    """
+    site = Site.objects.get(id=site_id)
+    with micro_batch_lock(site) as acquired:
+        if not acquired:
+            logger.info(
+                'figures.tasks.update_recent_enrollment_data_for_site site[{}]:'
+                ' skipped, a run is in progress'.format(site_id))
+            return
+        with course_structure_cache(description='update_recent_enrollment_data',
+                                    logger=logger):
+            results = update_recent_enrollment_data(site)
+    for rec in results['errors']:
+        logger.error('figures.tasks.update_recent_enrollment_data_for_site. Error:{}'.format(rec))
+    if results['updated']:
+        bump_data_version(site)
+    msg = ('figures.tasks.update_recent_enrollment_data_for_site site[{}]:'
+           ' processed={}, updated={}, watermark={}')
+    logger.info(msg.format(site_id, results['processed'], results['updated'],
+                           results['watermark']))
+
+
+@shared_task
+def run_enrollment_data_micro_batch():
+    """Starts the recent EnrollmentData update for each site
+
+    Scheduled every few minutes when ``ENABLE_ENROLLMENT_DATA_MICRO_BATCH`` is
+    set. See `figures.settings.lms_production`
+    """
+    for site_id in Site.objects.values_list('id', flat=True):
+        update_recent_enrollment_data_for_site.delay(site_id=site_id)
+
+
+def carry_forward_cdms(site, course_ids, date_for, force_update=False):
+    """Carries forward the CDM records of the site's inactive courses
+
+    See `figures.pipeline.course_activity`. If this fails, we log the error
+    and return an empty set so the pipeline extracts every course
+
+    Returns the set of inactive course id strings
+    """
+    try:
+        inactive = carry_forward_inactive_courses(course_ids=course_ids,
+                                                  date_for=date_for,
+                                                  force_update=force_update)
+    except Exception:  # pylint: disable=broad-except
+        msg = 'FIGURES:FAIL figures.tasks.carry_forward_cdms site[{}]'
+        logger.exception(msg.format(site.id))
+        return set()
+    msg = 'figures.tasks.carry_forward_cdms site[{}]: courses={}, inactive={}'
+    logger.info(msg.format(site.id, len(course_ids), len(inactive)))
+    return inactive
+
+
+def site_enrollment_counts(site, course_ids, date_for):
+    """Returns a dict of the course enrollment counts, not counting staff,
+    for the site's courses
+
+    We count all the courses at once instead of one course per CDM task. See
+    `figures.pipeline.course_daily_metrics.get_enrollment_counts_exclude_admins`.
+    If this fails, we log the error and return an empty dict so each CDM task
+    counts its course
+    """
+    try:
+        return get_enrollment_counts_exclude_admins(
+            course_ids, date_for=pipeline_date_for_rule(date_for))
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('FIGURES:FAIL figures.tasks.site_enrollment_counts site[{}]'.format(
+            site.id))
+        return {}
+
+
+def populate_site_cdms(site, course_ids, date_for, force_update=False):
+    """Populates the CDM records of the site's courses, extracting the data
+    for all of them at once
+
+    See `figures.pipeline.course_daily_metrics.load_site_course_daily_metrics`.
+    Courses that fail to save are logged to the Figures pipeline error table.
+    If the extraction fails, we log the error and return None so the pipeline
+    falls back to populating one course at a time
+
+    Returns the dict `load_site_course_daily_metrics` returns
+    """
+    start_time = time.time()
+    try:
+        results = load_site_course_daily_metrics(course_ids=course_ids,
+                                                 date_for=date_for,
+                                                 force_update=force_update)
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('FIGURES:FAIL figures.tasks.populate_site_cdms site[{}]'.format(
+            site.id))
+        return None
+    for course_id, exc in results['failed'].items():
+        logger.error('figures.tasks.populate_site_cdms failed for course {}: {}'.format(
+            course_id, exc))
+        log_cdm_error_to_db(exc,
+                            site=site,
+                            course_id=course_id,
+                            date_for=date_for,
+                            msg='figures.tasks.populate_site_cdms failed')
+    msg = ('figures.tasks.populate_site_cdms site[{}]: loaded={}, failed={}.'
+           ' Elapsed time (seconds)={}')
+    logger.info(msg.format(site.id,
+                           len(results['loaded']),
+                           len(results['failed']),
+                           time.time() - start_time))
+    return results
+
+
+def log_cdm_error_to_db(exc, site, course_id, date_for, msg):
+    """Capture a CDM load exception to the Figures pipeline error table
+
+    We always log these, regardless of the `log_pipeline_errors_to_db` setting
+    """
+    error_data = dict(
+        date_for=date_for,
+        msg=msg,
+        exception_class=exc.__class__.__name__,
+        )
+    if hasattr(exc, 'message_dict'):
+        error_data['message_dict'] = exc.message_dict  # pylint: disable=no-member
+    log_error_to_db(
+        error_data=error_data,
+        error_type=PipelineError.COURSE_DATA,
+        course_id=str(course_id),
+        site=site,
+        logger=logger,
+        log_pipeline_errors_to_db=True,
+        )
+
+
 @shared_task
 def populate_daily_metrics(date_for=None, force_update=False):
     '''Populates the daily metrics models for the given date
@@ -111,10 +409,12 @@ def populate_daily_metrics(date_for=None, force_update=False):
     ``populate_site_daily_metrics`` as immediate calls so that no courses are
     missed when the site daily metrics record is populated.
 
-    NOTE: We have an experimental task that runs the course populators in
+    When `daily_metrics_site_extraction()` is set, the site's course metrics
+    are extracted for all the courses at once. See ``populate_site_cdms``
 
-    parallel, then when they are all done, populates the site metrics. See the
-    function ``experimental_populate_daily_metrics`` docstring for details
+    NOTE: We have a parallel task that runs the course populators for each
+    site in parallel, then when they are all done, populates the site metrics.
+    See the function ``populate_daily_metrics_parallel`` docstring for details
 
     TODO: Add error handling and error logging
     TODO: Create and add decorator to assign 'date_for' if None
@@ -127,46 +427,66 @@ def populate_daily_metrics(date_for=None, force_update=False):
     logger.info('Starting task "figures.populate_daily_metrics" for date "{}"'.format(
         date_for))
 
-    sites_count = Site.objects.count()
-    for i, site in enumerate(Site.objects.all()):
+    sites = pipeline_sites('figures.tasks.populate_daily_metrics')
+    sites_count = len(sites)
+    for i, site in enumerate(sites):
         try:
-            for course in figures.sites.get_courses_for_site(site):
+            cache_msg = 'figures.populate_daily_metrics course structure cache site[{}]'
+            membership_msg = 'figures.populate_daily_metrics site membership cache site[{}]'
+            with course_structure_cache(description=cache_msg.format(site.id),
+                                        logger=logger), \
+                    site_membership_cache(description=membership_msg.format(site.id),
+                                          logger=logger):
+                courses = figures.sites.get_courses_for_site(site)
+                inactive = carry_forward_cdms(site=site,
+                                              course_ids=[str(course.id) for course in courses],
+                                              date_for=date_for,
+                                              force_update=force_update)
+                active_course_ids = [str(course.id) for course in courses
+                                     if str(course.id) not in inactive]
+                site_results = None
+                if daily_metrics_site_extraction():
+                    site_results = populate_site_cdms(site=site,
+                                                      course_ids=active_course_ids,
+                                                      date_for=date_for,
+                                                      force_update=force_update)
+                if site_results is None:
+                    enrollment_counts = site_enrollment_counts(site=site,
+                                                               course_ids=active_course_ids,
+                                                               date_for=date_for)
+                    for course_id in active_course_ids:
+                        try:
+                            populate_single_cdm(
+                                course_id=course_id,
+                                date_for=date_for,
+                                force_update=force_update,
+                                enrollment_count=enrollment_counts.get(course_id))
+                        except Exception as e:  # pylint: disable=broad-except
+                            logger.exception('figures.tasks.populate_daily_metrics failed')
+                            log_cdm_error_to_db(
+                                e,
+                                site=site,
+                                course_id=course_id,
+                                date_for=date_for,
+                                msg='figures.tasks.populate_daily_metrics failed')
+                populate_daily_active_users(
+                    site_id=site.id,
+                    date_for=date_for,
+                    force_update=force_update)
+                populate_site_daily_metrics(
+                    site_id=site.id,
+                    date_for=date_for,
+                    force_update=force_update)
+                populate_current_month_site_metrics(site_id=site.id, date_for=date_for)
+
+                # Until we implement signal triggers
                 try:
-                    populate_single_cdm(
-                        course_id=course.id,
-                        date_for=date_for,
-                        force_update=force_update)
-                except Exception as e:  # pylint: disable=broad-except
-                    logger.exception('figures.tasks.populate_daily_metrics failed')
-                    # Always capture CDM load exceptions to the Figures pipeline
-                    # error table
-                    error_data = dict(
-                        date_for=date_for,
-                        msg='figures.tasks.populate_daily_metrics failed',
-                        exception_class=e.__class__.__name__,
-                        )
-                    if hasattr(e, 'message_dict'):
-                        error_data['message_dict'] = e.message_dict  # pylint: disable=no-member
-                    log_error_to_db(
-                        error_data=error_data,
-                        error_type=PipelineError.COURSE_DATA,
-                        course_id=str(course.id),
-                        site=site,
-                        logger=logger,
-                        log_pipeline_errors_to_db=True,
-                        )
-            populate_site_daily_metrics(
-                site_id=site.id,
-                date_for=date_for,
-                force_update=force_update)
-
-            # Until we implement signal triggers
-            try:
-                update_enrollment_data(site_id=site.id)
-            except Exception:  # pylint: disable=broad-except
-                msg = ('FIGURES:FAIL figures.tasks update_enrollment_data '
-                       ' unhandled exception. site[{}]:{}')
-                logger.exception(msg.format(site.id, site.domain))
+                    update_enrollment_data(site_id=site.id)
+                except Exception:  # pylint: disable=broad-except
+                    msg = ('FIGURES:FAIL figures.tasks update_enrollment_data '
+                           ' unhandled exception. site[{}]:{}')
+                    logger.exception(msg.format(site.id, site.domain))
+                bump_data_version(site)
 
         except Exception:  # pylint: disable=broad-except
             msg = ('FIGURES:FAIL populate_daily_metrics unhandled site level'
@@ -176,61 +496,193 @@ def populate_daily_metrics(date_for=None, force_update=False):
             i, sites_count))
     logger.info('Finished task "figures.populate_daily_metrics" for date "{}"'.format(
         date_for))
+    log_response_cache_stats(logger)
 
 
 #
-# Daily Metrics Experimental Tasks
+# Parallel Daily Metrics Tasks
 #
 
 
+@shared_task(bind=True)
+def populate_single_cdm_with_retry(self, previous_results=None, course_id=None,
+                                   site_id=None, date_for=None, force_update=False,
+                                   enrollment_count=None):
+    """Populate a course's CDM for the parallel daily metrics pipeline
+
+    This task never raises, so that a failing course does not break the site's
+    chord. We retry failures with exponential backoff. When we run out of
+    retries, we log the error to the Figures pipeline error table and return a
+    'failed' result.
+
+    Tasks for a site are run in chains to limit how many courses we process at
+    the same time. Each task in a chain receives the results of the tasks
+    before it as `previous_results` and returns them with its own result
+    appended. The chord callback then gets the results for every course.
+    """
+    results = list(previous_results or [])
+    try:
+        populate_single_cdm(course_id=course_id,
+                            date_for=date_for,
+                            force_update=force_update,
+                            enrollment_count=enrollment_count)
+        results.append(dict(course_id=course_id, status='ok'))
+    except Exception as e:  # pylint: disable=broad-except
+        retries = self.request.retries
+        if retries < daily_metrics_cdm_max_retries():
+            countdown = daily_metrics_cdm_retry_backoff() * (2 ** retries)
+            logger.warning(
+                'figures.tasks.populate_single_cdm_with_retry retry {} for course {}'
+                ' in {} seconds'.format(retries + 1, course_id, countdown))
+            raise self.retry(exc=e,
+                             countdown=countdown,
+                             max_retries=daily_metrics_cdm_max_retries())
+        logger.exception(
+            'figures.tasks.populate_single_cdm_with_retry failed for course {}'.format(
+                course_id))
+        log_cdm_error_to_db(e,
+                            site=Site.objects.filter(id=site_id).first(),
+                            course_id=course_id,
+                            date_for=date_for,
+                            msg='figures.tasks.populate_single_cdm_with_retry failed')
+        results.append(dict(course_id=course_id, status='failed'))
+    return results
+
+
 @shared_task
-def experimental_populate_daily_metrics(date_for=None, force_update=False):
-    '''Experimental task to populate daily metrics
+def populate_site_daily_metrics_after_cdms(cdm_results, site_id, date_for=None,
+                                           force_update=False):
+    """Chord callback for a site in the parallel daily metrics pipeline
 
-    WARNING: In Ginkgo devstack, this task tends to gets stuck in the middle of
-    processing course metrics. Not all the courses get processed and the site
-    metrics doesn't get called.
+    Celery calls this only after every CDM task for the site has finished,
+    whether the course succeeded or failed. Then we store the site's daily
+    active users, populate the site's SiteDailyMetrics record, refresh the
+    current month's SiteMonthlyMetrics record and update its enrollment data.
+    Last, we bump the site's data version so the API serves the new data.
 
-    We're keeping it in the tasks so that we can continue to debug this.
-    Enabling parallel course tasks will improve the pipeline performance
+    Like the serial pipeline, a failing step is logged and does not stop the
+    steps after it. We always bump the data version
 
-    '''
-    def include_course(course_overview, threshold=50):
-        '''This function let's us skip over courses with many enrollments, speeding
-        up testing. Do not use for production
-        '''
-        count = CourseEnrollment.objects.filter(course_id=course_overview.id).count()
-        return False if count > threshold else True
+    `cdm_results` has one list of course results for each chain in the chord
+    """
+    results = [rec for chain_results in cdm_results or [] for rec in chain_results or []]
+    failed = [rec['course_id'] for rec in results if rec.get('status') != 'ok']
+    msg = 'figures.tasks.populate_site_daily_metrics_after_cdms site[{}]: courses={}, failed={}'
+    logger.info(msg.format(site_id, len(results), len(failed)))
+    steps = [
+        ('populate_daily_active_users', populate_daily_active_users,
+         dict(date_for=date_for, force_update=force_update)),
+        ('populate_site_daily_metrics', populate_site_daily_metrics,
+         dict(date_for=date_for, force_update=force_update)),
+        ('populate_current_month_site_metrics', populate_current_month_site_metrics,
+         dict(date_for=date_for)),
+        ('update_enrollment_data', update_enrollment_data, dict()),
+    ]
+    failed_steps = []
+    try:
+        for name, step, kwargs in steps:
+            try:
+                step(site_id=site_id, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                failed_steps.append(name)
+                msg = ('FIGURES:FAIL figures.tasks.populate_site_daily_metrics_after_cdms'
+                       ' {} unhandled exception. site[{}]')
+                logger.exception(msg.format(name, site_id))
+    finally:
+        bump_data_version(Site.objects.get(id=site_id))
+    return dict(site_id=site_id, courses=len(results), failed=failed,
+                failed_steps=failed_steps)
+
+
+@shared_task
+def populate_daily_metrics_for_site(site_id, date_for=None, force_update=False):
+    """Run the daily metrics pipeline for one site as a Celery chord
+
+    The chord header has up to `daily_metrics_site_concurrency()` chains of
+    course daily metrics tasks. The chord callback populates the site daily
+    metrics and enrollment data once all the site's courses are done.
+    """
+    site = Site.objects.get(id=site_id)
+    course_ids = [six.text_type(course.id)
+                  for course in figures.sites.get_courses_for_site(site)]
+    inactive = carry_forward_cdms(site=site,
+                                  course_ids=course_ids,
+                                  date_for=date_for,
+                                  force_update=force_update)
+    course_ids = [course_id for course_id in course_ids if course_id not in inactive]
+    enrollment_counts = site_enrollment_counts(site=site,
+                                               course_ids=course_ids,
+                                               date_for=date_for)
+    callback = populate_site_daily_metrics_after_cdms.s(site_id=site_id,
+                                                        date_for=date_for,
+                                                        force_update=force_update)
+    if not course_ids:
+        return callback.delay([])
+
+    concurrency = min(daily_metrics_site_concurrency(), len(course_ids))
+    chains = []
+    for i in range(concurrency):
+        tasks = [populate_single_cdm_with_retry.s(
+            course_id=course_id,
+            site_id=site_id,
+            date_for=date_for,
+            force_update=force_update,
+            enrollment_count=enrollment_counts.get(course_id))
+                 for course_id in course_ids[i::concurrency]]
+        chains.append(chain(*tasks))
+    logger.info(
+        'figures.tasks.populate_daily_metrics_for_site site[{}]: {} courses in {} chains'.format(
+            site_id, len(course_ids), len(chains)))
+    return chord(chains)(callback)
 
+
+@shared_task
+def populate_daily_metrics_parallel(date_for=None, force_update=False):
+    """Parallel version of `populate_daily_metrics`
+
+    We start one `populate_daily_metrics_for_site` task per site. Each site
+    task fans out the site's courses and then populates the site metrics after
+    all of the site's courses have finished. See
+    `populate_daily_metrics_for_site` for details.
+
+    Configure with these Open edX FEATURES settings:
+
+    * ``FIGURES_DAILY_METRICS_SITE_CONCURRENCY``: courses processed at the same
+      time for a site
+    * ``FIGURES_DAILY_METRICS_CDM_MAX_RETRIES``: retries for a failed course
+    * ``FIGURES_DAILY_METRICS_CDM_RETRY_BACKOFF``: base retry delay in seconds
+    * ``FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES``: carry forward the CDM
+      records of courses with no activity. See `carry_forward_cdms`
+    * ``FIGURES_DAILY_METRICS_FULL_REFRESH_WEEKDAY``: day of the week we
+      extract every course
+    * ``FIGURES_SKIP_DORMANT_SITES``: skip sites with no recent activity. See
+      `figures.pipeline.site_activity`
+    """
     if date_for:
         date_for = as_date(date_for)
     else:
         date_for = datetime.datetime.utcnow().replace(tzinfo=utc).date()
-    date_for = date_for.strftime("%Y-%m-%d")
+    date_for = date_for.strftime('%Y-%m-%d')
     logger.info(
-        'Starting task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
+        'Starting task "figures.populate_daily_metrics_parallel" for date "{}"'.format(
             date_for))
+    for site in pipeline_sites('figures.tasks.populate_daily_metrics_parallel'):
+        populate_daily_metrics_for_site.delay(site_id=site.id,
+                                              date_for=date_for,
+                                              force_update=force_update)
+    log_response_cache_stats(logger)
 
-    courses = CourseOverview.objects.all()
-    cdm_tasks = [
-        populate_single_cdm.s(
-            course_id=six.text_type(course.id),  # noqa: F821
-            date_for=date_for,
-            force_update=force_update) for course in courses if include_course(course)
-    ]
-    results = chord(cdm_tasks)(populate_site_daily_metrics.s(
-        date_for=date_for, force_update=force_update))
-
-    # TODO: Are we going to update the SDM for the day if
-    # * course records were created, meaning there are data not added to the SDM
-    # * the SDM record already exists
-    # * force_update is not true
 
-    logger.info(
-        'Finished task "figures.experimental_populate_daily_metrics" for date "{}"'.format(
-            date_for))
+@shared_task
+def experimental_populate_daily_metrics(date_for=None, force_update=False):
+    """Deprecated. Use `populate_daily_metrics_parallel`
 
-    return results
+    We keep this task name so existing schedules and scripts keep working
+    """
+    logger.warning('figures.tasks.experimental_populate_daily_metrics is deprecated.'
+                   ' Use figures.tasks.populate_daily_metrics_parallel')
+    return populate_daily_metrics_parallel(date_for=date_for,
+                                           force_update=force_update)
 
 
 #
@@ -266,18 +718,25 @@ def populate_mau_metrics_for_site(site_id, month_for=None, force_update=False):
     """
     Collect (save) MAU metrics for the specified site
 
-    Iterates over all courses in the site to collect MAU counts
+    Collects the MAU for all courses in the site and the site MAU at once from
+    the daily active user store. See `figures.mau.store_mau_metrics`
+
     TODO: Decide how sites would be excluded and create filter
-    TODO: Check results of 'store_mau_metrics' to log unexpected results
     """
+    if month_for:
+        month_for = as_date(month_for)
+    else:
+        month_for = datetime.datetime.utcnow().date()
     site = Site.objects.get(id=site_id)
-    msg = 'Starting figures'
-    logger.info(msg)
-    for course_key in figures.sites.get_course_keys_for_site(site):
-        populate_course_mau(site_id=site_id,
-                            course_id=str(course_key),
-                            month_for=month_for,
-                            force_update=force_update)
+    start_time = time.time()
+    results = store_mau_metrics(site=site,
+                                month_for=month_for,
+                                overwrite=force_update)
+    bump_data_version(site)
+    elapsed_time = time.time() - start_time
+    logger.info(('populate_mau_metrics_for_site Elapsed time (seconds)={}. '
+                 'site={}, courses={}, smo={}').format(
+        elapsed_time, site.domain, len(results['cmos']), results['smo']))
 
 
 @shared_task
@@ -288,7 +747,7 @@ def populate_all_mau():
     Initially, run it every day to observe monthly active user accumulation for
     the month and evaluate the results
     """
-    for site in Site.objects.all():
+    for site in pipeline_sites('figures.tasks.populate_all_mau'):
         populate_mau_metrics_for_site(site_id=site.id, force_update=False)
 
 
@@ -298,14 +757,37 @@ def populate_monthly_metrics_for_site(site_id):
     site = Site.objects.get(id=site_id)
     msg = 'Ran populate_monthly_metrics_for_site. [{}]:{}'
     with log_exec_time(msg.format(site.id, site.domain)):
-        fill_last_smm_month(site=site)
+        # The daily pipeline wrote last month's record on its last day. We
+        # overwrite it to add the activity after that run
+        fill_last_smm_month(site=site, overwrite=True)
+    bump_data_version(site)
 
 
 @shared_task
 def run_figures_monthly_metrics():
-    """
-    TODO: only run for active sites. Requires knowing which sites we can skip
+    """Starts the monthly metrics task for each site
+
+    Dormant sites are skipped when ``FIGURES_SKIP_DORMANT_SITES`` is set. See
+    `figures.pipeline.site_activity`
     """
     logger.info('Starting figures.tasks.run_figures_monthly_metrics...')
-    for site in Site.objects.all():
+    for site in pipeline_sites('figures.tasks.run_figures_monthly_metrics'):
         populate_monthly_metrics_for_site.delay(site_id=site.id)
+
+
+@shared_task
+def run_report_job(job_id):
+    """Builds the report for a ReportJob. See `figures.reports`
+
+    If building the report fails, we mark the job as failed so that the next
+    request for the report creates a new job
+    """
+    job = ReportJob.objects.get(id=job_id)
+    msg = 'Ran run_report_job. job={}, site={}, report_type={}'
+    try:
+        with log_exec_time(msg.format(job.id, job.site.domain, job.report_type)):
+            build_report(job)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.exception('figures.tasks.run_report_job failed. job={}'.format(job.id))
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.FAILED,
+                                                   error_message=str(e))
@@ -123,6 +123,11 @@ router.register(
     views.LearnerMetricsViewSetV2,
     base_name='learner-metrics')
 
+router.register(
+    r'report-jobs',
+    views.ReportJobViewSet,
+    base_name='report-jobs')
+
 urlpatterns = [
 
     # UI Templates
@@ -131,6 +136,9 @@ urlpatterns = [
     # Non-router API endpoints
     url(r'^api/general-site-metrics', views.GeneralSiteMetricsView.as_view(),
         name='general-site-metrics'),
+
+    url(r'^api/learner-metrics-export/$', views.LearnerMetricsExportView.as_view(),
+        name='learner-metrics-export'),
 ]
 
 # Include router endpoints
@@ -9,11 +9,11 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required, user_passes_test
 import django.contrib.sites.shortcuts
 from django.contrib.sites.models import Site
-from django.http import HttpResponseRedirect
+from django.http import FileResponse, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.views.decorators.csrf import ensure_csrf_cookie
 
-from rest_framework import viewsets
+from rest_framework import status, viewsets
 from rest_framework.authentication import (
     BasicAuthentication,
     SessionAuthentication,
@@ -40,6 +40,7 @@ from opaque_keys import InvalidKeyError
 from opaque_keys.edx.keys import CourseKey
 
 from figures.compat import CourseEnrollment, CourseOverview
+import figures.export
 from figures.filters import (
     CourseDailyMetricsFilter,
     CourseEnrollmentFilter,
@@ -55,6 +56,7 @@ from figures.models import (
     CourseDailyMetrics,
     CourseMauMetrics,
     LearnerCourseGradeMetrics,
+    ReportJob,
     SiteDailyMetrics,
     SiteMauMetrics,
 )
@@ -73,6 +75,7 @@ from figures.serializers import (
     LearnerDetailsSerializer,
     LearnerMetricsSerializer,
     LearnerMetricsSerializerV2,
+    ReportJobSerializer,
     SiteDailyMetricsSerializer,
     SiteMauMetricsSerializer,
     SiteMauLiveMetricsSerializer,
@@ -83,16 +86,21 @@ from figures.serializers import (
 )
 from figures import metrics
 from figures.pagination import (
+    CursorPaginationOptInMixin,
     FiguresLimitOffsetPagination,
     FiguresKiloPagination,
+    FiguresOptionalLimitOffsetPagination,
 )
 import figures.permissions
 import figures.helpers
+import figures.reports
 import figures.sites
+from figures.response_cache import cache_response
 from figures.mau import (
     retrieve_live_course_mau_data,
     retrieve_live_site_mau_data,
 )
+from figures.tasks import run_report_job
 
 
 UNAUTHORIZED_USER_REDIRECT_URL = '/'
@@ -223,6 +231,19 @@ class GeneralCourseDataViewSet(CourseOverviewViewSet):
     search_fields = ['display_name', 'id']
     ordering_fields = ['display_name', 'self_paced', 'date_joined']
 
+    def get_serializer_context(self):
+        context = super(GeneralCourseDataViewSet, self).get_serializer_context()
+        context['site'] = django.contrib.sites.shortcuts.get_current_site(self.request)
+        return context
+
+    @cache_response('general_course_data')
+    def list(self, request, *args, **kwargs):
+        return super(GeneralCourseDataViewSet, self).list(request, *args, **kwargs)
+
+    @cache_response('general_course_data')
+    def retrieve(self, request, *args, **kwargs):
+        return super(GeneralCourseDataViewSet, self).retrieve(request, *args, **kwargs)
+
 
 class CourseDetailsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
     """Detailed course data
@@ -315,6 +336,7 @@ class GeneralSiteMetricsView(CommonAuthMixin, APIView):
         '''
         return metrics.get_monthly_site_metrics
 
+    @cache_response('general_site_metrics')
     def get(self, request, format=None):  # pylint: disable=redefined-builtin
         '''
         Does not yet support multi-tenancy
@@ -330,7 +352,8 @@ class GeneralSiteMetricsView(CommonAuthMixin, APIView):
         return Response(data)
 
 
-class GeneralUserDataViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class GeneralUserDataViewSet(CursorPaginationOptInMixin, CommonAuthMixin,
+                             viewsets.ReadOnlyModelViewSet):
     '''View class to serve general user data to the Figures UI
 
     See the serializer class, GeneralUserDataSerializer for the specific fields
@@ -339,6 +362,9 @@ class GeneralUserDataViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
     Can filter users for a specific course by providing the 'course_id' query
     parameter
 
+    Add the 'cursor' query parameter for cursor pagination. See
+    `figures.pagination.FiguresCursorPagination`
+
     TODO: Make this class and any other User model based viewsets inherit a
     base. The only difference between them is the serializer
     '''
@@ -449,7 +475,8 @@ class LearnerMetricsViewSetV1(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return context
 
 
-class LearnerMetricsViewSetV2(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class LearnerMetricsViewSetV2(CursorPaginationOptInMixin, CommonAuthMixin,
+                              viewsets.ReadOnlyModelViewSet):
     """Provides user identity and nested enrollment data
 
     Version 2 of this viewset. We'll remove the old view
@@ -507,7 +534,97 @@ class LearnerMetricsViewSetV2(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
         return context
 
 
-class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+class LearnerMetricsExportView(CommonAuthMixin, APIView):
+    """Streams the site's learner metrics as a CSV or NDJSON file
+
+    Query parameters:
+    * ``export_format`` - ``csv`` (the default) or ``ndjson``
+    * ``course`` - filter on course ids. Repeat for multiple courses
+    * ``search`` - filter on username, email or full name
+
+    The ``course`` and ``search`` parameters work the same as for
+    `LearnerMetricsViewSetV2`. See `figures.export`
+    """
+    content_types = dict(csv='text/csv', ndjson='application/x-ndjson')
+
+    def get(self, request, format=None):  # pylint: disable=redefined-builtin
+        export_format = request.query_params.get('export_format', 'csv')
+        if export_format not in figures.export.EXPORT_FORMATS:
+            return Response(
+                dict(detail='Invalid export format "{}"'.format(export_format)),
+                status=status.HTTP_400_BAD_REQUEST)
+
+        site = django.contrib.sites.shortcuts.get_current_site(request)
+        course_ids = [elem.replace(' ', '+') for elem in request.GET.getlist('course')]
+        rows = figures.export.learner_metrics_rows(
+            site=site,
+            course_ids=course_ids,
+            search=request.query_params.get('search'))
+        if export_format == 'csv':
+            lines = figures.export.csv_lines(rows)
+        else:
+            lines = figures.export.ndjson_lines(rows)
+
+        response = StreamingHttpResponse(lines,
+                                         content_type=self.content_types[export_format])
+        filename = 'figures-learner-metrics-{}-{}.{}'.format(
+            site.domain, datetime.utcnow().date(), export_format)
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+
+class ReportJobViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
+    """Requests server side reports and downloads them when they are done
+
+    ``POST`` with ``report_type`` set to ``learner``, ``course`` or
+    ``enrollment`` to request a report. If the site's data has not changed
+    since a job for the same report type was requested, we return that job
+    instead of building the report again. Otherwise we create a job and start
+    the Celery task that builds it. See `figures.reports`
+
+    Poll the job detail for the ``status`` and ``progress_percent``. When the
+    job is ``completed``, get the gzip compressed CSV file from
+    ``/figures/api/report-jobs/<id>/download/``
+    """
+    model = ReportJob
+    pagination_class = FiguresLimitOffsetPagination
+    serializer_class = ReportJobSerializer
+
+    def get_queryset(self):
+        site = django.contrib.sites.shortcuts.get_current_site(self.request)
+        return ReportJob.objects.filter(site=site)
+
+    def create(self, request):
+        report_type = request.data.get('report_type')
+        if report_type not in figures.reports.REPORTS:
+            return Response(
+                dict(detail='Invalid report type "{}"'.format(report_type)),
+                status=status.HTTP_400_BAD_REQUEST)
+        site = django.contrib.sites.shortcuts.get_current_site(request)
+        job, created = figures.reports.request_report(site=site,
+                                                      report_type=report_type,
+                                                      requested_by=request.user)
+        if created:
+            run_report_job.delay(job_id=job.id)
+        return Response(self.get_serializer(job).data,
+                        status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK)
+
+    @detail_route()
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ReportJob.COMPLETED or not job.artifact:
+            raise NotFound('Report job {} has no completed report'.format(job.id))
+        # `FieldFile.open` returns None in older Django releases
+        response = FileResponse(job.artifact.storage.open(job.artifact.name, 'rb'),
+                                content_type='application/gzip')
+        filename = 'figures-{}-report-{}-{}.csv.gz'.format(
+            job.report_type, job.site.domain, job.created.date())
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+
+class EnrollmentMetricsViewSet(CursorPaginationOptInMixin, CommonAuthMixin,
+                               viewsets.ReadOnlyModelViewSet):
     """Initial viewset for enrollment metrics
 
     Initial purpose to serve up course progress and completion data
@@ -568,6 +685,7 @@ class EnrollmentMetricsViewSet(CommonAuthMixin, viewsets.ReadOnlyModelViewSet):
 class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
 
     lookup_value_regex = settings.COURSE_ID_PATTERN
+    pagination_class = FiguresOptionalLimitOffsetPagination
     # TODO: Make 'months_back' be a query parameter.
     # We will also need to either set a limit or paginate history results
     months_back = 6
@@ -605,24 +723,48 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
             months_back=months_back
         )
 
+    @cache_response('course_monthly_metrics')
     def list(self, request):
         """
-        Returns site metrics data for current month
+        Returns course metrics data for current month for the site's courses
+
+        Query parameters:
+        * ``course`` - one or more course ids to filter the courses. Repeat the
+          parameter or separate the ids with commas
+        * ``limit`` and ``offset`` - paginate the courses. Without ``limit``
+          we return the full list unpaginated
+
+        We only calculate metrics for the courses on the requested page
 
         TODO: NEXT Add query params to get data from previous months
-        TODO: Add paginagation
         """
         site = django.contrib.sites.shortcuts.get_current_site(request)
-        course_keys = figures.sites.get_course_keys_for_site(site)
+        course_ids = [str(key) for key in figures.sites.get_course_keys_for_site(site)]
+        course_filter = self.get_course_filter(request)
+        if course_filter:
+            course_ids = [cid for cid in course_ids if cid in course_filter]
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(course_ids, request, view=self)
         date_for = datetime.utcnow().date()
         month_for = '{}/{}'.format(date_for.month, date_for.year)
-        data = []
-        for course_key in course_keys:
-            data.append(metrics.get_month_course_metrics(site=site,
-                                                         course_id=str(course_key),
-                                                         month_for=month_for))
-        return Response(data)
+        data = metrics.get_month_course_metrics_for_courses(
+            site=site,
+            course_ids=course_ids if page is None else page,
+            month_for=month_for)
+        if page is None:
+            return Response(data)
+        return paginator.get_paginated_response(data)
+
+    def get_course_filter(self, request):
+        """Returns the set of course id strings in the ``course`` query parameter
+        """
+        course_filter = set()
+        for value in request.query_params.getlist('course'):
+            course_filter.update(cid.strip().replace(' ', '+')
+                                 for cid in value.split(',') if cid.strip())
+        return course_filter
 
+    @cache_response('course_monthly_metrics')
     def retrieve(self, request, **kwargs):  # pylint: disable=unused-argument
         """
         TODO: Make sure we have a test to handle invalid or empty course id
@@ -637,6 +779,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @detail_route()
+    @cache_response('course_monthly_metrics')
     def active_users(self, request, **kwargs):  # pylint: disable=unused-argument
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         date_for = datetime.utcnow().date()
@@ -651,6 +794,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @detail_route()
+    @cache_response('course_monthly_metrics')
     def course_enrollments(self, request, **kwargs):
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         data = dict(course_enrollments=self.historic_data(
@@ -661,6 +805,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @detail_route()
+    @cache_response('course_monthly_metrics')
     def num_learners_completed(self, request, **kwargs):
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         data = dict(num_learners_completed=self.historic_data(
@@ -671,6 +816,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @detail_route()
+    @cache_response('course_monthly_metrics')
     def avg_days_to_complete(self, request, **kwargs):
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         data = dict(avg_days_to_complete=self.historic_data(
@@ -681,6 +827,7 @@ class CourseMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @detail_route()
+    @cache_response('course_monthly_metrics')
     def avg_progress(self, request, **kwargs):
         site, course_id = self.site_course_helper(kwargs.get('pk', ''))
         data = dict(avg_progress=self.historic_data(
@@ -703,12 +850,12 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
 
     ## Dev note
     Does it benefit to make serializers for these calls?
-    Do we want to create a SiteMonthlyMetrics model?
-    If we do, then we can also use django-filter on the model
-    Tradeoff: Additional storage cost to reduced request time
-    Perhaps we make this a server setting
+
+    The history endpoints read the `SiteMonthlyMetrics` records the pipeline
+    stores. See `figures.metrics.get_site_monthly_history`
     """
 
+    @cache_response('site_monthly_metrics')
     def list(self, request):
         """
         Returns site metrics data for current month
@@ -719,21 +866,23 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def registered_users(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
         months_back = 6
 
-        registered_users = metrics.get_monthly_history_metric(
-            func=metrics.get_total_site_users_for_time_period,
+        registered_users = metrics.get_site_monthly_history(
             site=site,
             date_for=date_for,
             months_back=months_back,
-        )
+            fields=['registered_users'],
+        )['registered_users']
         data = dict(registered_users=registered_users)
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def new_users(self, request):
         """
         TODO: Rename the metrics module function to "new_users" to match this
@@ -742,61 +891,65 @@ class SiteMonthlyMetricsViewSet(CommonAuthMixin, viewsets.ViewSet):
         date_for = datetime.utcnow().date()
         months_back = 6
 
-        new_users = metrics.get_monthly_history_metric(
-            func=metrics.get_total_site_users_joined_for_time_period,
+        new_users = metrics.get_site_monthly_history(
             site=site,
             date_for=date_for,
             months_back=months_back,
-        )
+            fields=['new_users'],
+        )['new_users']
         data = dict(new_users=new_users)
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def course_completions(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
         months_back = 6
 
-        course_completions = metrics.get_monthly_history_metric(
-            func=metrics.get_total_course_completions_for_time_period,
+        course_completions = metrics.get_site_monthly_history(
             site=site,
             date_for=date_for,
             months_back=months_back,
-        )
+            fields=['course_completions'],
+        )['course_completions']
         data = dict(course_completions=course_completions)
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def course_enrollments(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
         months_back = 6
 
-        course_enrollments = metrics.get_monthly_history_metric(
-            func=metrics.get_total_enrollments_for_time_period,
+        course_enrollments = metrics.get_site_monthly_history(
             site=site,
             date_for=date_for,
             months_back=months_back,
-        )
+            fields=['course_enrollments'],
+        )['course_enrollments']
         data = dict(course_enrollments=course_enrollments)
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def site_courses(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         date_for = datetime.utcnow().date()
         months_back = 6
 
-        site_courses = metrics.get_monthly_history_metric(
-            func=metrics.get_total_site_courses_for_time_period,
+        site_courses = metrics.get_site_monthly_history(
             site=site,
             date_for=date_for,
             months_back=months_back,
-        )
+            fields=['site_courses'],
+        )['site_courses']
         data = dict(site_courses=site_courses)
         return Response(data)
 
     @list_route()
+    @cache_response('site_monthly_metrics')
     def active_users(self, request):
         site = django.contrib.sites.shortcuts.get_current_site(request)
         months_back = 6
@@ -4,6 +4,7 @@ from datetime import datetime
 import pytest
 from django.utils.timezone import utc
 from six.moves import range
+from figures.site_membership import invalidate_course_membership
 from tests.helpers import organizations_support_sites
 
 from tests.factories import (
@@ -24,6 +25,14 @@ if organizations_support_sites():
                                         organization=org) for user in users]
 
 
+@pytest.fixture(autouse=True)
+def clear_site_membership_cache():
+    """The site membership cache outlives a test. Tests reuse site ids, so
+    each test starts with an empty cache. See `figures.site_membership`
+    """
+    invalidate_course_membership()
+
+
 @pytest.fixture
 @pytest.mark.django_db
 def sm_test_data(db):
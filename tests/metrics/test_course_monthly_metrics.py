@@ -2,17 +2,25 @@
 """
 
 from __future__ import absolute_import
+import datetime
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import utc
 
 from figures.metrics import (
     get_course_mau_history_metrics,
     get_month_course_metrics,
+    get_month_course_metrics_for_courses,
 )
 
 from tests.factories import (
+    CourseDailyMetricsFactory,
     CourseOverviewFactory,
     SiteFactory,
+    StudentModuleFactory,
     UserFactory,
 )
 
@@ -104,3 +112,81 @@ def test_get_month_course_metrics(monkeypatch):
                                     month_for=expected_data['month_for'])
 
     assert data == expected_data
+
+
+def make_month_course_data(site, course_overview, progress):
+    """Creates CDM and StudentModule records in February 2020 and one
+    CDM and StudentModule record outside the month
+    """
+    course_id = str(course_overview.id)
+    for day, enrollment_count in [(1, 10), (15, 12), (29, 11)]:
+        CourseDailyMetricsFactory(site=site,
+                                  course_id=course_id,
+                                  date_for=datetime.date(2020, 2, day),
+                                  enrollment_count=enrollment_count,
+                                  num_learners_completed=day,
+                                  average_days_to_complete=day,
+                                  average_progress=progress)
+    CourseDailyMetricsFactory(site=site,
+                              course_id=course_id,
+                              date_for=datetime.date(2020, 3, 1),
+                              enrollment_count=100)
+    user = UserFactory()
+    for day in [3, 4]:
+        StudentModuleFactory(course_id=course_overview.id,
+                             student=user,
+                             modified=datetime.datetime(2020, 2, day, tzinfo=utc))
+    StudentModuleFactory(course_id=course_overview.id,
+                         modified=datetime.datetime(2020, 2, 5, tzinfo=utc))
+    StudentModuleFactory(course_id=course_overview.id,
+                         modified=datetime.datetime(2020, 3, 5, tzinfo=utc))
+
+
+@pytest.mark.django_db
+class TestGetMonthCourseMetricsForCourses(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.month_for = '2/2020'
+
+    def test_matches_per_course_metrics(self):
+        course_overviews = [CourseOverviewFactory() for _ in range(3)]
+        make_month_course_data(self.site, course_overviews[0], progress=0.25)
+        make_month_course_data(self.site, course_overviews[1], progress=0.5)
+        # The third course has no data for the month
+        course_ids = [str(co.id) for co in course_overviews]
+
+        data = get_month_course_metrics_for_courses(site=self.site,
+                                                    course_ids=course_ids,
+                                                    month_for=self.month_for)
+        expected = [get_month_course_metrics(site=self.site,
+                                             course_id=course_id,
+                                             month_for=self.month_for)
+                    for course_id in course_ids]
+        assert data == expected
+        assert data[0]['active_users'] == 2
+        assert data[0]['course_enrollments'] == 12
+        assert data[2]['active_users'] == 0
+
+    def test_query_count_independent_of_course_count(self):
+        course_overviews = [CourseOverviewFactory() for _ in range(5)]
+        for course_overview in course_overviews:
+            make_month_course_data(self.site, course_overview, progress=0.5)
+        query_counts = []
+        for num_courses in [1, 5]:
+            course_ids = [str(co.id) for co in course_overviews[:num_courses]]
+            with CaptureQueriesContext(connection) as ctx:
+                data = get_month_course_metrics_for_courses(site=self.site,
+                                                            course_ids=course_ids,
+                                                            month_for=self.month_for)
+            assert len(data) == num_courses
+            query_counts.append(len(ctx.captured_queries))
+        assert query_counts == [2, 2]
+
+    def test_no_courses(self):
+        with CaptureQueriesContext(connection) as ctx:
+            assert get_month_course_metrics_for_courses(site=self.site,
+                                                        course_ids=[],
+                                                        month_for=self.month_for) == []
+        assert not ctx.captured_queries
@@ -44,6 +44,8 @@ from dateutil.rrule import rrule, DAILY
 import pytest
 
 from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import utc
 
 from figures.metrics import (
@@ -53,6 +55,7 @@ from figures.metrics import (
     get_course_enrolled_users_for_time_period,
     get_course_num_learners_completed_for_time_period,
     get_monthly_site_metrics,
+    get_site_monthly_history,
     get_total_course_completions_for_time_period,
     get_total_enrollments_for_time_period,
     get_total_site_courses_for_time_period,
@@ -60,6 +63,8 @@ from figures.metrics import (
 
 )
 import figures.helpers
+import figures.metrics
+from figures.models import SiteMonthlyMetrics
 
 from figures.sites import get_organizations_for_site
 
@@ -70,6 +75,7 @@ from tests.factories import (
     OrganizationCourseFactory,
     SiteDailyMetricsFactory,
     SiteFactory,
+    SiteMonthlyMetricsFactory,
     StudentModuleFactory,
     UserFactory,
     )
@@ -239,6 +245,70 @@ class TestGetMonthlySiteMetrics(object):
         assert set(data.keys()) == self.expected_keys
 
 
+@pytest.mark.django_db
+class TestGetSiteMonthlyHistory(object):
+    """Tests reading site monthly history from stored `SiteMonthlyMetrics`
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.date_for = datetime.date(2020, 6, 15)
+        self.months = [datetime.date(2020, month, 1) for month in range(4, 7)]
+        for i, month_for in enumerate(self.months):
+            SiteMonthlyMetricsFactory(site=self.site,
+                                      month_for=month_for,
+                                      active_user_count=i,
+                                      registered_users=10 + i,
+                                      new_users=20 + i,
+                                      site_courses=30 + i,
+                                      course_enrollments=40 + i,
+                                      course_completions=50 + i)
+
+    def test_reads_stored_months(self):
+        with CaptureQueriesContext(connection) as ctx:
+            history = get_site_monthly_history(site=self.site,
+                                               date_for=self.date_for,
+                                               months_back=2,
+                                               fields=SiteMonthlyMetrics.METRIC_FIELDS)
+        assert len(ctx.captured_queries) == 1
+        assert history['registered_users'] == dict(
+            current_month=12,
+            history=[dict(period='2020/04', value=10),
+                     dict(period='2020/05', value=11),
+                     dict(period='2020/06', value=12)])
+        assert history['active_user_count']['current_month'] == 2
+        assert history['course_completions']['current_month'] == 52
+
+    def test_missing_months_are_calculated(self, monkeypatch):
+        SiteMonthlyMetrics.objects.filter(month_for=self.months[0]).update(new_users=None)
+        calls = []
+
+        def mock_new_users(site, start_date, end_date):
+            calls.append((start_date, end_date))
+            return 99
+
+        monkeypatch.setitem(figures.metrics.SITE_MONTH_METRICS_FUNCTIONS,
+                            'new_users', mock_new_users)
+        history = get_site_monthly_history(site=self.site,
+                                           date_for=self.date_for,
+                                           months_back=3,
+                                           fields=['new_users'])
+        assert [rec['value'] for rec in history['new_users']['history']] == [
+            99, 99, 21, 22]
+        assert calls == [(datetime.date(2020, 3, 1), datetime.date(2020, 3, 31)),
+                         (datetime.date(2020, 4, 1), datetime.date(2020, 4, 30))]
+
+    def test_monthly_site_metrics(self):
+        data = get_monthly_site_metrics(site=self.site,
+                                        date_for=self.date_for,
+                                        months_back=2)
+        assert data['monthly_active_users']['current_month'] == 2
+        assert data['total_site_users']['current_month'] == 12
+        assert data['total_site_courses']['current_month'] == 32
+        assert data['total_course_enrollments']['current_month'] == 42
+        assert data['total_course_completions']['current_month'] == 52
+
+
 @pytest.mark.django_db
 class TestGetMonthlyActiveUsers(object):
 
@@ -0,0 +1,114 @@
+"""Tests the CourseData model, the course totals it stores and their readers
+"""
+
+from __future__ import absolute_import
+import pytest
+
+from lms.djangoapps.grades.course_grade import create_chapter_grades
+
+from figures.course_structure import course_structure_cache
+from figures.models import CourseData, EnrollmentData
+from figures.progress import EnrollmentProgress, course_totals
+
+from tests.factories import (
+    CourseEnrollmentFactory,
+    SiteFactory,
+    StudentModuleFactory,
+)
+from tests.helpers import OPENEDX_RELEASE, GINKGO
+
+
+COURSE_ID = 'course-v1:StarFleetAcademy+SFA01+2161'
+
+
+def graded_sections():
+    return [section for chapter in create_chapter_grades().values()
+            for section in chapter['sections'] if section.all_total.possible > 0]
+
+
+def test_course_totals():
+    totals = course_totals(graded_sections())
+    assert totals['sections_possible'] == 2
+    assert totals['points_possible'] == 1.5
+    assert totals['structure_hash'] == course_totals(graded_sections())['structure_hash']
+    assert totals['structure_hash'] != course_totals(graded_sections()[:1])['structure_hash']
+
+
+@pytest.mark.django_db
+class TestCourseDataManager(object):
+
+    def test_update_totals(self):
+        obj = CourseData.objects.update_totals(course_id=COURSE_ID,
+                                               sections_possible=2,
+                                               points_possible=1.5,
+                                               structure_hash='a')
+        assert obj.sections_possible == 2
+        assert obj.points_possible == 1.5
+
+        # Same structure, so we keep the stored record
+        same = CourseData.objects.update_totals(course_id=COURSE_ID,
+                                                sections_possible=3,
+                                                points_possible=2.0,
+                                                structure_hash='a')
+        assert same.sections_possible == 2
+
+        updated = CourseData.objects.update_totals(course_id=COURSE_ID,
+                                                   sections_possible=3,
+                                                   points_possible=2.0,
+                                                   structure_hash='b')
+        assert CourseData.objects.count() == 1
+        assert updated.id == obj.id
+        assert CourseData.objects.get(id=obj.id).sections_possible == 3
+
+    def test_totals_cached_in_run(self, django_assert_num_queries):
+        CourseData.objects.update_totals(course_id=COURSE_ID,
+                                         sections_possible=2,
+                                         points_possible=1.5,
+                                         structure_hash='a')
+        with course_structure_cache():
+            with django_assert_num_queries(1):
+                for _ in range(3):
+                    CourseData.objects.update_totals(course_id=COURSE_ID,
+                                                     sections_possible=2,
+                                                     points_possible=1.5,
+                                                     structure_hash='a')
+                    assert CourseData.objects.for_course(COURSE_ID).sections_possible == 2
+
+
+@pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+@pytest.mark.django_db
+class TestSetEnrollmentDataCourseTotals(object):
+    """Tests `set_enrollment_data` for enrollments without LCGM records
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.ce = CourseEnrollmentFactory()
+
+    def test_not_started_uses_course_data(self, monkeypatch):
+        CourseData.objects.create(course_id=str(self.ce.course_id),
+                                  sections_possible=4,
+                                  points_possible=8.0,
+                                  structure_hash='a')
+
+        def fail(**_kwargs):
+            raise AssertionError('Should not read the grade')
+        monkeypatch.setattr('figures.models.EnrollmentProgress', fail)
+
+        obj, created = EnrollmentData.objects.set_enrollment_data(
+            site=self.site, user=self.ce.user, course_id=self.ce.course_id)
+        assert created
+        assert obj.sections_possible == 4
+        assert obj.points_possible == 8.0
+        assert obj.sections_worked == 0
+        assert obj.progress_percent == 0.0
+
+    def test_started_reads_grade_and_stores_course_data(self):
+        StudentModuleFactory(student=self.ce.user, course_id=self.ce.course_id)
+        obj, _ = EnrollmentData.objects.set_enrollment_data(
+            site=self.site, user=self.ce.user, course_id=self.ce.course_id)
+        course_data = CourseData.objects.get(course_id=str(self.ce.course_id))
+        assert course_data.sections_possible == obj.sections_possible
+        assert course_data.points_possible == obj.points_possible
+        assert course_data.structure_hash == EnrollmentProgress(
+            user=self.ce.user, course_id=self.ce.course_id).course_totals()['structure_hash']
@@ -5,6 +5,8 @@ import datetime
 import pytest
 
 from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.db.models.query import QuerySet
 from figures.helpers import as_date
 from figures.models import LearnerCourseGradeMetrics
@@ -110,6 +112,93 @@ def test_latest_lcgm_with_empty_table(db):
     assert not obj
 
 
+@pytest.mark.django_db
+def test_most_recent_for_course(db):
+    """Make sure we get only the newest record for each learner in the course
+    """
+    course_overview = CourseOverviewFactory()
+    course_id = str(course_overview.id)
+    users = [UserFactory() for i in range(2)]
+    expected = []
+    for user in users:
+        LearnerCourseGradeMetricsFactory(user=user,
+                                         course_id=course_id,
+                                         date_for=as_date('2020-02-02'))
+        expected.append(LearnerCourseGradeMetricsFactory(
+            user=user,
+            course_id=course_id,
+            date_for=as_date('2020-04-01')))
+    # Newer record for another course should not be returned
+    LearnerCourseGradeMetricsFactory(user=users[0], date_for=as_date('2020-05-01'))
+
+    recs = list(LearnerCourseGradeMetrics.objects.most_recent_for_course(
+        course_overview.id))
+    assert set(recs) == set(expected)
+
+
+@pytest.mark.django_db
+def test_latest_lcgms(db):
+    """Make sure we get the newest record for each requested enrollment in
+    one query
+    """
+    course_ids = [str(CourseOverviewFactory().id) for i in range(2)]
+    users = [UserFactory() for i in range(2)]
+    expected = {}
+    for user in users:
+        for course_id in course_ids:
+            LearnerCourseGradeMetricsFactory(user=user,
+                                             course_id=course_id,
+                                             date_for=as_date('2020-02-02'))
+            expected[(user.id, course_id)] = LearnerCourseGradeMetricsFactory(
+                user=user,
+                course_id=course_id,
+                date_for=as_date('2020-04-01'))
+    # Not requested. Same user and course as requested pairs
+    del expected[(users[1].id, course_ids[0])]
+    no_records_user = UserFactory()
+    pairs = list(expected.keys()) + [(no_records_user.id, course_ids[0])]
+
+    with CaptureQueriesContext(connection) as ctx:
+        recs = LearnerCourseGradeMetrics.objects.latest_lcgms(pairs)
+    assert len(ctx.captured_queries) == 1
+    assert recs == expected
+    for (user_id, course_id), rec in recs.items():
+        assert rec == LearnerCourseGradeMetrics.objects.latest_lcgm(
+            user=rec.user, course_id=course_id)
+
+
+@pytest.mark.django_db
+def test_latest_lcgms_chunks(monkeypatch):
+    """Large requests are split so each query stays under the parameter limit
+    """
+    monkeypatch.setattr(LearnerCourseGradeMetrics.objects.__class__,
+                        'LATEST_LCGMS_MAX_PARAMS', 3)
+    course_ids = [str(CourseOverviewFactory().id) for i in range(2)]
+    expected = {}
+    for course_id in course_ids:
+        for user in [UserFactory() for i in range(3)]:
+            expected[(user.id, course_id)] = LearnerCourseGradeMetricsFactory(
+                user=user,
+                course_id=course_id,
+                date_for=as_date('2020-04-01'))
+
+    chunks = list(LearnerCourseGradeMetrics.objects._latest_lcgms_chunks(set(expected)))
+    for chunk in chunks:
+        assert len(set(pair[0] for pair in chunk)) + len(set(pair[1] for pair in chunk)) <= 3
+    assert sorted(pair for chunk in chunks for pair in chunk) == sorted(expected)
+
+    with CaptureQueriesContext(connection) as ctx:
+        recs = LearnerCourseGradeMetrics.objects.latest_lcgms(expected.keys())
+    assert len(ctx.captured_queries) == len(chunks) > 1
+    assert recs == expected
+
+
+def test_latest_lcgms_no_pairs(db):
+    with CaptureQueriesContext(connection) as ctx:
+        assert LearnerCourseGradeMetrics.objects.latest_lcgms([]) == {}
+    assert not ctx.captured_queries
+
+
 @pytest.mark.django_db
 class TestLearnerCourseGradeMetricsManager(object):
     """Test the Manager methods
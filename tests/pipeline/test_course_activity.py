@@ -0,0 +1,100 @@
+"""Tests figures.pipeline.course_activity module
+"""
+from __future__ import absolute_import
+import datetime
+
+import pytest
+from django.utils.timezone import utc
+
+from figures.models import CourseDailyMetrics
+from figures.pipeline.course_activity import (
+    carry_forward_inactive_courses,
+    course_last_activity,
+)
+
+from tests.factories import (
+    CourseDailyMetricsFactory,
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    GeneratedCertificateFactory,
+    SiteFactory,
+    StudentModuleFactory,
+)
+
+
+# A Wednesday, so not the default full refresh day
+DATE_FOR = datetime.date(2020, 6, 3)
+
+
+def as_utc(*args):
+    return datetime.datetime(*args).replace(tzinfo=utc)
+
+
+@pytest.mark.django_db
+class TestCarryForwardInactiveCourses(object):
+    """Tests carrying forward the CDM records of courses with no activity
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES=True,
+                                 FIGURES_DAILY_METRICS_FULL_REFRESH_WEEKDAY=6)
+        self.site = SiteFactory()
+        self.course_overviews = [CourseOverviewFactory() for _ in range(3)]
+        self.course_ids = [str(co.id) for co in self.course_overviews]
+        for co in self.course_overviews:
+            CourseEnrollmentFactory(course_id=co.id, created=as_utc(2020, 1, 1))
+            CourseDailyMetricsFactory(site=self.site,
+                                      course_id=str(co.id),
+                                      date_for=datetime.date(2020, 6, 1),
+                                      enrollment_count=5,
+                                      active_learners_today=2,
+                                      average_progress='0.50',
+                                      average_days_to_complete=10,
+                                      num_learners_completed=1)
+        # Activity after the previous records
+        StudentModuleFactory(course_id=self.course_overviews[1].id,
+                             created=as_utc(2020, 6, 2, 12),
+                             modified=as_utc(2020, 6, 2, 12))
+        GeneratedCertificateFactory(course_id=self.course_overviews[2].id,
+                                    created_date=as_utc(2020, 6, 2))
+
+    def test_course_last_activity(self):
+        last_activity = course_last_activity(self.course_ids)
+        assert last_activity == {
+            self.course_ids[0]: as_utc(2020, 1, 1),
+            self.course_ids[1]: as_utc(2020, 6, 2, 12),
+            self.course_ids[2]: as_utc(2020, 6, 2),
+        }
+        last_activity = course_last_activity(self.course_ids, since=as_utc(2020, 6, 2))
+        assert last_activity == {
+            self.course_ids[1]: as_utc(2020, 6, 2, 12),
+            self.course_ids[2]: as_utc(2020, 6, 2),
+        }
+
+    def test_carry_forward(self):
+        inactive = carry_forward_inactive_courses(self.course_ids, date_for=DATE_FOR)
+        assert inactive == set([self.course_ids[0]])
+        cdm = CourseDailyMetrics.objects.get(date_for=DATE_FOR)
+        assert cdm.course_id == self.course_ids[0]
+        assert cdm.site == self.site
+        assert (cdm.enrollment_count, cdm.active_learners_today,
+                float(cdm.average_progress), cdm.average_days_to_complete,
+                cdm.num_learners_completed) == (5, 0, 0.5, 10, 1)
+
+        # Rerunning keeps the existing record
+        assert carry_forward_inactive_courses(self.course_ids, date_for=DATE_FOR) == inactive
+        assert CourseDailyMetrics.objects.filter(date_for=DATE_FOR).count() == 1
+
+    @pytest.mark.parametrize('features, date_for, force_update', [
+        (dict(FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES=False), DATE_FOR, False),
+        (dict(), datetime.date(2020, 6, 7), False),
+        (dict(FIGURES_DAILY_METRICS_FULL_REFRESH_WEEKDAY=2), DATE_FOR, False),
+        (dict(), DATE_FOR, True),
+    ])
+    def test_no_skipping(self, settings, features, date_for, force_update):
+        settings.FEATURES = dict(settings.FEATURES, **features)
+        assert carry_forward_inactive_courses(self.course_ids,
+                                              date_for=date_for,
+                                              force_update=force_update) == set()
+        assert not CourseDailyMetrics.objects.filter(date_for=date_for).exists()
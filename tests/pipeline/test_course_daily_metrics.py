@@ -5,13 +5,19 @@ TODO: Update this test module to test multisite environments
 
 from __future__ import absolute_import
 import datetime
+import os
+import time
 import mock
 import pytest
 
+from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied, ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import utc
 
-from figures.compat import CourseAccessRole, CourseEnrollment
-from figures.helpers import as_datetime, next_day, prev_day
+from figures.compat import CourseAccessRole, CourseEnrollment, GeneratedCertificate
+from figures.helpers import as_course_key, as_datetime, next_day, prev_day
 from figures.models import CourseDailyMetrics, PipelineError
 from figures.pipeline import course_daily_metrics as pipeline_cdm
 import figures.sites
@@ -84,12 +90,17 @@ class TestCourseDailyMetricsPipelineFunctions(object):
     def setup(self, db):
         self.today = datetime.date(2018, 6, 1)
         self.course_overview = CourseOverviewFactory()
+        # Pin the enrollment dates so the certificates are created before
+        # `self.today` no matter how many enrollments other tests created
+        enrolled = datetime.datetime(2018, 1, 1, tzinfo=utc)
         if OPENEDX_RELEASE == GINKGO:
             self.course_enrollments = [CourseEnrollmentFactory(
-                course_id=self.course_overview.id) for i in range(4)]
+                course_id=self.course_overview.id,
+                created=enrolled + datetime.timedelta(days=i)) for i in range(4)]
         else:
             self.course_enrollments = [CourseEnrollmentFactory(
-                course=self.course_overview) for i in range(4)]
+                course=self.course_overview,
+                created=enrolled + datetime.timedelta(days=i)) for i in range(4)]
 
         if organizations_support_sites():
             self.my_site = SiteFactory(domain='my-site.test')
@@ -148,6 +159,50 @@ class TestCourseDailyMetricsPipelineFunctions(object):
             course_id=str(self.course_overview.id), date_for=self.today)
         assert learners.count() == expected_count
 
+        staff_user_ids = set(role.user_id for role in self.course_access_roles)
+        learners = pipeline_cdm.get_enrolled_in_exclude_admins(
+            course_id=self.course_overview.id,
+            date_for=self.today,
+            staff_user_ids=staff_user_ids)
+        assert learners.count() == expected_count
+
+    def test_get_course_staff_user_ids(self):
+        other_course = CourseOverviewFactory()
+        # Roles other than the staff roles don't exclude the user
+        CourseAccessRoleFactory(course_id=self.course_overview.id, role='beta_testers')
+        course_ids = [str(self.course_overview.id), str(other_course.id)]
+        assert pipeline_cdm.get_course_staff_user_ids(course_ids) == {
+            str(self.course_overview.id): set(
+                role.user_id for role in self.course_access_roles),
+            str(other_course.id): set(),
+        }
+
+    def test_get_enrollment_counts_exclude_admins(self):
+        other_course = CourseOverviewFactory()
+        CourseEnrollmentFactory(course_id=other_course.id,
+                                created=datetime.datetime(2018, 1, 1, tzinfo=utc))
+        # The staff user of our course is a learner in the other course
+        CourseEnrollmentFactory(course_id=other_course.id,
+                                user=self.course_access_roles[0].user,
+                                created=datetime.datetime(2018, 1, 1, tzinfo=utc))
+        # Enrolled after the date we count for
+        CourseEnrollmentFactory(course_id=other_course.id,
+                                created=datetime.datetime(2018, 7, 1, tzinfo=utc))
+        empty_course = CourseOverviewFactory()
+        course_ids = [str(self.course_overview.id),
+                      str(other_course.id),
+                      str(empty_course.id)]
+
+        counts = pipeline_cdm.get_enrollment_counts_exclude_admins(course_ids,
+                                                                   date_for=self.today)
+        assert counts == {
+            course_id: pipeline_cdm.get_enrolled_in_exclude_admins(
+                course_id=course_id, date_for=self.today).count()
+            for course_id in course_ids}
+        assert counts == {str(self.course_overview.id): 1,
+                          str(other_course.id): 2,
+                          str(empty_course.id): 0}
+
     def test_get_active_learner_ids_today(self):
         """
 
@@ -223,6 +278,117 @@ class TestCourseDailyMetricsPipelineFunctions(object):
         assert actual == len(self.generated_certificates)
 
 
+@pytest.mark.django_db
+class TestGetDaysToComplete(object):
+    """Tests `get_days_to_complete` gets its data in one query
+
+    The 100k benchmark takes a while to set up, so it only runs when the
+    ``FIGURES_BENCHMARK`` environment variable is set
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.date_for = datetime.date(2018, 6, 1)
+        self.course_overview = CourseOverviewFactory()
+        self.enrolled = datetime.datetime(2018, 1, 1, tzinfo=utc)
+
+    def bulk_create_completions(self, count):
+        """Create `count` learners each with an enrollment and a certificate
+
+        Learner `i` completes in `i % 100` days. We bulk create the records so
+        that we can build large data sets quickly
+        """
+        user_model = get_user_model()
+        user_model.objects.bulk_create([
+            user_model(username='bench{}'.format(i), email='bench{}@example.com'.format(i))
+            for i in range(count)])
+        user_ids = user_model.objects.filter(
+            username__startswith='bench').order_by('id').values_list('id', flat=True)
+        CourseEnrollment.objects.bulk_create([
+            CourseEnrollment(user_id=user_id,
+                             course_id=self.course_overview.id,
+                             created=self.enrolled)
+            for user_id in user_ids])
+        GeneratedCertificate.objects.bulk_create([
+            GeneratedCertificate(user_id=user_id,
+                                 course_id=self.course_overview.id,
+                                 created_date=self.enrolled + datetime.timedelta(days=i % 100))
+            for i, user_id in enumerate(user_ids)])
+        return [i % 100 for i in range(count)]
+
+    def test_ignores_other_courses(self):
+        """Make sure we use the enrollment for the certificate's course
+        """
+        ce = CourseEnrollmentFactory(course_id=self.course_overview.id,
+                                     created=self.enrolled)
+        GeneratedCertificateFactory(user=ce.user,
+                                    course_id=self.course_overview.id,
+                                    created_date=self.enrolled + datetime.timedelta(days=5))
+        # Same learner, other course
+        other_ce = CourseEnrollmentFactory(user=ce.user,
+                                           created=self.enrolled - datetime.timedelta(days=50))
+        GeneratedCertificateFactory(user=ce.user,
+                                    course_id=other_ce.course_id,
+                                    created_date=self.enrolled)
+        # Certificate after date_for
+        late_ce = CourseEnrollmentFactory(course_id=self.course_overview.id,
+                                          created=self.enrolled)
+        GeneratedCertificateFactory(user=late_ce.user,
+                                    course_id=self.course_overview.id,
+                                    created_date=as_datetime(next_day(self.date_for)))
+        # Certificate without an enrollment
+        GeneratedCertificateFactory(course_id=self.course_overview.id,
+                                    created_date=self.enrolled)
+
+        actual = pipeline_cdm.get_days_to_complete(course_id=self.course_overview.id,
+                                                   date_for=self.date_for)
+        assert actual == dict(days=[5], errors=[])
+
+    def test_multiple_enrollments(self, monkeypatch):
+        """Make sure we report learners with more than one enrollment row
+
+        The LMS enforces one enrollment per learner and course, so we mock the
+        query results
+        """
+        cert_date = self.enrolled + datetime.timedelta(days=10)
+        rows = [
+            (1, cert_date, self.enrolled),
+            (1, cert_date, self.enrolled + datetime.timedelta(days=3)),
+            (1, cert_date, self.enrolled + datetime.timedelta(days=4)),
+            (2, cert_date, self.enrolled + datetime.timedelta(days=8)),
+        ]
+        mock_certs = mock.Mock()
+        mock_certs.objects.filter.return_value.order_by.return_value.values_list.return_value = rows
+        monkeypatch.setattr(pipeline_cdm, 'GeneratedCertificate', mock_certs)
+        actual = pipeline_cdm.get_days_to_complete(course_id=self.course_overview.id,
+                                                   date_for=self.date_for)
+        assert actual['days'] == [10, 2]
+        assert actual['errors'] == [dict(msg='Multiple CE records',
+                                         course_id=self.course_overview.id,
+                                         user_id=1)]
+
+    @pytest.mark.parametrize('cert_count', [
+        1000,
+        10000,
+        pytest.param(100000, marks=pytest.mark.skipif(
+            not os.environ.get('FIGURES_BENCHMARK'),
+            reason='Set FIGURES_BENCHMARK to run the 100k benchmark')),
+    ])
+    def test_benchmark(self, cert_count):
+        """We should make one query no matter how many certificates there are
+        """
+        expected_days = self.bulk_create_completions(cert_count)
+        start_time = time.time()
+        with CaptureQueriesContext(connection) as ctx:
+            actual = pipeline_cdm.get_days_to_complete(course_id=self.course_overview.id,
+                                                       date_for=self.date_for)
+        elapsed_time = time.time() - start_time
+        print('get_days_to_complete: {} certificates in {:.3f} seconds'.format(
+            cert_count, elapsed_time))
+        assert len(ctx.captured_queries) == 1
+        assert sorted(actual['days']) == sorted(expected_days)
+        assert actual['errors'] == []
+
+
 @pytest.mark.django_db
 class TestCourseDailyMetricsExtractor(object):
     """
@@ -268,6 +434,59 @@ class TestCourseDailyMetricsExtractor(object):
         assert not results['average_progress']
 
 
+@pytest.mark.django_db
+class TestSiteCourseDailyMetricsExtractor(object):
+    """Checks the site extractor gets the same data as the course extractor
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.date_for = datetime.date(2018, 6, 1)
+        enrolled = datetime.datetime(2018, 1, 1, tzinfo=utc)
+        self.course_overviews = [CourseOverviewFactory() for i in range(3)]
+        for i, co in enumerate(self.course_overviews[:2]):
+            enrollments = [CourseEnrollmentFactory(course_id=co.id, created=enrolled)
+                           for j in range(i + 2)]
+            CourseAccessRoleFactory(user=enrollments[0].user,
+                                    course_id=co.id,
+                                    role='staff')
+            for ce in enrollments[1:]:
+                # Two records for the learner on the day, counted once
+                for k in range(2):
+                    StudentModuleFactory(course_id=co.id,
+                                         student=ce.user,
+                                         modified=as_datetime(self.date_for))
+            GeneratedCertificateFactory(user=enrollments[-1].user,
+                                        course_id=co.id,
+                                        created_date=enrolled + datetime.timedelta(days=10))
+        self.course_ids = [str(co.id) for co in self.course_overviews]
+
+    def test_extract(self, monkeypatch):
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        with CaptureQueriesContext(connection) as site_queries:
+            results = pipeline_cdm.SiteCourseDailyMetricsExtractor().extract(
+                self.course_ids, self.date_for)
+        for course_id in self.course_ids:
+            expected = pipeline_cdm.CourseDailyMetricsExtractor().extract(
+                course_id, self.date_for)
+            del expected['average_progress']
+            del expected['average_days_to_complete']
+            assert results[course_id] == expected
+        assert [results[course_id]['enrollment_count']
+                for course_id in self.course_ids] == [1, 2, 0]
+        assert [results[course_id]['active_learners_today']
+                for course_id in self.course_ids] == [1, 2, 0]
+        assert [results[course_id]['num_learners_completed']
+                for course_id in self.course_ids] == [1, 1, 0]
+
+        # The counts don't grow with the number of courses
+        with CaptureQueriesContext(connection) as course_queries:
+            pipeline_cdm.SiteCourseDailyMetricsExtractor().extract(
+                self.course_ids[:1], self.date_for)
+        assert len(site_queries) == len(course_queries)
+
+
 @pytest.mark.django_db
 class TestCourseDailyMetricsLoader(object):
     """Provides minimal checking that CourseDailyMetricsLoader works
@@ -338,3 +557,73 @@ class TestCourseDailyMetricsLoader(object):
     @pytest.mark.skip('Implement me!')
     def test_load_force_update(self):
         pass
+
+
+@pytest.mark.django_db
+class TestLoadSiteCourseDailyMetrics(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.date_for = datetime.date(2018, 6, 1)
+        self.course_overviews = [CourseOverviewFactory() for i in range(3)]
+        self.course_ids = [str(co.id) for co in self.course_overviews]
+        for course_id in self.course_ids:
+            CourseEnrollmentFactory(course_id=as_course_key(course_id),
+                                    created=datetime.datetime(2018, 1, 1, tzinfo=utc))
+
+    def test_load(self, monkeypatch):
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        results = pipeline_cdm.load_site_course_daily_metrics(self.course_ids,
+                                                              date_for=self.date_for)
+        assert results == dict(loaded=self.course_ids, failed={})
+        cdms = CourseDailyMetrics.objects.filter(date_for=self.date_for)
+        assert set(cdms.values_list('course_id', 'enrollment_count')) == set(
+            (course_id, 1) for course_id in self.course_ids)
+
+        # Existing records are only updated when forced
+        results = pipeline_cdm.load_site_course_daily_metrics(self.course_ids,
+                                                              date_for=self.date_for)
+        assert results == dict(loaded=[], failed={})
+        results = pipeline_cdm.load_site_course_daily_metrics(self.course_ids,
+                                                              date_for=self.date_for,
+                                                              force_update=True)
+        assert results == dict(loaded=self.course_ids, failed={})
+        assert cdms.count() == len(self.course_ids)
+
+    def test_load_invalid_data(self, monkeypatch):
+        bad_course_id = self.course_ids[1]
+
+        def mock_bulk(course_id, **_kwargs):
+            return dict(average_progress=2.0 if str(course_id) == bad_course_id else 0.5)
+
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            mock_bulk)
+        results = pipeline_cdm.load_site_course_daily_metrics(self.course_ids,
+                                                              date_for=self.date_for)
+        assert results['loaded'] == [self.course_ids[0], self.course_ids[2]]
+        assert list(results['failed'].keys()) == [bad_course_id]
+        assert isinstance(results['failed'][bad_course_id], ValidationError)
+        assert not CourseDailyMetrics.objects.filter(course_id=bad_course_id).exists()
+
+    def test_load_days_to_complete_error(self, monkeypatch):
+        bad_course_id = self.course_ids[0]
+        get_average_days_to_complete = pipeline_cdm.get_average_days_to_complete
+
+        def mock_get_average_days_to_complete(course_id, date_for):
+            if str(course_id) == bad_course_id:
+                raise Exception('fail')
+            return get_average_days_to_complete(course_id, date_for)
+
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'bulk_calculate_course_progress_data',
+                            lambda **_kwargs: dict(average_progress=0.5))
+        monkeypatch.setattr(figures.pipeline.course_daily_metrics,
+                            'get_average_days_to_complete',
+                            mock_get_average_days_to_complete)
+        results = pipeline_cdm.load_site_course_daily_metrics(self.course_ids,
+                                                              date_for=self.date_for)
+        assert results['loaded'] == self.course_ids[1:]
+        assert list(results['failed'].keys()) == [bad_course_id]
@@ -11,6 +11,12 @@ from mock import Mock
 
 from factory import fuzzy
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from figures.compat import StudentModule
+from figures.mau import store_mau_metrics
+from figures.models import CourseMauMetrics, DailyActiveUsers, SiteMauMetrics
 from figures.pipeline.mau_pipeline import (
     get_all_mau_for_site_course,
     calculate_course_mau,
@@ -193,3 +199,96 @@ class TestLoadMauData(object):
         assert obj
         assert created
         assert obj.mau == mau_data['mau']
+
+
+@pytest.mark.django_db
+class TestStoreSiteMau(object):
+    """
+    Test storing the MAU for all courses in the site at once
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, simple_mau_test_data):
+        self.data = simple_mau_test_data
+        self.site = simple_mau_test_data['our_site']
+        self.month_for = simple_mau_test_data['month_for']
+        # The fixture gives these random dates. Keep them out of our month
+        not_this_month = datetime(2019, 6, 1, tzinfo=fuzzy.compat.UTC)
+        StudentModule.objects.filter(
+            id__in=[rec.id for rec in self.data['our_other_course_sm']]).update(
+                created=not_this_month, modified=not_this_month)
+
+    def saved_course_mau(self):
+        return dict(CourseMauMetrics.objects.filter(
+            site=self.site, date_for=self.month_for).values_list('course_id', 'mau'))
+
+    def test_course_mau_matches_course_collector(self):
+        store_mau_metrics(site=self.site, month_for=self.month_for)
+        course_mau = self.saved_course_mau()
+        for course_id, mau in course_mau.items():
+            obj, _created = collect_course_mau(site=self.site,
+                                               courselike=course_id,
+                                               month_for=self.month_for,
+                                               overwrite=True)
+            assert mau == obj.mau
+        our_course_id = str(self.data['our_course'].id)
+        assert course_mau[our_course_id] == len(self.data['expected_mau_ids'])
+        # Not active this month
+        assert course_mau[str(self.data['our_other_course'].id)] == 0
+
+    def test_store(self):
+        results = store_mau_metrics(site=self.site, month_for=self.month_for)
+        assert results['smo'].mau == len(self.data['expected_mau_ids'])
+        assert SiteMauMetrics.objects.filter(site=self.site).count() == 1
+        assert len(results['cmos']) == len(self.saved_course_mau())
+
+    def test_reads_stored_days(self):
+        """Stored days are read from the daily active user store, not StudentModule
+        """
+        our_course_id = str(self.data['our_course'].id)
+        stored_ids = [1000001, 1000002]
+        for day in range(1, 32):
+            DailyActiveUsers.build(site=self.site,
+                                   date_for=date(2020, 1, day),
+                                   user_ids=stored_ids if day == 10 else []).save()
+        DailyActiveUsers.build(site=self.site,
+                               date_for=date(2020, 1, 10),
+                               course_id=our_course_id,
+                               user_ids=stored_ids).save()
+        results = store_mau_metrics(site=self.site, month_for=self.month_for)
+        assert results['smo'].mau == len(stored_ids)
+        assert self.saved_course_mau()[our_course_id] == len(stored_ids)
+
+    def test_approximate(self, monkeypatch):
+        monkeypatch.setattr('figures.active_users.use_approximate_mau', lambda site: True)
+        results = store_mau_metrics(site=self.site, month_for=self.month_for)
+        # The sketch is exact for small counts
+        assert results['smo'].mau == len(self.data['expected_mau_ids'])
+        our_course_id = str(self.data['our_course'].id)
+        assert self.saved_course_mau()[our_course_id] == len(self.data['expected_mau_ids'])
+
+    def test_query_count_does_not_grow_with_courses(self):
+        store_mau_metrics(site=self.site, month_for=self.month_for)
+        with CaptureQueriesContext(connection) as ctx:
+            store_mau_metrics(site=self.site, month_for=self.month_for, overwrite=True)
+        num_queries = len(ctx.captured_queries)
+        for _ in range(5):
+            StudentModuleFactory(course_id=CourseOverviewFactory().id,
+                                 modified=datetime(2020, 1, 10, tzinfo=fuzzy.compat.UTC))
+        with CaptureQueriesContext(connection) as ctx:
+            store_mau_metrics(site=self.site, month_for=self.month_for, overwrite=True)
+        assert len(ctx.captured_queries) == num_queries
+
+    def test_overwrite(self):
+        our_course_id = str(self.data['our_course'].id)
+        store_mau_metrics(site=self.site, month_for=self.month_for)
+        CourseMauMetrics.objects.filter(course_id=our_course_id).update(mau=42)
+
+        store_mau_metrics(site=self.site, month_for=self.month_for)
+        assert CourseMauMetrics.objects.get(course_id=our_course_id).mau == 42
+
+        results = store_mau_metrics(site=self.site, month_for=self.month_for,
+                                    overwrite=True)
+        obj = CourseMauMetrics.objects.get(course_id=our_course_id)
+        assert obj.mau == len(self.data['expected_mau_ids'])
+        assert CourseMauMetrics.objects.filter(course_id=our_course_id).count() == 1
+        assert len(results['cmos']) == CourseMauMetrics.objects.count()
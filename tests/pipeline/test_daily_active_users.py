@@ -0,0 +1,116 @@
+"""Tests storing the daily active user sets
+"""
+
+from __future__ import absolute_import
+import datetime
+
+import pytest
+
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import utc
+
+from figures.helpers import as_datetime
+from figures.hll import HyperLogLog
+from figures.models import DailyActiveUsers
+from figures.pipeline.daily_active_users import (
+    collect_daily_active_users,
+    extract_daily_active_users,
+)
+
+from tests.factories import (
+    CourseOverviewFactory,
+    StudentModuleFactory,
+    UserFactory,
+)
+from tests.helpers import organizations_support_sites
+
+
+@pytest.mark.skipif(organizations_support_sites(),
+                    reason='Standalone mode test data')
+@pytest.mark.django_db
+class TestCollectDailyActiveUsers(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES['FIGURES_IS_MULTISITE'] = False
+        self.date_for = datetime.date(2020, 3, 10)
+        self.site = Site.objects.first()
+        self.courses = [CourseOverviewFactory() for i in range(2)]
+        self.users = [UserFactory() for i in range(3)]
+        active_time = as_datetime(self.date_for) + datetime.timedelta(hours=5)
+        # users 0 and 1 in the first course, users 1 and 2 in the second
+        for course, users in zip(self.courses, [self.users[:2], self.users[1:]]):
+            for user in users:
+                StudentModuleFactory(student=user,
+                                     course_id=course.id,
+                                     modified=active_time)
+                # Second record for the same learner should not matter
+                StudentModuleFactory(student=user,
+                                     course_id=course.id,
+                                     modified=active_time)
+        # Activity on other days
+        StudentModuleFactory(course_id=self.courses[0].id,
+                             modified=as_datetime(self.date_for) - datetime.timedelta(seconds=1))
+        StudentModuleFactory(course_id=self.courses[0].id,
+                             modified=datetime.datetime(2020, 3, 11, tzinfo=utc))
+
+    def test_extract(self):
+        with CaptureQueriesContext(connection) as ctx:
+            data = extract_daily_active_users(self.site, self.date_for)
+        sm_queries = [query for query in ctx.captured_queries
+                      if 'courseware_studentmodule' in query['sql']]
+        assert len(sm_queries) == 1
+        assert data == {
+            str(self.courses[0].id): set(user.id for user in self.users[:2]),
+            str(self.courses[1].id): set(user.id for user in self.users[1:]),
+        }
+
+    def test_collect(self):
+        site_rec, created = collect_daily_active_users(self.site, self.date_for)
+        assert created
+        assert site_rec.course_id == DailyActiveUsers.SITE_COURSE_ID
+        assert site_rec.user_ids == sorted(user.id for user in self.users)
+        assert DailyActiveUsers.objects.count() == 3
+        course_rec = DailyActiveUsers.objects.get(course_id=str(self.courses[0].id))
+        assert course_rec.user_count == 2
+        assert course_rec.user_ids == sorted(user.id for user in self.users[:2])
+
+    def test_collect_without_sketch(self):
+        collect_daily_active_users(self.site, self.date_for)
+        assert not DailyActiveUsers.objects.exclude(sketch=None).exists()
+
+    def test_collect_sketch(self, settings):
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_APPROXIMATE_MAU_SITES=[self.site.domain])
+        site_rec, created = collect_daily_active_users(self.site, self.date_for)
+        site_sketch = HyperLogLog.from_bytes(site_rec.sketch)
+        assert site_sketch.precision == 14
+        assert site_sketch.count() == 3
+        course_rec = DailyActiveUsers.objects.get(course_id=str(self.courses[0].id))
+        assert HyperLogLog.from_bytes(course_rec.sketch).count() == 2
+
+    def test_collect_existing(self):
+        collect_daily_active_users(self.site, self.date_for)
+        StudentModuleFactory(course_id=self.courses[0].id,
+                             modified=as_datetime(self.date_for))
+        site_rec, created = collect_daily_active_users(self.site, self.date_for)
+        assert not created
+        assert site_rec.user_count == 3
+
+        site_rec, created = collect_daily_active_users(self.site, self.date_for,
+                                                       overwrite=True)
+        assert created
+        assert site_rec.user_count == 4
+        assert DailyActiveUsers.objects.count() == 3
+
+    def test_collect_no_activity(self):
+        """We store the site record so readers know the day was collected
+        """
+        date_for = datetime.date(2020, 3, 1)
+        site_rec, created = collect_daily_active_users(self.site, date_for)
+        assert created
+        assert site_rec.user_count == 0
+        assert site_rec.user_ids == []
+        assert DailyActiveUsers.objects.filter(date_for=date_for).count() == 1
@@ -5,6 +5,8 @@ from dateutil.relativedelta import relativedelta
 import mock
 import pytest
 
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import utc
 from figures.compat import CourseEnrollment, StudentModule
 
@@ -18,6 +20,7 @@ from figures.pipeline.enrollment_metrics import (
     _new_enrollment_metrics_record,
     _collect_progress_data,
 )
+import figures.pipeline.enrollment_metrics as pipeline_em
 from figures.sites import UnlinkedCourseError
 
 from tests.factories import (
@@ -37,41 +40,62 @@ if organizations_support_sites():
     from tests.factories import UserOrganizationMappingFactory
 
 
+def course_progress_data_by_enrollment(course_id, date_for):
+    """The original per-enrollment implementation of
+    `bulk_calculate_course_progress_data`
+
+    We keep it here to check the set based implementation gets the same results.
+    It reads the functions from the pipeline module so the tests can mock them
+    """
+    site = pipeline_em.get_site_for_course(course_id)
+    progress_percentages = []
+    for ce in pipeline_em.course_enrollments_for_course(course_id):
+        sm = pipeline_em.student_modules_for_course_enrollment(
+            site=site,
+            course_enrollment=ce).order_by('-modified')
+        if sm:
+            metrics = pipeline_em.collect_metrics_for_enrollment(site=site,
+                                                                 course_enrollment=ce,
+                                                                 date_for=date_for,
+                                                                 student_modules=sm)
+            if metrics:
+                progress_percentages.append(metrics.progress_percent)
+    return dict(average_progress=calculate_average_progress(progress_percentages))
+
+
 @pytest.mark.django_db
 def test_bulk_calculate_course_progress_data_happy_path(db, monkeypatch):
     """Tests 'bulk_calculate_course_progress_data' function
 
     The function under test iterates over a set of course enrollment records,
-    So we create a couple of records to iterate over and mock the collect
-    function
+    So we create a couple of records with up to date progress to iterate over
+    and mock the collect function
     """
     course_overview = CourseOverviewFactory()
     course_enrollments = [CourseEnrollmentFactory(
         course_id=course_overview.id) for i in range(2)]
-    mapping = {ce.course_id: LearnerCourseGradeMetricsFactory(
-        course_id=str(ce.course_id),
-        user=ce.user,
-        sections_worked=1,
-        sections_possible=2) for ce in course_enrollments
-    }
-    StudentModuleFactory()
-
-    def mock_metrics(course_enrollment, **_kwargs):
-        return mapping[course_enrollment.course_id]
+    for ce in course_enrollments:
+        StudentModuleFactory(student=ce.user,
+                             course_id=ce.course_id,
+                             modified=datetime(2018, 1, 1, tzinfo=utc))
+        LearnerCourseGradeMetricsFactory(course_id=str(ce.course_id),
+                                         user=ce.user,
+                                         sections_worked=1,
+                                         sections_possible=2)
+    mock_collect = mock.Mock()
 
     monkeypatch.setattr('figures.pipeline.enrollment_metrics.get_site_for_course',
                         lambda val: SiteFactory())
-    monkeypatch.setattr('figures.pipeline.enrollment_metrics.collect_metrics_for_enrollment',
-                        mock_metrics)
-
+    monkeypatch.setattr('figures.pipeline.enrollment_metrics._collect_progress_data',
+                        mock_collect)
     monkeypatch.setattr('figures.pipeline.enrollment_metrics.course_enrollments_for_course',
                         lambda val: CourseEnrollment.objects.all())
-    # monkeypatch.setattr('figures.pipeline.enrollment_metrics.student_modules_for_course_enrollment',
-    #                     mock_get_student_modules)
-    monkeypatch.setattr('figures.pipeline.enrollment_metrics.student_modules_for_course_enrollment',
-                        lambda **_kwargs: StudentModule.objects.all())
+    monkeypatch.setattr(
+        'figures.pipeline.enrollment_metrics.student_modules_for_course_enrollments',
+        lambda **_kwargs: StudentModule.objects.all())
     data = bulk_calculate_course_progress_data(course_overview.id)
     assert data['average_progress'] == 0.5
+    assert not mock_collect.called
 
 
 @pytest.mark.skipif(not is_multisite(),
@@ -116,6 +140,99 @@ def test_bulk_calculate_course_progress_no_enrollments(db, monkeypatch):
     assert data['average_progress'] == 0.0
 
 
+@pytest.mark.django_db
+class TestBulkCalculateCourseProgressData(object):
+    """Tests the set based 'bulk_calculate_course_progress_data' function
+
+    We check that it returns the same average progress as the per-enrollment
+    implementation and that the query count does not grow with enrollments
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch):
+        self.site = SiteFactory()
+        self.course_overview = CourseOverviewFactory()
+        self.sm_modified = datetime(2020, 2, 2, tzinfo=utc)
+        self.date_for = date(2020, 3, 1)
+        self.progress_data = dict(points_possible=100,
+                                  points_earned=25,
+                                  sections_worked=1,
+                                  count=4)
+        self.collected = []
+        self.stored_course_totals = []
+
+        def mock_collect(student_module, store_course_totals=True):
+            self.collected.append(student_module.student_id)
+            self.stored_course_totals.append(store_course_totals)
+            return self.progress_data
+
+        monkeypatch.setattr('figures.pipeline.enrollment_metrics.get_site_for_course',
+                            lambda val: self.site)
+        monkeypatch.setattr('figures.pipeline.enrollment_metrics._collect_progress_data',
+                            mock_collect)
+
+    def make_enrollment(self, lcgm_date_for=None, with_sm=True):
+        ce = CourseEnrollmentFactory(course_id=self.course_overview.id)
+        if with_sm:
+            StudentModuleFactory(student=ce.user,
+                                 course_id=ce.course_id,
+                                 modified=self.sm_modified)
+        if lcgm_date_for:
+            LearnerCourseGradeMetricsFactory(site=self.site,
+                                             user=ce.user,
+                                             course_id=str(ce.course_id),
+                                             date_for=lcgm_date_for,
+                                             sections_worked=1,
+                                             sections_possible=2)
+        return ce
+
+    def test_mixed_enrollments(self):
+        up_to_date = self.make_enrollment(lcgm_date_for=self.sm_modified.date())
+        stale = self.make_enrollment(
+            lcgm_date_for=self.sm_modified.date() - relativedelta(days=1))
+        no_lcgm = self.make_enrollment()
+        self.make_enrollment(with_sm=False)
+        # StudentModule record for a learner not enrolled in the course
+        StudentModuleFactory(course_id=self.course_overview.id)
+
+        data = bulk_calculate_course_progress_data(self.course_overview.id,
+                                                   date_for=self.date_for)
+
+        # (0.5 + 0.25 + 0.25) / 3
+        assert data['average_progress'] == 0.33
+        assert set(self.collected) == set([stale.user_id, no_lcgm.user_id])
+        # The course totals are stored from the first grade read only
+        assert self.stored_course_totals == [True, False]
+        assert not LearnerCourseGradeMetrics.objects.filter(
+            user=up_to_date.user, date_for=self.date_for).exists()
+        assert LearnerCourseGradeMetrics.objects.filter(
+            date_for=self.date_for).count() == 2
+
+    def test_matches_by_enrollment(self):
+        for i in range(3):
+            self.make_enrollment(lcgm_date_for=self.sm_modified.date())
+        self.make_enrollment(with_sm=False)
+        set_based = bulk_calculate_course_progress_data(self.course_overview.id,
+                                                        date_for=self.date_for)
+        by_enrollment = course_progress_data_by_enrollment(
+            self.course_overview.id, date_for=self.date_for)
+        assert set_based == by_enrollment
+        assert not self.collected
+
+    @pytest.mark.parametrize('num_enrollments', [2, 10, 40])
+    def test_benchmark_query_count_is_constant(self, num_enrollments):
+        """The query count should not change as enrollments grow
+
+        All enrollments are up to date, so no progress is collected
+        """
+        for i in range(num_enrollments):
+            self.make_enrollment(lcgm_date_for=self.sm_modified.date())
+        with CaptureQueriesContext(connection) as ctx:
+            data = bulk_calculate_course_progress_data(self.course_overview.id,
+                                                       date_for=self.date_for)
+        assert data['average_progress'] == 0.5
+        assert len(ctx.captured_queries) == 3
+
+
 @pytest.mark.parametrize('progress_percentages, expected_result', [
     (None, 0.0),
     ([], 0.0),
@@ -0,0 +1,145 @@
+"""Tests updating EnrollmentData for recently active enrollments
+"""
+
+from __future__ import absolute_import
+from datetime import timedelta
+
+import pytest
+from django.contrib.sites.models import Site
+from django.utils.timezone import now
+
+from figures.models import EnrollmentData, PipelineWatermark
+from figures.pipeline.recent_enrollment_data import (
+    micro_batch_lock,
+    update_recent_enrollment_data,
+)
+import figures.tasks
+
+from tests.factories import (
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    LearnerCourseGradeMetricsFactory,
+    StudentModuleFactory,
+)
+from tests.helpers import OPENEDX_RELEASE, GINKGO
+
+
+@pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+@pytest.mark.django_db
+class TestUpdateRecentEnrollmentData(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+        self.started = now()
+        self.course_overview = CourseOverviewFactory()
+        self.enrollments = [CourseEnrollmentFactory(course=self.course_overview)
+                            for _ in range(3)]
+        PipelineWatermark.objects.create(site=self.site,
+                                         name=PipelineWatermark.ENROLLMENT_DATA,
+                                         value=self.started - timedelta(hours=1))
+
+    def add_activity(self, ce, minutes_ago):
+        return StudentModuleFactory(student=ce.user,
+                                    course_id=ce.course_id,
+                                    modified=self.started - timedelta(minutes=minutes_ago))
+
+    def test_updates_changed_enrollments(self):
+        # Before the watermark
+        self.add_activity(self.enrollments[0], minutes_ago=120)
+        self.add_activity(self.enrollments[1], minutes_ago=10)
+        self.add_activity(self.enrollments[2], minutes_ago=20)
+        lcgm = LearnerCourseGradeMetricsFactory(site=self.site,
+                                                user=self.enrollments[1].user,
+                                                course_id=str(self.course_overview.id),
+                                                sections_worked=0,
+                                                sections_possible=10)
+
+        results = update_recent_enrollment_data(self.site)
+        assert results['processed'] == 2
+        assert results['updated'] == 2
+        assert not results['errors']
+        assert set(EnrollmentData.objects.values_list('user_id', flat=True)) == set(
+            [self.enrollments[1].user_id, self.enrollments[2].user_id])
+        # We read the grade instead of using the daily LCGM record
+        ed = EnrollmentData.objects.get(user=self.enrollments[1].user)
+        assert ed.sections_possible != lcgm.sections_possible
+
+        watermark = PipelineWatermark.objects.get(site=self.site)
+        assert watermark.value == results['watermark']
+        assert update_recent_enrollment_data(self.site)['processed'] == 0
+
+    def test_limit_continues_next_run(self):
+        for i, ce in enumerate(self.enrollments):
+            self.add_activity(ce, minutes_ago=30 - i)
+        results = update_recent_enrollment_data(self.site, batch_size=1, limit=2)
+        assert results['processed'] == 2
+        assert results['watermark'] == self.started - timedelta(minutes=29)
+        assert not EnrollmentData.objects.filter(user=self.enrollments[2].user).exists()
+
+        results = update_recent_enrollment_data(self.site, limit=2)
+        assert results['processed'] == 1
+        assert EnrollmentData.objects.filter(user=self.enrollments[2].user).exists()
+
+    def test_limit_with_shared_change_time(self):
+        for ce in self.enrollments:
+            self.add_activity(ce, minutes_ago=30)
+        results = update_recent_enrollment_data(self.site, limit=2)
+        # We don't leave any enrollment behind the watermark
+        assert results['processed'] == 3
+        assert results['watermark'] == self.started - timedelta(minutes=30)
+        assert EnrollmentData.objects.count() == 3
+
+    def test_failed_enrollment_does_not_stop_run(self, monkeypatch):
+        for ce in self.enrollments:
+            self.add_activity(ce, minutes_ago=10)
+        failing_user = self.enrollments[0].user
+        set_enrollment_data = EnrollmentData.objects.set_enrollment_data
+
+        def mock_set_enrollment_data(**kwargs):
+            if kwargs['user'] == failing_user:
+                raise Exception('grade read failed')
+            return set_enrollment_data(**kwargs)
+
+        monkeypatch.setattr(EnrollmentData.objects, 'set_enrollment_data',
+                            mock_set_enrollment_data)
+        results = update_recent_enrollment_data(self.site)
+        assert results['updated'] == 2
+        assert len(results['errors']) == 1
+        assert str(failing_user.id) in results['errors'][0]
+
+    def test_first_run_starts_today(self):
+        PipelineWatermark.objects.all().delete()
+        self.add_activity(self.enrollments[0], minutes_ago=60 * 24 * 2)
+        results = update_recent_enrollment_data(self.site)
+        assert results['processed'] == 0
+        assert PipelineWatermark.objects.filter(site=self.site).exists()
+
+
+@pytest.mark.parametrize('updated, bumped', [(0, False), (2, True)])
+def test_update_recent_enrollment_data_for_site(transactional_db, monkeypatch,
+                                                updated, bumped):
+    site = Site.objects.first()
+    bumps = []
+    monkeypatch.setattr(
+        'figures.tasks.update_recent_enrollment_data',
+        lambda site: dict(processed=updated, updated=updated, errors=[], watermark=now()))
+    monkeypatch.setattr('figures.tasks.bump_data_version', lambda site: bumps.append(site))
+    figures.tasks.update_recent_enrollment_data_for_site(site_id=site.id)
+    assert bool(bumps) == bumped
+
+
+def test_update_recent_enrollment_data_for_site_locked(transactional_db, monkeypatch):
+    site = Site.objects.first()
+    calls = []
+    monkeypatch.setattr(
+        'figures.tasks.update_recent_enrollment_data',
+        lambda site: calls.append(site) or dict(
+            processed=0, updated=0, errors=[], watermark=now()))
+    with micro_batch_lock(site) as acquired:
+        assert acquired
+        figures.tasks.update_recent_enrollment_data_for_site(site_id=site.id)
+    assert not calls
+    # The lock is released when the run ends
+    figures.tasks.update_recent_enrollment_data_for_site(site_id=site.id)
+    assert calls == [site]
@@ -0,0 +1,103 @@
+"""Tests figures.pipeline.site_activity module
+"""
+from __future__ import absolute_import
+import datetime
+
+import pytest
+from django.contrib.sites.models import Site
+from django.utils.timezone import now, utc
+
+from figures.models import SiteActivity
+from figures.pipeline.site_activity import (
+    dormant_reason,
+    pipeline_sites,
+    update_site_activity,
+)
+
+from tests.factories import (
+    CourseEnrollmentFactory,
+    CourseOverviewFactory,
+    SiteFactory,
+    StudentModuleFactory,
+    UserFactory,
+)
+from tests.helpers import organizations_support_sites
+
+
+def as_utc(*args):
+    return datetime.datetime(*args).replace(tzinfo=utc)
+
+
+@pytest.mark.skipif(organizations_support_sites(),
+                    reason='Site activity data is set up for single site mode')
+@pytest.mark.django_db
+def test_update_site_activity():
+    site = Site.objects.get()
+    course_overview = CourseOverviewFactory()
+    CourseEnrollmentFactory(course_id=course_overview.id, created=as_utc(2020, 1, 1))
+    StudentModuleFactory(course_id=course_overview.id,
+                         created=as_utc(2020, 2, 1),
+                         modified=as_utc(2020, 2, 1))
+    UserFactory(last_login=as_utc(2020, 3, 1))
+
+    activity = update_site_activity(site)
+    assert (activity.last_enrollment,
+            activity.last_student_module,
+            activity.last_login) == (as_utc(2020, 1, 1), as_utc(2020, 2, 1), as_utc(2020, 3, 1))
+    assert activity.last_activity == as_utc(2020, 3, 1)
+
+    # We only read newer records
+    CourseEnrollmentFactory(course_id=course_overview.id, created=as_utc(2020, 4, 1))
+    activity = update_site_activity(site)
+    assert activity.last_enrollment == as_utc(2020, 4, 1)
+    assert activity.last_student_module == as_utc(2020, 2, 1)
+    assert SiteActivity.objects.count() == 1
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('last_login, expected', [
+    (None, 'no activity'),
+    (as_utc(2020, 1, 1), 'no activity since 2020-01-01'),
+    (as_utc(2020, 5, 1), None),
+])
+def test_dormant_reason(settings, last_login, expected):
+    settings.FEATURES = dict(settings.FEATURES, FIGURES_SITE_DORMANT_DAYS=90)
+    activity = SiteActivity(site=SiteFactory(), last_login=last_login)
+    assert dormant_reason(activity, as_of=as_utc(2020, 6, 1)) == expected
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('skip', [False, True])
+def test_pipeline_sites(monkeypatch, settings, skip):
+    settings.FEATURES = dict(settings.FEATURES,
+                             FIGURES_SKIP_DORMANT_SITES=skip,
+                             FIGURES_SITE_DORMANT_DAYS=30)
+    Site.objects.all().delete()
+    last_logins = [now() - datetime.timedelta(days=60),
+                   now() - datetime.timedelta(days=1),
+                   None,
+                   now() - datetime.timedelta(days=2)]
+    sites = {}
+    for last_login in last_logins:
+        site = SiteFactory()
+        sites[site.id] = SiteActivity(site=site, last_login=last_login)
+
+    monkeypatch.setattr('figures.pipeline.site_activity.update_site_activity',
+                        lambda site: sites[site.id])
+    expected = [last_logins[1], last_logins[3]]
+    if not skip:
+        expected += [last_logins[0], None]
+    assert [sites[site.id].last_login
+            for site in pipeline_sites('test')] == expected
+
+
+@pytest.mark.django_db
+def test_pipeline_sites_fails(monkeypatch):
+    site = SiteFactory()
+
+    def mock_update_site_activity(site):
+        raise Exception('fail')
+
+    monkeypatch.setattr('figures.pipeline.site_activity.update_site_activity',
+                        mock_update_site_activity)
+    assert site in pipeline_sites('test')
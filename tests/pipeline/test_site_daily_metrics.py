@@ -19,8 +19,8 @@ from django.utils.timezone import utc
 
 from figures.compat import StudentModule
 
-from figures.helpers import as_datetime, prev_day, days_from, is_multisite
-from figures.models import SiteDailyMetrics
+from figures.helpers import as_datetime, next_day, prev_day, days_from, is_multisite
+from figures.models import DailyActiveUsers, SiteDailyMetrics
 from figures.pipeline import site_daily_metrics as pipeline_sdm
 import figures.sites
 
@@ -290,6 +290,45 @@ class TestSiteDailyMetricsExtractor(object):
             assert actual[key] == value, 'failed on key: "{}"'.format(key)
 
 
+    def test_extract_from_daily_active_users(self, monkeypatch):
+        """When the day is stored, we read active users from the stored sets
+        """
+        DailyActiveUsers.build(site=self.site,
+                               date_for=self.date_for,
+                               user_ids=[user.id for user in self.users[:2]]).save()
+
+        def mock_student_modules_for_site(site):
+            raise AssertionError('StudentModule should not be read')
+
+        monkeypatch.setattr(pipeline_sdm, 'get_student_modules_for_site',
+                            mock_student_modules_for_site)
+        monkeypatch.setattr(pipeline_sdm, 'site_mau_1g_for_month_as_of_day',
+                            mock_student_modules_for_site)
+        monkeypatch.setattr(pipeline_sdm, 'get_previous_cumulative_active_user_count',
+                            lambda site, date_for: 50)
+        actual = pipeline_sdm.SiteDailyMetricsExtractor().extract(
+            site=self.site,
+            date_for=self.date_for)
+        assert actual['todays_active_user_count'] == 2
+        assert actual['cumulative_active_user_count'] == 52
+        assert actual['mau'] == 2
+
+    def test_extract_excludes_users_joined_later(self, monkeypatch):
+        UserFactory(date_joined=as_datetime(next_day(self.date_for)))
+        monkeypatch.setattr(pipeline_sdm, 'get_user_count_for_site',
+                            lambda site: figures.sites.get_users_for_site(site).count())
+        monkeypatch.setattr(pipeline_sdm, 'get_student_modules_for_site',
+                            lambda site: StudentModule.objects.none())
+        monkeypatch.setattr(pipeline_sdm, 'site_mau_1g_for_month_as_of_day',
+                            lambda site, date_for: StudentModule.objects.none())
+        monkeypatch.setattr(pipeline_sdm, 'get_previous_cumulative_active_user_count',
+                            lambda site, date_for: 0)
+        actual = pipeline_sdm.SiteDailyMetricsExtractor().extract(
+            site=self.site,
+            date_for=self.date_for)
+        assert actual['total_user_count'] == len(self.users)
+
+
 @pytest.mark.django_db
 class TestSiteDailyMetricsLoader(object):
     """
@@ -4,17 +4,24 @@ This is initial test coverage
 
 """
 from __future__ import absolute_import
-from datetime import datetime
+from datetime import date, datetime
 from dateutil.relativedelta import relativedelta
 from django.utils.timezone import utc
 from freezegun import freeze_time
 import pytest
 
 from figures.compat import RELEASE_LINE, StudentModule
-from figures.models import SiteMonthlyMetrics
-from figures.pipeline.site_monthly_metrics import fill_month, fill_last_month
+from figures.models import DailyActiveUsers, SiteMonthlyMetrics
+from figures.pipeline.site_monthly_metrics import (
+    fill_current_month,
+    fill_last_month,
+    fill_month,
+    fill_months,
+)
+import figures.tasks
 
 from tests.factories import (
+    SiteDailyMetricsFactory,
     SiteFactory,
     StudentModuleFactory,
 )
@@ -106,3 +113,138 @@ def test_fill_last_month_wo_overwrite(monkeypatch, smm_test_data):
     assert obj.active_user_count == len(smm_test_data['last_month_sm'])
     assert obj.site == site
     assert obj.month_for == smm_test_data['last_month'].date()
+
+
+class TestFillMonths(object):
+    """Tests filling a range of months in one pass
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, smm_test_data):
+        self.data = smm_test_data
+        self.site = smm_test_data['site']
+        self.student_modules = StudentModule.objects.all()
+
+    def test_matches_fill_month(self):
+        results = fill_months(site=self.site,
+                              first_month=date(2019, 11, 1),
+                              last_month=date(2020, 1, 31),
+                              student_modules=self.student_modules)
+        assert [obj.month_for for obj, _created in results] == [
+            date(2019, 11, 1), date(2019, 12, 1), date(2020, 1, 1)]
+        assert all(created for _obj, created in results)
+        assert [obj.active_user_count for obj, _created in results] == [0, 1, 2]
+        for single_pass_obj, _created in results:
+            obj, created = fill_month(site=self.site,
+                                      month_for=single_pass_obj.month_for,
+                                      student_modules=self.student_modules,
+                                      overwrite=True)
+            for field in SiteMonthlyMetrics.METRIC_FIELDS:
+                assert getattr(obj, field) == getattr(single_pass_obj, field)
+
+    def test_overwrite(self):
+        SiteMonthlyMetrics.add_month(site=self.site, year=2020, month=1,
+                                     active_user_count=42)
+        results = fill_months(site=self.site,
+                              first_month=date(2019, 12, 1),
+                              last_month=date(2020, 1, 1),
+                              student_modules=self.student_modules)
+        assert [(obj.active_user_count, created) for obj, created in results] == [
+            (1, True), (42, False)]
+        results = fill_months(site=self.site,
+                              first_month=date(2019, 12, 1),
+                              last_month=date(2020, 1, 1),
+                              student_modules=self.student_modules,
+                              overwrite=True)
+        assert [obj.active_user_count for obj, _created in results] == [1, 2]
+        assert all(obj.has_all_metrics for obj, _created in results)
+        assert SiteMonthlyMetrics.objects.count() == 2
+
+    def test_uses_stored_days(self):
+        """Stored days are read from the active user sets, like `fill_month`
+        """
+        last_month = self.data['last_month'].date()
+        DailyActiveUsers.build(site=self.site,
+                               date_for=last_month,
+                               user_ids=[]).save()
+        results = fill_months(site=self.site,
+                              first_month=last_month,
+                              last_month=last_month,
+                              student_modules=self.student_modules)
+        assert results[0][0].active_user_count == 0
+
+    def test_progress(self, monkeypatch):
+        monkeypatch.setattr('figures.pipeline.site_monthly_metrics.PROGRESS_INTERVAL', 2)
+        progress = []
+        fill_months(site=self.site,
+                    first_month=date(2019, 12, 1),
+                    last_month=date(2020, 1, 1),
+                    student_modules=self.student_modules,
+                    progress_callback=progress.append)
+        assert progress == [2, 3]
+
+    def test_reads_distinct_users(self):
+        """The database removes a user's repeat activity in the month
+        """
+        user = self.data['last_month_sm'][0].student
+        for day in [3, 4, 5]:
+            modified = datetime(2020, 1, day, tzinfo=utc)
+            StudentModuleFactory(student=user, created=modified, modified=modified)
+        progress = []
+        results = fill_months(site=self.site,
+                              first_month=date(2019, 12, 1),
+                              last_month=date(2020, 1, 1),
+                              student_modules=StudentModule.objects.all(),
+                              progress_callback=progress.append)
+        assert [obj.active_user_count for obj, _created in results] == [1, 2]
+        assert progress == [3]
+
+
+def test_fill_month_stores_site_metrics(smm_test_data):
+    site = smm_test_data['site']
+    for day in [3, 9]:
+        SiteDailyMetricsFactory(site=site,
+                                date_for=date(2020, 1, day),
+                                total_user_count=day * 10,
+                                course_count=day,
+                                total_enrollment_count=day * 100)
+    obj, created = fill_month(site=site,
+                              month_for=date(2020, 1, 15),
+                              student_modules=StudentModule.objects.all())
+    assert obj.has_all_metrics
+    assert obj.registered_users == 90
+    assert obj.site_courses == 9
+    assert obj.course_enrollments == 900
+    assert obj.course_completions == 0
+
+
+def test_fill_current_month(monkeypatch, smm_test_data):
+    site = smm_test_data['site']
+    monkeypatch.setattr('figures.pipeline.site_monthly_metrics.get_student_modules_for_site',
+                        lambda site: StudentModule.objects.all())
+    SiteMonthlyMetrics.add_month(site=site, year=2020, month=1, active_user_count=42)
+    obj, created = fill_current_month(site=site, date_for=date(2020, 1, 20))
+    assert not created
+    assert obj.active_user_count == len(smm_test_data['last_month_sm'])
+    assert obj.has_all_metrics
+
+
+@pytest.mark.skipif(RELEASE_LINE=='ginkgo',
+                    reason='Freezegun breaks the StudentModule query')
+def test_monthly_task_adds_last_day_activity(monkeypatch, smm_test_data):
+    """The monthly task finalizes last month after the daily run wrote it
+
+    Activity after the daily run on the month's last day must be counted
+    """
+    site = smm_test_data['site']
+    monkeypatch.setattr('figures.pipeline.site_monthly_metrics.get_student_modules_for_site',
+                        lambda site: StudentModule.objects.all())
+    with freeze_time(datetime(2020, 1, 31, 2, tzinfo=utc)):
+        obj, _created = fill_current_month(site=site)
+    assert obj.active_user_count == len(smm_test_data['last_month_sm'])
+
+    StudentModuleFactory(created=datetime(2020, 1, 31, 20, tzinfo=utc),
+                         modified=datetime(2020, 1, 31, 20, tzinfo=utc))
+    with freeze_time(smm_test_data['mock_today']):
+        figures.tasks.populate_monthly_metrics_for_site(site.id)
+    obj = SiteMonthlyMetrics.objects.get(site=site, month_for=date(2020, 1, 1))
+    assert obj.active_user_count == len(smm_test_data['last_month_sm']) + 1
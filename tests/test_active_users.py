@@ -0,0 +1,221 @@
+"""Tests reading active users from the stored daily active user sets
+"""
+
+from __future__ import absolute_import
+import datetime
+
+import pytest
+
+from django.contrib.sites.models import Site
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from figures.active_users import (
+    get_active_user_count,
+    get_active_user_ids,
+    get_active_user_ids_by_course,
+    get_active_user_sketch,
+    missing_date_ranges,
+    stored_dates,
+)
+from figures.helpers import as_datetime
+from figures.hll import HyperLogLog
+from figures.models import DailyActiveUsers
+
+from tests.factories import (
+    CourseOverviewFactory,
+    StudentModuleFactory,
+    UserFactory,
+)
+from tests.helpers import organizations_support_sites
+from six.moves import range
+
+
+def studentmodule_queries(ctx):
+    return [query for query in ctx.captured_queries
+            if 'courseware_studentmodule' in query['sql']]
+
+
+@pytest.mark.parametrize('dates, expected', [
+    ([], [(1, 7)]),
+    ([1, 2, 3, 4, 5, 6, 7], []),
+    ([1, 2, 6], [(3, 5), (7, 7)]),
+    ([3], [(1, 2), (4, 7)]),
+])
+def test_missing_date_ranges(dates, expected):
+    def day(num):
+        return datetime.date(2020, 3, num)
+
+    actual = missing_date_ranges(day(1), day(7), set(day(num) for num in dates))
+    assert actual == [(day(start), day(end)) for start, end in expected]
+
+
+@pytest.mark.skipif(organizations_support_sites(),
+                    reason='Standalone mode test data')
+@pytest.mark.django_db
+class TestActiveUsers(object):
+    """
+    The first week of March 2020 is stored. Users 0 to 3 are active in the
+    first course and users 2 to 5 in the second course over the week.
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES['FIGURES_IS_MULTISITE'] = False
+        self.site = Site.objects.first()
+        self.courses = [CourseOverviewFactory() for i in range(2)]
+        self.users = [UserFactory() for i in range(8)]
+        self.user_ids = [user.id for user in self.users]
+        self.course_ids = [str(course.id) for course in self.courses]
+        records = []
+        for day in range(1, 8):
+            date_for = datetime.date(2020, 3, day)
+            course_users = {
+                self.course_ids[0]: set([self.user_ids[day % 4]]),
+                self.course_ids[1]: set([self.user_ids[2 + day % 4]]),
+            }
+            for course_id, user_ids in course_users.items():
+                records.append(DailyActiveUsers.build(site=self.site,
+                                                      date_for=date_for,
+                                                      course_id=course_id,
+                                                      user_ids=user_ids))
+            records.append(DailyActiveUsers.build(
+                site=self.site,
+                date_for=date_for,
+                user_ids=set.union(*course_users.values())))
+        DailyActiveUsers.objects.bulk_create(records)
+
+    def test_stored_dates(self):
+        dates = stored_dates(self.site, datetime.date(2020, 2, 28), datetime.date(2020, 3, 2))
+        assert dates == set([datetime.date(2020, 3, 1), datetime.date(2020, 3, 2)])
+
+    def test_stored_window(self):
+        """We should not query StudentModule when every day is stored
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            user_ids = get_active_user_ids(self.site,
+                                           datetime.date(2020, 3, 1),
+                                           datetime.date(2020, 3, 7))
+        assert not studentmodule_queries(ctx)
+        assert user_ids == set(self.user_ids[:6])
+
+    def test_day_window(self):
+        count = get_active_user_count(self.site,
+                                      datetime.date(2020, 3, 2),
+                                      datetime.date(2020, 3, 2))
+        assert count == 2
+
+    def test_course_window(self):
+        with CaptureQueriesContext(connection) as ctx:
+            user_ids = get_active_user_ids(self.site,
+                                           datetime.date(2020, 3, 1),
+                                           datetime.date(2020, 3, 7),
+                                           course_ids=[self.courses[1].id])
+        assert not studentmodule_queries(ctx)
+        assert user_ids == set(self.user_ids[2:6])
+
+    def test_window_with_missing_days(self):
+        """Days we did not store are read from StudentModule
+        """
+        StudentModuleFactory(student=self.users[6],
+                             course_id=self.courses[0].id,
+                             modified=as_datetime(datetime.date(2020, 3, 8)))
+        StudentModuleFactory(student=self.users[7],
+                             course_id=self.courses[1].id,
+                             modified=as_datetime(datetime.date(2020, 3, 9)))
+        # Not in the window
+        StudentModuleFactory(course_id=self.courses[0].id,
+                             modified=as_datetime(datetime.date(2020, 3, 10)))
+        # Activity on a stored day is ignored, the stored set is used
+        StudentModuleFactory(course_id=self.courses[0].id,
+                             modified=as_datetime(datetime.date(2020, 3, 7)))
+
+        with CaptureQueriesContext(connection) as ctx:
+            user_ids = get_active_user_ids(self.site,
+                                           datetime.date(2020, 3, 1),
+                                           datetime.date(2020, 3, 9))
+        assert len(studentmodule_queries(ctx)) == 1
+        assert user_ids == set(self.user_ids)
+
+        user_ids = get_active_user_ids(self.site,
+                                       datetime.date(2020, 3, 1),
+                                       datetime.date(2020, 3, 9),
+                                       course_ids=[self.course_ids[0]])
+        assert user_ids == set(self.user_ids[:4] + [self.user_ids[6]])
+
+    def test_active_user_ids_by_course(self):
+        StudentModuleFactory(student=self.users[6],
+                             course_id=self.courses[0].id,
+                             modified=as_datetime(datetime.date(2020, 3, 8)))
+        data = get_active_user_ids_by_course(self.site,
+                                             datetime.date(2020, 3, 1),
+                                             datetime.date(2020, 3, 8))
+        assert data == {
+            self.course_ids[0]: set(self.user_ids[:4] + [self.user_ids[6]]),
+            self.course_ids[1]: set(self.user_ids[2:6]),
+        }
+
+
+@pytest.mark.skipif(organizations_support_sites(),
+                    reason='Standalone mode test data')
+@pytest.mark.django_db
+class TestApproximateActiveUsers(object):
+    """
+    Each day in the first week of March 2020 has 1000 active users and the
+    users overlap with the next day. Days 1 to 3 are stored with sketches,
+    day 4 is stored before the site used sketches and days 5 to 7 are not
+    stored.
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        settings.FEATURES = dict(FIGURES_IS_MULTISITE=False,
+                                 FIGURES_APPROXIMATE_MAU_SITES=['*'])
+        self.site = Site.objects.first()
+        records = []
+        for day in range(1, 5):
+            user_ids = set(range(10 ** 6 + day * 500, 10 ** 6 + day * 500 + 1000))
+            sketch = None
+            if day < 4:
+                sketch = HyperLogLog(precision=14)
+                sketch.update(user_ids)
+            records.append(DailyActiveUsers.build(site=self.site,
+                                                  date_for=datetime.date(2020, 3, day),
+                                                  user_ids=user_ids,
+                                                  sketch=sketch))
+        DailyActiveUsers.objects.bulk_create(records)
+        self.user_ids = set(range(10 ** 6 + 500, 10 ** 6 + 3000))
+
+    def test_stored_window(self):
+        with CaptureQueriesContext(connection) as ctx:
+            sketch = get_active_user_sketch(self.site,
+                                            datetime.date(2020, 3, 1),
+                                            datetime.date(2020, 3, 4))
+        assert not studentmodule_queries(ctx)
+        expected = HyperLogLog(precision=14)
+        expected.update(self.user_ids)
+        assert sketch.registers == expected.registers
+
+    def test_count(self):
+        StudentModuleFactory(student=UserFactory(),
+                             course_id=CourseOverviewFactory().id,
+                             modified=as_datetime(datetime.date(2020, 3, 6)))
+        count = get_active_user_count(self.site,
+                                      datetime.date(2020, 3, 1),
+                                      datetime.date(2020, 3, 7))
+        assert abs(count - (len(self.user_ids) + 1)) <= 3 * 0.0081 * len(self.user_ids)
+        exact = get_active_user_count(self.site,
+                                      datetime.date(2020, 3, 1),
+                                      datetime.date(2020, 3, 7),
+                                      approximate=False)
+        assert exact == len(self.user_ids) + 1
+
+    def test_configured_precision(self, settings):
+        """Sketches with another precision are read from the stored id sets
+        """
+        settings.FEATURES = dict(settings.FEATURES, FIGURES_APPROXIMATE_MAU_ERROR=0.02)
+        sketch = get_active_user_sketch(self.site,
+                                        datetime.date(2020, 3, 1),
+                                        datetime.date(2020, 3, 4))
+        assert sketch.precision == 12
+        expected = HyperLogLog(precision=12)
+        expected.update(self.user_ids)
+        assert sketch.registers == expected.registers
@@ -37,3 +37,16 @@ def test_figures_config_name():
     from figures.apps import FiguresConfig
     assert FiguresConfig.name == 'figures'
     assert FiguresConfig.verbose_name == 'Figures'
+
+
+@pytest.mark.parametrize('capture', [True, False])
+def test_enrollment_change_capture_signals(settings, capture):
+    from django.apps import apps
+    from django.db.models.signals import post_save
+    from figures.compat import StudentModule
+
+    dispatch_uid = 'figures.signals.capture_student_module_change'
+    post_save.disconnect(sender=StudentModule, dispatch_uid=dispatch_uid)
+    settings.FEATURES = dict(settings.FEATURES, FIGURES_ENROLLMENT_CHANGE_CAPTURE=capture)
+    apps.get_app_config('figures').connect_enrollment_change_capture_signals()
+    assert post_save.disconnect(sender=StudentModule, dispatch_uid=dispatch_uid) == capture
@@ -5,18 +5,34 @@ from datetime import datetime
 import pytest
 from dateutil.relativedelta import relativedelta
 from dateutil.rrule import rrule, MONTHLY
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.timezone import utc
 
-from figures.backfill import backfill_monthly_metrics_for_site
-from figures.models import SiteMonthlyMetrics
+import figures.backfill
+from figures.backfill import (
+    backfill_enrollment_data_for_site,
+    backfill_monthly_metrics_for_site,
+    plan_enrollment_data_backfill,
+    update_dirty_enrollment_data,
+)
+from figures.compat import CourseEnrollment
+from figures.models import (
+    DirtyEnrollment,
+    EnrollmentData,
+    EnrollmentDataBackfillChunk,
+    SiteMonthlyMetrics,
+)
 
 from tests.factories import (
+    CourseEnrollmentFactory,
     CourseOverviewFactory,
+    LearnerCourseGradeMetricsFactory,
     OrganizationFactory,
     OrganizationCourseFactory,
     StudentModuleFactory,
     SiteFactory)
-from tests.helpers import organizations_support_sites
+from tests.helpers import OPENEDX_RELEASE, GINKGO, organizations_support_sites
 from six.moves import range
 from six.moves import zip
 
@@ -72,7 +88,8 @@ def backfill_test_data(db):
     )
 
 
-def test_backfill_monthly_metrics_for_site(backfill_test_data):
+@pytest.mark.parametrize('single_pass', [True, False])
+def test_backfill_monthly_metrics_for_site(backfill_test_data, single_pass):
     """Simple coverage and data validation check for the function under test
 
     Example backfilled results
@@ -100,7 +117,9 @@ def test_backfill_monthly_metrics_for_site(backfill_test_data):
     site = backfill_test_data['site']
     count_check = backfill_test_data['count_check']
     assert not SiteMonthlyMetrics.objects.count()
-    backfilled = backfill_monthly_metrics_for_site(site=site, overwrite=True)
+    backfilled = backfill_monthly_metrics_for_site(site=site,
+                                                   overwrite=True,
+                                                   single_pass=single_pass)
     assert len(backfilled) == backfill_test_data['months_back']
     assert len(backfilled) == SiteMonthlyMetrics.objects.count()
     assert len(backfilled) == len(count_check)
@@ -108,3 +127,157 @@ def test_backfill_monthly_metrics_for_site(backfill_test_data):
         assert rec['obj'].active_user_count == check_rec['sm_count']
         assert rec['obj'].month_for.year == check_rec['month'].year
         assert rec['obj'].month_for.month == check_rec['month'].month
+        assert rec['dt'].month == check_rec['month'].month
+
+
+def test_backfill_single_pass_queries(backfill_test_data):
+    """The single pass reads StudentModule a fixed number of times
+    """
+    site = backfill_test_data['site']
+    with CaptureQueriesContext(connection) as ctx:
+        backfill_monthly_metrics_for_site(site=site)
+    sm_queries = [query for query in ctx.captured_queries
+                  if 'courseware_studentmodule' in query['sql']]
+    # The first record query and the stream
+    assert len(sm_queries) == 2
+
+
+@pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+@pytest.mark.django_db
+class TestUpdateDirtyEnrollmentData(object):
+    """Tests updating EnrollmentData for the enrollments queued by change capture
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.enrollments = [CourseEnrollmentFactory() for _ in range(3)]
+        for ce in self.enrollments:
+            LearnerCourseGradeMetricsFactory(site=self.site,
+                                             user=ce.user,
+                                             course_id=str(ce.course_id))
+
+    def mark(self, ce):
+        return DirtyEnrollment.objects.mark(site_id=self.site.id,
+                                            user_id=ce.user_id,
+                                            course_id=ce.course_id)
+
+    def test_updates_queued_enrollments(self):
+        for ce in self.enrollments[:2]:
+            self.mark(ce)
+        # Queued without a CourseEnrollment record
+        DirtyEnrollment.objects.mark(site_id=self.site.id,
+                                     user_id=self.enrollments[2].user_id,
+                                     course_id=self.enrollments[0].course_id)
+        # Other site
+        DirtyEnrollment.objects.mark(site_id=SiteFactory().id,
+                                     user_id=self.enrollments[2].user_id,
+                                     course_id=self.enrollments[2].course_id)
+
+        results = update_dirty_enrollment_data(self.site, batch_size=2)
+        assert results == dict(processed=3, updated=2, errors=[])
+        assert set(EnrollmentData.objects.values_list('user_id', flat=True)) == set(
+            ce.user_id for ce in self.enrollments[:2])
+        assert not DirtyEnrollment.objects.filter(site=self.site).exists()
+        assert DirtyEnrollment.objects.count() == 1
+
+    def test_queued_again_while_updating(self, monkeypatch):
+        self.mark(self.enrollments[0])
+        set_batch = figures.backfill._set_enrollment_data_batch
+
+        def mock_set_batch(*args, **kwargs):
+            set_batch(*args, **kwargs)
+            self.mark(self.enrollments[0])
+
+        monkeypatch.setattr('figures.backfill._set_enrollment_data_batch', mock_set_batch)
+        results = update_dirty_enrollment_data(self.site)
+        assert results['updated'] == 1
+        assert DirtyEnrollment.objects.filter(site=self.site).count() == 1
+
+    def test_full_backfill_clears_queue(self, monkeypatch):
+        self.mark(self.enrollments[0])
+        monkeypatch.setattr('figures.backfill.get_course_enrollments_for_site',
+                            lambda site: CourseEnrollment.objects.all())
+        results = backfill_enrollment_data_for_site(self.site)
+        assert results['updated'] == len(self.enrollments)
+        assert not DirtyEnrollment.objects.exists()
+
+
+class TestBackfillEnrollmentData(object):
+    """Tests the chunked, resumable EnrollmentData backfill
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch):
+        self.site = SiteFactory()
+        self.course_overviews = [CourseOverviewFactory() for _ in range(2)]
+        self.enrollments = [CourseEnrollmentFactory(course_id=co.id)
+                            for co in self.course_overviews for _ in range(3)]
+        for ce in self.enrollments:
+            LearnerCourseGradeMetricsFactory(site=self.site,
+                                             user=ce.user,
+                                             course_id=str(ce.course_id))
+        monkeypatch.setattr('figures.backfill.get_course_enrollments_for_site',
+                            lambda site: CourseEnrollment.objects.all())
+
+    def test_plan_chunks(self):
+        chunk_ids = plan_enrollment_data_backfill(self.site, chunk_size=2)
+        chunks = EnrollmentDataBackfillChunk.objects.filter(id__in=chunk_ids)
+        course_ce_ids = [[ce.id for ce in self.enrollments if ce.course_id == co.id]
+                         for co in self.course_overviews]
+        expected = set()
+        for ce_ids in course_ce_ids:
+            course_id = str(self.course_overviews[course_ce_ids.index(ce_ids)].id)
+            expected.update([(course_id, 0, ce_ids[1]), (course_id, ce_ids[1], None)])
+        assert set(chunks.values_list('course_id', 'after_id', 'through_id')) == expected
+        # Resuming returns the same chunks
+        assert plan_enrollment_data_backfill(self.site, chunk_size=2, resume=True) == chunk_ids
+        # Planning again starts a new backfill
+        new_chunk_ids = plan_enrollment_data_backfill(self.site, chunk_size=2)
+        assert len(new_chunk_ids) == len(chunk_ids)
+        assert not set(new_chunk_ids) & set(chunk_ids)
+
+    def test_backfill(self):
+        results = backfill_enrollment_data_for_site(self.site, chunk_size=2)
+        assert results == dict(chunks=4, failed=0, processed=6, updated=6, errors=[])
+        assert EnrollmentData.objects.count() == len(self.enrollments)
+        assert not EnrollmentDataBackfillChunk.objects.exists()
+
+    def test_resumes_after_failure(self, monkeypatch):
+        set_batch = figures.backfill._set_enrollment_data_batch
+        calls = []
+
+        def mock_set_batch(site, course_enrollments, enrollment_data, errors):
+            calls.append(len(course_enrollments))
+            if len(calls) == 2:
+                raise Exception('fail')
+            set_batch(site, course_enrollments, enrollment_data, errors)
+
+        monkeypatch.setattr('figures.backfill._set_enrollment_data_batch', mock_set_batch)
+        results = backfill_enrollment_data_for_site(self.site, chunk_size=2)
+        # The failed chunk does not stop the chunks after it
+        assert results['failed'] == 1
+        assert calls == [2, 1, 2, 1]
+        assert EnrollmentDataBackfillChunk.objects.filter(
+            completed__isnull=False).count() == 3
+
+        results = backfill_enrollment_data_for_site(self.site, chunk_size=2, resume=True)
+        assert results['chunks'] == 1
+        assert results['failed'] == 0
+        assert calls == [2, 1, 2, 1, 1]
+        assert EnrollmentData.objects.count() == len(self.enrollments)
+        assert not EnrollmentDataBackfillChunk.objects.exists()
+
+    def test_starts_over(self):
+        plan_enrollment_data_backfill(self.site, chunk_size=2)
+        EnrollmentDataBackfillChunk.objects.update(completed=datetime.now(tz=utc))
+        results = backfill_enrollment_data_for_site(self.site, chunk_size=10)
+        assert results == dict(chunks=2, failed=0, processed=6, updated=6, errors=[])
+
+    def test_resume_discards_expired_plan(self):
+        plan_enrollment_data_backfill(self.site, chunk_size=2)
+        EnrollmentDataBackfillChunk.objects.update(
+            created=datetime.now(tz=utc) - relativedelta(days=2))
+        EnrollmentDataBackfillChunk.objects.filter(
+            id=EnrollmentDataBackfillChunk.objects.first().id).update(
+                completed=datetime.now(tz=utc))
+        results = backfill_enrollment_data_for_site(self.site, chunk_size=10, resume=True)
+        assert results == dict(chunks=2, failed=0, processed=6, updated=6, errors=[])
@@ -34,6 +34,18 @@ def test_mau_no_delay(transactional_db):
         mock_populate_all_mau.assert_called()
 
 
+@pytest.mark.parametrize('flag', ['--parallel', '--experimental'])
+def test_parallel_no_delay(transactional_db, flag):
+    """
+    We test that `populate_figures_metrics` command executes the method,
+    `figures.tasks.populate_daily_metrics_parallel` in immediate mode "no delay"
+    """
+    path = 'figures.management.commands.populate_figures_metrics.populate_daily_metrics_parallel'
+    with mock.patch(path) as mock_populate_parallel:
+        call_command('populate_figures_metrics', '--no-delay', flag)
+        mock_populate_parallel.assert_called()
+
+
 def test_backfill(transactional_db):
     """Minimal test the backfill management command
     """
@@ -41,3 +53,18 @@ def test_backfill(transactional_db):
     with mock.patch(path) as mock_backfill:
         call_command('backfill_figures_metrics')
         mock_backfill.assert_called()
+        assert mock_backfill.call_args[1]['single_pass']
+
+
+def test_backfill_by_month(transactional_db):
+    path = 'figures.management.commands.backfill_figures_metrics.backfill_monthly_metrics_for_site'
+    with mock.patch(path) as mock_backfill:
+        call_command('backfill_figures_metrics', '--by-month')
+        assert not mock_backfill.call_args[1]['single_pass']
+
+
+def test_report_site_activity(transactional_db, capsys):
+    site = SiteFactory()
+    call_command('report_figures_site_activity')
+    out = capsys.readouterr().out
+    assert 'site[{}]:{} dormant, no activity'.format(site.id, site.domain) in out
@@ -0,0 +1,143 @@
+"""Tests the Figures course structure cache
+"""
+
+from __future__ import absolute_import
+import logging
+
+import pytest
+from mock import Mock
+
+import figures.compat
+from figures.course_structure import (
+    CourseStructureCache,
+    active_cache,
+    course_structure_cache,
+    get_course,
+)
+
+
+class FakeCourse(object):
+    def __init__(self, course_id):
+        self.id = course_id
+
+
+class FakeLoader(object):
+    """Counts how many times we load a course
+    """
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, course_id):
+        self.calls.append(course_id)
+        return FakeCourse(course_id)
+
+
+class TestCourseStructureCache(object):
+
+    def test_hit_and_miss(self):
+        loader = FakeLoader()
+        cache = CourseStructureCache(max_size=4)
+        first = cache.get('course-v1:A+B+C', loader)
+        second = cache.get('course-v1:A+B+C', loader)
+        assert first is second
+        assert loader.calls == ['course-v1:A+B+C']
+        assert cache.stats() == dict(hits=1, misses=1, evictions=0, size=1, max_size=4)
+
+    def test_evicts_least_recently_used(self):
+        loader = FakeLoader()
+        cache = CourseStructureCache(max_size=2)
+        cache.get('a', loader)
+        cache.get('b', loader)
+        # Makes 'a' the most recently used, so 'b' gets evicted
+        cache.get('a', loader)
+        cache.get('c', loader)
+        assert len(cache) == 2
+        assert cache.evictions == 1
+        cache.get('b', loader)
+        assert loader.calls == ['a', 'b', 'c', 'b']
+
+    def test_invalidate(self):
+        loader = FakeLoader()
+        cache = CourseStructureCache(max_size=2)
+        cache.get('a', loader)
+        cache.invalidate('a')
+        cache.get('a', loader)
+        assert loader.calls == ['a', 'a']
+
+    def test_totals(self):
+        loader = Mock(return_value=None)
+        cache = CourseStructureCache(max_size=2)
+        assert cache.get_totals('a', loader) is None
+        assert cache.get_totals('a', loader) is None
+        assert loader.call_count == 1
+        cache.set_totals('a', dict(sections_possible=2))
+        assert cache.get_totals('a', loader) == dict(sections_possible=2)
+        cache.get_totals('b', loader)
+        cache.get_totals('c', loader)
+        # Bounded by count like the courses
+        cache.get_totals('a', loader)
+        assert loader.call_count == 4
+
+
+class TestCourseStructureCacheContext(object):
+
+    def test_no_active_cache(self):
+        loader = FakeLoader()
+        assert active_cache() is None
+        get_course('a', loader)
+        get_course('a', loader)
+        assert loader.calls == ['a', 'a']
+
+    def test_active_cache_logs_stats(self):
+        loader = FakeLoader()
+        logger = Mock(spec=logging.Logger)
+        with course_structure_cache(description='test run', logger=logger) as cache:
+            assert active_cache() is cache
+            for _ in range(3):
+                get_course('a', loader)
+        assert active_cache() is None
+        assert loader.calls == ['a']
+        logger.info.assert_called_once_with(
+            'test run: hits=2, misses=1, evictions=0, size=1')
+
+    def test_nested_blocks_share_cache(self):
+        loader = FakeLoader()
+        outer_logger = Mock(spec=logging.Logger)
+        inner_logger = Mock(spec=logging.Logger)
+        with course_structure_cache(logger=outer_logger) as outer:
+            get_course('a', loader)
+            with course_structure_cache(logger=inner_logger) as inner:
+                assert inner is outer
+                get_course('a', loader)
+            assert active_cache() is outer
+        assert loader.calls == ['a']
+        assert not inner_logger.info.called
+        assert outer_logger.info.call_count == 1
+
+    def test_cache_cleared_on_exception(self):
+        with pytest.raises(ValueError):
+            with course_structure_cache(logger=Mock(spec=logging.Logger)):
+                raise ValueError()
+        assert active_cache() is None
+
+    def test_size_from_settings(self, settings):
+        settings.FEATURES = dict(FIGURES_COURSE_STRUCTURE_CACHE_SIZE=3)
+        with course_structure_cache(logger=Mock(spec=logging.Logger)) as cache:
+            assert cache.max_size == 3
+
+
+def test_course_grade_from_course_id_uses_cache(monkeypatch):
+    """Make sure we load the course once per run and clear its field data cache
+    """
+    loader = Mock(side_effect=lambda course_id: FakeCourse(course_id))
+    monkeypatch.setattr(figures.compat, 'course_for_grading', loader)
+    monkeypatch.setattr(figures.compat, 'course_grade',
+                        lambda learner, course: (learner, course))
+    course_id = 'course-v1:StarFleetAcademy+SFA01+2161'
+    with course_structure_cache(logger=Mock(spec=logging.Logger)):
+        for learner in ['alpha', 'bravo']:
+            learner_out, course = figures.compat.course_grade_from_course_id(
+                learner, course_id)
+            assert learner_out == learner
+            assert course._field_data_cache == {}
+    assert loader.call_count == 1
@@ -0,0 +1,86 @@
+"""Tests the Figures learner metrics export module
+"""
+
+from __future__ import absolute_import
+import csv
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from figures.export import (
+    EXPORT_FIELDNAMES,
+    csv_lines,
+    learner_metrics_rows,
+    ndjson_lines,
+)
+
+from tests.factories import (
+    EnrollmentDataFactory,
+    SiteFactory,
+    UserFactory,
+)
+
+
+@pytest.mark.django_db
+class TestLearnerMetricsRows(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = SiteFactory()
+        self.users = [UserFactory(username='alpha', profile__name='Alpha One'),
+                      UserFactory(username='bravo', profile__name='Bravo Two')]
+        self.course_ids = ['course-v1:StarFleetAcademy+SFA01+2161',
+                           'course-v1:StarFleetAcademy+SFA02+2161']
+        self.enrollment_data = [EnrollmentDataFactory(site=self.site,
+                                                      user=user,
+                                                      course_id=course_id)
+                                for user in self.users
+                                for course_id in self.course_ids]
+        # Other site
+        EnrollmentDataFactory(course_id=self.course_ids[0])
+
+    def test_all_rows_in_chunks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            rows = list(learner_metrics_rows(self.site, chunk_size=3))
+        assert len(ctx.captured_queries) == 2
+        assert [(row[0], row[6]) for row in rows] == [
+            (rec.user_id, rec.course_id) for rec in self.enrollment_data]
+        first = dict(zip(EXPORT_FIELDNAMES, rows[0]))
+        assert first['username'] == 'alpha'
+        assert first['fullname'] == 'Alpha One'
+        assert first['progress_percent'] == self.enrollment_data[0].progress_percent
+
+    def test_exact_chunk_boundary(self):
+        rows = list(learner_metrics_rows(self.site, chunk_size=2))
+        assert len(rows) == len(self.enrollment_data)
+
+    def test_course_filter(self):
+        rows = list(learner_metrics_rows(self.site, course_ids=self.course_ids[1:]))
+        assert [row[6] for row in rows] == [self.course_ids[1]] * 2
+
+    @pytest.mark.parametrize('search, usernames', [
+        ('alpha', ['alpha', 'alpha']),
+        ('Two', ['bravo', 'bravo']),
+        ('bravo one', []),
+        ('', ['alpha', 'alpha', 'bravo', 'bravo']),
+    ])
+    def test_search(self, search, usernames):
+        rows = learner_metrics_rows(self.site, search=search)
+        assert [row[1] for row in rows] == usernames
+
+    def test_csv_lines(self):
+        content = ''.join(csv_lines(learner_metrics_rows(self.site)))
+        records = list(csv.DictReader(content.splitlines()))
+        assert len(records) == len(self.enrollment_data)
+        assert records[0]['username'] == 'alpha'
+        assert records[0]['course_id'] == self.course_ids[0]
+
+    def test_ndjson_lines(self):
+        lines = list(ndjson_lines(learner_metrics_rows(self.site)))
+        assert len(lines) == len(self.enrollment_data)
+        record = json.loads(lines[-1])
+        assert set(record.keys()) == set(EXPORT_FIELDNAMES)
+        assert record['username'] == 'bravo'
+        assert record['date_for'] == str(self.enrollment_data[-1].date_for)
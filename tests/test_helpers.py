@@ -21,6 +21,8 @@ from figures.helpers import (
     prev_day,
     previous_months_iterator,
     first_last_days_for_month,
+    pack_int_set,
+    unpack_int_set,
     )
 
 from tests.factories import COURSE_ID_STR_TEMPLATE
@@ -220,3 +222,22 @@ def test_first_last_days_for_month():
     assert last_day.year == year
     assert first_day.day == 1
     assert last_day.day == 29
+
+
+@pytest.mark.parametrize('values, expected', [
+    ([], []),
+    ([7], [7]),
+    ([5, 3, 3, 1000000, 4], [3, 4, 5, 1000000]),
+    (set(range(1, 5000, 3)), list(range(1, 5000, 3))),
+])
+def test_pack_int_set(values, expected):
+    packed = pack_int_set(values)
+    assert isinstance(packed, bytes)
+    assert unpack_int_set(packed) == expected
+
+
+def test_pack_int_set_is_compact():
+    """Dense ids should take much less than four bytes each
+    """
+    packed = pack_int_set(range(10000))
+    assert len(packed) < 1000
@@ -0,0 +1,79 @@
+"""Tests the HyperLogLog sketch
+"""
+
+from __future__ import absolute_import
+import math
+
+import pytest
+
+from figures.hll import (
+    HyperLogLog,
+    SketchMismatchError,
+    precision_for_error,
+)
+from six.moves import range
+
+
+@pytest.mark.parametrize('error, expected', [
+    (0.01, 14),
+    (0.02, 12),
+    (0.5, 4),
+    (0.0001, 16),
+])
+def test_precision_for_error(error, expected):
+    assert precision_for_error(error) == expected
+
+
+@pytest.mark.parametrize('num_values', [0, 10, 10000, 100000])
+def test_count_within_error(num_values):
+    """The estimate should be within three standard errors
+    """
+    sketch = HyperLogLog(precision=14)
+    sketch.update(range(num_values))
+    # Adding values again should not change the estimate
+    sketch.update(range(num_values // 2))
+    assert abs(sketch.count() - num_values) <= max(3 * 0.0081 * num_values, 1)
+
+
+def test_count_small_range_correction():
+    """A sketch with empty registers uses linear counting over the empty
+    registers. This reads the registers as bytes on Python 2 and 3
+    """
+    sketch = HyperLogLog(precision=4)
+    sketch.registers[:4] = bytearray([1, 2, 3, 4])
+    assert sketch.count() == int(round(16 * math.log(16.0 / 12)))
+    loaded = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert loaded.count() == sketch.count()
+
+
+def test_merge_is_union():
+    first = HyperLogLog(precision=12)
+    first.update(range(0, 6000))
+    second = HyperLogLog(precision=12)
+    second.update(range(4000, 10000))
+    union = HyperLogLog(precision=12)
+    union.update(range(0, 10000))
+    first.merge(second)
+    assert first.registers == union.registers
+    assert first.count() == union.count()
+
+
+def test_merge_precision_mismatch():
+    with pytest.raises(SketchMismatchError):
+        HyperLogLog(precision=12).merge(HyperLogLog(precision=14))
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=20)
+
+
+def test_serialize():
+    sketch = HyperLogLog(precision=10)
+    sketch.update(range(500))
+    data = sketch.to_bytes()
+    assert isinstance(data, bytes)
+    loaded = HyperLogLog.from_bytes(data)
+    assert loaded.precision == 10
+    assert loaded.registers == sketch.registers
+    assert loaded.count() == sketch.count()
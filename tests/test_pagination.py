@@ -1,9 +1,20 @@
 from __future__ import absolute_import
+import pytest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
 from figures.pagination import (
+    FiguresCursorPagination,
     FiguresLimitOffsetPagination,
     FiguresKiloPagination,
 )
 
+from tests.factories import UserFactory
+
 
 class TestFiguresLimitOffsetPagination(object):
     def test_default_pagination_limit(self):
@@ -13,3 +24,43 @@ class TestFiguresLimitOffsetPagination(object):
 class TestFigureKiloPagination(object):
     def test_default_pagination_limit(self):
         assert FiguresKiloPagination.default_limit == 1000
+
+
+@pytest.mark.django_db
+class TestFiguresCursorPagination(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.users = [UserFactory() for _ in range(5)]
+        self.queryset = get_user_model().objects.all()
+
+    def paginate(self, path):
+        paginator = FiguresCursorPagination()
+        paginator.page_size = 2
+        request = Request(APIRequestFactory().get(path))
+        with CaptureQueriesContext(connection) as ctx:
+            page = paginator.paginate_queryset(self.queryset, request)
+        return paginator, page, ctx.captured_queries
+
+    def test_pages_in_id_order(self):
+        paginator, page, _ = self.paginate('/?cursor=')
+        ids = [user.id for user in page]
+        next_link = paginator.get_next_link()
+        while next_link:
+            paginator, page, queries = self.paginate(next_link)
+            ids += [user.id for user in page]
+            next_link = paginator.get_next_link()
+            # We select the page on the id instead of skipping rows
+            assert 'OFFSET' not in queries[-1]['sql'].upper()
+        assert ids == sorted(user.id for user in self.users)
+
+    def test_count_only_when_asked(self):
+        paginator, _, queries = self.paginate('/?cursor=')
+        assert paginator.count is None
+        assert not any('COUNT(' in query['sql'].upper() for query in queries)
+        response = paginator.get_paginated_response([])
+        assert 'count' not in response.data
+
+        paginator, _, _ = self.paginate('/?cursor=&count=true')
+        assert paginator.count == len(self.users)
+        assert paginator.get_paginated_response([]).data['count'] == len(self.users)
@@ -0,0 +1,149 @@
+"""Tests the Figures server side report module
+"""
+
+from __future__ import absolute_import
+import csv
+import gzip
+import io
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.sites.models import Site
+
+from figures.compat import CourseOverview
+from figures.models import ReportJob
+from figures.reports import REPORTS, build_report, request_report
+from figures.response_cache import bump_data_version
+from figures.tasks import run_report_job
+
+from tests.factories import (
+    CourseDailyMetricsFactory,
+    CourseOverviewFactory,
+    EnrollmentDataFactory,
+    UserFactory,
+)
+
+
+def read_report(job):
+    with job.artifact.storage.open(job.artifact.name, 'rb') as artifact_file:
+        content = gzip.GzipFile(fileobj=io.BytesIO(artifact_file.read())).read()
+    return list(csv.reader(io.StringIO(content.decode('utf-8'))))
+
+
+@pytest.mark.django_db
+class TestBuildReport(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings, tmpdir):
+        settings.MEDIA_ROOT = str(tmpdir)
+        self.site = Site.objects.first()
+        self.users = [UserFactory() for _ in range(3)]
+        self.course_overviews = [CourseOverviewFactory() for _ in range(2)]
+        self.enrollment_data = [EnrollmentDataFactory(site=self.site, user=user)
+                                for user in self.users]
+
+    @pytest.mark.parametrize('report_type', [
+        ReportJob.LEARNER_REPORT,
+        ReportJob.COURSE_REPORT,
+        ReportJob.ENROLLMENT_REPORT,
+    ])
+    def test_report_types(self, report_type):
+        job, created = request_report(self.site, report_type)
+        assert created
+        assert job.status == ReportJob.PENDING
+        build_report(job, chunk_size=2)
+        job.refresh_from_db()
+        rows = read_report(job)
+        expected_count = REPORTS[report_type]['queryset'](self.site).count()
+        assert rows[0] == REPORTS[report_type]['columns']
+        assert len(rows) == expected_count + 1
+        assert job.row_count == expected_count
+        assert job.status == ReportJob.COMPLETED
+        assert job.progress_percent == 100.0
+        assert job.artifact.name.endswith('.csv.gz')
+
+    def test_learner_report_rows(self):
+        job, _ = request_report(self.site, ReportJob.LEARNER_REPORT)
+        build_report(job)
+        usernames = [row[1] for row in read_report(job)[1:]]
+        assert usernames == [user.username for user in
+                             get_user_model().objects.order_by('id')]
+
+    def test_course_report_metrics(self):
+        course_overview = self.course_overviews[0]
+        cdm = CourseDailyMetricsFactory(site=self.site,
+                                        course_id=str(course_overview.id),
+                                        enrollment_count=42)
+        job, _ = request_report(self.site, ReportJob.COURSE_REPORT)
+        build_report(job)
+        rows = read_report(job)
+        row = dict(zip(rows[0], rows[1]))
+        assert row['course_id'] == str(course_overview.id)
+        assert row['number'] == course_overview.id.course
+        assert row['metrics_enrollment_count'] == str(cdm.enrollment_count)
+        empty_row = dict(zip(rows[0], rows[2]))
+        assert empty_row['metrics_enrollment_count'] == ''
+        assert len(rows) == CourseOverview.objects.count() + 1
+
+
+@pytest.mark.django_db
+class TestRequestReport(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        self.site = Site.objects.first()
+
+    def test_reuses_job_for_data_version(self):
+        job, created = request_report(self.site, ReportJob.COURSE_REPORT)
+        assert created
+        same_job, created = request_report(self.site, ReportJob.COURSE_REPORT)
+        assert not created
+        assert same_job.id == job.id
+
+    def test_new_job_for_new_data_version(self):
+        job, _ = request_report(self.site, ReportJob.COURSE_REPORT)
+        bump_data_version(self.site)
+        new_job, created = request_report(self.site, ReportJob.COURSE_REPORT)
+        assert created
+        assert new_job.id != job.id
+        assert new_job.data_version != job.data_version
+
+    def test_failed_job_is_not_reused(self):
+        job, _ = request_report(self.site, ReportJob.COURSE_REPORT)
+        ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.FAILED)
+        new_job, created = request_report(self.site, ReportJob.COURSE_REPORT)
+        assert created
+        assert new_job.id != job.id
+
+    def test_other_report_type(self):
+        request_report(self.site, ReportJob.COURSE_REPORT)
+        _, created = request_report(self.site, ReportJob.LEARNER_REPORT)
+        assert created
+
+    def test_invalid_report_type(self):
+        with pytest.raises(ValueError):
+            request_report(self.site, 'grades')
+
+
+@pytest.mark.django_db
+def test_run_report_job(settings, tmpdir):
+    settings.MEDIA_ROOT = str(tmpdir)
+    job, _ = request_report(Site.objects.first(), ReportJob.LEARNER_REPORT)
+    run_report_job(job_id=job.id)
+    job.refresh_from_db()
+    assert job.status == ReportJob.COMPLETED
+    assert job.artifact
+
+
+@pytest.mark.django_db
+def test_run_report_job_failure(monkeypatch):
+    def fail(job):
+        raise Exception('storage is down')
+    monkeypatch.setattr('figures.tasks.build_report', fail)
+    job, _ = request_report(Site.objects.first(), ReportJob.LEARNER_REPORT)
+    run_report_job(job_id=job.id)
+    job.refresh_from_db()
+    assert job.status == ReportJob.FAILED
+    assert job.error_message == 'storage is down'
+    _, created = request_report(job.site, ReportJob.LEARNER_REPORT)
+    assert created
@@ -0,0 +1,115 @@
+"""Tests the Figures API response cache
+"""
+
+from __future__ import absolute_import
+
+import mock
+import pytest
+
+import django.contrib.sites.shortcuts
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from figures.response_cache import (
+    bump_data_version,
+    cache_response,
+    get_cache,
+    get_data_version,
+    get_stats,
+    log_stats,
+)
+
+from tests.factories import SiteFactory
+
+
+class CountingView(APIView):
+    """Returns the number of times the view computed its response
+    """
+    authentication_classes = ()
+    permission_classes = ()
+    calls = 0
+
+    @cache_response('counting')
+    def get(self, request, format=None):  # pylint: disable=redefined-builtin
+        CountingView.calls += 1
+        if request.query_params.get('fail'):
+            return Response(dict(calls=CountingView.calls),
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(dict(calls=CountingView.calls))
+
+
+@pytest.mark.django_db
+class TestCacheResponse(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings, monkeypatch):
+        settings.FEATURES = dict(FIGURES_RESPONSE_CACHE_TIMEOUTS=dict(counting=60))
+        get_cache().clear()
+        CountingView.calls = 0
+        self.site = SiteFactory()
+        self.other_site = SiteFactory()
+        self.current_site = self.site
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: self.current_site)
+
+    def get(self, path='/counting'):
+        return CountingView.as_view()(APIRequestFactory().get(path)).data
+
+    def test_not_opted_in(self, settings):
+        settings.FEATURES = {}
+        assert self.get() == dict(calls=1)
+        assert self.get() == dict(calls=2)
+
+    def test_hit(self):
+        assert self.get() == dict(calls=1)
+        assert self.get() == dict(calls=1)
+        assert get_stats(['counting']) == dict(counting=dict(hits=1, misses=1))
+
+    def test_log_stats(self):
+        self.get()
+        self.get()
+        logger = mock.Mock()
+        log_stats(logger)
+        logger.info.assert_called_once_with(
+            'figures response cache counting: hits=1, misses=1')
+
+    def test_key_includes_query_params(self):
+        assert self.get('/counting?a=1&b=2') == dict(calls=1)
+        assert self.get('/counting?b=2&a=1') == dict(calls=1)
+        assert self.get('/counting?a=2&b=2') == dict(calls=2)
+
+    def test_key_includes_site(self):
+        assert self.get() == dict(calls=1)
+        self.current_site = self.other_site
+        assert self.get() == dict(calls=2)
+
+    def test_bump_data_version(self):
+        assert self.get() == dict(calls=1)
+        bump_data_version(self.other_site)
+        assert self.get() == dict(calls=1)
+        bump_data_version(self.site)
+        assert self.get() == dict(calls=2)
+        assert self.get() == dict(calls=2)
+
+    def test_errors_not_cached(self):
+        self.get('/counting?fail=1')
+        self.get('/counting?fail=1')
+        assert CountingView.calls == 2
+
+
+@pytest.mark.django_db
+def test_data_version_survives_eviction(monkeypatch):
+    """A new version after eviction should not match one responses were
+    cached under
+    """
+    get_cache().clear()
+    site = SiteFactory()
+    monkeypatch.setattr('figures.response_cache.time.time', lambda: 1000.0)
+    assert get_data_version(site) == 1000000
+    assert bump_data_version(site) == 1000001
+    get_cache().clear()
+    monkeypatch.setattr('figures.response_cache.time.time', lambda: 1001.0)
+    assert get_data_version(site) == 1001000
@@ -18,6 +18,7 @@ from rest_framework.exceptions import ValidationError
 from figures.compat import CourseEnrollment
 from figures.models import (
     CourseDailyMetrics,
+    CourseData,
     CourseMauMetrics,
     LearnerCourseGradeMetrics,
     SiteDailyMetrics,
@@ -133,7 +134,7 @@ class TestCourseDetailsSerializer(object):
             'course_id', 'course_name', 'course_code','org', 'start_date',
             'end_date', 'self_paced', 'staff', 'average_progress',
             'learners_enrolled', 'average_days_to_complete', 'users_completed',
-
+            'sections_possible', 'points_possible',
         ]
 
     def test_has_fields(self):
@@ -149,6 +150,16 @@ class TestCourseDetailsSerializer(object):
         assert parse(data['start_date']) == self.course_overview.start
         assert parse(data['end_date']) == self.course_overview.end
         assert data['self_paced'] == self.course_overview.self_paced
+        assert data['sections_possible'] is None
+        assert data['points_possible'] is None
+
+    def test_course_totals(self):
+        CourseData.objects.create(course_id=str(self.course_overview.id),
+                                  sections_possible=4,
+                                  points_possible=8.0)
+        data = CourseDetailsSerializer(instance=self.course_overview).data
+        assert data['sections_possible'] == 4
+        assert data['points_possible'] == 8.0
 
     def test_get_staff_with_no_course(self):
         '''Create a serializer for a course with a different ID than for the
@@ -379,6 +390,25 @@ class TestGeneralCourseDataSerializer(object):
         assert not data
 
 
+    def test_many_matches_single(self):
+        """The list serializer bulk loads the staff and metrics. Make sure we
+        get the same data as serializing each course
+        """
+        other_course = CourseOverviewFactory()
+        for date in ['2018-01-01', '2018-02-01']:
+            CourseDailyMetricsFactory(site=self.site,
+                                      course_id=self.course_overview.id,
+                                      date_for=date)
+        courses = [self.course_overview, other_course]
+        many_data = GeneralCourseDataSerializer(courses, many=True).data
+        assert many_data == [GeneralCourseDataSerializer(course).data
+                             for course in courses]
+        assert len(many_data[0]['staff']) == 2
+        assert many_data[0]['metrics']['date_for'] == '2018-02-01'
+        assert many_data[1]['staff'] == []
+        assert many_data[1]['metrics'] is None
+
+
 class TestGeneralUserDataSerializer(object):
     '''Tests the UserIndexSerializer serializer class
     '''
@@ -12,6 +12,7 @@ import pytest
 
 
 from figures import helpers as figures_helpers
+from figures.settings import use_approximate_mau
 from figures.settings.lms_production import plugin_settings
 
 
@@ -90,6 +91,24 @@ class TestUpdateSettings(object):
         assert settings.ENV_TOKENS['FIGURES'] == figures_env_tokens
 
 
+@pytest.mark.parametrize('figures_env_tokens, expected_task', [
+        ({}, 'figures.tasks.populate_daily_metrics'),
+        ({'DAILY_METRICS_PARALLEL': False}, 'figures.tasks.populate_daily_metrics'),
+        ({'DAILY_METRICS_PARALLEL': True}, 'figures.tasks.populate_daily_metrics_parallel'),
+    ])
+def test_daily_metrics_parallel_setting(figures_env_tokens, expected_task):
+    settings = mock.Mock(
+        WEBPACK_LOADER={},
+        CELERYBEAT_SCHEDULE={},
+        FEATURES={},
+        ENV_TOKENS={'FIGURES': figures_env_tokens},
+        CELERY_IMPORTS=[],
+    )
+    plugin_settings(settings)
+    schedule = settings.CELERYBEAT_SCHEDULE['figures-populate-daily-metrics']
+    assert schedule['task'] == expected_task
+
+
 class TestDailyMauPipelineSettings(object):
     """Tests MAU pipeline settings
 
@@ -130,3 +149,38 @@ class TestDailyMauPipelineSettings(object):
         assert 'FIGURES' not in self.settings.ENV_TOKENS
         plugin_settings(self.settings)
         assert self.TASK_NAME not in self.settings.CELERYBEAT_SCHEDULE
+
+
+@pytest.mark.parametrize('figures_env_tokens, scheduled', [
+        ({}, False),
+        ({'ENABLE_ENROLLMENT_DATA_MICRO_BATCH': True}, True),
+    ])
+def test_enrollment_data_micro_batch_setting(figures_env_tokens, scheduled):
+    settings = mock.Mock(
+        WEBPACK_LOADER={},
+        CELERYBEAT_SCHEDULE={},
+        FEATURES={},
+        ENV_TOKENS={'FIGURES': figures_env_tokens},
+        CELERY_IMPORTS=[],
+    )
+    plugin_settings(settings)
+    task_name = 'figures-enrollment-data-micro-batch'
+    assert (task_name in settings.CELERYBEAT_SCHEDULE) == scheduled
+    if scheduled:
+        assert settings.CELERYBEAT_SCHEDULE[task_name]['task'] == (
+            'figures.tasks.run_enrollment_data_micro_batch')
+
+
+@pytest.mark.parametrize('domains, expected', [
+    (None, False),
+    ([], False),
+    (['other.example.com'], False),
+    (['alpha.example.com'], True),
+    (['*'], True),
+])
+def test_use_approximate_mau(settings, domains, expected):
+    site = mock.Mock(domain='alpha.example.com')
+    settings.FEATURES = {}
+    if domains is not None:
+        settings.FEATURES['FIGURES_APPROXIMATE_MAU_SITES'] = domains
+    assert use_approximate_mau(site) == expected
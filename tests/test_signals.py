@@ -0,0 +1,65 @@
+"""Tests the Figures signal handlers
+"""
+
+from __future__ import absolute_import
+import pytest
+from django.contrib.sites.models import Site
+
+from figures.models import DirtyEnrollment
+from figures.signals import (
+    capture_course_enrollment_change,
+    capture_student_module_change,
+    mark_enrollment_dirty,
+)
+
+from tests.factories import CourseEnrollmentFactory, StudentModuleFactory
+from tests.helpers import OPENEDX_RELEASE, GINKGO
+
+
+@pytest.mark.django_db
+class TestEnrollmentChangeCapture(object):
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        self.settings = settings
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_ENROLLMENT_CHANGE_CAPTURE=True)
+
+    def test_student_module_saved(self):
+        sm = StudentModuleFactory()
+        capture_student_module_change(sender=None, instance=sm, created=True)
+        rec = DirtyEnrollment.objects.get()
+        assert rec.site == Site.objects.get(id=self.settings.SITE_ID)
+        assert rec.user_id == sm.student_id
+        assert rec.course_id == str(sm.course_id)
+
+        capture_student_module_change(sender=None, instance=sm, created=False)
+        assert DirtyEnrollment.objects.get().modified > rec.modified
+
+    def test_queued_enrollment_single_query(self, django_assert_num_queries):
+        sm = StudentModuleFactory()
+        capture_student_module_change(sender=None, instance=sm, created=True)
+        with django_assert_num_queries(1):
+            capture_student_module_change(sender=None, instance=sm, created=False)
+
+    @pytest.mark.skipif(OPENEDX_RELEASE == GINKGO, reason='Breaks on CourseEnrollmentFactory')
+    def test_course_enrollment_saved(self):
+        ce = CourseEnrollmentFactory()
+        capture_course_enrollment_change(sender=None, instance=ce, created=True)
+        assert DirtyEnrollment.objects.filter(user_id=ce.user_id,
+                                              course_id=str(ce.course_id)).exists()
+
+    def test_capture_disabled(self):
+        self.settings.FEATURES = dict(self.settings.FEATURES,
+                                      FIGURES_ENROLLMENT_CHANGE_CAPTURE=False)
+        capture_student_module_change(sender=None, instance=StudentModuleFactory())
+        assert not DirtyEnrollment.objects.exists()
+
+    def test_capture_never_raises(self, monkeypatch, caplog):
+        def fail(course_id):
+            raise Exception('no site')
+        monkeypatch.setattr('figures.signals.get_site_id_for_course', fail)
+        mark_enrollment_dirty(user_id=1, course_id='course-v1:StarFleetAcademy+SFA01+2161')
+        assert not DirtyEnrollment.objects.exists()
+        assert caplog.records[-1].message.startswith(
+            'FIGURES:FAIL enrollment change capture')
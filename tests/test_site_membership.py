@@ -0,0 +1,101 @@
+"""Tests the figures.site_membership module
+"""
+from __future__ import absolute_import
+import mock
+import pytest
+
+import figures.site_membership
+from figures.site_membership import (
+    course_site,
+    course_site_id,
+    invalidate_course_membership,
+    invalidate_site_users,
+    site_membership_cache,
+    site_user_count,
+)
+from figures.signals import invalidate_site_membership, invalidate_site_user_count
+import figures.sites
+
+from tests.factories import SiteFactory
+
+
+COURSE_ID = 'course-v1:StarFleetAcademy+SFA01+2161'
+
+
+@pytest.mark.django_db
+class TestSiteMembership(object):
+    """Tests the cached course and user membership
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, monkeypatch, settings):
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_SITE_MEMBERSHIP_CACHE_TIMEOUT=600)
+        self.site = SiteFactory()
+        self.loader = mock.Mock(return_value=self.site.id)
+        monkeypatch.setattr('figures.site_membership._load_course_site_id', self.loader)
+
+    def test_course_site_id_cached(self):
+        assert course_site_id(COURSE_ID) == self.site.id
+        assert course_site_id(COURSE_ID) == self.site.id
+        assert self.loader.call_count == 1
+
+        invalidate_course_membership()
+        assert course_site_id(COURSE_ID) == self.site.id
+        assert self.loader.call_count == 2
+
+    def test_course_without_site(self):
+        self.loader.return_value = figures.site_membership.NO_SITE
+        assert course_site_id(COURSE_ID) is None
+        assert course_site_id(COURSE_ID) is None
+        assert course_site(COURSE_ID) is None
+        assert self.loader.call_count == 1
+
+    def test_shared_tier_disabled(self, settings):
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_SITE_MEMBERSHIP_CACHE_TIMEOUT=0)
+        course_site_id(COURSE_ID)
+        course_site_id(COURSE_ID)
+        assert self.loader.call_count == 2
+
+    def test_in_memory_tier(self, settings, django_assert_num_queries):
+        settings.FEATURES = dict(settings.FEATURES,
+                                 FIGURES_SITE_MEMBERSHIP_CACHE_TIMEOUT=0)
+        with site_membership_cache():
+            with django_assert_num_queries(1):
+                assert course_site(COURSE_ID) == self.site
+                assert course_site(COURSE_ID) == self.site
+            # Invalidation in this process clears the in-memory tier
+            invalidate_site_membership(sender=None)
+            course_site_id(COURSE_ID)
+        assert self.loader.call_count == 2
+
+    def test_site_user_count(self, monkeypatch):
+        user_model = mock.Mock()
+        count = user_model.objects.filter.return_value.distinct.return_value.count
+        count.return_value = 5
+        monkeypatch.setattr('figures.site_membership.get_user_model', lambda: user_model)
+        assert site_user_count(self.site) == 5
+        assert site_user_count(self.site) == 5
+        assert count.call_count == 1
+
+        invalidate_site_users([self.site.id])
+        site_user_count(self.site)
+        assert count.call_count == 2
+
+    def test_invalidate_site_user_count_handler(self, monkeypatch):
+        mock_invalidate = mock.Mock()
+        monkeypatch.setattr('figures.signals.invalidate_site_users', mock_invalidate)
+        instance = mock.Mock()
+        instance.organization.sites.values_list.return_value = [self.site.id]
+        invalidate_site_user_count(sender=None, instance=instance)
+        mock_invalidate.assert_called_once_with([self.site.id])
+
+        # Never raises
+        instance.organization.sites.values_list.side_effect = Exception('fail')
+        invalidate_site_user_count(sender=None, instance=instance)
+
+    def test_get_site_for_course_multisite(self, settings):
+        settings.FEATURES = dict(settings.FEATURES, FIGURES_IS_MULTISITE=True)
+        assert figures.sites.get_site_for_course(COURSE_ID) == self.site
+        assert figures.sites.get_site_for_course(COURSE_ID) == self.site
+        assert self.loader.call_count == 1
@@ -7,15 +7,18 @@ from datetime import date
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 
+import mock
 import pytest
 
 from openedx.core.djangoapps.content.course_overviews.models import (
     CourseOverview,
 )
 
-from figures.helpers import as_course_key, as_date
+from figures.compat import CourseEnrollment
+from figures.helpers import as_date
 from figures.models import (
     CourseDailyMetrics,
+    EnrollmentDataBackfillChunk,
     PipelineError,
     SiteDailyMetrics,
     )
@@ -24,6 +27,7 @@ import figures.mau
 
 from tests.factories import (
     CourseDailyMetricsFactory,
+    CourseEnrollmentFactory,
     CourseMauMetricsFactory,
     CourseOverviewFactory,
     SiteFactory,
@@ -70,6 +74,33 @@ def test_populate_site_daily_metrics(transactional_db, monkeypatch):
     assert SiteDailyMetrics.objects.count() == 1
 
 
+def test_populate_daily_active_users(transactional_db, monkeypatch):
+    site = SiteFactory()
+    date_for = '2019-01-02'
+    calls = []
+
+    def mock_collect_daily_active_users(site, date_for, overwrite):
+        calls.append((site, date_for, overwrite))
+
+    monkeypatch.setattr(figures.tasks, 'collect_daily_active_users',
+                        mock_collect_daily_active_users)
+    figures.tasks.populate_daily_active_users(site.id, date_for=date_for)
+    assert calls == [(site, date_for, False)]
+
+
+def test_populate_current_month_site_metrics(transactional_db, monkeypatch):
+    site = SiteFactory()
+    calls = []
+
+    def mock_fill_current_month(site, date_for):
+        calls.append((site, date_for))
+
+    monkeypatch.setattr(figures.tasks, 'fill_current_month', mock_fill_current_month)
+    figures.tasks.populate_current_month_site_metrics(site.id, date_for='2019-01-02')
+    figures.tasks.populate_current_month_site_metrics(site.id)
+    assert calls == [(site, date(2019, 1, 2)), (site, None)]
+
+
 @pytest.mark.skipif(OPENEDX_RELEASE == GINKGO,
                     reason='Broken test. Apparent Django 1.8 incompatibility')
 def test_populate_daily_metrics_site_level_error(transactional_db,
@@ -159,6 +190,57 @@ def test_populate_daily_metrics_enrollment_data_error(transactional_db,
         'FIGURES:FAIL figures.tasks update_enrollment_data')
 
 
+@pytest.mark.parametrize('site_results, single_cdm_calls', [
+    (dict(loaded=[], failed={}), 0),
+    (None, 2),
+])
+def test_populate_daily_metrics_site_extraction(transactional_db,
+                                                monkeypatch,
+                                                settings,
+                                                site_results,
+                                                single_cdm_calls):
+    """Make sure the site extraction replaces the per course populators and
+    that we fall back to them when it fails
+    """
+    settings.FEATURES = dict(settings.FEATURES,
+                             FIGURES_DAILY_METRICS_SITE_EXTRACTION=True,
+                             FIGURES_DAILY_METRICS_SKIP_INACTIVE_COURSES=False)
+    date_for = '2019-01-02'
+    courses = [CourseOverviewFactory() for i in range(2)]
+    mock_site_cdms = mock.Mock(return_value=site_results)
+    mock_single_cdm = mock.Mock()
+    monkeypatch.setattr(figures.tasks, 'populate_site_cdms', mock_site_cdms)
+    monkeypatch.setattr(figures.tasks, 'populate_single_cdm', mock_single_cdm)
+    for task_name in ['populate_daily_active_users',
+                      'populate_site_daily_metrics',
+                      'populate_current_month_site_metrics',
+                      'update_enrollment_data']:
+        monkeypatch.setattr(figures.tasks, task_name, mock.Mock())
+
+    figures.tasks.populate_daily_metrics(date_for=date_for)
+    assert sorted(mock_site_cdms.call_args[1]['course_ids']) == sorted(
+        str(course.id) for course in courses)
+    assert mock_single_cdm.call_count == single_cdm_calls
+
+
+def test_populate_site_cdms(transactional_db, monkeypatch):
+    site = Site.objects.first()
+    results = dict(loaded=['a'],
+                   failed={'b': ValidationError(message=dict(message=['invalid']))})
+    monkeypatch.setattr(figures.tasks, 'load_site_course_daily_metrics',
+                        mock.Mock(return_value=results))
+    assert figures.tasks.populate_site_cdms(site=site,
+                                            course_ids=['a', 'b'],
+                                            date_for='2019-01-02') == results
+    assert list(PipelineError.objects.values_list('course_id', flat=True)) == ['b']
+
+    monkeypatch.setattr(figures.tasks, 'load_site_course_daily_metrics',
+                        mock.Mock(side_effect=Exception('fail')))
+    assert figures.tasks.populate_site_cdms(site=site,
+                                            course_ids=['a', 'b'],
+                                            date_for='2019-01-02') is None
+
+
 @pytest.mark.skipif(OPENEDX_RELEASE == GINKGO,
                     reason='Broken test. Apparent Django 1.8 incompatibility')
 def test_populate_daily_metrics_multisite(transactional_db, monkeypatch):
@@ -174,6 +256,240 @@ def test_populate_daily_metrics_multisite(transactional_db, monkeypatch):
         figures.tasks.populate_daily_metrics(date_for=date_for)
 
 
+@pytest.mark.django_db
+class TestParallelDailyMetrics(object):
+    """Tests the parallel daily metrics pipeline tasks
+    """
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings):
+        self.site = Site.objects.first()
+        self.date_for = '2019-01-02'
+        settings.FEATURES = dict(FIGURES_DAILY_METRICS_SITE_CONCURRENCY=2,
+                                 FIGURES_DAILY_METRICS_CDM_MAX_RETRIES=2,
+                                 FIGURES_DAILY_METRICS_CDM_RETRY_BACKOFF=0)
+
+    def run_single_cdm_with_retry(self, retries=0, **kwargs):
+        """Run the task body as if Celery called it for the given retry
+
+        We run the task body directly so the tests do not need a result backend
+        """
+        task = figures.tasks.populate_single_cdm_with_retry
+        task.push_request(retries=retries)
+        try:
+            return task.run(**kwargs)
+        finally:
+            task.pop_request()
+
+    def test_single_cdm_with_retry_success(self, monkeypatch):
+        course_id = 'course-v1:certs-appsembler+001+2019'
+        calls = []
+
+        def mock_pop_single_cdm(**kwargs):
+            calls.append(kwargs['course_id'])
+
+        monkeypatch.setattr(figures.tasks, 'populate_single_cdm', mock_pop_single_cdm)
+        previous = [dict(course_id='course-v1:a+b+c', status='ok')]
+        results = self.run_single_cdm_with_retry(previous_results=previous,
+                                                 course_id=course_id,
+                                                 site_id=self.site.id,
+                                                 date_for=self.date_for)
+        assert calls == [course_id]
+        assert results == previous + [dict(course_id=course_id, status='ok')]
+
+    @pytest.mark.parametrize('retries, countdown', [(0, 10), (1, 20)])
+    def test_single_cdm_with_retry_retries(self, monkeypatch, settings,
+                                           retries, countdown):
+        """Make sure we retry with exponential backoff
+        """
+        settings.FEATURES['FIGURES_DAILY_METRICS_CDM_RETRY_BACKOFF'] = 10
+        error = ValidationError(message=dict(message=[u'expected failure']))
+
+        def mock_pop_single_cdm_fails(**kwargs):
+            raise error
+
+        class MockRetry(Exception):
+            pass
+
+        mock_retry = mock.Mock(return_value=MockRetry())
+        monkeypatch.setattr(figures.tasks, 'populate_single_cdm',
+                            mock_pop_single_cdm_fails)
+        monkeypatch.setattr(figures.tasks.populate_single_cdm_with_retry, 'retry',
+                            mock_retry)
+        with pytest.raises(MockRetry):
+            self.run_single_cdm_with_retry(retries=retries,
+                                           course_id='course-v1:a+b+c',
+                                           site_id=self.site.id,
+                                           date_for=self.date_for)
+        mock_retry.assert_called_once_with(exc=error, countdown=countdown, max_retries=2)
+        assert PipelineError.objects.count() == 0
+
+    def test_single_cdm_with_retry_fails(self, monkeypatch):
+        """Make sure we log the failure and return a result after the last retry
+        """
+        course_id = 'course-v1:certs-appsembler+001+2019'
+
+        def mock_pop_single_cdm_fails(**kwargs):
+            raise ValidationError(message=dict(message=[u'expected failure']))
+
+        monkeypatch.setattr(figures.tasks, 'populate_single_cdm',
+                            mock_pop_single_cdm_fails)
+        assert PipelineError.objects.count() == 0
+        results = self.run_single_cdm_with_retry(retries=2,
+                                                 course_id=course_id,
+                                                 site_id=self.site.id,
+                                                 date_for=self.date_for)
+        assert results == [dict(course_id=course_id, status='failed')]
+        error = PipelineError.objects.get()
+        assert error.course_id == course_id
+        assert error.site == self.site
+
+    def test_site_daily_metrics_after_cdms(self, monkeypatch):
+        calls = []
+
+        def mock_pop_sdm(site_id, **kwargs):
+            calls.append(('sdm', site_id, kwargs['date_for']))
+
+        def mock_update_enrollment_data(site_id, **kwargs):
+            calls.append(('enrollment_data', site_id))
+
+        def mock_pop_daily_active_users(site_id, **kwargs):
+            calls.append(('daily_active_users', site_id))
+
+        def mock_pop_current_month(site_id, **kwargs):
+            calls.append(('current_month', site_id))
+
+        monkeypatch.setattr(figures.tasks, 'populate_daily_active_users',
+                            mock_pop_daily_active_users)
+        monkeypatch.setattr(figures.tasks, 'populate_current_month_site_metrics',
+                            mock_pop_current_month)
+        monkeypatch.setattr(figures.tasks, 'populate_site_daily_metrics', mock_pop_sdm)
+        monkeypatch.setattr(figures.tasks, 'update_enrollment_data',
+                            mock_update_enrollment_data)
+        cdm_results = [
+            [dict(course_id='a', status='ok'), dict(course_id='b', status='failed')],
+            [dict(course_id='c', status='ok')],
+        ]
+        results = figures.tasks.populate_site_daily_metrics_after_cdms(
+            cdm_results, site_id=self.site.id, date_for=self.date_for)
+        assert calls == [('daily_active_users', self.site.id),
+                         ('sdm', self.site.id, self.date_for),
+                         ('current_month', self.site.id),
+                         ('enrollment_data', self.site.id)]
+        assert results == dict(site_id=self.site.id, courses=3, failed=['b'],
+                               failed_steps=[])
+
+    def test_site_daily_metrics_after_cdms_step_fails(self, monkeypatch):
+        calls = []
+
+        def mock_step(name):
+            return lambda site_id, **kwargs: calls.append(name)
+
+        def mock_pop_sdm(site_id, **kwargs):
+            raise Exception('sdm failed')
+
+        monkeypatch.setattr(figures.tasks, 'populate_daily_active_users',
+                            mock_step('daily_active_users'))
+        monkeypatch.setattr(figures.tasks, 'populate_site_daily_metrics', mock_pop_sdm)
+        monkeypatch.setattr(figures.tasks, 'populate_current_month_site_metrics',
+                            mock_step('current_month'))
+        monkeypatch.setattr(figures.tasks, 'update_enrollment_data',
+                            mock_step('enrollment_data'))
+        bumped = []
+        monkeypatch.setattr(figures.tasks, 'bump_data_version', bumped.append)
+        results = figures.tasks.populate_site_daily_metrics_after_cdms(
+            [], site_id=self.site.id, date_for=self.date_for)
+        assert calls == ['daily_active_users', 'current_month', 'enrollment_data']
+        assert results['failed_steps'] == ['populate_site_daily_metrics']
+        assert bumped == [self.site]
+
+    def test_daily_metrics_for_site_chord(self, monkeypatch):
+        """Make sure the chord has a chain per concurrent slot covering every
+        course and has the site metrics task as the callback
+        """
+        courses = [CourseOverviewFactory() for i in range(5)]
+        chords = []
+
+        def mock_chord(header):
+            def apply_callback(callback):
+                chords.append(dict(header=header, callback=callback))
+            return apply_callback
+
+        monkeypatch.setattr(figures.tasks, 'chord', mock_chord)
+        figures.tasks.populate_daily_metrics_for_site(site_id=self.site.id,
+                                                      date_for=self.date_for)
+        assert len(chords) == 1
+        header = chords[0]['header']
+        assert len(header) == 2
+        course_ids = [task.kwargs['course_id'] for chain in header for task in chain.tasks]
+        assert sorted(course_ids) == sorted(str(course.id) for course in courses)
+        # Chained tasks must receive the results of the tasks before them
+        assert not any(task.immutable for chain in header for task in chain.tasks)
+        callback = chords[0]['callback']
+        assert callback.task == 'figures.tasks.populate_site_daily_metrics_after_cdms'
+        assert callback.kwargs['site_id'] == self.site.id
+
+    def test_daily_metrics_for_site_no_courses(self, monkeypatch):
+        mock_callback = mock.Mock()
+        monkeypatch.setattr(figures.tasks, 'populate_site_daily_metrics_after_cdms',
+                            mock_callback)
+        monkeypatch.setattr(figures.tasks, 'chord', mock.Mock())
+        figures.tasks.populate_daily_metrics_for_site(site_id=self.site.id,
+                                                      date_for=self.date_for)
+        mock_callback.s.return_value.delay.assert_called_once_with([])
+        assert not figures.tasks.chord.called
+
+    def test_daily_metrics_for_site_skips_inactive(self, monkeypatch):
+        courses = [CourseOverviewFactory() for i in range(3)]
+        inactive = set([str(courses[0].id)])
+        monkeypatch.setattr(figures.tasks, 'carry_forward_inactive_courses',
+                            mock.Mock(return_value=inactive))
+        chords = []
+        monkeypatch.setattr(figures.tasks, 'chord',
+                            lambda header: lambda callback: chords.append(header))
+        figures.tasks.populate_daily_metrics_for_site(site_id=self.site.id,
+                                                      date_for=self.date_for)
+        course_ids = [task.kwargs['course_id'] for chain in chords[0] for task in chain.tasks]
+        assert sorted(course_ids) == sorted(str(course.id) for course in courses[1:])
+
+    def test_daily_metrics_for_site_enrollment_counts(self, monkeypatch):
+        courses = [CourseOverviewFactory() for i in range(3)]
+        counts = {str(course.id): i for i, course in enumerate(courses)}
+        monkeypatch.setattr(figures.tasks, 'get_enrollment_counts_exclude_admins',
+                            mock.Mock(return_value=counts))
+        chords = []
+        monkeypatch.setattr(figures.tasks, 'chord',
+                            lambda header: lambda callback: chords.append(header))
+        figures.tasks.populate_daily_metrics_for_site(site_id=self.site.id,
+                                                      date_for=self.date_for)
+        assert {task.kwargs['course_id']: task.kwargs['enrollment_count']
+                for chain in chords[0] for task in chain.tasks} == counts
+
+    def test_site_enrollment_counts_fails(self, monkeypatch):
+        monkeypatch.setattr(figures.tasks, 'get_enrollment_counts_exclude_admins',
+                            mock.Mock(side_effect=Exception('fail')))
+        assert figures.tasks.site_enrollment_counts(site=self.site,
+                                                    course_ids=['a'],
+                                                    date_for=self.date_for) == {}
+
+    def test_carry_forward_cdms_fails(self, monkeypatch):
+        monkeypatch.setattr(figures.tasks, 'carry_forward_inactive_courses',
+                            mock.Mock(side_effect=Exception('fail')))
+        assert figures.tasks.carry_forward_cdms(site=self.site,
+                                                course_ids=['a'],
+                                                date_for=self.date_for) == set()
+
+    def test_populate_daily_metrics_parallel(self, monkeypatch):
+        sites = [self.site] + [SiteFactory() for i in range(2)]
+        mock_site_task = mock.Mock()
+        monkeypatch.setattr(figures.tasks, 'populate_daily_metrics_for_site',
+                            mock_site_task)
+        figures.tasks.populate_daily_metrics_parallel(date_for=self.date_for)
+        site_ids = [call[1]['site_id'] for call in mock_site_task.delay.call_args_list]
+        assert sorted(site_ids) == sorted(site.id for site in sites)
+        for call in mock_site_task.delay.call_args_list:
+            assert call[1]['date_for'] == self.date_for
+
+
 def test_populate_course_mau(transactional_db, monkeypatch):
     expected_site = SiteFactory()
     course = CourseOverviewFactory()
@@ -200,23 +516,27 @@ def test_populate_course_mau(transactional_db, monkeypatch):
 
 def test_populate_mau_metrics_for_site(transactional_db, monkeypatch):
     expected_site = SiteFactory()
-    courses = [CourseOverviewFactory() for i in range(3)]
-
-    # Shoudl we track call for each course?
-    def mock_populate_course_mau(site_id, course_id, month_for, force_update=False):
-        assert site_id == Site.objects.get(id=site_id).id
-        assert course_id
+    calls = []
 
-    def mock_get_course_keys_for_site(site):
-        assert site == expected_site
-        return [as_course_key(course.id) for course in courses]
+    def mock_store_mau_metrics(site, month_for, overwrite=False):
+        calls.append(dict(site=site, month_for=month_for, overwrite=overwrite))
+        return dict(smo=None, cmos=[])
 
-    monkeypatch.setattr('figures.sites.get_course_keys_for_site',
-                        mock_get_course_keys_for_site)
-    monkeypatch.setattr('figures.tasks.populate_course_mau',
-                        mock_populate_course_mau)
+    monkeypatch.setattr('figures.tasks.store_mau_metrics', mock_store_mau_metrics)
+    bumped = []
+    monkeypatch.setattr('figures.tasks.bump_data_version', bumped.append)
 
     figures.tasks.populate_mau_metrics_for_site(site_id=expected_site.id)
+    figures.tasks.populate_mau_metrics_for_site(site_id=expected_site.id,
+                                                month_for='2020-1-1',
+                                                force_update=True)
+    assert calls[0]['site'] == expected_site
+    assert isinstance(calls[0]['month_for'], date)
+    assert not calls[0]['overwrite']
+    assert calls[1] == dict(site=expected_site,
+                            month_for=date(2020, 1, 1),
+                            overwrite=True)
+    assert bumped == [expected_site, expected_site]
 
 
 def test_populate_all_mau_single_site(transactional_db, monkeypatch):
@@ -256,8 +576,9 @@ def test_populate_monthly_metrics_for_site(transactional_db, monkeypatch):
     expected_site = SiteFactory()
     sites_visited = []
 
-    def mock_fill_last_smm_month(site):
+    def mock_fill_last_smm_month(site, overwrite=False):
         assert site == expected_site
+        assert overwrite
         sites_visited.append(site)
 
     monkeypatch.setattr('figures.tasks.fill_last_smm_month',
@@ -284,3 +605,57 @@ def test_run_figures_monthly_metrics(transactional_db, monkeypatch):
 
     figures.tasks.run_figures_monthly_metrics()
     assert set(sites_visited) == set([expected_site.id])
+
+
+@pytest.mark.parametrize('capture, full_scan, expected', [
+    (False, None, 'backfill'),
+    (True, None, 'dirty'),
+    (True, True, 'backfill'),
+])
+def test_update_enrollment_data_mode(transactional_db, monkeypatch, settings,
+                                     capture, full_scan, expected):
+    settings.FEATURES = dict(settings.FEATURES,
+                             FIGURES_ENROLLMENT_CHANGE_CAPTURE=capture)
+    site = SiteFactory()
+    calls = []
+
+    def mock_backfill(site, resume=False):
+        calls.append(('backfill', site.id))
+        return dict(chunks=0, processed=0, updated=0, errors=[])
+
+    def mock_update_dirty(site):
+        calls.append(('dirty', site.id))
+        return dict(processed=0, updated=0, errors=[])
+
+    monkeypatch.setattr('figures.tasks.backfill_enrollment_data_for_site', mock_backfill)
+    monkeypatch.setattr('figures.tasks.update_dirty_enrollment_data', mock_update_dirty)
+    figures.tasks.update_enrollment_data(site_id=site.id, full_scan=full_scan)
+    assert calls == [(expected, site.id)]
+
+
+def test_backfill_enrollment_data_parallel(transactional_db, monkeypatch):
+    site = SiteFactory()
+    enrollments = [CourseEnrollmentFactory() for _ in range(3)]
+    monkeypatch.setattr('figures.backfill.get_course_enrollments_for_site',
+                        lambda site: CourseEnrollment.objects.all())
+    chords = []
+
+    def mock_chord(header):
+        def apply_callback(callback):
+            chords.append(dict(header=header, callback=callback))
+        return apply_callback
+
+    monkeypatch.setattr(figures.tasks, 'chord', mock_chord)
+    figures.tasks.backfill_enrollment_data_parallel(site_id=site.id)
+    header = chords[0]['header']
+    assert len(header) == len(enrollments)
+    assert chords[0]['callback'].kwargs['site_id'] == site.id
+
+    monkeypatch.setattr('figures.tasks.backfill_enrollment_data_chunk',
+                        mock.Mock(side_effect=Exception('fail')))
+    results = [figures.tasks.backfill_enrollment_data_chunk_task(**task.kwargs)
+               for task in header]
+    assert [rec['status'] for rec in results] == ['failed'] * len(enrollments)
+    finished = figures.tasks.finish_enrollment_data_backfill_for_site(results, site_id=site.id)
+    assert not finished['finished']
+    assert EnrollmentDataBackfillChunk.objects.filter(site=site).count() == len(enrollments)
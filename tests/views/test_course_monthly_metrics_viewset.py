@@ -170,6 +170,53 @@ class TestCourseMonthlyMetricsViewSet(BaseViewTest):
         response = view(request)
         assert response.status_code == status.HTTP_200_OK
 
+    def call_list(self, monkeypatch, course_test_data, query=''):
+        """Adds two more courses to the site and calls the list endpoint
+        """
+        site = course_test_data['site']
+        org = course_test_data['org']
+        users = course_test_data['users']
+        for _ in range(2):
+            OrganizationCourseFactory(organization=org,
+                                      course_id=str(CourseOverviewFactory().id))
+        caller = UserFactory(is_staff=True)
+        if organizations_support_sites():
+            map_users_to_org_site(caller=caller, site=site, users=users)
+
+        request = APIRequestFactory().get(self.base_request_path + query)
+        monkeypatch.setattr(django.contrib.sites.shortcuts,
+                            'get_current_site',
+                            lambda req: site)
+        force_authenticate(request, user=caller)
+        view = self.view_class.as_view({'get': 'list'})
+        response = view(request)
+        assert response.status_code == status.HTTP_200_OK
+        return response
+
+    def test_list_unpaginated(self, monkeypatch, course_test_data):
+        response = self.call_list(monkeypatch, course_test_data)
+        assert isinstance(response.data, list)
+        assert len(response.data) == 3
+        for rec in response.data:
+            assert set(rec.keys()) == set(['course_id',
+                                           'month_for',
+                                           'active_users',
+                                           'course_enrollments',
+                                           'num_learners_completed',
+                                           'avg_days_to_complete',
+                                           'avg_progress'])
+
+    def test_list_paginated(self, monkeypatch, course_test_data):
+        response = self.call_list(monkeypatch, course_test_data, '?limit=2&offset=1')
+        assert response.data['count'] == 3
+        assert len(response.data['results']) == 2
+
+    def test_list_course_filter(self, monkeypatch, course_test_data):
+        course_id = str(course_test_data['course_overview'].id)
+        query = '?course={},course-v1:NothingToSeeHere+NTS+42'.format(course_id)
+        response = self.call_list(monkeypatch, course_test_data, query)
+        assert [rec['course_id'] for rec in response.data] == [course_id]
+
     def test_retrieve_method(self, monkeypatch, course_test_data):
         site = course_test_data['site']
         users = course_test_data['users']
@@ -5,7 +5,9 @@ import pytest
 
 from django.contrib.auth import get_user_model
 from django.contrib.sites.models import Site
+from django.db import connection
 from django.db.models import F
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.test import (
     APIRequestFactory,
@@ -19,6 +21,7 @@ from figures.helpers import as_course_key, is_multisite
 from figures.views import GeneralCourseDataViewSet
 
 from tests.factories import (
+    CourseAccessRoleFactory,
     CourseDailyMetricsFactory,
     CourseEnrollmentFactory,
     CourseOverviewFactory,
@@ -148,6 +151,44 @@ class TestGeneralCourseDataViewSet(BaseViewTest):
             # We're starting to need more complex data set-up, so deferring to
             # implement a
 
+    def add_course_data(self, course_overview, map_to_site=True):
+        """Adds staff and daily metrics for the course
+        """
+        if map_to_site and is_multisite():
+            OrganizationCourseFactory(organization=self.organization,
+                                      course_id=str(course_overview.id))
+        for role in ['staff', 'instructor']:
+            CourseAccessRoleFactory(course_id=course_overview.id, role=role)
+        for date_for in ['2020-01-01', '2020-01-02']:
+            CourseDailyMetricsFactory(site=self.site,
+                                      course_id=str(course_overview.id),
+                                      date_for=date_for)
+
+    def list_query_count(self):
+        request = APIRequestFactory().get(self.request_path)
+        force_authenticate(request, user=self.staff_user)
+        view = self.view_class.as_view({'get': 'list'})
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(request)
+        assert response.status_code == 200
+        for rec in response.data['results']:
+            assert len(rec['staff']) == 2
+            assert rec['metrics']['date_for'] == '2020-01-02'
+        return len(ctx.captured_queries)
+
+    def test_get_list_query_count(self):
+        """The number of queries for a page does not depend on the number of
+        courses in the page
+        """
+        for course_overview in self.course_overviews:
+            self.add_course_data(course_overview, map_to_site=False)
+        # The first call also loads the current site, so we don't count it
+        self.list_query_count()
+        query_count = self.list_query_count()
+        for _ in range(4):
+            self.add_course_data(CourseOverviewFactory())
+        assert self.list_query_count() == query_count
+
     def test_get_retrieve(self):
         '''Tests retrieving a list of users with abbreviated details
 
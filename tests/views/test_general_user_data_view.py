@@ -194,6 +194,34 @@ class TestGeneralUserViewSet(BaseViewTest):
                 # Test that the course id exists in the data
                 assert get_course_rec(course_enrollment.course_id, rec['courses'])
 
+    def get_list(self, request_path):
+        request = APIRequestFactory().get(request_path)
+        force_authenticate(request, user=self.staff_user)
+        view = self.view_class.as_view({'get': 'list'})
+        response = view(request)
+        assert response.status_code == 200
+        return response
+
+    def test_get_list_cursor_pagination(self):
+        """Walk the pages with cursor pagination and check we get every user
+        once, in id order
+        """
+        expected_ids = [rec['id'] for rec in
+                        self.get_list(self.request_path).data['results']]
+        response = self.get_list(self.request_path + '?cursor=&page_size=2')
+        assert set(response.data.keys()) == set(['next', 'previous', 'results'])
+        assert response.data['previous'] is None
+        result_ids = [rec['id'] for rec in response.data['results']]
+        while response.data['next']:
+            response = self.get_list(response.data['next'])
+            assert len(response.data['results']) <= 2
+            result_ids += [rec['id'] for rec in response.data['results']]
+        assert result_ids == sorted(expected_ids)
+
+    def test_get_list_cursor_pagination_with_count(self):
+        response = self.get_list(self.request_path + '?cursor=&count=true')
+        assert response.data['count'] == len(response.data['results'])
+
     @pytest.mark.parametrize('search_term', SEARCH_TERMS)
     def test_get_search(self, search_term):
         """
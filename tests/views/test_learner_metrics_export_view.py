@@ -0,0 +1,53 @@
+"""Tests the Figures learner metrics export view
+"""
+
+from __future__ import absolute_import
+import json
+
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from figures.views import LearnerMetricsExportView
+
+from tests.factories import EnrollmentDataFactory
+from tests.views.base import BaseViewTest
+
+
+@pytest.mark.django_db
+class TestLearnerMetricsExportView(BaseViewTest):
+
+    request_path = 'api/learner-metrics-export/'
+    view_class = LearnerMetricsExportView
+    get_action = None
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db):
+        super(TestLearnerMetricsExportView, self).setup(db)
+        self.enrollment_data = [EnrollmentDataFactory(site=self.site) for _ in range(3)]
+
+    def get_export(self, query=''):
+        request = APIRequestFactory().get(self.request_path + query)
+        force_authenticate(request, user=self.staff_user)
+        return self.view_class.as_view()(request)
+
+    def test_csv(self):
+        response = self.get_export()
+        assert response.status_code == 200
+        assert response.streaming
+        assert response['Content-Type'] == 'text/csv'
+        assert 'attachment' in response['Content-Disposition']
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        assert len(lines) == len(self.enrollment_data) + 1
+        assert lines[0].startswith('user_id,username')
+
+    def test_ndjson_with_course_filter(self):
+        course_id = self.enrollment_data[1].course_id
+        response = self.get_export('?export_format=ndjson&course=' + course_id)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/x-ndjson'
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        assert [json.loads(line)['course_id'] for line in lines] == [course_id]
+
+    def test_invalid_format(self):
+        response = self.get_export('?export_format=xml')
+        assert response.status_code == 400
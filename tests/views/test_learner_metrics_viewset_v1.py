@@ -4,6 +4,8 @@
 import pytest
 
 import django.contrib.sites.shortcuts
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIRequestFactory, force_authenticate
 
@@ -14,11 +16,20 @@ from figures.sites import (
 )
 from figures.views import LearnerMetricsViewSetV1
 
+from tests.factories import (
+    CourseEnrollmentFactory,
+    LearnerCourseGradeMetricsFactory,
+    UserFactory,
+)
 from tests.helpers import organizations_support_sites
 from tests.views.base import BaseViewTest
 from tests.views.helpers import is_response_paginated, make_caller
 
 
+if organizations_support_sites():
+    from tests.factories import UserOrganizationMappingFactory
+
+
 def filter_enrollments(enrollments, courses):
     course_ids = [elem.id for elem in courses]
     return [elem for elem in enrollments if elem.course_id in course_ids]
@@ -128,6 +139,53 @@ class TestLearnerMetricsViewSetV1(BaseViewTest):
                     'date_joined', 'enrollments']
         assert set(results[0].keys()) == set(top_keys)
 
+    def add_learner_with_progress(self, site_data):
+        """Enrolls a new learner in all the site's courses with progress records
+        """
+        user = UserFactory()
+        if organizations_support_sites():
+            UserOrganizationMappingFactory(user=user, organization=site_data['org'])
+        for course in site_data['courses']:
+            CourseEnrollmentFactory(course=course, user=user)
+            for sections_worked in [1, 2]:
+                LearnerCourseGradeMetricsFactory(site=site_data['site'],
+                                                 user=user,
+                                                 course_id=str(course.id),
+                                                 sections_worked=sections_worked)
+        return user
+
+    def test_list_query_count(self, monkeypatch, lm_test_data):
+        """The number of queries for a page does not depend on the number of
+        learners and enrollments in the page
+        """
+        us = lm_test_data['us']
+        caller = make_caller(us['org'])
+        self.add_learner_with_progress(us)
+
+        def list_query_count():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.make_request(request_path=self.base_request_path,
+                                             monkeypatch=monkeypatch,
+                                             site=us['site'],
+                                             caller=caller,
+                                             action='list')
+            assert response.status_code == status.HTTP_200_OK
+            return response, len(ctx.captured_queries)
+
+        # The first call also loads the current site, so we don't count it
+        list_query_count()
+        _, query_count = list_query_count()
+        learners = [self.add_learner_with_progress(us) for i in range(3)]
+        response, new_query_count = list_query_count()
+        assert new_query_count == query_count
+
+        results = {rec['id']: rec for rec in response.data['results']}
+        for learner in learners:
+            enrollments = results[learner.id]['enrollments']
+            assert len(enrollments) == len(us['courses'])
+            for enrollment in enrollments:
+                assert enrollment['progress_details']['sections_worked'] == 2
+
     def test_course_param_single(self, monkeypatch, lm_test_data):
         """Test that the 'course' query parameter works
 
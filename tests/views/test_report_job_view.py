@@ -0,0 +1,86 @@
+"""Tests the Figures report job viewset
+"""
+
+from __future__ import absolute_import
+import gzip
+import io
+
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from figures.models import ReportJob
+from figures.reports import build_report
+from figures.views import ReportJobViewSet
+
+from tests.factories import SiteFactory
+from tests.views.base import BaseViewTest
+
+
+@pytest.mark.django_db
+class TestReportJobViewSet(BaseViewTest):
+
+    request_path = 'api/report-jobs/'
+    view_class = ReportJobViewSet
+
+    @pytest.fixture(autouse=True)
+    def setup(self, db, settings, tmpdir, monkeypatch):
+        super(TestReportJobViewSet, self).setup(db)
+        settings.MEDIA_ROOT = str(tmpdir)
+        self.started = []
+        monkeypatch.setattr('figures.views.run_report_job.delay',
+                            lambda job_id: self.started.append(job_id))
+
+    def call(self, method, action, path='', data=None, **kwargs):
+        request = getattr(APIRequestFactory(), method)(self.request_path + path,
+                                                       data=data,
+                                                       format='json')
+        force_authenticate(request, user=self.staff_user)
+        return self.view_class.as_view({method: action})(request, **kwargs)
+
+    def test_create(self):
+        response = self.call('post', 'create', data=dict(report_type='learner'))
+        assert response.status_code == 202
+        job = ReportJob.objects.get(id=response.data['id'])
+        assert job.site == self.site
+        assert job.requested_by == self.staff_user
+        assert response.data['status'] == ReportJob.PENDING
+        assert self.started == [job.id]
+
+        response = self.call('post', 'create', data=dict(report_type='learner'))
+        assert response.status_code == 200
+        assert response.data['id'] == job.id
+        assert self.started == [job.id]
+
+    def test_create_invalid_report_type(self):
+        response = self.call('post', 'create', data=dict(report_type='grades'))
+        assert response.status_code == 400
+        assert not ReportJob.objects.exists()
+
+    def test_list(self):
+        job = ReportJob.objects.create(site=self.site,
+                                       report_type=ReportJob.COURSE_REPORT,
+                                       data_version='1')
+        ReportJob.objects.create(site=SiteFactory(),
+                                 report_type=ReportJob.COURSE_REPORT,
+                                 data_version='1')
+        response = self.call('get', 'list')
+        assert response.status_code == 200
+        assert [rec['id'] for rec in response.data['results']] == [job.id]
+
+    def test_download(self):
+        job = ReportJob.objects.create(site=self.site,
+                                       report_type=ReportJob.LEARNER_REPORT,
+                                       data_version='1')
+        response = self.call('get', 'download', path='{}/download/'.format(job.id),
+                             pk=job.id)
+        assert response.status_code == 404
+
+        build_report(job)
+        response = self.call('get', 'download', path='{}/download/'.format(job.id),
+                             pk=job.id)
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'application/gzip'
+        assert 'attachment' in response['Content-Disposition']
+        content = gzip.GzipFile(
+            fileobj=io.BytesIO(b''.join(response.streaming_content))).read()
+        assert content.decode('utf-8').startswith('user_id,username')